@@ -4,6 +4,10 @@
  * This sketch captures video from an ESP32-CAM and streams it to a PC
  * over WebSockets for AI processing.
  * 
+ * Set USE_TCP_INGEST to 1 to instead connect to the PC's binary TCP ingest
+ * port (stream_receiver.py --tcp-port) and send each JPEG behind a small
+ * header, without WebSocket framing.
+ * 
  * Hardware: AI Thinker ESP32-CAM or similar
  * 
  * Libraries required:
@@ -28,6 +32,21 @@ const char* password = "YOUR_WIFI_PASSWORD";  // Replace with your WiFi password
 WebSocketsServer webSocket = WebSocketsServer(8888);
 bool clientConnected = false;
 
+// Binary TCP ingest settings (used instead of the WebSocket when enabled)
+#define USE_TCP_INGEST 0
+const char* serverHost = "192.168.1.100";  // Replace with the IP address of the PC
+const uint16_t tcpIngestPort = 8889;
+const char* cameraId = "cam1";              // Camera ID sent with every frame
+WiFiClient tcpClient;
+uint32_t frameSequence = 0;
+unsigned long lastConnectAttempt = 0;
+char commandLine[256];
+size_t commandLength = 0;
+
+// Frame pacing, adjusted at runtime by rate control commands from the PC
+unsigned long frameIntervalMs = 50;   // Minimum time between frames
+unsigned long lastFrameTime = 0;
+
 // Camera pins for AI Thinker ESP32-CAM
 #define PWDN_GPIO_NUM     32
 #define RESET_GPIO_NUM    -1
@@ -53,6 +72,9 @@ camera_config_t config;
 bool initCamera();
 void webSocketEvent(uint8_t num, WStype_t type, uint8_t * payload, size_t length);
 void sendCameraFrame();
+void handleRateControl(const char * message);
+void tcpIngestLoop();
+void sendTcpFrame(camera_fb_t * fb);
 
 void setup() {
   // Disable brownout detector
@@ -81,20 +103,27 @@ void setup() {
   Serial.print("Connected to WiFi, IP address: ");
   Serial.println(WiFi.localIP());
   
+#if USE_TCP_INGEST
+  Serial.printf("Sending frames to %s:%u over TCP\n", serverHost, tcpIngestPort);
+#else
   // Start WebSocket server
   webSocket.begin();
   webSocket.onEvent(webSocketEvent);
   Serial.println("WebSocket server started");
+#endif
 }
 
 void loop() {
+#if USE_TCP_INGEST
+  tcpIngestLoop();
+#else
   webSocket.loop();
+#endif
   
-  // If client is connected, send camera frames
-  if (clientConnected) {
+  // If client is connected, send camera frames at the requested rate
+  if (clientConnected && millis() - lastFrameTime >= frameIntervalMs) {
+    lastFrameTime = millis();
     sendCameraFrame();
-    // Add a small delay to control frame rate
-    delay(50);  // Adjust this value to change frame rate
   }
 }
 
@@ -180,8 +209,9 @@ void webSocketEvent(uint8_t num, WStype_t type, uint8_t * payload, size_t length
       }
       break;
     case WStype_TEXT:
-      // Handle text messages from client if needed
+      // Text messages carry rate control commands from the PC
       Serial.printf("[%u] Received text: %s\n", num, payload);
+      handleRateControl((const char *)payload);
       break;
     case WStype_BIN:
       // Handle binary messages from client if needed
@@ -204,9 +234,137 @@ void sendCameraFrame() {
     return;
   }
   
+#if USE_TCP_INGEST
+  sendTcpFrame(fb);
+#else
   // Send the frame over WebSocket
   webSocket.sendBIN(0, fb->buf, fb->len);
+#endif
   
   // Return the frame buffer to the camera driver
   esp_camera_fb_return(fb);
 }
+
+// Keep the TCP ingest connection open and apply commands sent back by the PC
+void tcpIngestLoop() {
+  if (!tcpClient.connected()) {
+    clientConnected = false;
+    if (millis() - lastConnectAttempt < 2000) {
+      return;
+    }
+    lastConnectAttempt = millis();
+    if (!tcpClient.connect(serverHost, tcpIngestPort)) {
+      Serial.println("TCP ingest connection failed");
+      return;
+    }
+    tcpClient.setNoDelay(true);
+    commandLength = 0;
+    clientConnected = true;
+    Serial.println("Connected to TCP ingest server");
+  }
+
+  // Commands arrive as one JSON object per line
+  while (tcpClient.available()) {
+    char c = tcpClient.read();
+    if (c == '\n') {
+      commandLine[commandLength] = '\0';
+      handleRateControl(commandLine);
+      commandLength = 0;
+    } else if (commandLength < sizeof(commandLine) - 1) {
+      commandLine[commandLength++] = c;
+    }
+  }
+}
+
+// Write a big-endian integer of the given size into a buffer
+void putBigEndian(uint8_t * out, uint64_t value, int size) {
+  for (int i = size - 1; i >= 0; i--) {
+    out[i] = value & 0xFF;
+    value >>= 8;
+  }
+}
+
+// Send a frame as: magic "AC", version, ID length, sequence, timestamp (us), JPEG length, ID, JPEG
+void sendTcpFrame(camera_fb_t * fb) {
+  static uint8_t header[20 + 32];
+  size_t idLength = strlen(cameraId);
+  if (idLength > 32) idLength = 32;
+
+  header[0] = 'A';
+  header[1] = 'C';
+  header[2] = 1;
+  header[3] = idLength;
+  putBigEndian(header + 4, frameSequence++, 4);
+  putBigEndian(header + 8, esp_timer_get_time(), 8);
+  putBigEndian(header + 16, fb->len, 4);
+  memcpy(header + 20, cameraId, idLength);
+
+  if (tcpClient.write(header, 20 + idLength) != 20 + idLength ||
+      tcpClient.write(fb->buf, fb->len) != fb->len) {
+    Serial.println("TCP ingest send failed");
+    tcpClient.stop();
+  }
+}
+
+// Find an integer value for "key" in a flat JSON object. Returns fallback if missing.
+long jsonInt(const char * json, const char * key, long fallback) {
+  char pattern[32];
+  snprintf(pattern, sizeof(pattern), "\"%s\"", key);
+  const char * pos = strstr(json, pattern);
+  if (!pos) return fallback;
+  pos = strchr(pos + strlen(pattern), ':');
+  if (!pos) return fallback;
+  return strtol(pos + 1, NULL, 10);
+}
+
+// Find a string value for "key" in a flat JSON object. Returns false if missing.
+bool jsonString(const char * json, const char * key, char * out, size_t outSize) {
+  char pattern[32];
+  snprintf(pattern, sizeof(pattern), "\"%s\"", key);
+  const char * pos = strstr(json, pattern);
+  if (!pos) return false;
+  pos = strchr(pos + strlen(pattern), '"');
+  if (!pos) return false;
+  const char * end = strchr(pos + 1, '"');
+  if (!end || (size_t)(end - pos - 1) >= outSize) return false;
+  memcpy(out, pos + 1, end - pos - 1);
+  out[end - pos - 1] = '\0';
+  return true;
+}
+
+// Apply a rate control command, e.g.
+// {"type": "rate_control", "interval_ms": 83, "framesize": "QVGA", "quality": 10}
+void handleRateControl(const char * message) {
+  if (!strstr(message, "\"rate_control\"")) {
+    return;
+  }
+
+  long interval = jsonInt(message, "interval_ms", -1);
+  if (interval > 0) {
+    frameIntervalMs = interval;
+  }
+
+  sensor_t * s = esp_camera_sensor_get();
+
+  char framesize[8];
+  if (jsonString(message, "framesize", framesize, sizeof(framesize))) {
+    framesize_t size = FRAMESIZE_INVALID;
+    if (strcmp(framesize, "QQVGA") == 0) size = FRAMESIZE_QQVGA;
+    else if (strcmp(framesize, "QVGA") == 0) size = FRAMESIZE_QVGA;
+    else if (strcmp(framesize, "CIF") == 0) size = FRAMESIZE_CIF;
+    else if (strcmp(framesize, "VGA") == 0) size = FRAMESIZE_VGA;
+    else if (strcmp(framesize, "SVGA") == 0) size = FRAMESIZE_SVGA;
+
+    // Frame sizes above QVGA need PSRAM
+    if (size != FRAMESIZE_INVALID && (size <= FRAMESIZE_QVGA || psramFound())) {
+      s->set_framesize(s, size);
+    }
+  }
+
+  long quality = jsonInt(message, "quality", -1);
+  if (quality >= 0 && quality <= 63) {
+    s->set_quality(s, quality);
+  }
+
+  Serial.printf("Rate control: %lu ms/frame\n", frameIntervalMs);
+}
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Adaptive Inference Input Size for YOLO
+
+This module picks the YOLO network input size at runtime so that inference
+keeps up with a target frame rate or latency budget. Smaller inputs are
+faster but miss small objects, so the controller steps down only while the
+budget is being missed and steps back up as soon as the next larger size is
+predicted to fit.
+
+One controller is kept per camera; the AIProcessor input size is switched to
+the camera's size before each frame is processed.
+"""
+
+# Supported input sizes, smallest first (YOLO needs multiples of 32)
+INPUT_SIZES = (256, 320, 416, 512, 608)
+
+
+class InputSizeController:
+    """Class to choose a YOLO input size that meets a latency budget."""
+
+    def __init__(self, sizes=INPUT_SIZES, initial_size=416, target_fps=None,
+                 latency_budget_ms=None, headroom=0.7, hold_frames=10, smoothing=0.2):
+        """
+        Initialize the input size controller.
+
+        Either target_fps or latency_budget_ms must be given. If both are given
+        the tighter of the two budgets is used.
+
+        Args:
+            sizes (iterable): Input sizes the controller may choose from
+            initial_size (int): Size to start with (snapped to the nearest allowed size)
+            target_fps (float): Inference rate to sustain
+            latency_budget_ms (float): Maximum inference time per frame in milliseconds
+            headroom (float): Fraction of the budget the next larger size must fit in
+            hold_frames (int): Consecutive frames a condition must hold before switching
+            smoothing (float): Weight of the newest sample in the moving average
+        """
+        budgets = []
+        if target_fps:
+            budgets.append(1.0 / target_fps)
+        if latency_budget_ms:
+            budgets.append(latency_budget_ms / 1000.0)
+        if not budgets:
+            raise ValueError("A target FPS or latency budget is required")
+
+        self.sizes = sorted(sizes)
+        self.budget = min(budgets)
+        self.headroom = headroom
+        self.hold_frames = hold_frames
+        self.smoothing = smoothing
+
+        self.size = min(self.sizes, key=lambda s: abs(s - initial_size))
+        self.average_time = None
+        self._over_budget = 0
+        self._under_budget = 0
+
+    def update(self, inference_time):
+        """
+        Record the inference time of a frame and pick the size for the next one.
+
+        Args:
+            inference_time (float): Seconds spent on inference at the current size
+
+        Returns:
+            int: Input size to use for the next frame
+        """
+        if self.average_time is None:
+            self.average_time = inference_time
+        else:
+            self.average_time += self.smoothing * (inference_time - self.average_time)
+
+        index = self.sizes.index(self.size)
+
+        if self.average_time > self.budget:
+            self._over_budget += 1
+            self._under_budget = 0
+            if self._over_budget >= self.hold_frames and index > 0:
+                self._switch(self.sizes[index - 1])
+
+        elif index < len(self.sizes) - 1 and \
+                self._predict(self.sizes[index + 1]) <= self.budget * self.headroom:
+            self._under_budget += 1
+            self._over_budget = 0
+            if self._under_budget >= self.hold_frames:
+                self._switch(self.sizes[index + 1])
+
+        else:
+            self._over_budget = 0
+            self._under_budget = 0
+
+        return self.size
+
+    def _predict(self, size):
+        """Estimate inference time at another size (cost scales with the pixel count)."""
+        return self.average_time * (size * size) / (self.size * self.size)
+
+    def _switch(self, size):
+        """Move to a new size and seed the average with the predicted time."""
+        self.average_time = self._predict(size)
+        self.size = size
+        self._over_budget = 0
+        self._under_budget = 0
@@ -3,262 +3,460 @@
 AI Processor Module for ESP32-CAM Video Stream
 
 This module handles AI processing of video frames using different models:
-- YOLOv4 for object detection
+- YOLOv4 and YOLOv4-tiny for object detection
+- YOLOv5/YOLOv8 ONNX exports for object detection
 - MediaPipe for pose estimation
 - MediaPipe for face detection
 
-Each model can be selected at runtime.
+Each model can be selected at runtime. The available models are defined in
+the registry in model_backends.py.
+
+Several models can also run on the same frame at once with
+MultiModelProcessor, e.g. objects and faces together, or in a cascade with
+CascadeProcessor, where face/pose models only look inside the people a YOLO
+model found. create_processor() builds the right processor from a model spec
+such as 'yolov4_tiny:3,mediapipe_face' or 'yolov4_tiny>mediapipe_face+mediapipe_pose'.
 """
 
-import cv2
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-import os
+
+from model_backends import MODEL_REGISTRY, create_backend, get_model_spec
 
 class AIProcessor:
     """Class to handle AI processing of video frames."""
 
-    def __init__(self, model_name='yolov4', confidence_threshold=0.5):
+    def __init__(self, model_name='yolov4', confidence_threshold=0.5, input_size=None,
+                 model_dir=None, dnn_backend=None, dnn_target=None, threads=None):
         """
         Initialize the AI processor with the specified model.
 
         Args:
-            model_name (str): Name of the AI model to use ('yolov4', 'mediapipe_pose', 'mediapipe_face')
+            model_name (str): Name of the AI model to use (a key of MODEL_REGISTRY)
             confidence_threshold (float): Confidence threshold for detections (0.0 to 1.0)
+            input_size (int): Network input width and height for YOLO models (multiple of 32)
+            model_dir (str): Directory containing the model files (defaults to ../models)
+            dnn_backend (str): OpenCV DNN backend name (e.g. 'opencv', 'cuda', 'openvino')
+            dnn_target (str): OpenCV DNN target name (e.g. 'cpu', 'cuda', 'opencl')
+            threads (int): Number of OpenCV threads (0 for OpenCV's default)
+
+        Arguments left as None use the model's registered defaults.
         """
         self.model_name = model_name
         self.confidence_threshold = confidence_threshold
-        self.model = None
-        self.classes = None
         self.last_detection_count = 0
+        self.last_detections = []
+
+        # Annotated output frames per frame shape, reused across frames
+        self._result_buffers = {}
 
         # Initialize the selected model
-        if model_name == 'yolov4':
-            self._init_yolov4()
-        elif model_name == 'mediapipe_pose':
-            self._init_mediapipe_pose()
-        elif model_name == 'mediapipe_face':
-            self._init_mediapipe_face()
-        else:
-            raise ValueError(f"Unsupported model: {model_name}")
-
-    def _init_yolov4(self):
-        """Initialize YOLOv4 model for object detection."""
-        print("Initializing YOLOv4 model...")
-
-        # Paths to model files
-        model_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
-        weights_path = os.path.join(model_dir, 'yolov4.weights')
-        config_path = os.path.join(model_dir, 'yolov4.cfg')
-        classes_path = os.path.join(model_dir, 'coco.names')
-
-        # Check if model files exist
-        if not os.path.exists(weights_path) or not os.path.exists(config_path):
-            raise FileNotFoundError(
-                f"YOLOv4 model files not found. Please download them to {model_dir}. "
-                "See INSTALL.md for instructions."
-            )
-
-        # Load COCO class names
-        with open(classes_path, 'r') as f:
-            self.classes = [line.strip() for line in f.readlines()]
-
-        # Load YOLOv4 model
-        self.model = cv2.dnn.readNetFromDarknet(config_path, weights_path)
-
-        # Set preferred backend and target
-        self.model.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
-        self.model.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)  # Use DNN_TARGET_CUDA for GPU
-
-        # Get output layer names
-        self.layer_names = self.model.getLayerNames()
-        self.output_layers = [self.layer_names[i - 1] for i in self.model.getUnconnectedOutLayers()]
-
-        # Generate random colors for class visualization
-        np.random.seed(42)
-        self.colors = np.random.randint(0, 255, size=(len(self.classes), 3), dtype=np.uint8)
-
-    def _init_mediapipe_pose(self):
-        """Initialize MediaPipe model for pose estimation."""
-        try:
-            import mediapipe as mp
-            self.mp = mp
-            self.mp_pose = mp.solutions.pose
-            self.mp_drawing = mp.solutions.drawing_utils
-            self.model = self.mp_pose.Pose(
-                static_image_mode=False,
-                model_complexity=1,
-                smooth_landmarks=True,
-                min_detection_confidence=self.confidence_threshold,
-                min_tracking_confidence=self.confidence_threshold
-            )
-            print("MediaPipe Pose model initialized")
-        except ImportError:
-            raise ImportError(
-                "MediaPipe not installed. Please install it with: pip install mediapipe"
-            )
-
-    def _init_mediapipe_face(self):
-        """Initialize MediaPipe model for face detection."""
-        try:
-            import mediapipe as mp
-            self.mp = mp
-            self.mp_face_detection = mp.solutions.face_detection
-            self.mp_drawing = mp.solutions.drawing_utils
-            self.model = self.mp_face_detection.FaceDetection(
-                model_selection=1,  # 0 for short-range, 1 for full-range detection
-                min_detection_confidence=self.confidence_threshold
-            )
-            print("MediaPipe Face Detection model initialized")
-        except ImportError:
-            raise ImportError(
-                "MediaPipe not installed. Please install it with: pip install mediapipe"
-            )
+        self.backend = create_backend(model_name, confidence_threshold, model_dir,
+                                      input_size=input_size, dnn_backend=dnn_backend,
+                                      dnn_target=dnn_target, threads=threads)
+
+    @staticmethod
+    def available_models():
+        """Return the names of all registered models."""
+        return list(MODEL_REGISTRY)
+
+    @property
+    def input_size(self):
+        """Network input size of the model, or None if it has no fixed input size."""
+        return self.backend.input_size
+
+    @input_size.setter
+    def input_size(self, size):
+        if self.backend.resizable_input:
+            self.backend.input_size = size
+
+    @property
+    def resizable_input(self):
+        """Whether the input size can be changed at runtime."""
+        return self.backend.resizable_input
+
+    def warmup(self, input_sizes):
+        """
+        Prepare the model for the given input sizes so later size switches don't stall.
 
-    def process_frame(self, frame):
+        Args:
+            input_sizes (iterable): Network input sizes to prepare
         """
-        Process a video frame with the selected AI model.
+        self.backend.warmup(input_sizes)
+
+    def detect(self, frame):
+        """
+        Run the selected model on a video frame.
 
         Args:
             frame (numpy.ndarray): Input video frame
 
         Returns:
-            numpy.ndarray: Processed frame with annotations
+            list: Detection tuples in frame coordinates
         """
-        if self.model_name == 'yolov4':
-            return self._process_yolov4(frame)
-        elif self.model_name == 'mediapipe_pose':
-            return self._process_mediapipe_pose(frame)
-        elif self.model_name == 'mediapipe_face':
-            return self._process_mediapipe_face(frame)
-        else:
-            return frame  # Return original frame if model not supported
-
-    def _process_yolov4(self, frame):
-        """Process frame with YOLOv4 for object detection."""
-        height, width, _ = frame.shape
-
-        # Prepare image for YOLO
-        blob = cv2.dnn.blobFromImage(frame, 1/255.0, (416, 416), swapRB=True, crop=False)
-        self.model.setInput(blob)
-
-        # Forward pass through the network
-        outputs = self.model.forward(self.output_layers)
-
-        # Process detections
-        class_ids = []
-        confidences = []
-        boxes = []
-
-        for output in outputs:
-            for detection in output:
-                scores = detection[5:]
-                class_id = np.argmax(scores)
-                confidence = scores[class_id]
-
-                if confidence > self.confidence_threshold:
-                    # YOLO returns coordinates relative to the center of the object
-                    center_x = int(detection[0] * width)
-                    center_y = int(detection[1] * height)
-                    w = int(detection[2] * width)
-                    h = int(detection[3] * height)
-
-                    # Rectangle coordinates
-                    x = int(center_x - w / 2)
-                    y = int(center_y - h / 2)
-
-                    boxes.append([x, y, w, h])
-                    confidences.append(float(confidence))
-                    class_ids.append(class_id)
-
-        # Apply non-maximum suppression to remove redundant overlapping boxes
-        indices = cv2.dnn.NMSBoxes(boxes, confidences, self.confidence_threshold, 0.4)
+        detections = self.backend.detect(frame, self.confidence_threshold)
 
         # Update detection count
-        self.last_detection_count = len(indices) if isinstance(indices, np.ndarray) else 0
-
-        # Draw bounding boxes and labels
-        result_frame = frame.copy()
-        if self.last_detection_count > 0:
-            for i in indices.flatten():
-                x, y, w, h = boxes[i]
-                label = self.classes[class_ids[i]]
-                confidence = confidences[i]
-                color = (int(self.colors[class_ids[i]][0]),
-                         int(self.colors[class_ids[i]][1]),
-                         int(self.colors[class_ids[i]][2]))
-
-                # Draw bounding box
-                cv2.rectangle(result_frame, (x, y), (x + w, y + h), color, 2)
-
-                # Draw label background
-                text = f"{label}: {confidence:.2f}"
-                text_size, _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
-                cv2.rectangle(result_frame, (x, y - text_size[1] - 10), (x + text_size[0], y), color, -1)
-
-                # Draw label text
-                cv2.putText(result_frame, text, (x, y - 5),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+        self.last_detections = detections
+        self.last_detection_count = len(detections)
+        return detections
 
+    def annotate(self, frame, detections):
+        """
+        Draw detections onto a copy of a frame.
+
+        The copy is written into a buffer that is reused by the next call, so
+        callers that keep the result across frames must copy it.
+
+        Args:
+            frame (numpy.ndarray): Input video frame
+            detections (list): Detection tuples returned by detect()
+
+        Returns:
+            numpy.ndarray: Annotated copy of the frame
+        """
+        result_frame = self._result_buffers.get(frame.shape)
+        if result_frame is None:
+            result_frame = np.empty_like(frame)
+            self._result_buffers[frame.shape] = result_frame
+        np.copyto(result_frame, frame)
+        self.draw(result_frame, detections)
         return result_frame
 
-    def _process_mediapipe_pose(self, frame):
-        """Process frame with MediaPipe for pose estimation."""
-        # Convert BGR to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    def draw(self, frame, detections):
+        """
+        Draw the detections produced by this processor onto a frame in place.
+
+        Args:
+            frame (numpy.ndarray): Frame to draw on
+            detections (list): Detection tuples; those from other models are ignored
+        """
+        self.backend.annotate(frame, [detection for detection in detections
+                                      if detection.source == self.backend.name])
+
+    def process_frame(self, frame):
+        """
+        Process a video frame with the selected AI model.
 
-        # Process the frame
-        results = self.model.process(rgb_frame)
+        Args:
+            frame (numpy.ndarray): Input video frame
 
-        # Update detection count (1 if pose detected, 0 otherwise)
-        self.last_detection_count = 1 if results.pose_landmarks else 0
+        Returns:
+            numpy.ndarray: Processed frame with annotations (reused by the next call)
+        """
+        return self.annotate(frame, self.detect(frame))
 
-        # Draw pose landmarks
-        result_frame = frame.copy()
-        if results.pose_landmarks:
-            self.mp_drawing.draw_landmarks(
-                result_frame,
-                results.pose_landmarks,
-                self.mp_pose.POSE_CONNECTIONS,
-                self.mp_drawing.DrawingSpec(color=(245, 117, 66), thickness=2, circle_radius=2),
-                self.mp_drawing.DrawingSpec(color=(245, 66, 230), thickness=2, circle_radius=2)
-            )
 
-            # Add text indicating pose detected
-            cv2.putText(result_frame, "Pose Detected", (10, 60),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+class CascadeProcessor(AIProcessor):
+    """Class to run face/pose models only inside the people found by a YOLO model."""
 
-        return result_frame
+    def __init__(self, detector_name, stage_names, confidence_threshold=0.5, padding=0.15,
+                 min_crop_size=32, **model_options):
+        """
+        Initialize the person detector and the models that run on its crops.
 
-    def _process_mediapipe_face(self, frame):
-        """Process frame with MediaPipe for face detection."""
-        # Convert BGR to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        Args:
+            detector_name (str): Registered YOLO model that finds the people
+            stage_names (list): Registered models to run on each person crop
+            confidence_threshold (float): Confidence threshold for detections (0.0 to 1.0)
+            padding (float): Fraction of the person box added on each side of a crop
+            min_crop_size (int): People smaller than this many pixels are skipped
+            **model_options: Options passed to the detector (input_size, model_dir, ...)
+        """
+        super().__init__(detector_name, confidence_threshold, **model_options)
+        self.model_name = f"{detector_name}>{'+'.join(stage_names)}"
+        self.padding = padding
+        self.min_crop_size = min_crop_size
+
+        # Crops of different people are unrelated images, so disable tracking between them
+        self.stages = [create_backend(name, confidence_threshold, model_options.get('model_dir'),
+                                      static_image_mode=True)
+                       for name in stage_names]
+        self.last_crop_count = 0
+
+    def person_crops(self, frame, detections):
+        """
+        Return padded crops around the people among the detections.
 
-        # Process the frame
-        results = self.model.process(rgb_frame)
+        Args:
+            frame (numpy.ndarray): Input video frame
+            detections (list): Detection tuples from the detector
 
-        # Update detection count
-        self.last_detection_count = len(results.detections) if results.detections else 0
+        Returns:
+            list: (crop, x offset, y offset) with crops as views into the frame
+        """
+        height, width = frame.shape[:2]
+        crops = []
+        for detection in detections:
+            if detection.label != 'person':
+                continue
+            x, y, w, h = detection.box
+            if min(w, h) < self.min_crop_size:
+                continue
+            pad_x, pad_y = int(w * self.padding), int(h * self.padding)
+            x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+            x1, y1 = min(width, x + w + pad_x), min(height, y + h + pad_y)
+            if x1 - x0 >= self.min_crop_size and y1 - y0 >= self.min_crop_size:
+                crops.append((frame[y0:y1, x0:x1], x0, y0))
+        return crops
+
+    def detect(self, frame):
+        """
+        Find people, then run the second-stage models on each person crop.
+
+        Frames without people skip the second stage, so its cost grows with
+        the number of people rather than the frame size.
 
-        # Draw face detections
-        result_frame = frame.copy()
-        if results.detections:
-            for detection in results.detections:
-                # Draw bounding box
-                bboxC = detection.location_data.relative_bounding_box
-                ih, iw, _ = frame.shape
-                x, y, w, h = int(bboxC.xmin * iw), int(bboxC.ymin * ih), \
-                             int(bboxC.width * iw), int(bboxC.height * ih)
+        Args:
+            frame (numpy.ndarray): Input video frame
 
-                cv2.rectangle(result_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        Returns:
+            list: Detector and second-stage Detection tuples in frame coordinates
+        """
+        detections = self.backend.detect(frame, self.confidence_threshold)
+        crops = self.person_crops(frame, detections)
 
-                # Draw confidence score
-                score = detection.score[0]
-                cv2.putText(result_frame, f"Face: {score:.2f}",
-                            (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        for crop, x0, y0 in crops:
+            for stage in self.stages:
+                for detection in stage.detect(crop, self.confidence_threshold):
+                    detections.append(offset_detection(detection, x0, y0))
 
-            # Add text showing number of faces detected
-            cv2.putText(result_frame, f"Faces Detected: {self.last_detection_count}", (10, 60),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        self.last_crop_count = len(crops)
+        self.last_detections = detections
+        self.last_detection_count = len(detections)
+        return detections
 
+    def draw(self, frame, detections):
+        """Draw the detector and second-stage detections onto a frame in place."""
+        super().draw(frame, detections)
+        for stage in self.stages:
+            stage.annotate(frame, [detection for detection in detections if detection.source == stage.name])
+
+
+def offset_detection(detection, x0, y0):
+    """Move a detection from crop coordinates to frame coordinates."""
+    x, y, w, h = detection.box
+    landmarks = detection.landmarks
+    if landmarks is not None:
+        landmarks = landmarks.copy()
+        landmarks[:, 0] += x0
+        landmarks[:, 1] += y0
+    return detection._replace(box=(x + x0, y + y0, w, h), landmarks=landmarks)
+
+
+class MultiModelProcessor:
+    """Class to run several models on the same frame in parallel and merge their results."""
+
+    def __init__(self, models, confidence_threshold=0.5, **model_options):
+        """
+        Initialize one AI processor per model.
+
+        Args:
+            models (list): (model_name, interval) pairs; a model runs on every interval-th frame
+            confidence_threshold (float): Confidence threshold for detections (0.0 to 1.0)
+            **model_options: Options passed to every AIProcessor (input_size, model_dir, ...)
+        """
+        self.model_name = format_model_spec(models)
+        self.processors = [create_model_processor(name, confidence_threshold, **model_options)
+                           for name, _ in models]
+        self.intervals = [interval for _, interval in models]
+        self._confidence_threshold = confidence_threshold
+        self.frame_index = 0
+        self.last_detection_count = 0
+        self.last_detections = []
+
+        # Annotated output frames per frame shape, reused across frames
+        self._result_buffers = {}
+
+        # The first due model runs on the calling thread, the others on the pool.
+        # OpenCV DNN and MediaPipe release the GIL while they run.
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(models) - 1),
+                                            thread_name_prefix='inference')
+
+    @property
+    def confidence_threshold(self):
+        """Confidence threshold shared by all models."""
+        return self._confidence_threshold
+
+    @confidence_threshold.setter
+    def confidence_threshold(self, threshold):
+        self._confidence_threshold = threshold
+        for processor in self.processors:
+            processor.confidence_threshold = threshold
+
+    @property
+    def input_size(self):
+        """Input size of the first resizable model, or None if no model is resizable."""
+        for processor in self.processors:
+            if processor.resizable_input:
+                return processor.input_size
+        return None
+
+    @input_size.setter
+    def input_size(self, size):
+        for processor in self.processors:
+            processor.input_size = size
+
+    @property
+    def resizable_input(self):
+        """Whether any model's input size can be changed at runtime."""
+        return any(processor.resizable_input for processor in self.processors)
+
+    def warmup(self, input_sizes):
+        """
+        Prepare every model for the given input sizes so later size switches don't stall.
+
+        Args:
+            input_sizes (iterable): Network input sizes to prepare
+        """
+        for processor in self.processors:
+            processor.warmup(input_sizes)
+
+    def detect(self, frame):
+        """
+        Run the models that are due on this frame in parallel.
+
+        Models that are not due keep the detections from their last run, so the
+        merged result always contains every model's most recent detections.
+
+        Args:
+            frame (numpy.ndarray): Input video frame
+
+        Returns:
+            list: Detection tuples from all models in frame coordinates
+        """
+        due = [processor for processor, interval in zip(self.processors, self.intervals)
+               if self.frame_index % interval == 0]
+        self.frame_index += 1
+
+        if due:
+            futures = [self._executor.submit(processor.detect, frame) for processor in due[1:]]
+            due[0].detect(frame)
+            for future in futures:
+                future.result()
+
+        detections = [detection for processor in self.processors for detection in processor.last_detections]
+        self.last_detections = detections
+        self.last_detection_count = len(detections)
+        return detections
+
+    def annotate(self, frame, detections):
+        """
+        Draw the detections of all models onto a single copy of a frame.
+
+        The copy is written into a buffer that is reused by the next call, so
+        callers that keep the result across frames must copy it.
+
+        Args:
+            frame (numpy.ndarray): Input video frame
+            detections (list): Detection tuples returned by detect()
+
+        Returns:
+            numpy.ndarray: Annotated copy of the frame
+        """
+        result_frame = self._result_buffers.get(frame.shape)
+        if result_frame is None:
+            result_frame = np.empty_like(frame)
+            self._result_buffers[frame.shape] = result_frame
+        np.copyto(result_frame, frame)
+
+        for processor in self.processors:
+            processor.draw(result_frame, detections)
         return result_frame
+
+    def process_frame(self, frame):
+        """
+        Process a video frame with all models.
+
+        Args:
+            frame (numpy.ndarray): Input video frame
+
+        Returns:
+            numpy.ndarray: Processed frame with annotations (reused by the next call)
+        """
+        return self.annotate(frame, self.detect(frame))
+
+    def close(self):
+        """Stop the worker threads."""
+        self._executor.shutdown(wait=True)
+
+
+def parse_model_spec(spec):
+    """
+    Parse a model spec such as 'yolov4_tiny:3,mediapipe_face'.
+
+    Each comma-separated entry is a registered model name, optionally followed
+    by ':N' to run that model only on every N-th frame. An entry can also be a
+    cascade 'detector>model+model', where the models after '>' only run inside
+    the people found by the YOLO detector.
+
+    Args:
+        spec (str): Model spec
+
+    Returns:
+        list: (model_name, interval) pairs
+
+    Raises:
+        ValueError: If a model is unknown, repeated or has an invalid interval
+    """
+    models = []
+    for entry in spec.split(','):
+        name, _, interval = entry.strip().partition(':')
+        check_model_name(name)
+        if name in [model for model, _ in models]:
+            raise ValueError(f"Model listed twice: {name}")
+        try:
+            interval = int(interval) if interval else 1
+        except ValueError:
+            raise ValueError(f"Invalid frame interval for {name}: {interval}")
+        if interval < 1:
+            raise ValueError(f"Invalid frame interval for {name}: {interval}")
+        models.append((name, interval))
+    return models
+
+
+def check_model_name(name):
+    """
+    Check a single model or cascade name from a model spec.
+
+    Raises:
+        ValueError: If a model is unknown or the cascade detector is not a YOLO model
+    """
+    detector, cascade, stages = name.partition('>')
+    for model in [detector] + (stages.split('+') if cascade else []):
+        get_model_spec(model)
+    if cascade and 'classes' not in MODEL_REGISTRY[detector]['config']:
+        raise ValueError(f"Cascade detector must be a YOLO model: {detector}")
+
+
+def create_model_processor(name, confidence_threshold=0.5, **model_options):
+    """Create the processor for a single model or cascade name from a model spec."""
+    detector, cascade, stages = name.partition('>')
+    if cascade:
+        return CascadeProcessor(detector, stages.split('+'), confidence_threshold, **model_options)
+    return AIProcessor(name, confidence_threshold, **model_options)
+
+
+def format_model_spec(models):
+    """Turn (model_name, interval) pairs back into a model spec string."""
+    return ','.join(name if interval == 1 else f"{name}:{interval}" for name, interval in models)
+
+
+def create_processor(spec, confidence_threshold=0.5, **model_options):
+    """
+    Create the processor for a model spec: an AIProcessor or CascadeProcessor
+    for a single entry, or a MultiModelProcessor for several.
+
+    Args:
+        spec (str): Model spec (see parse_model_spec)
+        confidence_threshold (float): Confidence threshold for detections (0.0 to 1.0)
+        **model_options: Options passed to AIProcessor (input_size, model_dir, ...)
+
+    Returns:
+        AIProcessor, CascadeProcessor or MultiModelProcessor: Initialized processor
+    """
+    models = parse_model_spec(spec)
+    if len(models) == 1 and models[0][1] == 1:
+        return create_model_processor(models[0][0], confidence_threshold, **model_options)
+    return MultiModelProcessor(models, confidence_threshold, **model_options)
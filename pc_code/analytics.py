@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Rolling Detection Analytics for the AI WiFi CAM Server
+
+Keeps per-camera, per-class activity over the last minute, 15 minutes and
+hour, updated as each frame's detections arrive instead of being
+recomputed from the detection history on every request.
+
+Each window is a ring of time buckets (60 per window: 1 s, 15 s and 60 s
+wide). A frame adds to the newest bucket and to the window's running
+totals. When time moves on, the buckets that fall out of the window are
+subtracted from the totals and reused. A frame therefore costs the same
+small amount of work no matter how much history there is, and memory is
+fixed per camera and class. Because whole buckets expire, a window covers
+between its span minus one bucket and its span.
+
+For every class and window:
+
+- detections: Detections summed over the processed frames
+- visits: Times the class appeared after being absent (for more than the gap)
+- mean: Average number in view per processed frame
+- peak: Most in view in a single frame (peak occupancy)
+- presence_s: Seconds the class was in view
+- longest_dwell_s: Longest visit seen in the window
+
+plus whether the class is in view now and for how long (dwell_s). There is
+no object tracking, so a visit is a run of frames containing the class,
+allowing gaps of up to `gap` seconds for missed detections.
+"""
+
+import time
+from collections import Counter
+
+# Name, span in seconds and number of buckets of each window
+WINDOWS = (('1m', 60, 60), ('15m', 900, 60), ('1h', 3600, 60))
+
+
+class RollingWindow:
+    """Class keeping sums and maxima over a sliding time window in a ring of buckets."""
+
+    def __init__(self, span, buckets, sums=1, maxima=0):
+        """
+        Initialize an empty window.
+
+        Args:
+            span (float): Window length in seconds
+            buckets (int): Number of buckets the window is divided into
+            sums (int): Number of values summed over the window
+            maxima (int): Number of values whose maximum over the window is kept
+        """
+        self.span = span
+        self.buckets = buckets
+        self.width = span / buckets
+        self._sums = sums
+        self._empty = [0] * (sums + maxima)
+        self._slots = [list(self._empty) for _ in range(buckets)]
+        self._totals = [0] * sums
+        self._current = None  # Bucket number of the newest bucket
+
+    def _advance(self, timestamp):
+        """Expire the buckets that left the window by timestamp and return the newest bucket."""
+        number = int(timestamp // self.width)
+        if self._current is None:
+            self._current = number
+        elif number > self._current:
+            # At most every bucket once, however long nothing arrived
+            for old in range(self._current + 1, min(number, self._current + self.buckets) + 1):
+                slot = self._slots[old % self.buckets]
+                for index in range(self._sums):
+                    self._totals[index] -= slot[index]
+                slot[:] = self._empty
+            self._current = number
+        # Times before the newest bucket (a clock stepping back) count towards it
+        return self._slots[self._current % self.buckets]
+
+    def add(self, timestamp, sums=(), maxima=()):
+        """
+        Add values at a time.
+
+        Args:
+            timestamp (float): Time in seconds
+            sums (tuple): Values to add to the sums
+            maxima (tuple): Values to include in the maxima
+        """
+        slot = self._advance(timestamp)
+        for index, value in enumerate(sums):
+            slot[index] += value
+            self._totals[index] += value
+        for index, value in enumerate(maxima, self._sums):
+            if value > slot[index]:
+                slot[index] = value
+
+    def values(self, now):
+        """
+        Return the window's values at a time.
+
+        Returns:
+            tuple: (sums, maxima) as lists
+        """
+        self._advance(now)
+        maxima = [max(slot[index] for slot in self._slots) for index in range(self._sums, len(self._empty))]
+        # Running float sums can drift just below zero after expiring
+        return [max(0, total) for total in self._totals], maxima
+
+
+class ClassActivity:
+    """Rolling activity of one class on one camera."""
+
+    def __init__(self):
+        """Initialize the windows: sums of detections, visits and presence; maxima of count and dwell."""
+        self.windows = {name: RollingWindow(span, buckets, sums=3, maxima=2) for name, span, buckets in WINDOWS}
+        self.since = None
+        self.last_seen = None
+
+
+class CameraAnalytics:
+    """Class updating the rolling activity of one camera frame by frame."""
+
+    def __init__(self, gap=3.0):
+        """
+        Initialize the camera without activity.
+
+        Args:
+            gap (float): Seconds a class may go undetected without ending its visit
+        """
+        self.gap = gap
+        self.frames = {name: RollingWindow(span, buckets) for name, span, buckets in WINDOWS}
+        self.classes = {}
+        self.last_frame = None
+
+    def update(self, detections, timestamp):
+        """
+        Add the detections of one processed frame.
+
+        Args:
+            detections (list): Detection tuples
+            timestamp (float): Frame time in seconds
+        """
+        if self.last_frame is not None:
+            timestamp = max(timestamp, self.last_frame)
+            # Time in view since the last frame, not counting long pauses in processing
+            interval = min(timestamp - self.last_frame, self.gap)
+        else:
+            interval = 0.0
+        self.last_frame = timestamp
+        for window in self.frames.values():
+            window.add(timestamp, (1,))
+
+        for label, count in Counter(detection.label for detection in detections).items():
+            activity = self.classes.get(label)
+            if activity is None:
+                activity = self.classes[label] = ClassActivity()
+            visits = 0
+            if activity.last_seen is None or timestamp - activity.last_seen > self.gap:
+                activity.since = timestamp
+                visits = 1
+            activity.last_seen = timestamp
+            dwell = timestamp - activity.since
+            for window in activity.windows.values():
+                window.add(timestamp, (count, visits, interval), (count, dwell))
+
+    def stats(self, now):
+        """
+        Return the activity of every class seen on the camera.
+
+        Args:
+            now (float): Current time in seconds
+
+        Returns:
+            dict: Per class, the values of each window plus 'present' and 'dwell_s'
+        """
+        frames = {name: window.values(now)[0][0] for name, window in self.frames.items()}
+        result = {}
+        for label, activity in self.classes.items():
+            present = now - activity.last_seen <= self.gap
+            entry = {'present': present, 'dwell_s': round(activity.last_seen - activity.since, 1) if present else 0}
+            for name, window in activity.windows.items():
+                (detections, visits, presence), (peak, dwell) = window.values(now)
+                entry[name] = {
+                    'detections': detections,
+                    'visits': visits,
+                    'mean': round(detections / frames[name], 2) if frames[name] else 0,
+                    'peak': peak,
+                    'presence_s': round(presence, 1),
+                    'longest_dwell_s': round(dwell, 1)
+                }
+            result[label] = entry
+        return result
+
+
+class Analytics:
+    """Class keeping rolling activity per camera."""
+
+    def __init__(self, gap=3.0, clock=time.time):
+        """
+        Initialize without cameras.
+
+        Args:
+            gap (float): Seconds a class may go undetected without ending its visit
+            clock (callable): Returns the current time in seconds (for tests)
+        """
+        self.gap = gap
+        self.clock = clock
+        self.cameras = {}
+
+    def update(self, camera_id, detections, timestamp=None):
+        """
+        Add the detections of one processed frame.
+
+        Args:
+            camera_id (str): Camera the frame came from
+            detections (list): Detection tuples
+            timestamp (float): Frame time in seconds (defaults to now)
+        """
+        camera = self.cameras.get(camera_id)
+        if camera is None:
+            camera = self.cameras[camera_id] = CameraAnalytics(self.gap)
+        camera.update(detections, timestamp if timestamp is not None else self.clock())
+
+    def camera_stats(self, camera_id):
+        """Return the activity of one camera, or None if it has no processed frames."""
+        camera = self.cameras.get(camera_id)
+        return camera.stats(self.clock()) if camera is not None else None
+
+    def stats(self):
+        """Return the activity of every camera."""
+        now = self.clock()
+        return {camera_id: camera.stats(now) for camera_id, camera in self.cameras.items()}
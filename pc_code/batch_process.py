@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Offline Batch Processing for AI WiFi CAM
+
+Runs the AI model over recorded footage as fast as the machine allows,
+instead of replaying it in real time to stream_receiver.py. Inputs can be:
+
+- video files (anything OpenCV can read, e.g. recordings made with
+  stream_receiver.py --save)
+- directories of JPEG images (e.g. snapshots), processed in name order
+- MJPEG archives (.mjpeg, .mjpg): JPEG frames stored back to back, as in a
+  saved ESP32-CAM HTTP stream; multipart boundaries between frames are
+  skipped
+
+Frames are read in a background thread and handed to one worker process
+per physical core, with a bounded number of frames in flight, so reading,
+decoding and inference overlap without loading whole files into memory.
+Each worker runs one OpenCV thread pinned to its core(s) (see
+thread_budget.py). A single worker (--workers 1, or a one-core machine)
+runs on a thread instead, with OpenCV threads for every core, so frames
+aren't copied between processes. JPEG frames are decoded by the workers, and video frames
+are decoded by the reader. Where processes can be forked, the model is
+loaded once and shared by the workers (see inference_worker.py).
+
+Detections are written in input order to a JSON Lines file, one line per
+frame:
+
+    {"source": "clip.avi", "frame": 12, "name": null, "time_s": 0.8, "shape": [480, 640],
+     "detections": [{"label": "person", "confidence": 0.87, "box": [x, y, w, h]}]}
+
+With --resume, frames already in the output file are skipped, so an
+interrupted run continues where it stopped. Progress and the frames per
+second processed are logged while running.
+
+Example:
+    python batch_process.py recordings/*.avi snapshots/2024/05/17 --output detections.jsonl
+    python batch_process.py stream.mjpeg --output out.jsonl --annotated-video out.avi --resume
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from collections import deque
+from multiprocessing.pool import ThreadPool
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from ai_processor import create_processor, parse_model_spec
+from inference_worker import ModelHost, can_share
+from thread_budget import cpu_topology, split_cores, pin_current_thread
+
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+MJPEG_EXTENSIONS = ('.mjpeg', '.mjpg')
+
+# Processor of a worker process, set by the initializer (or inherited when forked)
+_processor = None
+
+
+def iter_mjpeg(path, chunk_size=1 << 20):
+    """
+    Yield the JPEG frames stored back to back in an MJPEG file.
+
+    Frames run from a start-of-image marker to the next end-of-image marker;
+    anything between frames (such as multipart headers) is ignored. The file is
+    read in chunks, so it can be larger than memory.
+    """
+    buffer = bytearray()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if chunk:
+                buffer += chunk
+            position = 0
+            while True:
+                start = buffer.find(b'\xff\xd8', position)
+                if start < 0:
+                    position = max(position, len(buffer) - 1)
+                    break
+                end = buffer.find(b'\xff\xd9', start + 2)
+                if end < 0:
+                    position = start
+                    break
+                yield bytes(buffer[start:end + 2])
+                position = end + 2
+            del buffer[:position]
+            if not chunk:
+                return
+
+
+def source_frames(path, skip=0):
+    """
+    Open an input and yield its frames.
+
+    Args:
+        path (Path): Video file, JPEG directory or MJPEG archive
+        skip (int): Frames to skip from the start (already processed)
+
+    Yields:
+        (index, name, data, fps) tuples: name is the image file name for directories
+        (else None), data is JPEG bytes or a decoded BGR frame, fps the frame rate
+        if known
+    """
+    if path.is_dir():
+        files = sorted(file for file in path.iterdir() if file.suffix.lower() in JPEG_EXTENSIONS
+                       and not file.stem.endswith('_thumb'))
+        for index, file in enumerate(files[skip:], skip):
+            yield index, file.name, file.read_bytes(), None
+    elif path.suffix.lower() in MJPEG_EXTENSIONS:
+        for index, jpeg in enumerate(iter_mjpeg(path)):
+            if index >= skip:
+                yield index, None, jpeg, None
+    else:
+        capture = cv2.VideoCapture(str(path))
+        if not capture.isOpened():
+            raise ValueError(f"Cannot open video: {path}")
+        fps = capture.get(cv2.CAP_PROP_FPS) or None
+        try:
+            # Seeking by frame number is not exact for every codec; grabbing is
+            for _ in range(skip):
+                if not capture.grab():
+                    return
+            index = skip
+            while True:
+                ret, frame = capture.read()
+                if not ret:
+                    return
+                yield index, None, frame, fps
+                index += 1
+        finally:
+            capture.release()
+
+
+def read_inputs(paths, done, items, stop):
+    """
+    Read the frames of every input into a bounded queue (runs on the reader thread).
+
+    Args:
+        paths (list): Input paths in processing order
+        done (dict): Frames already processed per input, keyed by str(path)
+        items (queue.Queue): Receives (source, index, name, data, fps) tuples, then None
+        stop (threading.Event): Set to stop reading early
+    """
+    try:
+        for path in paths:
+            for index, name, data, fps in source_frames(path, done.get(str(path), 0)):
+                if stop.is_set():
+                    return
+                items.put((str(path), index, name, data, fps))
+    except Exception as e:
+        items.put(e)
+    finally:
+        items.put(None)
+
+
+def init_worker(shares, started, spec, confidence, model_options):
+    """Pin a worker process to its cores and make sure it has the model (pool initializer)."""
+    global _processor
+    with started.get_lock():
+        share = shares[started.value % len(shares)]
+        started.value += 1
+    pin_current_thread(share.cpus)
+    cv2.setNumThreads(share.threads)
+    if _processor is None:
+        _processor = create_processor(spec, confidence_threshold=confidence, **model_options)
+
+
+def detect_frame(data, annotate):
+    """
+    Run the model on one frame (runs in a worker process).
+
+    Args:
+        data: JPEG bytes or a decoded BGR frame
+        annotate (bool): Also return the annotated frame
+
+    Returns:
+        tuple: (frame shape, detection dicts, annotated frame or None), or None if
+        the JPEG could not be decoded
+    """
+    frame = data
+    if isinstance(data, bytes):
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return None
+    detections = _processor.detect(frame)
+    encoded = [{'label': detection.label,
+                'confidence': round(float(detection.confidence), 3),
+                'box': [int(value) for value in detection.box]}
+               for detection in detections]
+    annotated = _processor.annotate(frame, detections).copy() if annotate else None
+    return list(frame.shape[:2]), encoded, annotated
+
+
+def load_progress(output):
+    """
+    Read which frames an interrupted run already wrote, and drop a partly written last line.
+
+    Returns:
+        dict: Number of frames done per input
+    """
+    done = {}
+    if not output.exists():
+        return done
+    with open(output, 'rb+') as f:
+        data = f.read()
+        complete = data.rfind(b'\n') + 1
+        if complete < len(data):
+            f.truncate(complete)
+    for line in data[:complete].splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        done[record['source']] = max(done.get(record['source'], 0), record['frame'] + 1)
+    return done
+
+
+def open_video_writer(path, shape, fps):
+    """Open the annotated video output (XVID for .avi, mp4v otherwise)."""
+    fourcc = cv2.VideoWriter_fourcc(*('XVID' if path.suffix.lower() == '.avi' else 'mp4v'))
+    writer = cv2.VideoWriter(str(path), fourcc, fps, (shape[1], shape[0]))
+    if not writer.isOpened():
+        raise ValueError(f"Cannot write video: {path}")
+    return writer
+
+
+def run_batch(inputs, output, model='yolov4', confidence=0.5, workers=None, prefetch=None,
+              annotated_video=None, video_fps=10.0, resume=False, progress_interval=5.0, **model_options):
+    """
+    Process every frame of the inputs and write the detections.
+
+    Args:
+        inputs (list): Video files, JPEG directories and MJPEG archives
+        output (str): JSON Lines file for the detections
+        model (str): Model spec
+        confidence (float): Confidence threshold
+        workers (int): Worker processes (default: one per physical core)
+        prefetch (int): Frames in flight between reader and workers (default: 4 per worker)
+        annotated_video (str): Also write the annotated frames to this video file
+        video_fps (float): Frame rate of the annotated video when the inputs have none
+        resume (bool): Skip the frames already in the output file
+        progress_interval (float): Seconds between progress log messages
+        **model_options: Options passed to create_processor (model_dir, input_size, ...)
+
+    Returns:
+        dict: frames, detections, seconds and fps of this run
+    """
+    global _processor
+    paths = [Path(path) for path in inputs]
+    for path in paths:
+        if not path.exists():
+            raise FileNotFoundError(f"Input not found: {path}")
+    output = Path(output)
+    done = load_progress(output) if resume else {}
+    if done:
+        logging.info(f"Resuming after {sum(done.values())} frames already in {output}")
+
+    cores = cpu_topology()
+    workers = workers or len(cores)
+    prefetch = prefetch or 4 * workers
+    shares = split_cores(cores, workers)
+    threads = cv2.getNumThreads()
+
+    if workers == 1:
+        # A single worker runs on a thread, without copying frames between processes
+        pool = ThreadPool(1, initializer=init_worker,
+                          initargs=(shares, multiprocessing.Value('i', 0), model, confidence, model_options))
+    else:
+        # Load the model once and let the workers inherit it when they can be forked
+        context = multiprocessing.get_context('spawn')
+        if 'fork' in multiprocessing.get_all_start_methods() and can_share(model):
+            host = ModelHost(**model_options)
+            host.preload(model, confidence, [model_options['input_size']] if model_options.get('input_size') else [])
+            if host.processor is None:
+                raise ValueError(host.error)
+            _processor = host.processor
+            context = multiprocessing.get_context('fork')
+
+        # Workers take the core shares in turn as they start
+        pool = context.Pool(workers, initializer=init_worker,
+                            initargs=(shares, context.Value('i', 0), model, confidence, model_options))
+        _processor = None
+        cv2.setNumThreads(threads)
+
+    # The reader stays ahead of the workers by at most the prefetch window
+    items = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    reader = threading.Thread(target=read_inputs, args=(paths, done, items, stop), name='reader', daemon=True)
+    reader.start()
+
+    annotate = annotated_video is not None
+    writer = None
+    if annotate and done:
+        # A video can't be appended to; the resumed part goes to its own file
+        annotated_video = Path(annotated_video)
+        annotated_video = annotated_video.with_name(
+            f"{annotated_video.stem}-from{sum(done.values())}{annotated_video.suffix}")
+
+    frames = detection_count = 0
+    start = last_report = time.monotonic()
+    pending = deque()
+    exhausted = False
+    try:
+        with open(output, 'a' if resume else 'w') as out:
+            while pending or not exhausted:
+                # Keep the workers busy, then write the oldest result to keep input order
+                while not exhausted and len(pending) < prefetch:
+                    item = items.get()
+                    if item is None:
+                        exhausted = True
+                    elif isinstance(item, Exception):
+                        raise item
+                    else:
+                        source, index, name, data, fps = item
+                        pending.append((source, index, name, fps,
+                                        pool.apply_async(detect_frame, (data, annotate))))
+                if not pending:
+                    break
+
+                source, index, name, fps, result = pending.popleft()
+                result = result.get()
+                if result is None:
+                    logging.warning(f"Skipping undecodable frame {index} of {source}")
+                    continue
+                shape, detections, annotated = result
+                record = {'source': source, 'frame': index, 'name': name,
+                          'time_s': round(index / fps, 3) if fps else None,
+                          'shape': shape, 'detections': detections}
+                out.write(json.dumps(record) + '\n')
+                frames += 1
+                detection_count += len(detections)
+
+                if annotated is not None:
+                    if writer is None:
+                        writer = open_video_writer(Path(annotated_video), annotated.shape, fps or video_fps)
+                    if annotated.shape[:2] != tuple(shape):
+                        annotated = cv2.resize(annotated, (shape[1], shape[0]))
+                    writer.write(annotated)
+
+                now = time.monotonic()
+                if now - last_report >= progress_interval:
+                    logging.info(f"{frames} frames, {frames / (now - start):.1f} frames/s ({source} frame {index})")
+                    last_report = now
+    finally:
+        stop.set()
+        # Unblock the reader if it is waiting for room in the queue
+        while reader.is_alive():
+            try:
+                items.get_nowait()
+            except queue.Empty:
+                reader.join(0.05)
+        pool.terminate()
+        pool.join()
+        if writer is not None:
+            writer.release()
+        _processor = None
+        cv2.setNumThreads(threads)
+
+    seconds = time.monotonic() - start
+    summary = {'frames': frames, 'detections': detection_count, 'seconds': round(seconds, 2),
+               'fps': round(frames / seconds, 1) if seconds > 0 else 0.0}
+    logging.info(f"Processed {frames} frames in {seconds:.1f} s ({summary['fps']} frames/s), "
+                 f"{detection_count} detections")
+    return summary
+
+
+def main():
+    """Parse arguments and process the inputs."""
+    parser = argparse.ArgumentParser(description='AI WiFi CAM offline batch processing')
+    parser.add_argument('inputs', nargs='+', help='Video files, JPEG directories or MJPEG archives')
+    parser.add_argument('--output', type=str, required=True, help='JSON Lines file to write the detections to')
+    parser.add_argument('--annotated-video', type=str, default=None,
+                        help='Also write the annotated frames to this video file (.avi or .mp4)')
+    parser.add_argument('--video-fps', type=float, default=10.0,
+                        help='Frame rate of the annotated video for inputs without one (JPEGs, MJPEG)')
+    parser.add_argument('--resume', action='store_true', help='Skip frames already in the output file')
+    parser.add_argument('--model', type=str, default='yolov4', help='Model spec (see stream_receiver.py --model)')
+    parser.add_argument('--model-dir', type=str, default=None, help='Directory containing the model files')
+    parser.add_argument('--input-size', type=int, default=None, help='Network input size (default: per model)')
+    parser.add_argument('--confidence', type=float, default=0.5, help='Confidence threshold for detections')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: one per physical core)')
+    parser.add_argument('--prefetch', type=int, default=None,
+                        help='Frames read ahead of the workers (default: 4 per worker)')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    try:
+        parse_model_spec(args.model)
+    except ValueError as e:
+        parser.error(str(e))
+
+    summary = run_batch(args.inputs, args.output, model=args.model, confidence=args.confidence,
+                        workers=args.workers, prefetch=args.prefetch, annotated_video=args.annotated_video,
+                        video_fps=args.video_fps, resume=args.resume, model_dir=args.model_dir,
+                        input_size=args.input_size)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        logging.info("Stopped; run again with --resume to continue")
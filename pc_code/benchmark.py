@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the AI WiFi CAM project.
+
+This script measures the performance of the PC-side pipeline without an
+ESP32-CAM connected. Each scenario is a sub-command:
+
+- models: inference latency and throughput of every registered model backend
+  (and each input size for resizable models)
+- ingest: frame throughput and receiver CPU time per frame of the camera
+  WebSocket and the binary TCP ingest protocol
+- workers: memory use and start-up time of inference worker processes that
+  share one preloaded model, compared with processes loading their own
+- load: a load generator running several receiver pipelines side by side,
+  each fed by simulated cameras at a fixed frame rate, once with the
+  default threading and once with a CPU budget (thread_budget.py);
+  reports throughput and latency percentiles
+
+Example:
+    python benchmark.py models --frames 100 --input-sizes 320,416
+    python benchmark.py ingest --frames 5000 --frame-bytes 30000
+    python benchmark.py workers --model yolov4 --processes 4
+    python benchmark.py load --model yolov4_tiny --pipelines 2 --cameras 2 --fps 15
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+from collections import deque
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from ai_processor import AIProcessor
+from model_backends import MODEL_REGISTRY, missing_model_files
+from tcp_ingest import FrameReceiver, FrameSender
+from worker_pool import WorkerPool
+from inference_worker import process_memory
+from thread_budget import ThreadBudget, cpu_topology, split_cores, format_cpu_list
+
+def summarize(durations):
+    """
+    Summarize a list of durations in seconds.
+
+    Returns:
+        dict: mean/p50/p95 in milliseconds and the matching frames per second
+    """
+    values = np.array(durations) * 1000.0
+    mean = float(values.mean()) if len(values) else 0.0
+    return {
+        'mean_ms': round(mean, 2),
+        'p50_ms': round(float(np.percentile(values, 50)), 2) if len(values) else 0.0,
+        'p95_ms': round(float(np.percentile(values, 95)), 2) if len(values) else 0.0,
+        'fps': round(1000.0 / mean, 1) if mean > 0 else 0.0
+    }
+
+def load_test_frames(source, count, size=(640, 480)):
+    """
+    Load frames to benchmark with.
+
+    Args:
+        source (str): Video or image path, or None for synthetic frames
+        count (int): Number of frames to load
+        size (tuple): Width and height of synthetic frames
+
+    Returns:
+        list: BGR frames
+    """
+    if source:
+        cap = cv2.VideoCapture(source)
+        frames = []
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+        if frames:
+            return frames
+
+    # Synthetic scene: noise plus a few solid shapes
+    rng = np.random.RandomState(0)
+    frames = []
+    for i in range(min(count, 10)):
+        frame = rng.randint(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+        cv2.rectangle(frame, (100 + i * 5, 100), (300, 400), (40, 40, 200), -1)
+        cv2.circle(frame, (450, 200), 60, (200, 180, 160), -1)
+        frames.append(frame)
+    return frames
+
+def print_table(rows, columns):
+    """Print a list of result dictionaries as an aligned table."""
+    widths = [max(len(column), *(len(str(row.get(column, ''))) for row in rows)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    print("  ".join("-" * width for width in widths))
+    for row in rows:
+        print("  ".join(str(row.get(column, '')).ljust(width) for column, width in zip(columns, widths)))
+
+def benchmark_models(args):
+    """Benchmark every registered model backend whose files are available."""
+    frames = load_test_frames(args.video, args.frames)
+    model_names = args.models or list(MODEL_REGISTRY)
+    input_sizes = [int(size) for size in args.input_sizes.split(',')] if args.input_sizes else [None]
+    results = []
+
+    for model_name in model_names:
+        missing = missing_model_files(model_name, args.model_dir)
+        if missing:
+            print(f"Skipping {model_name}: missing {', '.join(missing)}")
+            continue
+
+        try:
+            processor = AIProcessor(model_name, confidence_threshold=args.confidence, model_dir=args.model_dir,
+                                    dnn_backend=args.dnn_backend, dnn_target=args.dnn_target,
+                                    threads=args.threads)
+        except (ImportError, FileNotFoundError, cv2.error) as e:
+            print(f"Skipping {model_name}: {e}")
+            continue
+
+        sizes = input_sizes if processor.resizable_input else [processor.input_size]
+        processor.warmup([size for size in sizes if size])
+
+        for size in sizes:
+            if size:
+                processor.input_size = size
+
+            # Untimed warm-up frames
+            for frame in frames[:3]:
+                processor.process_frame(frame)
+
+            detect_times = []
+            total_times = []
+            for i in range(args.frames):
+                frame = frames[i % len(frames)]
+                start = time.perf_counter()
+                detections = processor.detect(frame)
+                detected = time.perf_counter()
+                processor.annotate(frame, detections)
+                total_times.append(time.perf_counter() - start)
+                detect_times.append(detected - start)
+
+            detect = summarize(detect_times)
+            results.append({
+                'model': model_name,
+                'input_size': processor.input_size or '-',
+                'detect_mean_ms': detect['mean_ms'],
+                'detect_p95_ms': detect['p95_ms'],
+                'total_mean_ms': summarize(total_times)['mean_ms'],
+                'fps': detect['fps']
+            })
+
+    if results:
+        print_table(results, ['model', 'input_size', 'detect_mean_ms', 'detect_p95_ms', 'total_mean_ms', 'fps'])
+    return results
+
+def send_ingest_frames(transport, port, payload, count):
+    """Send count frames as fast as possible (runs in a separate process, like a camera)."""
+    async def send():
+        if transport == 'tcp':
+            sender = FrameSender('bench')
+            await sender.connect('127.0.0.1', port)
+            for _ in range(count):
+                await sender.send(payload)
+            await sender.close()
+        else:
+            import websockets
+            async with websockets.connect(f"ws://127.0.0.1:{port}/bench") as websocket:
+                for _ in range(count):
+                    await websocket.send(payload)
+    asyncio.run(send())
+
+async def measure_ingest(transport, payload, count):
+    """
+    Receive count frames over one transport and time the receiving side.
+
+    Returns:
+        dict: Frames and megabytes per second, and receiver CPU time per frame
+    """
+    received = {'frames': 0}
+    done = asyncio.Event()
+
+    def frame_received():
+        if received['frames'] == 0:
+            received['start'] = (time.perf_counter(), time.process_time())
+        received['frames'] += 1
+        if received['frames'] == count:
+            received['end'] = (time.perf_counter(), time.process_time())
+            done.set()
+
+    # Receive the same way stream_receiver.py does, without processing the frames
+    if transport == 'tcp':
+        server = await asyncio.get_running_loop().create_server(
+            lambda: FrameReceiver(lambda receiver, frame: frame_received()), '127.0.0.1', 0)
+    else:
+        import websockets
+
+        async def handler(websocket, path=None):
+            async for message in websocket:
+                frame_received()
+        # Like stream_receiver.py, without per-message compression
+        server = await websockets.serve(handler, '127.0.0.1', 0, compression=None)
+    port = list(server.sockets)[0].getsockname()[1]
+
+    sender = multiprocessing.get_context('spawn').Process(
+        target=send_ingest_frames, args=(transport, port, payload, count))
+    sender.start()
+    try:
+        await asyncio.wait_for(done.wait(), timeout=120)
+    finally:
+        await asyncio.get_running_loop().run_in_executor(None, sender.join)
+        server.close()
+        await server.wait_closed()
+
+    wall = received['end'][0] - received['start'][0]
+    cpu = received['end'][1] - received['start'][1]
+    frames = count - 1  # Intervals between the first and last frame
+    return {
+        'transport': transport,
+        'frames': count,
+        'frame_bytes': len(payload),
+        'fps': round(frames / wall, 1),
+        'mb_per_s': round(frames * len(payload) / wall / 1e6, 1),
+        'cpu_us_per_frame': round(1e6 * cpu / frames, 1)
+    }
+
+def benchmark_ingest(args):
+    """Compare the camera WebSocket with the binary TCP ingest protocol."""
+    # Frame contents don't matter for ingest; random bytes don't compress, like JPEG
+    payload = os.urandom(args.frame_bytes)
+    results = [asyncio.run(measure_ingest(transport, payload, args.frames)) for transport in args.transports]
+    print_table(results, ['transport', 'frames', 'frame_bytes', 'fps', 'mb_per_s', 'cpu_us_per_frame'])
+    return results
+
+async def measure_workers(args, shared):
+    """
+    Start a group of worker processes, give each one frame and measure their memory.
+
+    Args:
+        args (argparse.Namespace): Scenario arguments
+        shared (bool): Preload the model before forking (else each process loads its own)
+
+    Returns:
+        list: One result per worker process plus one for the parent process
+    """
+    mode = 'shared' if shared else 'separate'
+    pool = WorkerPool(max_in_flight=1, timeout=120.0)
+    pool.configure(model=args.model, confidence=0.5)
+    server = await pool.start('127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    command = [sys.executable, str(Path(__file__).parent / 'inference_worker.py'),
+               '--server', f'127.0.0.1:{port}', '--name', mode, '--processes', str(args.processes),
+               '--retry', '0.2']
+    if args.model_dir:
+        command += ['--model-dir', args.model_dir]
+    if args.input_size:
+        command += ['--input-sizes', str(args.input_size)]
+    if shared:
+        command += ['--model', args.model]
+    started = time.monotonic()
+    # Own process group so the forked workers are stopped with it
+    group = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        while not (len(pool.workers) == args.processes and
+                   all(worker.status.get('spawn_s') is not None for worker in pool.workers.values())):
+            if group.poll() is not None or time.monotonic() - started > 300:
+                raise RuntimeError(f"{mode} workers did not start (is {args.model} in the model directory?)")
+            await asyncio.sleep(0.05)
+        ready = time.monotonic() - started
+
+        # One frame each so every process has run the model before measuring
+        jpeg = cv2.imencode('.jpg', load_test_frames(None, 1)[0])[1].tobytes()
+        await asyncio.gather(*[pool.submit(jpeg, args.input_size) for _ in range(args.processes)])
+
+        results = []
+        for name, worker in sorted(pool.workers.items()):
+            results.append(dict(process_memory(worker.status['pid']) or {}, mode=mode, process=name,
+                                spawn_s=worker.status['spawn_s'], load_s=worker.status['load_s']))
+        results.append(dict(process_memory(group.pid) or {}, mode=mode, process='parent',
+                            spawn_s=round(ready, 3), load_s=None))
+        return results
+    finally:
+        os.killpg(group.pid, signal.SIGKILL)
+        group.wait()
+        pool.close()
+        # Let the pool notice the closed connections before the event loop stops
+        for _ in range(100):
+            if not pool.workers:
+                break
+            await asyncio.sleep(0.01)
+
+def benchmark_workers(args):
+    """Compare worker processes sharing a preloaded model with processes loading their own."""
+    if process_memory() is None:
+        print("Process memory can only be measured on Linux (/proc/<pid>/smaps_rollup)")
+        return []
+    missing = missing_model_files(args.model, args.model_dir)
+    if missing:
+        print(f"Skipping {args.model}: missing {', '.join(missing)}")
+        return []
+
+    results = []
+    totals = []
+    for shared in [False, True]:
+        rows = asyncio.run(measure_workers(args, shared))
+        results += rows
+        workers = [row for row in rows if row['process'] != 'parent']
+        totals.append({
+            'mode': rows[0]['mode'],
+            'processes': len(workers),
+            'total_pss_mb': round(sum(row['pss_mb'] for row in rows), 1),
+            'mean_private_mb': round(sum(row['private_mb'] for row in workers) / len(workers), 1),
+            'max_spawn_s': max(row['spawn_s'] for row in workers),
+            'ready_s': rows[-1]['spawn_s']
+        })
+
+    print_table(results, ['mode', 'process', 'spawn_s', 'load_s', 'rss_mb', 'pss_mb', 'private_mb'])
+    print()
+    # PSS adds up to the real memory used by the group, counting shared pages once
+    print_table(totals, ['mode', 'processes', 'total_pss_mb', 'mean_private_mb', 'max_spawn_s', 'ready_s'])
+    return results + totals
+
+async def process_load(args, processor, jpegs, budget):
+    """
+    Feed simulated cameras into one pipeline and process their frames like the receiver.
+
+    Each camera offers a frame every 1/fps seconds. Like the receiver's scheduler,
+    only a camera's latest frame waits for processing (older ones are dropped) and
+    cameras take turns. Latency runs from when a frame was due to be sent until it
+    is decoded, detected, annotated and encoded, so frames delayed by a blocked
+    event loop count their whole delay.
+
+    Returns:
+        dict: Offered, processed and dropped frame counts and the latencies in seconds
+    """
+    loop = asyncio.get_running_loop()
+    inference_executor = encode_executor = None
+    if budget is not None:
+        budget.enter('ingest')
+        inference_executor = budget.executor('inference')
+        encode_executor = budget.executor('encode')
+
+    async def run(executor, function, *arguments):
+        if executor is None:
+            return function(*arguments)
+        return await loop.run_in_executor(executor, function, *arguments)
+
+    pending = {}
+    counts = {'offered': 0, 'dropped': 0}
+    latencies = []
+    ready = asyncio.Event()
+    stop = time.monotonic() + args.duration
+
+    async def camera(index):
+        interval = 1.0 / args.fps
+        due = time.monotonic() + index * interval / args.cameras
+        while due < stop:
+            await asyncio.sleep(max(0.0, due - time.monotonic()))
+            if index in pending:
+                counts['dropped'] += 1
+            pending[index] = (jpegs[counts['offered'] % len(jpegs)], due)
+            counts['offered'] += 1
+            ready.set()
+            due += interval
+
+    cameras = [asyncio.ensure_future(camera(index)) for index in range(args.cameras)]
+    turns = deque(range(args.cameras))
+    while time.monotonic() < stop:
+        if not pending:
+            ready.clear()
+            try:
+                await asyncio.wait_for(ready.wait(), max(0.0, stop - time.monotonic()))
+            except asyncio.TimeoutError:
+                break
+        turns.rotate(-1)
+        index = next(index for index in turns if index in pending)
+        jpeg, due = pending.pop(index)
+
+        frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        detections = await run(inference_executor, processor.detect, frame)
+        annotated = processor.annotate(frame, detections)
+        await run(encode_executor, cv2.imencode, '.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        latencies.append(time.monotonic() - due)
+
+    for task in cameras:
+        task.cancel()
+    for executor in [inference_executor, encode_executor]:
+        if executor is not None:
+            executor.shutdown()
+    return dict(counts, processed=len(latencies), dropped=counts['dropped'] + len(pending), latencies=latencies)
+
+def run_load_pipeline(args, cpus, budgeted, barrier, results):
+    """Load the model and run one pipeline under load (runs in its own process)."""
+    budget = None
+    if budgeted:
+        # This pipeline's share of the cores, divided between its stages
+        budget = ThreadBudget.auto(cpu_topology(cpus))
+        budget.enter('inference')
+    processor = AIProcessor(args.model, model_dir=args.model_dir, input_size=args.input_size,
+                            threads=budget.threads('inference') if budget is not None else None)
+    processor.warmup([processor.input_size])
+    jpegs = [cv2.imencode('.jpg', frame)[1].tobytes() for frame in load_test_frames(args.video, 10)]
+    for jpeg in jpegs[:3]:
+        processor.process_frame(cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR))
+
+    # Start loading every pipeline at the same moment
+    barrier.wait()
+    results.put(asyncio.run(process_load(args, processor, jpegs, budget)))
+
+def benchmark_load(args):
+    """Compare pipelines running side by side with default threading and with a CPU budget."""
+    missing = missing_model_files(args.model, args.model_dir)
+    if missing:
+        print(f"Skipping {args.model}: missing {', '.join(missing)}")
+        return []
+
+    cores = cpu_topology()
+    shares = split_cores(cores, args.pipelines)
+    print(f"{len(cores)} physical cores, {sum(len(core) for core in cores)} logical CPUs; "
+          f"budgeted pipelines get CPUs {', '.join(format_cpu_list(share.cpus) for share in shares)}")
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for budgeted in [False, True]:
+        barrier = context.Barrier(args.pipelines)
+        queue = context.Queue()
+        processes = [context.Process(target=run_load_pipeline, args=(args, share.cpus, budgeted, barrier, queue))
+                     for share in shares]
+        for process in processes:
+            process.start()
+        pipelines = [queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        latencies = np.array([latency for pipeline in pipelines for latency in pipeline['latencies']]) * 1000.0
+        offered = sum(pipeline['offered'] for pipeline in pipelines)
+        percentile = lambda q: round(float(np.percentile(latencies, q)), 1) if len(latencies) else 0.0
+        results.append({
+            'threading': 'budget' if budgeted else 'default',
+            'pipelines': args.pipelines,
+            'cameras': args.pipelines * args.cameras,
+            'offered_fps': round(offered / args.duration, 1),
+            'processed_fps': round(len(latencies) / args.duration, 1),
+            'dropped_pct': round(100.0 * sum(pipeline['dropped'] for pipeline in pipelines) / max(1, offered), 1),
+            'p50_ms': percentile(50),
+            'p95_ms': percentile(95),
+            'p99_ms': percentile(99)
+        })
+
+    print_table(results, ['threading', 'pipelines', 'cameras', 'offered_fps', 'processed_fps', 'dropped_pct',
+                          'p50_ms', 'p95_ms', 'p99_ms'])
+    return results
+
+def main():
+    """Parse arguments and run the selected benchmark scenario."""
+    parser = argparse.ArgumentParser(description='AI WiFi CAM benchmark harness')
+    parser.add_argument('--output', type=str, default=None, help='Write results as JSON to this file')
+    subparsers = parser.add_subparsers(dest='scenario', required=True)
+
+    models_parser = subparsers.add_parser('models', help='Inference speed of each model backend')
+    models_parser.add_argument('--models', nargs='*', choices=list(MODEL_REGISTRY),
+                               help='Models to benchmark (default: all with model files present)')
+    models_parser.add_argument('--model-dir', type=str, default=None, help='Directory containing the model files')
+    models_parser.add_argument('--frames', type=int, default=50, help='Frames to time per configuration')
+    models_parser.add_argument('--video', type=str, default=None, help='Video or image to use instead of synthetic frames')
+    models_parser.add_argument('--input-sizes', type=str, default=None,
+                               help='Comma-separated input sizes for resizable models (default: model default)')
+    models_parser.add_argument('--confidence', type=float, default=0.5, help='Confidence threshold')
+    models_parser.add_argument('--dnn-backend', type=str, default=None, help='OpenCV DNN backend override')
+    models_parser.add_argument('--dnn-target', type=str, default=None, help='OpenCV DNN target override')
+    models_parser.add_argument('--threads', type=int, default=None, help='OpenCV thread count override')
+    models_parser.set_defaults(func=benchmark_models)
+
+    ingest_parser = subparsers.add_parser('ingest', help='Camera frame transport throughput and CPU cost')
+    ingest_parser.add_argument('--frames', type=int, default=2000, help='Frames to send per transport')
+    ingest_parser.add_argument('--frame-bytes', type=int, default=30000,
+                               help='Size of each frame (a VGA ESP32-CAM JPEG is about 20-40 KB)')
+    ingest_parser.add_argument('--transports', nargs='*', choices=['websocket', 'tcp'], default=['websocket', 'tcp'],
+                               help='Transports to benchmark')
+    ingest_parser.set_defaults(func=benchmark_ingest)
+
+    workers_parser = subparsers.add_parser('workers', help='Memory and start-up time of inference worker processes')
+    workers_parser.add_argument('--model', type=str, default='yolov4', choices=list(MODEL_REGISTRY),
+                                help='Model the workers run')
+    workers_parser.add_argument('--model-dir', type=str, default=None, help='Directory containing the model files')
+    workers_parser.add_argument('--processes', type=int, default=3, help='Worker processes per group (at least 2)')
+    workers_parser.add_argument('--input-size', type=int, default=None,
+                                help='Network input size to run (default: model default)')
+    workers_parser.set_defaults(func=benchmark_workers)
+
+    load_parser = subparsers.add_parser('load', help='Pipelines under camera load, default threading vs CPU budget')
+    load_parser.add_argument('--model', type=str, default='yolov4_tiny', choices=list(MODEL_REGISTRY),
+                             help='Model each pipeline runs')
+    load_parser.add_argument('--model-dir', type=str, default=None, help='Directory containing the model files')
+    load_parser.add_argument('--input-size', type=int, default=None, help='Network input size (default: per model)')
+    load_parser.add_argument('--video', type=str, default=None, help='Video or image to use instead of synthetic frames')
+    load_parser.add_argument('--pipelines', type=int, default=2,
+                             help='Pipelines (receiver processes) running side by side')
+    load_parser.add_argument('--cameras', type=int, default=2, help='Simulated cameras per pipeline')
+    load_parser.add_argument('--fps', type=float, default=15.0, help='Frames per second offered by each camera')
+    load_parser.add_argument('--duration', type=float, default=20.0, help='Seconds of load per threading mode')
+    load_parser.set_defaults(func=benchmark_load)
+
+    args = parser.parse_args()
+    results = args.func(args)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({'scenario': args.scenario, 'results': results}, indent=2))
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,26 @@ System Compatibility Check for AI WiFi CAM
 
 This script checks if your system meets the requirements for running the AI WiFi CAM
 Python application, including Python version, required packages, and hardware capabilities.
+
+With --tune it also measures this machine (JPEG decoding, inference time per model,
+input size and thread count, and MediaPipe throughput), chooses the settings that best
+serve the given number of cameras at the given frame rate, and writes them as a runtime
+profile that stream_receiver.py applies at startup (see tuning.py).
 """
 
 import sys
+import argparse
+import statistics
+import time
 import platform
 import subprocess
 import importlib.util
 import os
 from pathlib import Path
 
+# Stop trying larger input sizes once inference takes longer than this
+SLOW_MS = 2000
+
 def check_python_version():
     """Check if Python version is compatible."""
     print(f"Python version: {platform.python_version()}")
@@ -121,25 +132,183 @@ def check_model_files():
         print(f"❌ Models directory not found: {models_dir}")
         return False
     
-    # Check for YOLOv4 files
-    yolo_files = ["yolov4.weights", "yolov4.cfg", "coco.names"]
-    missing_files = []
+    # The model registry needs OpenCV; without it nothing can run anyway
+    try:
+        from model_backends import MODEL_REGISTRY, missing_model_files
+    except ImportError:
+        print("❌ Cannot check model files without OpenCV installed")
+        return False
     
-    for file in yolo_files:
-        file_path = models_dir / file
-        if not file_path.exists():
-            missing_files.append(file)
+    # Check the files of every registered model; the default model is required
+    default_ok = False
+    for model_name, spec in MODEL_REGISTRY.items():
+        if not spec['files']:
+            continue
+        missing_files = missing_model_files(model_name, models_dir)
+        if missing_files:
+            marker = "❌" if model_name == "yolov4" else "ℹ️"
+            print(f"{marker} Missing {model_name} files: {', '.join(missing_files)}")
+        else:
+            print(f"✅ All {model_name} model files found")
+            if model_name == "yolov4":
+                default_ok = True
     
-    if missing_files:
-        print(f"❌ Missing YOLOv4 files: {', '.join(missing_files)}")
+    if not default_ok:
         print("   Run pc_code/download_models.py to download them")
+    return default_ok
+
+def probe_frame(width=640, height=480):
+    """Return a synthetic camera frame that compresses like a real scene."""
+    import numpy as np
+    import cv2
+    gradient = np.linspace(40, 200, width, dtype=np.uint8)
+    frame = np.dstack([np.tile(gradient, (height, 1))] * 3)
+    cv2.rectangle(frame, (100, 120), (260, 420), (40, 40, 200), -1)
+    cv2.circle(frame, (450, 200), 60, (200, 180, 160), -1)
+    noise = np.random.RandomState(0).randint(0, 12, frame.shape, dtype=np.uint8)
+    return cv2.add(frame, noise)
+
+def time_calls(function, count, warmup=2):
+    """Return the median time of a call in milliseconds, after untimed warm-up calls."""
+    for _ in range(warmup):
+        function()
+    durations = []
+    for _ in range(count):
+        start = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - start) * 1000.0)
+    return round(statistics.median(durations), 2)
+
+def probe_jpeg_decode(frame, count=50):
+    """Measure how long decoding a camera JPEG takes."""
+    import numpy as np
+    import cv2
+    jpeg = np.frombuffer(cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes(), np.uint8)
+    decode_ms = time_calls(lambda: cv2.imdecode(jpeg, cv2.IMREAD_COLOR), count)
+    print(f"JPEG decode ({frame.shape[1]}x{frame.shape[0]}, {len(jpeg) // 1000} KB): {decode_ms} ms "
+          f"({1000.0 / decode_ms:.0f} frames/s on one core)")
+    return decode_ms
+
+def probe_inference(model_names, input_sizes, thread_counts, frame, count, model_dir=None):
+    """
+    Measure inference time per model, input size and OpenCV thread count.
+
+    Models whose files or packages are missing are skipped. Larger input sizes are
+    skipped once a smaller one takes longer than SLOW_MS at the same thread count.
+
+    Returns:
+        list: Dicts with model, input_size (None if fixed), threads (None if not
+        applicable) and detect_ms
+    """
+    import cv2
+    from ai_processor import AIProcessor
+    from model_backends import missing_model_files
+
+    measurements = []
+    for model_name in model_names:
+        missing = missing_model_files(model_name, model_dir)
+        if missing:
+            print(f"ℹ️ Skipping {model_name}: missing {', '.join(missing)}")
+            continue
+        try:
+            processor = AIProcessor(model_name, model_dir=model_dir)
+        except (ImportError, FileNotFoundError, cv2.error) as e:
+            print(f"ℹ️ Skipping {model_name}: {e}")
+            continue
+
+        if processor.resizable_input:
+            sizes = sorted(input_sizes)
+            processor.warmup(sizes)
+        else:
+            sizes = [processor.input_size]
+        # MediaPipe runs its own threads
+        threads = thread_counts if processor.input_size is not None else [None]
+        for thread_count in threads:
+            if thread_count is not None:
+                cv2.setNumThreads(thread_count)
+            for size in sizes:
+                if processor.resizable_input:
+                    processor.input_size = size
+                detect_ms = time_calls(lambda: processor.detect(frame), count)
+                measurements.append({'model': model_name, 'input_size': size if processor.resizable_input else None,
+                                     'threads': thread_count, 'detect_ms': detect_ms})
+                label = f"{model_name}" + (f" @ {size}" if processor.resizable_input else "")
+                label += f", {thread_count} thread(s)" if thread_count is not None else ""
+                print(f"{label}: {detect_ms} ms ({1000.0 / detect_ms:.1f} inferences/s)")
+                if detect_ms > SLOW_MS:
+                    break
+    cv2.setNumThreads(-1)
+    return measurements
+
+def tune(args):
+    """Measure this machine and write a runtime profile for the target load."""
+    from model_backends import MODEL_REGISTRY
+    from adaptive_input import INPUT_SIZES
+    from tuning import MODEL_QUALITY, PROFILE_PATH, choose_settings, host_info, save_profile
+
+    host = host_info()
+    print(f"Tuning for {args.cameras} camera(s) at {args.fps:g} fps on {host['cores']} physical core(s), "
+          f"{host['cpus']} logical CPU(s)")
+    if args.models:
+        for model_name in args.models:
+            if model_name not in MODEL_REGISTRY:
+                print(f"❌ Unknown model: {model_name}")
+                return False
+    # MediaPipe is measured for information; it is only chosen when asked for
+    model_names = args.models or [name for name in MODEL_REGISTRY if name in MODEL_QUALITY]
+    input_sizes = [int(size) for size in args.input_sizes.split(',')] if args.input_sizes else list(INPUT_SIZES)
+    thread_counts = sorted({count for count in (1, 2, 4, 8, 16) if count < host['cores']} | {host['cores']})
+
+    frame = probe_frame()
+    decode_ms = probe_jpeg_decode(frame)
+    measurements = probe_inference(model_names, input_sizes, thread_counts, frame, args.probe_frames,
+                                   args.model_dir)
+    if not args.models:
+        mediapipe = [name for name in MODEL_REGISTRY if name.startswith('mediapipe')]
+        if importlib.util.find_spec('mediapipe') is not None:
+            probe_inference(mediapipe, [], [], frame, args.probe_frames)
+        else:
+            print("ℹ️ MediaPipe is not installed; not measured")
+    if not measurements:
+        print("❌ No model could be measured - run pc_code/download_models.py first")
         return False
+
+    choice = choose_settings(measurements, decode_ms, args.cameras, args.fps, host['cores'])
+    profile_path = args.profile or PROFILE_PATH
+    save_profile(profile_path, choice, measurements, decode_ms, args.cameras, args.fps, host)
+    settings, expected = choice['settings'], choice['expected']
+    print("")
+    print(f"Model: {settings['model']}" + (f" at input size {settings['input_size']}" if settings['input_size'] else ""))
+    print(f"Inference: {1 + settings['local_workers']} process(es) with {settings['dnn_threads'] or 'default'} "
+          f"thread(s) each ({settings['local_workers']} local worker(s))")
+    print(f"Camera frame rate: up to {settings['max_camera_fps']:g} fps")
+    if expected['meets_target']:
+        print(f"✅ Expected to sustain {args.cameras} camera(s) at {args.fps:g} fps")
     else:
-        print("✅ All YOLOv4 model files found")
-        return True
+        print(f"❌ This machine can't sustain {args.cameras} camera(s) at {args.fps:g} fps; "
+              f"expect about {expected['camera_fps']:g} fps per camera")
+    print(f"Profile written to {profile_path}; stream_receiver.py applies it at startup")
+    return True
 
 def main():
     """Run all compatibility checks."""
+    parser = argparse.ArgumentParser(description='AI WiFi CAM system compatibility check and tuning')
+    parser.add_argument('--tune', action='store_true',
+                        help='Measure this machine and write a runtime profile for stream_receiver.py')
+    parser.add_argument('--cameras', type=int, default=1, help='Number of cameras to tune for')
+    parser.add_argument('--fps', type=float, default=10.0, help='Frame rate per camera to tune for')
+    parser.add_argument('--models', nargs='*', default=None,
+                        help='Models to consider (default: every YOLO model with files present)')
+    parser.add_argument('--input-sizes', type=str, default=None,
+                        help='Comma-separated input sizes to measure (default: 256,320,416,512,608)')
+    parser.add_argument('--probe-frames', type=int, default=10, help='Frames to time per configuration')
+    parser.add_argument('--model-dir', type=str, default=None, help='Directory containing the model files')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='Runtime profile to write (default: pc_code/runtime_profile.json)')
+    args = parser.parse_args()
+    if args.cameras < 1 or args.fps <= 0:
+        parser.error("--cameras and --fps must be positive")
+
     print("AI WiFi CAM - System Compatibility Check")
     print("=======================================")
     print(f"Operating System: {platform.system()} {platform.release()}")
@@ -191,5 +360,13 @@ def main():
     print("")
     print("For detailed setup instructions, see docs/INSTALL.md")
 
+    if args.tune:
+        print("")
+        if not (opencv_ok and numpy_ok):
+            print("❌ Tuning needs OpenCV and NumPy")
+            sys.exit(1)
+        if not tune(args):
+            sys.exit(1)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Demand Tracking for the AI WiFi CAM Server
+
+The receiver used to decode, detect, annotate and encode every frame even
+when nobody was looking. This module keeps track of who consumes each
+stage of the pipeline so each frame gets only the work its consumers need:
+
+- FRAMES consumers want annotated video: web viewers, the display window
+  and the video recorder.
+- DETECTIONS consumers only want detection results: control clients and
+  anything else that reacts to detections.
+
+With FRAMES consumers every frame is fully processed. With only DETECTIONS
+consumers, detection runs at a reduced rate and nothing is annotated or
+encoded. With no consumers at all, frames are only read from the socket so
+the camera doesn't stall.
+"""
+
+import time
+
+# Pipeline stages that can have consumers
+FRAMES = 'frames'
+DETECTIONS = 'detections'
+
+# What to do with a frame
+IDLE = 'idle'      # Nobody is listening: drop the frame after reading it
+DETECT = 'detect'  # Run detection only
+FULL = 'full'      # Detect, annotate and distribute the frame
+
+
+class Demand:
+    """Class to track the consumers of each pipeline stage and plan the work per frame."""
+
+    def __init__(self, detection_interval=1.0, clock=time.monotonic):
+        """
+        Initialize without any consumers.
+
+        Args:
+            detection_interval (float): Seconds between detections when only DETECTIONS consumers are present
+            clock (callable): Function returning the current time in seconds
+        """
+        self.detection_interval = detection_interval
+        self.clock = clock
+        self._consumers = {FRAMES: set(), DETECTIONS: set()}
+
+    def add(self, stage, consumer):
+        """
+        Register a consumer of a stage.
+
+        Args:
+            stage (str): FRAMES or DETECTIONS
+            consumer: Any hashable object identifying the consumer (e.g. its WebSocket)
+        """
+        self._consumers[stage].add(consumer)
+
+    def remove(self, stage, consumer):
+        """Unregister a consumer of a stage (ignored if it is not registered)."""
+        self._consumers[stage].discard(consumer)
+
+    def count(self, stage):
+        """Return the number of consumers of a stage."""
+        return len(self._consumers[stage])
+
+    def plan(self, last_detection=None):
+        """
+        Decide how much work the next frame of a camera needs.
+
+        Args:
+            last_detection (float): Time of the camera's last detection run, or None
+
+        Returns:
+            str: FULL, DETECT or IDLE
+        """
+        if self._consumers[FRAMES]:
+            return FULL
+        if self._consumers[DETECTIONS]:
+            if last_detection is None or self.clock() - last_detection >= self.detection_interval:
+                return DETECT
+        return IDLE
+
+    def stats(self):
+        """Return the number of consumers per stage."""
+        return {stage: len(consumers) for stage, consumers in self._consumers.items()}
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Detection Log for the AI WiFi CAM Server
+
+Keeps every detection in an append-only columnar store so that questions
+such as "all persons on camera 2 between 14:00 and 15:00" can be answered
+later, in milliseconds, without loading the log into memory.
+
+Each detection is one fixed-width NumPy record (28 bytes):
+
+    time      float64  seconds since the epoch
+    camera    uint16   camera number (see the index)
+    label     uint16   class label number (see the index)
+    score     float32  confidence
+    box       int16x4  x, y, width, height in frame pixels
+    track     int32    track ID, or -1 if the detection is not tracked
+
+Records go into segment files (segment_000000.npy, ...) of a fixed number of
+rows. A segment is created at full size (sparse on most file systems) and
+memory-mapped, so appending is a copy into the page cache. flush() writes
+the dirty pages to disk and then updates index.json. The index holds the
+camera and label names and, per segment, its row count, time range and the
+cameras and labels it contains. Rows appended after the last flush are
+lost if the process dies.
+
+Rows are appended in time order (timestamps never go backwards within the
+log), so a query binary-searches the time column of each segment whose time
+range overlaps, skips segments without the camera or label, and only then
+reads the matching slice.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from datetime import datetime, date
+from pathlib import Path
+
+import numpy as np
+
+RECORD = np.dtype([
+    ('time', '<f8'),
+    ('camera', '<u2'),
+    ('label', '<u2'),
+    ('score', '<f4'),
+    ('box', '<i2', (4,)),
+    ('track', '<i4')
+])
+
+INDEX_FILENAME = 'index.json'
+SEGMENT_ROWS = 1 << 20
+
+
+class Segment:
+    """One segment file and what it contains."""
+
+    def __init__(self, path, rows=0, start=None, end=None, cameras=(), labels=()):
+        """
+        Initialize the segment description.
+
+        Args:
+            path (Path): Segment file
+            rows (int): Rows written
+            start (float): Time of the first row
+            end (float): Time of the last row
+            cameras (iterable): Camera numbers present
+            labels (iterable): Label numbers present
+        """
+        self.path = path
+        self.rows = rows
+        self.start = start
+        self.end = end
+        self.cameras = set(cameras)
+        self.labels = set(labels)
+        self.array = None
+
+    def overlaps(self, start, end):
+        """Whether the segment has rows between start and end (None for open ends)."""
+        if not self.rows:
+            return False
+        return (start is None or self.end >= start) and (end is None or self.start <= end)
+
+    def to_json(self):
+        """Return the segment's entry in the index."""
+        return {'file': self.path.name, 'rows': self.rows, 'start': self.start, 'end': self.end,
+                'cameras': sorted(self.cameras), 'labels': sorted(self.labels)}
+
+
+class DetectionLog:
+    """Class to append detections to memory-mapped segments and query them by time, camera and label."""
+
+    def __init__(self, root='detection_log', segment_rows=SEGMENT_ROWS):
+        """
+        Open the log, continuing after the rows recorded at the last flush.
+
+        Args:
+            root (str): Directory holding the segments and the index
+            segment_rows (int): Rows per segment file for new segments
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.segment_rows = segment_rows
+        self.index_path = self.root / INDEX_FILENAME
+
+        # Protects the names, the segment list and the active segment's row count
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.cameras = []
+        self.labels = []
+        self.segments = []
+        self._dirty = set()
+        self._last_time = 0.0
+        self._load_index()
+
+        self._camera_ids = {name: number for number, name in enumerate(self.cameras)}
+        self._label_ids = {name: number for number, name in enumerate(self.labels)}
+        # Segment being appended to; the next one is created when a row doesn't fit
+        self._active = None
+        if self.segments and self.segments[-1].rows < len(self._open(self.segments[-1], writable=True)):
+            self._active = self.segments[-1]
+
+    def _load_index(self):
+        """Read the index written by the last flush."""
+        if not self.index_path.exists():
+            return
+        try:
+            index = json.loads(self.index_path.read_text())
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"Cannot read detection log index {self.index_path}: {e}")
+        self.cameras = index['cameras']
+        self.labels = index['labels']
+        for entry in index['segments']:
+            self.segments.append(Segment(self.root / entry['file'], entry['rows'], entry['start'], entry['end'],
+                                         entry['cameras'], entry['labels']))
+        if self.segments and self.segments[-1].end is not None:
+            self._last_time = self.segments[-1].end
+
+    def _open(self, segment, writable=False):
+        """Memory-map a segment file (once)."""
+        if segment.array is None or (writable and not segment.array.flags.writeable):
+            segment.array = np.load(segment.path, mmap_mode='r+' if writable else 'r')
+        return segment.array
+
+    def _new_segment(self):
+        """Create the next segment file at full size."""
+        segment = Segment(self.root / f"segment_{len(self.segments):06d}.npy")
+        segment.array = np.lib.format.open_memmap(segment.path, mode='w+', dtype=RECORD, shape=(self.segment_rows,))
+        self.segments.append(segment)
+        return segment
+
+    def _number(self, names, numbers, name):
+        """Return the number of a camera or label name, adding new names."""
+        number = numbers.get(name)
+        if number is None:
+            number = numbers[name] = len(names)
+            names.append(name)
+        return number
+
+    def append(self, camera_id, detections, timestamp=None, track_ids=None):
+        """
+        Record the detections of one frame.
+
+        Args:
+            camera_id (str): Camera the frame came from
+            detections (list): Detection tuples
+            timestamp (float): Frame time in seconds since the epoch (defaults to now)
+            track_ids (list): Track ID per detection (default: untracked)
+        """
+        if not detections:
+            return
+        with self._lock:
+            # Keep the time column sorted even if the clock steps back
+            timestamp = max(timestamp if timestamp is not None else time.time(), self._last_time)
+            self._last_time = timestamp
+            camera = self._number(self.cameras, self._camera_ids, camera_id)
+
+            records = np.zeros(len(detections), dtype=RECORD)
+            records['time'] = timestamp
+            records['camera'] = camera
+            records['label'] = [self._number(self.labels, self._label_ids, detection.label)
+                                for detection in detections]
+            records['score'] = [detection.confidence for detection in detections]
+            records['box'] = np.clip([detection.box for detection in detections], -32768, 32767)
+            records['track'] = track_ids if track_ids is not None else -1
+
+            written = 0
+            while written < len(records):
+                segment = self._active
+                if segment is None or segment.rows == len(segment.array):
+                    segment = self._active = self._new_segment()
+                count = min(len(records) - written, len(segment.array) - segment.rows)
+                segment.array[segment.rows:segment.rows + count] = records[written:written + count]
+                if segment.start is None:
+                    segment.start = timestamp
+                segment.end = timestamp
+                segment.cameras.add(camera)
+                segment.labels.update(int(label) for label in records['label'][written:written + count])
+                segment.rows += count
+                written += count
+                self._dirty.add(segment)
+
+    def flush(self):
+        """Write the appended rows to disk, then record them in the index (safe to call from another thread)."""
+        with self._flush_lock:
+            with self._lock:
+                index = {'version': 1, 'cameras': list(self.cameras), 'labels': list(self.labels),
+                         'segments': [segment.to_json() for segment in self.segments]}
+                dirty = list(self._dirty)
+                self._dirty.clear()
+            for segment in dirty:
+                segment.array.flush()
+            temporary = self.index_path.with_suffix('.tmp')
+            temporary.write_text(json.dumps(index))
+            os.replace(temporary, self.index_path)
+
+    def close(self):
+        """Flush the log."""
+        self.flush()
+
+    @property
+    def rows(self):
+        """Total number of detections in the log."""
+        return sum(segment.rows for segment in self.segments)
+
+    def query(self, start=None, end=None, camera=None, label=None, limit=1000):
+        """
+        Find detections by time range, camera and label.
+
+        Args:
+            start (float): Earliest time in seconds since the epoch (None for no limit)
+            end (float): Latest time (None for no limit)
+            camera (str): Only this camera (None for all)
+            label (str): Only this class label (None for all)
+            limit (int): Most rows to return (None for all)
+
+        Returns:
+            tuple: (matching records as a NumPy array in time order, up to limit;
+            total number of matches)
+        """
+        with self._lock:
+            camera_number = self._camera_ids.get(camera) if camera is not None else None
+            label_number = self._label_ids.get(label) if label is not None else None
+            segments = [(segment, segment.rows) for segment in self.segments]
+        if (camera is not None and camera_number is None) or (label is not None and label_number is None):
+            return np.zeros(0, dtype=RECORD), 0
+
+        found = []
+        total = 0
+        for segment, rows in segments:
+            if not segment.overlaps(start, end):
+                continue
+            if camera_number is not None and camera_number not in segment.cameras:
+                continue
+            if label_number is not None and label_number not in segment.labels:
+                continue
+
+            data = self._open(segment)[:rows]
+            times = data['time']
+            # bisect reads only the rows it compares; np.searchsorted would copy the strided column
+            first = bisect.bisect_left(times, start) if start is not None else 0
+            last = bisect.bisect_right(times, end) if end is not None else rows
+            matches = data[first:last]
+            if camera_number is not None or label_number is not None:
+                mask = np.ones(len(matches), dtype=bool)
+                if camera_number is not None:
+                    mask &= matches['camera'] == camera_number
+                if label_number is not None:
+                    mask &= matches['label'] == label_number
+                matches = matches[mask]
+            total += len(matches)
+            if limit is None or sum(len(chunk) for chunk in found) < limit:
+                found.append(np.array(matches))
+
+        result = np.concatenate(found) if found else np.zeros(0, dtype=RECORD)
+        return (result[:limit] if limit is not None else result), total
+
+    def to_json(self, records):
+        """Turn query results into JSON-serializable dictionaries."""
+        # Whole columns to Python at once; per-record NumPy scalars are slow
+        return [{'time': datetime.fromtimestamp(timestamp).isoformat(timespec='milliseconds'),
+                 'timestamp': timestamp,
+                 'camera': self.cameras[camera],
+                 'label': self.labels[label],
+                 'confidence': round(score, 3),
+                 'box': box,
+                 'track_id': track if track >= 0 else None}
+                for timestamp, camera, label, score, box, track in zip(
+                    records['time'].tolist(), records['camera'].tolist(), records['label'].tolist(),
+                    records['score'].tolist(), records['box'].tolist(), records['track'].tolist())]
+
+
+def parse_time(text):
+    """
+    Parse a query time: seconds since the epoch, an ISO date and time, or a time of day today.
+
+    Raises:
+        ValueError: If the text is none of these
+    """
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        pass
+    try:
+        moment = datetime.strptime(text, '%H:%M:%S' if text.count(':') == 2 else '%H:%M')
+    except ValueError:
+        raise ValueError(f"Invalid time: {text}")
+    return datetime.combine(date.today(), moment.time()).timestamp()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Local Preview Window for the AI WiFi CAM Server
+
+This module shows processed frames in an OpenCV window from a dedicated
+thread. cv2.imshow and cv2.waitKey run the GUI event loop, which can take
+tens of milliseconds; running them on the asyncio loop would stall frame
+ingest and the web server.
+
+The pipeline publishes frames without waiting. The display thread renders
+only the most recent one at its own refresh rate, so frames it cannot keep
+up with are dropped. Key presses are turned into commands and passed back
+through a thread-safe queue.
+"""
+
+import queue
+import threading
+import time
+
+import cv2
+
+# Commands produced by key presses
+KEY_COMMANDS = {
+    ord('q'): 'quit',
+    ord('s'): 'snapshot',
+    ord('p'): 'pause',
+    ord('+'): 'confidence_up',
+    ord('='): 'confidence_up',
+    ord('-'): 'confidence_down',
+}
+
+
+class DisplayThread:
+    """Class to show the latest published frame in a window from its own thread."""
+
+    def __init__(self, window_name='AI WiFi CAM', refresh_rate=30.0,
+                 imshow=cv2.imshow, wait_key=cv2.waitKey, destroy_window=cv2.destroyWindow):
+        """
+        Initialize the display thread (call start() to open the window).
+
+        Args:
+            window_name (str): Title of the preview window
+            refresh_rate (float): Maximum number of window refreshes per second
+            imshow (callable): Function used to show a frame (cv2.imshow)
+            wait_key (callable): Function used to pump GUI events (cv2.waitKey)
+            destroy_window (callable): Function used to close the window (cv2.destroyWindow)
+        """
+        self.window_name = window_name
+        self.refresh_interval = 1.0 / refresh_rate
+        self.imshow = imshow
+        self.wait_key = wait_key
+        self.destroy_window = destroy_window
+
+        # Commands from key presses, read by the pipeline
+        self.commands = queue.Queue()
+
+        # Latest published frame and counters, protected by the lock
+        self._lock = threading.Lock()
+        self._frame = None
+        self._new_frame = False
+        self.frames_shown = 0
+        self.frames_dropped = 0
+
+        self._running = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the display thread."""
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name='display', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """Stop the display thread and close the window."""
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def publish(self, frame):
+        """
+        Offer a frame for display. Never blocks on the GUI.
+
+        The frame is shown by reference, so it must not be modified afterwards.
+        A frame that is replaced before the display thread shows it is dropped.
+
+        Args:
+            frame (numpy.ndarray): Frame to show
+        """
+        with self._lock:
+            if self._new_frame:
+                self.frames_dropped += 1
+            self._frame = frame
+            self._new_frame = True
+
+    def get_command(self):
+        """Return the next key press command, or None if there is none."""
+        try:
+            return self.commands.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _run(self):
+        """Render the latest frame and pump GUI events until stopped."""
+        try:
+            while self._running.is_set():
+                started = time.monotonic()
+
+                with self._lock:
+                    frame = self._frame if self._new_frame else None
+                    self._new_frame = False
+
+                if frame is not None:
+                    self.imshow(self.window_name, frame)
+                    self.frames_shown += 1
+
+                # waitKey also processes window events, so call it even without a new frame
+                key = self.wait_key(1) & 0xFF
+                command = KEY_COMMANDS.get(key)
+                if command is not None:
+                    self.commands.put(command)
+
+                elapsed = time.monotonic() - started
+                if elapsed < self.refresh_interval:
+                    time.sleep(self.refresh_interval - elapsed)
+        finally:
+            try:
+                self.destroy_window(self.window_name)
+            except cv2.error:
+                pass
@@ -2,67 +2,449 @@
 """
 Download script for AI models used in the AI WiFi CAM project.
 
-This script downloads the necessary model files for YOLOv4 object detection.
-MediaPipe models are downloaded automatically when installing the mediapipe package.
+This script downloads the model files of the models registered in
+model_backends.py (YOLOv4 by default). MediaPipe models are downloaded
+automatically when installing the mediapipe package.
+
+Files are downloaded several at a time. Each goes to a '.part' file first
+and is only renamed to its final name once it is complete and verified,
+so an interrupted run never leaves a truncated model behind; the next run
+resumes the '.part' file with an HTTP range request.
+
+Integrity is checked against a manifest of SHA-256 hashes (JSON,
+{"filename": {"sha256": "...", "size": n}}). Without a hash for a file,
+its size is checked against the server's instead. --update-manifest
+records the hashes of the files as downloaded, so one trusted download can
+pin the files for every other machine.
+
+Files already verified are recorded (with their size and modification
+time) in .verified.json in the model directory, so repeat runs don't read
+them again. --mirror downloads from a local server or directory instead of
+the original URLs, and --cache keeps verified files in a directory shared
+between model directories or machines.
 """
 
 import os
 import sys
-import urllib.request
+import argparse
+import hashlib
+import json
 import shutil
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-# Define model URLs and file paths
-MODELS_DIR = Path(__file__).parent.parent / "models"
-YOLO_FILES = {
-    "yolov4.weights": "https://github.com/AlexeyAB/darknet/releases/download/darknet_yolo_v3_optimal/yolov4.weights",
-    "yolov4.cfg": "https://raw.githubusercontent.com/AlexeyAB/darknet/master/cfg/yolov4.cfg",
-    "coco.names": "https://raw.githubusercontent.com/AlexeyAB/darknet/master/data/coco.names"
-}
-
-def download_file(url, destination):
-    """Download a file from a URL to a destination path."""
-    print(f"Downloading {url} to {destination}...")
-    
-    # Create a progress bar for large files
-    def report_progress(block_num, block_size, total_size):
-        downloaded = block_num * block_size
-        percent = min(int(downloaded * 100 / total_size), 100)
-        sys.stdout.write(f"\rProgress: {percent}% [{downloaded} / {total_size} bytes]")
-        sys.stdout.flush()
-    
+from model_backends import MODEL_REGISTRY, MODELS_DIR
+
+MANIFEST_PATH = Path(__file__).parent / 'model_manifest.json'
+VERIFIED_FILENAME = '.verified.json'
+CHUNK_SIZE = 1 << 20
+
+class DownloadError(Exception):
+    """A file could not be downloaded or failed verification."""
+
+class IntegrityError(DownloadError):
+    """A complete file doesn't match the manifest, so resuming it can't help."""
+
+def file_sha256(path):
+    """Return the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(source):
+    """
+    Load a manifest of expected hashes from a file or URL.
+
+    Returns:
+        dict: {filename: {'sha256': ..., 'size': ...}}, empty if a manifest file doesn't exist
+    """
+    source = str(source)
     try:
-        urllib.request.urlretrieve(url, destination, reporthook=report_progress)
-        print(f"\nDownloaded {destination}")
-        return True
-    except Exception as e:
-        print(f"\nError downloading {url}: {e}")
-        return False
+        if '://' in source:
+            with urllib.request.urlopen(source, timeout=30) as response:
+                return json.load(response)
+        if not Path(source).exists():
+            return {}
+        return json.loads(Path(source).read_text())
+    except (OSError, ValueError) as e:
+        raise DownloadError(f"Cannot read manifest {source}: {e}")
+
+def format_size(count):
+    """Format a byte count as bytes, KB or MB."""
+    if count >= 1e6:
+        return f"{count / 1e6:.1f} MB"
+    return f"{count / 1e3:.1f} KB" if count >= 1e3 else f"{count:.0f} bytes"
+
+def mirror_url(mirror, filename):
+    """Return the URL of a file on a mirror given as a base URL or a local directory."""
+    if '://' not in mirror:
+        return (Path(mirror).resolve() / filename).as_uri()
+    return mirror.rstrip('/') + '/' + filename
+
+class Progress:
+    """Thread-safe count of the bytes downloaded, for throughput reports."""
+
+    def __init__(self):
+        """Initialize the counters."""
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.start = time.monotonic()
+
+    def add(self, count):
+        """Count downloaded bytes."""
+        with self._lock:
+            self.bytes += count
+
+    def rate(self):
+        """Return the overall throughput in bytes per second."""
+        return self.bytes / max(time.monotonic() - self.start, 1e-6)
+
+def fetch(url, part, progress, timeout=30):
+    """
+    Download a URL into a '.part' file, continuing after the bytes it already holds.
+
+    Args:
+        url (str): URL to download
+        part (Path): Partial file, created or appended to
+        progress (Progress): Counter of downloaded bytes
+        timeout (float): Seconds to wait for the server
+
+    Returns:
+        tuple: (size of the complete file, bytes received)
+
+    Raises:
+        DownloadError: If the server's response is unusable or incomplete
+    """
+    offset = part.stat().st_size if part.exists() else 0
+    request = urllib.request.Request(url, headers={'Range': f"bytes={offset}-"} if offset else {})
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 416 and offset:
+            # Nothing left after the offset: the partial file is already complete
+            return offset, 0
+        raise DownloadError(f"{url}: HTTP {e.code} {e.reason}")
+    except (urllib.error.URLError, OSError) as e:
+        raise DownloadError(f"{url}: {getattr(e, 'reason', e)}")
+
+    with response:
+        length = response.headers.get('Content-Length')
+        if offset and getattr(response, 'status', 200) == 206:
+            total = offset + int(length) if length is not None else None
+            mode = 'ab'
+        else:
+            # The server ignored the range (or there was none): start over
+            offset = 0
+            total = int(length) if length is not None else None
+            mode = 'wb'
+        written = offset
+        with open(part, mode) as f:
+            try:
+                for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                    f.write(chunk)
+                    written += len(chunk)
+                    progress.add(len(chunk))
+            except OSError as e:
+                raise DownloadError(f"{url}: connection lost after {written} bytes ({e})")
+            f.flush()
+            os.fsync(f.fileno())
+    if total is not None and written != total:
+        raise DownloadError(f"{url}: received {written} of {total} bytes")
+    return written, written - offset
+
+def remote_size(url, timeout=30):
+    """Return a file's size as reported by the server, or None if it can't be found out."""
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, method='HEAD'), timeout=timeout) as response:
+            length = response.headers.get('Content-Length')
+            return int(length) if length is not None else None
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+
+class Provisioner:
+    """Class downloading, verifying and caching the model files."""
+
+    def __init__(self, model_dir, manifest=None, mirror=None, cache_dir=None, retries=3, verify=False):
+        """
+        Initialize the provisioner.
+
+        Args:
+            model_dir (str): Directory to save model files to
+            manifest (dict): Expected hashes and sizes per filename
+            mirror (str): Base URL or directory to download from instead of the original URLs
+            cache_dir (str): Directory of verified files shared between model directories
+            retries (int): Download attempts per file, each resuming the previous one
+            verify (bool): Re-read files already recorded as verified
+        """
+        self.model_dir = Path(model_dir)
+        self.manifest = manifest or {}
+        self.mirror = mirror
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.retries = retries
+        self.verify = verify
+        self.progress = Progress()
+        self.hashes = {}
+
+        self._lock = threading.Lock()
+        self._verified_path = self.model_dir / VERIFIED_FILENAME
+        try:
+            self._verified = json.loads(self._verified_path.read_text())
+        except (OSError, ValueError):
+            self._verified = {}
+
+    def _expected(self, filename):
+        """Return (sha256, size) expected for a file; either may be None."""
+        entry = self.manifest.get(filename) or {}
+        return entry.get('sha256'), entry.get('size')
+
+    def _is_recorded(self, filename, path):
+        """Whether a file is unchanged since it was verified against the current manifest."""
+        record = self._verified.get(filename)
+        if record is None or self.verify:
+            return False
+        stat = path.stat()
+        sha256, _ = self._expected(filename)
+        return (record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns
+                and (sha256 is None or record['sha256'] == sha256))
+
+    def _record(self, filename, path, sha256):
+        """Remember that a file was verified."""
+        stat = path.stat()
+        with self._lock:
+            self._verified[filename] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+            self.hashes[filename] = sha256
+
+    def save_records(self):
+        """Write the verified-file records atomically."""
+        temporary = self._verified_path.with_suffix('.tmp')
+        temporary.write_text(json.dumps(self._verified, indent=2, sort_keys=True))
+        os.replace(temporary, self._verified_path)
+
+    def _check(self, filename, path, url=None):
+        """
+        Verify a file against the manifest, or against the server's size without a hash.
+
+        Returns:
+            str: The file's SHA-256
+
+        Raises:
+            IntegrityError: If the file doesn't match the manifest
+            DownloadError: If the file is smaller or larger than on the server
+        """
+        sha256, size = self._expected(filename)
+        actual_size = path.stat().st_size
+        if size is not None and actual_size != size:
+            raise IntegrityError(f"{filename}: {actual_size} bytes, expected {size}")
+        if sha256 is None and size is None and url is not None:
+            server_size = remote_size(url)
+            if server_size is not None and actual_size != server_size:
+                raise DownloadError(f"{filename}: {actual_size} bytes, server has {server_size}")
+        digest = file_sha256(path)
+        if sha256 is not None and digest != sha256:
+            raise IntegrityError(f"{filename}: SHA-256 {digest} does not match the manifest ({sha256})")
+        return digest
+
+    def provision(self, filename, url):
+        """
+        Make sure one file is present and verified, downloading it if needed.
+
+        Returns:
+            dict: filename, status ('present', 'cached' or 'downloaded'), bytes downloaded and seconds
+
+        Raises:
+            DownloadError: If the file can't be downloaded or fails verification
+        """
+        start = time.monotonic()
+        destination = self.model_dir / filename
+        part = destination.with_name(destination.name + '.part')
+        url = mirror_url(self.mirror, filename) if self.mirror else url
+
+        # Fast path: unchanged since it was last verified
+        if destination.exists() and self._is_recorded(filename, destination):
+            return {'filename': filename, 'status': 'present', 'bytes': 0, 'seconds': 0.0}
+
+        if destination.exists():
+            try:
+                self._record(filename, destination, self._check(filename, destination, url))
+                return {'filename': filename, 'status': 'present', 'bytes': 0,
+                        'seconds': time.monotonic() - start}
+            except DownloadError as e:
+                # Most likely truncated by an interrupted download: continue it
+                print(f"{e}; downloading it again")
+                if not part.exists():
+                    os.replace(destination, part)
+                else:
+                    destination.unlink()
+
+        # A verified copy in the shared cache
+        if self.cache_dir is not None and (self.cache_dir / filename).exists():
+            cached = self.cache_dir / filename
+            try:
+                digest = self._check(filename, cached)
+                shutil.copyfile(cached, part)
+                os.replace(part, destination)
+                self._record(filename, destination, digest)
+                return {'filename': filename, 'status': 'cached', 'bytes': 0, 'seconds': time.monotonic() - start}
+            except DownloadError as e:
+                print(f"Ignoring cached {e}")
+
+        if url is None:
+            raise DownloadError(f"{filename} cannot be downloaded automatically")
+
+        downloaded = 0
+        attempt = 1
+        while True:
+            before = part.stat().st_size if part.exists() else 0
+            try:
+                _, received = fetch(url, part, self.progress)
+                downloaded += received
+                digest = self._check(filename, part)
+                break
+            except DownloadError as e:
+                if isinstance(e, IntegrityError) and part.exists():
+                    part.unlink()
+                    if before:
+                        # Bytes left from before were wrong: start over without waiting
+                        print(f"{e}; downloading it again")
+                        continue
+                if attempt == self.retries:
+                    raise
+                print(f"{e}; retrying ({attempt}/{self.retries - 1})")
+                time.sleep(min(2 ** attempt, 10))
+                attempt += 1
+
+        os.replace(part, destination)
+        self._record(filename, destination, digest)
+        if self.cache_dir is not None:
+            self._store_in_cache(filename, destination)
+        return {'filename': filename, 'status': 'downloaded', 'bytes': downloaded,
+                'seconds': time.monotonic() - start}
+
+    def _store_in_cache(self, filename, path):
+        """Put a verified file in the shared cache (linked if on the same file system)."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        cached = self.cache_dir / filename
+        temporary = cached.with_name(f"{cached.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            os.link(path, temporary)
+        except OSError:
+            shutil.copyfile(path, temporary)
+        os.replace(temporary, cached)
+
+    def provision_all(self, files, jobs=4):
+        """
+        Provision several files in parallel.
+
+        Args:
+            files (dict): {filename: URL or None}
+            jobs (int): Files downloaded at the same time
+
+        Returns:
+            tuple: (list of result dicts, dict of errors per filename)
+        """
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+        results = []
+        errors = {}
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            futures = {executor.submit(self.provision, filename, url): filename for filename, url in files.items()}
+            for future, filename in futures.items():
+                try:
+                    result = future.result()
+                except DownloadError as e:
+                    errors[filename] = str(e)
+                    print(f"Error: {e}")
+                    continue
+                results.append(result)
+                if result['status'] == 'downloaded':
+                    rate = result['bytes'] / max(result['seconds'], 1e-6)
+                    print(f"Downloaded {filename}: {format_size(result['bytes'])} in "
+                          f"{result['seconds']:.1f} s ({format_size(rate)}/s)")
+                elif result['status'] == 'cached':
+                    print(f"Copied {filename} from the cache")
+        self.save_records()
+        return results, errors
+
+def update_manifest(path, hashes, model_dir):
+    """Record the hashes and sizes of verified files in a manifest file."""
+    manifest = load_manifest(path)
+    for filename, sha256 in hashes.items():
+        manifest[filename] = {'sha256': sha256, 'size': (Path(model_dir) / filename).stat().st_size}
+    Path(path).write_text(json.dumps(manifest, indent=2, sort_keys=True) + '\n')
 
 def main():
     """Main function to download model files."""
+    parser = argparse.ArgumentParser(description='Download AI WiFi CAM model files')
+    parser.add_argument('models', nargs='*', default=['yolov4'],
+                        help=f"Models to download (default: yolov4, available: {', '.join(MODEL_REGISTRY)})")
+    parser.add_argument('--all', action='store_true', help='Download files for every registered model')
+    parser.add_argument('--model-dir', type=str, default=str(MODELS_DIR), help='Directory to save model files to')
+    parser.add_argument('--jobs', type=int, default=4, help='Number of files downloaded at the same time')
+    parser.add_argument('--mirror', type=str, default=None,
+                        help='Base URL or directory to download the files from instead of the original URLs')
+    parser.add_argument('--cache', type=str, default=None,
+                        help='Directory of verified files shared between model directories')
+    parser.add_argument('--manifest', type=str, default=str(MANIFEST_PATH),
+                        help='File or URL of the SHA-256 manifest to verify against')
+    parser.add_argument('--update-manifest', action='store_true',
+                        help='Record the hashes of the verified files in the manifest file')
+    parser.add_argument('--verify', action='store_true', help='Re-check files already recorded as verified')
+    parser.add_argument('--retries', type=int, default=3, help='Download attempts per file')
+    args = parser.parse_args()
+    for model_name in args.models:
+        if model_name not in MODEL_REGISTRY:
+            parser.error(f"unknown model: {model_name}")
+
     print("AI WiFi CAM - Model Downloader")
     print("==============================")
-    
-    # Create models directory if it doesn't exist
-    os.makedirs(MODELS_DIR, exist_ok=True)
-    
-    # Download YOLOv4 files
-    print("\nDownloading YOLOv4 model files...")
-    success = True
-    for filename, url in YOLO_FILES.items():
-        destination = MODELS_DIR / filename
-        if destination.exists():
-            print(f"{filename} already exists. Skipping download.")
-        else:
-            if not download_file(url, destination):
-                success = False
-    
-    if success:
-        print("\nAll model files downloaded successfully!")
-        print(f"Files saved to: {MODELS_DIR}")
-    else:
+
+    try:
+        manifest = load_manifest(args.manifest)
+    except DownloadError as e:
+        parser.error(str(e))
+
+    # Files shared by several models (coco.names) are downloaded once
+    model_names = list(MODEL_REGISTRY) if args.all else args.models
+    files = {}
+    manual_files = []
+    for model_name in model_names:
+        for filename, url in MODEL_REGISTRY[model_name]['files'].items():
+            if url is None and not (Path(args.model_dir) / filename).exists():
+                manual_files.append((model_name, filename))
+            elif url is not None:
+                files[filename] = url
+    if not files and not manual_files:
+        print(f"\n{', '.join(model_names)} has no model files to download.")
+        return
+
+    provisioner = Provisioner(args.model_dir, manifest, mirror=args.mirror, cache_dir=args.cache,
+                              retries=args.retries, verify=args.verify)
+    results, errors = provisioner.provision_all(files, jobs=args.jobs)
+    if args.update_manifest and '://' not in args.manifest:
+        update_manifest(args.manifest, provisioner.hashes, args.model_dir)
+        print(f"Recorded {len(provisioner.hashes)} hashes in {args.manifest}")
+
+    for model_name, filename in manual_files:
+        print(f"\n{filename} ({model_name}) cannot be downloaded automatically.")
+        print(f"Export it to ONNX as described in docs/INSTALL.md and copy it to {args.model_dir}")
+
+    downloaded = sum(result['bytes'] for result in results)
+    elapsed = time.monotonic() - provisioner.progress.start
+    unverified = [filename for filename in files if filename not in errors and filename not in manifest]
+    print(f"\n{len(results)} of {len(files)} files ready in {elapsed:.1f} s"
+          + (f", {format_size(downloaded)} at {format_size(provisioner.progress.rate())}/s" if downloaded else ""))
+    if unverified and not args.update_manifest:
+        print(f"No SHA-256 in the manifest for {', '.join(unverified)}: checked their size only. "
+              f"Run with --update-manifest to pin them.")
+    if errors:
         print("\nSome files could not be downloaded. Please check the errors above.")
+        sys.exit(1)
+    print(f"Files saved to: {args.model_dir}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Duplicate Frame Suppression for the AI WiFi CAM Server
+
+The ESP32-CAM often sends frames that are identical or nearly identical,
+for example in a dark room or a static scene. Decoding and running the
+model on them only repeats the previous result. This module recognizes such
+frames from the raw JPEG bytes, before the full decode:
+
+1. Exact duplicates: same length and CRC-32 as the last processed frame.
+   This costs a few microseconds.
+2. Near duplicates: the JPEG size is within a few percent of the last
+   processed frame, and a DC-only decode (cv2.IMREAD_REDUCED_GRAYSCALE_8,
+   where libjpeg skips the inverse DCT and keeps one value per 8x8 block)
+   barely differs from it. This costs about a fifth of a full decode.
+
+Frames are compared with the last frame that was processed, not the last
+one received, so a slow change cannot creep through as a chain of small
+differences. A refresh interval forces a frame through now and then so the
+results never go stale.
+"""
+
+import time
+import zlib
+
+import cv2
+import numpy as np
+
+
+class DuplicateFilter:
+    """Class to decide from the raw JPEG bytes whether a frame needs processing."""
+
+    def __init__(self, size_tolerance=0.05, max_mean_difference=1.5, max_block_difference=24,
+                 refresh_interval=1.0, clock=time.monotonic):
+        """
+        Initialize the filter.
+
+        Args:
+            size_tolerance (float): Largest relative JPEG size change for a near duplicate
+            max_mean_difference (float): Largest mean difference of the 8x8 block averages (0-255)
+            max_block_difference (int): Largest difference of any single 8x8 block average (0-255)
+            refresh_interval (float): Seconds after which a frame is processed even if it is a duplicate
+            clock (callable): Function returning the current time in seconds
+        """
+        self.size_tolerance = size_tolerance
+        self.max_mean_difference = max_mean_difference
+        self.max_block_difference = max_block_difference
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+
+        # Last processed frame; its block averages are only decoded when needed
+        self._jpeg = None
+        self._length = None
+        self._crc = None
+        self._blocks = None
+        self._processed_at = None
+
+        # Counters
+        self.frames_checked = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.forced_refreshes = 0
+
+    @property
+    def frames_suppressed(self):
+        """Number of frames that were not processed."""
+        return self.exact_duplicates + self.near_duplicates
+
+    def is_duplicate(self, jpeg):
+        """
+        Check whether a frame repeats the last processed frame.
+
+        A frame that is not a duplicate becomes the new reference, so callers
+        must process every frame for which this returns False.
+
+        Args:
+            jpeg (bytes): JPEG-encoded frame
+
+        Returns:
+            bool: True if the frame can be skipped
+        """
+        self.frames_checked += 1
+        now = self.clock()
+        length = len(jpeg)
+        crc = zlib.crc32(jpeg)
+        blocks = None
+
+        if self._length is not None:
+            duplicate = False
+            if length == self._length and crc == self._crc:
+                duplicate = 'exact'
+            elif abs(length - self._length) <= self.size_tolerance * self._length:
+                blocks = self._dc_blocks(jpeg)
+                if blocks is not None and self._similar(blocks):
+                    duplicate = 'near'
+
+            if duplicate:
+                if now - self._processed_at < self.refresh_interval:
+                    if duplicate == 'exact':
+                        self.exact_duplicates += 1
+                    else:
+                        self.near_duplicates += 1
+                    return True
+                self.forced_refreshes += 1
+
+        # Process this frame and compare the next ones with it
+        self._jpeg = jpeg
+        self._length = length
+        self._crc = crc
+        self._blocks = blocks
+        self._processed_at = now
+        return False
+
+    def _dc_blocks(self, jpeg):
+        """Decode only the 8x8 block averages of the luma channel (None if undecodable)."""
+        return cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+
+    def _similar(self, blocks):
+        """Compare block averages with those of the last processed frame."""
+        if self._blocks is None:
+            self._blocks = self._dc_blocks(self._jpeg)
+        if self._blocks is None or blocks.shape != self._blocks.shape:
+            return False
+        difference = cv2.absdiff(blocks, self._blocks)
+        return (difference.max() <= self.max_block_difference and
+                difference.mean() <= self.max_mean_difference)
+
+    def stats(self):
+        """Return the counters as a dictionary."""
+        return {
+            'checked': self.frames_checked,
+            'exact_duplicates': self.exact_duplicates,
+            'near_duplicates': self.near_duplicates,
+            'forced_refreshes': self.forced_refreshes
+        }
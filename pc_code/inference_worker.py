@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Remote Inference Worker for the AI WiFi CAM Server
+
+Runs the AI model for a stream_receiver.py started with --worker-port, on
+another machine or as extra processes on the same one. The worker connects
+to the receiver, gets the model settings from it, and then answers each
+JPEG frame it is sent with the detections (see worker_pool.py for the
+protocol). Frames of cameras with regions of interest come with the
+regions, and the model runs on the crop as it would on the receiver. The
+model files must be available on the worker.
+
+If the connection drops, the worker reconnects; meanwhile the receiver runs
+inference locally.
+
+Several worker processes on one machine can share a single copy of the
+model: with --processes N and --model, the model is loaded and warmed up
+once, and the worker processes are then forked from that process (Linux
+and macOS). They share the network weights and buffers copy-on-write, since
+inference doesn't write to them, so each extra process only adds a few MB
+and starts without reading or parsing the model files. (Building each
+network from one memory-mapped copy of the weights file doesn't save
+memory: OpenCV copies the weights into each network's own buffers.) The
+parent keeps OpenCV's thread pool unused while it loads, so the forked
+processes start their own.
+
+With --cpu-budget auto, the worker processes divide the machine's physical
+cores between them: each is pinned to its own cores and runs one OpenCV
+thread per core, instead of every process starting a thread per logical
+CPU (see thread_budget.py).
+
+Each worker reports its memory use (RSS, PSS and private) and how long it
+took to start to the receiver, which shows them in the stats.
+
+Example:
+    python inference_worker.py --server 192.168.1.10:8890 --name gpu-box
+    python inference_worker.py --server 127.0.0.1:8890 --processes 4 --model yolov4 --cpu-budget auto
+"""
+
+import argparse
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+import cv2
+import numpy as np
+
+from ai_processor import create_processor, parse_model_spec
+from model_backends import MODEL_REGISTRY, DNN_BACKENDS, DNN_TARGETS, DarknetYoloBackend
+from roi import RegionOfInterest
+from thread_budget import ThreadBudget, pin_current_thread, format_cpu_list
+from worker_pool import (MESSAGE, JOB, RESULT, HELLO, CONFIG, STATUS, JOB_KIND, RESULT_KIND,
+                         pack_message, encode_detections)
+
+
+def process_memory(pid='self'):
+    """
+    Return the memory use of a process in MB (Linux only).
+
+    Returns:
+        dict: rss_mb, pss_mb (RSS with shared pages divided among the processes
+        sharing them) and private_mb (pages used by this process alone), or
+        None if /proc is not available
+    """
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if line.count(':') == 1)
+    except OSError:
+        return None
+    size = lambda key: int(fields.get(key, '0').split()[0]) / 1024
+    return {
+        'rss_mb': round(size('Rss'), 1),
+        'pss_mb': round(size('Pss'), 1),
+        'private_mb': round(size('Private_Clean') + size('Private_Dirty'), 1)
+    }
+
+
+@functools.lru_cache(maxsize=32)
+def region_of_interest(regions):
+    """Return the RegionOfInterest for a job's JSON regions, kept so its geometry is reused across frames."""
+    return RegionOfInterest(json.loads(regions))
+
+
+def can_share(spec):
+    """Whether every model in a spec runs on OpenCV DNN, so its process can be forked after loading."""
+    names = []
+    for name, _ in parse_model_spec(spec):
+        detector, _, stages = name.partition('>')
+        names += [detector] + (stages.split('+') if stages else [])
+    return all(issubclass(MODEL_REGISTRY[name]['backend'], DarknetYoloBackend) for name in names)
+
+
+class ModelHost:
+    """Class holding the processor for the model settings sent by the receiver."""
+
+    def __init__(self, **model_options):
+        """
+        Initialize without a model.
+
+        Args:
+            **model_options: Options passed to create_processor (model_dir, dnn_backend, ...)
+        """
+        self.model_options = model_options
+        self.processor = None
+        self.model = None
+        self.error = None
+        self.load_time = None
+        self.shared = False
+
+    def preload(self, model, confidence, input_sizes=()):
+        """
+        Load and warm up a model before worker processes are forked from this one.
+
+        OpenCV threading stays off so no thread pool exists at the fork; the
+        warm-up allocates the network buffers that the workers then share.
+
+        Args:
+            model (str): Model spec
+            confidence (float): Confidence threshold
+            input_sizes (iterable): Network input sizes to prepare (default: the model's)
+        """
+        cv2.setNumThreads(0)
+        self.configure({'model': model, 'confidence': confidence}, threads=0)
+        if self.processor is not None:
+            self.processor.warmup(list(input_sizes) or [self.processor.input_size])
+            self.shared = True
+
+    def configure(self, config, **overrides):
+        """Load the model named in a config message and apply its confidence threshold."""
+        model = config.get('model')
+        confidence = config.get('confidence', 0.5)
+        if model and model != self.model:
+            previous = self.processor
+            self.model = model
+            self.shared = False
+            try:
+                start = time.perf_counter()
+                self.processor = create_processor(model, confidence_threshold=confidence,
+                                                  **dict(self.model_options, **overrides))
+                self.load_time = time.perf_counter() - start
+                self.error = None
+                logging.info(f"Loaded model {model} in {self.load_time:.2f} s")
+            except (ValueError, ImportError, FileNotFoundError, cv2.error) as e:
+                self.processor = None
+                self.error = f"cannot load model {model}: {e}"
+                logging.error(self.error)
+            if previous is not None and hasattr(previous, 'close'):
+                previous.close()
+        if self.processor is not None:
+            self.processor.confidence_threshold = confidence
+
+    def process(self, body):
+        """
+        Run the model on a job message body.
+
+        Returns:
+            bytes: Result message body
+        """
+        job_id, input_size, regions_length = JOB.unpack_from(body)
+        regions = bytes(body[JOB.size:JOB.size + regions_length])
+        result = self.detect(memoryview(body)[JOB.size + regions_length:], input_size, regions)
+        return RESULT.pack(job_id) + json.dumps(result).encode('utf-8')
+
+    def detect(self, jpeg, input_size, regions=b''):
+        """Decode a JPEG and return the result dictionary sent back to the receiver."""
+        if self.processor is None:
+            return {'error': self.error or 'no model configured'}
+        try:
+            roi = region_of_interest(regions) if regions else None
+        except ValueError as e:
+            return {'error': f"invalid regions: {e}"}
+        frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return {'error': 'failed to decode image'}
+
+        if input_size and self.processor.resizable_input:
+            self.processor.input_size = input_size
+        start = time.perf_counter()
+        detections = roi.detect(self.processor, frame) if roi is not None else self.processor.detect(frame)
+        return {'detections': encode_detections(detections), 'shape': list(frame.shape[:2]),
+                'ms': round(1000 * (time.perf_counter() - start), 2)}
+
+    def status(self, spawn_time):
+        """Return the status message reported to the receiver."""
+        return dict(process_memory() or {}, pid=os.getpid(), model=self.model, shared=self.shared,
+                    load_s=round(self.load_time, 3) if self.load_time is not None else None,
+                    spawn_s=round(spawn_time, 3) if spawn_time is not None else None)
+
+
+def serve(sock, host, name, spawned=None):
+    """
+    Answer the receiver's jobs on a connected socket until it closes.
+
+    Args:
+        sock (socket.socket): Connection to the receiver
+        host (ModelHost): Model to run
+        name (str): Worker name sent in the hello message
+        spawned (float): time.monotonic() when the worker process was started; the time until
+            its model is ready is reported as its spawn time
+    """
+    stream = sock.makefile('rb')
+    sock.sendall(pack_message(HELLO, json.dumps({'name': name}).encode('utf-8')))
+    spawn_time = None
+    while True:
+        header = stream.read(MESSAGE.size)
+        if len(header) < MESSAGE.size:
+            return
+        length, kind = MESSAGE.unpack(header)
+        body = stream.read(length)
+        if len(body) < length:
+            return
+
+        kind = bytes([kind])
+        if kind == CONFIG:
+            host.configure(json.loads(body))
+            if spawn_time is None and spawned is not None and host.processor is not None:
+                spawn_time = time.monotonic() - spawned
+            sock.sendall(pack_message(STATUS, json.dumps(host.status(spawn_time)).encode('utf-8')))
+        elif kind == JOB_KIND:
+            sock.sendall(pack_message(RESULT_KIND, host.process(body)))
+
+
+def run_worker(address, host, name, retry, spawned=None, threads=None, cpus=None):
+    """
+    Serve the receiver, reconnecting when the connection drops.
+
+    Args:
+        address (str): Receiver worker address as host:port
+        host (ModelHost): Model to run
+        name (str): Worker name
+        retry (float): Seconds between connection attempts
+        spawned (float): time.monotonic() when the worker process was started
+        threads (int): OpenCV threads for a forked worker (None keeps the current setting)
+        cpus (list): CPUs to pin a forked worker to (None for no pinning)
+    """
+    if cpus is not None:
+        pin_current_thread(cpus)
+    if threads is not None:
+        # Forked from a process that kept threading off; a negative value restores OpenCV's default
+        cv2.setNumThreads(threads or -1)
+
+    server_host, _, server_port = address.rpartition(':')
+    while True:
+        try:
+            with socket.create_connection((server_host, int(server_port))) as sock:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                logging.info(f"Connected to {address} as {name}")
+                serve(sock, host, name, spawned)
+                logging.info("Receiver closed the connection")
+        except OSError as e:
+            logging.info(f"Cannot reach {address}: {e}")
+        time.sleep(retry)
+
+
+def run_processes(args, host, shares=None):
+    """
+    Fork the worker processes from this one and restart any that exit.
+
+    Args:
+        args (argparse.Namespace): Command-line arguments
+        host (ModelHost): Model host, possibly with a preloaded model
+        shares (list): StageBudget (CPUs and OpenCV threads) per process, or None
+    """
+    context = multiprocessing.get_context('fork')
+    processes = {}
+
+    def start(index):
+        name = f"{args.name}-{index}"
+        threads, cpus = args.dnn_threads or 0, None
+        if shares is not None:
+            cpus = shares[index].cpus
+            threads = args.dnn_threads or shares[index].threads
+            logging.info(f"{name}: CPUs {format_cpu_list(cpus)}, {threads} thread(s)")
+        process = context.Process(target=run_worker, name=name, daemon=True,
+                                  args=(args.server, host, name, args.retry, time.monotonic(),
+                                        threads, cpus))
+        process.start()
+        processes[index] = process
+
+    # Stop the workers along with this process
+    signal.signal(signal.SIGTERM, lambda signum, frame: exit(0))
+    try:
+        for index in range(args.processes):
+            start(index)
+        logging.info(f"Started {args.processes} worker processes" +
+                     (f" sharing {host.model}" if host.shared else ""))
+        while True:
+            time.sleep(1.0)
+            for index, process in list(processes.items()):
+                if not process.is_alive():
+                    logging.warning(f"Worker process {process.name} exited with {process.exitcode}; restarting")
+                    start(index)
+    finally:
+        for process in processes.values():
+            process.terminate()
+
+
+def main():
+    """Parse arguments and serve the receiver from one or several processes."""
+    started = time.monotonic()
+    parser = argparse.ArgumentParser(description='AI WiFi CAM remote inference worker')
+    parser.add_argument('--server', type=str, required=True, help='Receiver worker address as host:port')
+    parser.add_argument('--name', type=str, default=socket.gethostname(), help='Worker name shown in the stats')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='Number of worker processes to run (forked after loading --model)')
+    parser.add_argument('--model', type=str, default=None,
+                        help='Model to load before the receiver asks for one, shared by all worker processes')
+    parser.add_argument('--confidence', type=float, default=0.5, help='Confidence threshold for --model')
+    parser.add_argument('--input-size', type=int, default=None,
+                        help='Network input size when the receiver does not choose one per frame (default: per model)')
+    parser.add_argument('--input-sizes', type=str, default=None,
+                        help='Comma-separated input sizes to prepare for --model (default: --input-size)')
+    parser.add_argument('--model-dir', type=str, default=None, help='Directory containing the model files')
+    parser.add_argument('--dnn-backend', type=str, default=None, choices=list(DNN_BACKENDS),
+                        help='OpenCV DNN backend (default: per model)')
+    parser.add_argument('--dnn-target', type=str, default=None, choices=list(DNN_TARGETS),
+                        help='OpenCV DNN target device (default: per model)')
+    parser.add_argument('--dnn-threads', type=int, default=None,
+                        help='Number of OpenCV threads for inference (default: per model)')
+    parser.add_argument('--cpu-budget', type=str, default='off', choices=['off', 'auto'],
+                        help='Divide the CPU cores between the worker processes and pin each to its cores')
+    parser.add_argument('--inference-cpus', type=str, default=None,
+                        help='CPUs the worker processes may use, e.g. 2-7 (divided between them)')
+    parser.add_argument('--retry', type=float, default=2.0, help='Seconds between connection attempts')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    forking = args.processes > 1 and 'fork' in multiprocessing.get_all_start_methods()
+    if args.processes > 1 and not forking:
+        parser.error("--processes needs a platform that can fork; start several workers instead")
+
+    try:
+        budget = ThreadBudget.from_args(args.cpu_budget, inference_cpus=args.inference_cpus,
+                                        inference_threads=args.dnn_threads, ingest=False)
+    except ValueError as e:
+        parser.error(str(e))
+    shares = None
+    if budget is not None and forking:
+        shares = budget.split('inference', args.processes)
+    elif budget is not None:
+        budget.log()
+        budget.enter('inference')
+
+    threads = budget.threads('inference') if budget is not None and not forking else args.dnn_threads
+    host = ModelHost(model_dir=args.model_dir, input_size=args.input_size, dnn_backend=args.dnn_backend,
+                     dnn_target=args.dnn_target, threads=threads)
+
+    if args.model:
+        try:
+            parse_model_spec(args.model)
+        except ValueError as e:
+            parser.error(str(e))
+        if forking and can_share(args.model):
+            sizes = [int(size) for size in args.input_sizes.split(',')] if args.input_sizes else []
+            host.preload(args.model, args.confidence, sizes)
+        elif forking:
+            # Other frameworks (e.g. MediaPipe) run threads that don't survive a fork; load per process
+            logging.warning(f"{args.model} can't be shared between processes; each loads its own copy")
+        else:
+            host.configure({'model': args.model, 'confidence': args.confidence})
+            started = None if host.processor is None else started
+
+    if forking:
+        run_processes(args, host, shares)
+    else:
+        run_worker(args.server, host, args.name, args.retry, started)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        logging.info("Worker stopped by user")
@@ -0,0 +1,611 @@
+#!/usr/bin/env python3
+"""
+Model Backends for the AI Processor
+
+This module contains a registry of the AI models the AI Processor can run.
+Each model is implemented by a backend class with a common interface:
+- detect(frame, confidence_threshold) returns a list of Detection tuples
+- annotate(frame, detections) draws those detections onto a frame
+
+Backends:
+- DarknetYoloBackend: YOLOv4 and YOLOv4-tiny Darknet weights via OpenCV DNN
+- OnnxYoloBackend: YOLOv5/YOLOv8 ONNX exports via cv2.dnn.readNetFromONNX
+- MediaPipePoseBackend: MediaPipe pose estimation
+- MediaPipeFaceBackend: MediaPipe face detection
+
+Every registered model carries its own default configuration (input size,
+DNN backend/target and thread count), which can be overridden when the
+AI Processor is created. The model downloader, the system check and the
+--model choices of the receiver are all driven by MODEL_REGISTRY.
+"""
+
+import logging
+from collections import namedtuple
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Default directory for model files
+MODELS_DIR = Path(__file__).parent.parent / "models"
+
+# A single detection. box is (x, y, w, h) in frame pixels; landmarks is an
+# optional (N, 3) array of (x, y, visibility) in frame pixels.
+Detection = namedtuple('Detection', ['label', 'confidence', 'box', 'class_id', 'source', 'landmarks'],
+                       defaults=(-1, None, None))
+
+# OpenCV DNN backends and targets by name
+DNN_BACKENDS = {
+    'default': cv2.dnn.DNN_BACKEND_DEFAULT,
+    'opencv': cv2.dnn.DNN_BACKEND_OPENCV,
+    'openvino': cv2.dnn.DNN_BACKEND_INFERENCE_ENGINE,
+    'cuda': cv2.dnn.DNN_BACKEND_CUDA,
+}
+DNN_TARGETS = {
+    'cpu': cv2.dnn.DNN_TARGET_CPU,
+    'opencl': cv2.dnn.DNN_TARGET_OPENCL,
+    'opencl_fp16': cv2.dnn.DNN_TARGET_OPENCL_FP16,
+    'cuda': cv2.dnn.DNN_TARGET_CUDA,
+    'cuda_fp16': cv2.dnn.DNN_TARGET_CUDA_FP16,
+}
+
+COCO_NAMES_URL = "https://raw.githubusercontent.com/AlexeyAB/darknet/master/data/coco.names"
+
+# Registered models by name
+MODEL_REGISTRY = {}
+
+
+def register_model(name, backend_class, description, files=None, **config):
+    """
+    Register a model so it can be selected by name.
+
+    Args:
+        name (str): Model name used on the command line and in the web interface
+        backend_class (type): ModelBackend subclass that runs the model
+        description (str): Human readable description
+        files (dict): Model files as {filename: download URL or None}
+        **config: Default backend configuration (input_size, dnn_backend, dnn_target, threads, ...)
+    """
+    MODEL_REGISTRY[name] = {
+        'backend': backend_class,
+        'description': description,
+        'files': files or {},
+        'config': config
+    }
+
+
+def get_model_spec(name):
+    """Look up a registered model, raising ValueError for unknown names."""
+    if name not in MODEL_REGISTRY:
+        raise ValueError(f"Unsupported model: {name}")
+    return MODEL_REGISTRY[name]
+
+
+def missing_model_files(name, model_dir=None):
+    """Return the files of a registered model that are not present in model_dir."""
+    model_dir = Path(model_dir or MODELS_DIR)
+    return [filename for filename in get_model_spec(name)['files']
+            if not (model_dir / filename).exists()]
+
+
+def create_backend(name, confidence_threshold=0.5, model_dir=None, **overrides):
+    """
+    Create the backend for a registered model.
+
+    Args:
+        name (str): Registered model name
+        confidence_threshold (float): Confidence threshold used when building the model
+        model_dir (str): Directory containing the model files (defaults to MODELS_DIR)
+        **overrides: Configuration values replacing the registered defaults (None is ignored)
+
+    Returns:
+        ModelBackend: Initialized backend
+    """
+    spec = get_model_spec(name)
+    config = dict(spec['config'])
+    config.update({key: value for key, value in overrides.items() if value is not None})
+    return spec['backend'](name, Path(model_dir or MODELS_DIR), confidence_threshold, config)
+
+
+def reuse_buffer(buffers, key, shape, dtype):
+    """
+    Return buffers[key] if it already has the given shape and dtype, otherwise allocate it.
+
+    Args:
+        buffers (dict): Buffer cache to look in and update
+        key: Cache key
+        shape (tuple): Required array shape
+        dtype: Required array dtype
+
+    Returns:
+        numpy.ndarray: Uninitialized array to write into
+    """
+    buffer = buffers.get(key)
+    if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+        buffer = np.empty(shape, dtype=dtype)
+        buffers[key] = buffer
+    return buffer
+
+
+def _read_varint(data, position):
+    """Read a protobuf varint, returning (value, position after it)."""
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _protobuf_fields(data):
+    """Yield (field number, value) for each field of a protobuf message; messages and strings as memoryviews."""
+    position = 0
+    while position < len(data):
+        key, position = _read_varint(data, position)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, position = _read_varint(data, position)
+        elif wire_type == 2:
+            length, position = _read_varint(data, position)
+            value = data[position:position + length]
+            position += length
+        elif wire_type in (1, 5):
+            length = 8 if wire_type == 1 else 4
+            value = data[position:position + length]
+            position += length
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+        yield field, value
+
+
+def onnx_input_size(path):
+    """
+    Read the input size of an ONNX network from its file, without the onnx package.
+
+    The input shape is at ModelProto.graph (field 7) > GraphProto.input (11) >
+    ValueInfoProto.type (2) > TypeProto.tensor_type (1) > shape (2) > dim (1) >
+    dim_value (1). Inputs that are also initializers (weights) are skipped.
+
+    Args:
+        path (str): ONNX file
+
+    Returns:
+        int: Side of the fixed square (1, 3, N, N) input, or None if it is dynamic or unreadable
+    """
+    def field(message, number):
+        return [value for key, value in _protobuf_fields(message) if key == number]
+
+    try:
+        graph = field(memoryview(Path(path).read_bytes()), 7)[0]
+        weights = {bytes(name) for initializer in field(graph, 5) for name in field(initializer, 8)}
+        for value_info in field(graph, 11):
+            if bytes(field(value_info, 1)[0]) in weights:
+                continue
+            shape = field(field(field(value_info, 2)[0], 1)[0], 2)[0]
+            dims = [(field(dim, 1) or [None])[0] for dim in field(shape, 1)]
+            if len(dims) == 4 and dims[2] and dims[2] == dims[3]:
+                return dims[2]
+            return None
+    except (OSError, IndexError, ValueError):
+        return None
+    return None
+
+
+class ModelBackend:
+    """Base class for model backends."""
+
+    # Whether the network input size can change at runtime
+    resizable_input = False
+
+    def __init__(self, name, model_dir, confidence_threshold, config):
+        """
+        Initialize the backend.
+
+        Args:
+            name (str): Registered model name
+            model_dir (Path): Directory containing the model files
+            confidence_threshold (float): Confidence threshold used when building the model
+            config (dict): Backend configuration
+        """
+        self.name = name
+        self.model_dir = model_dir
+        self.config = config
+        self.input_size = config.get('input_size')
+
+        # Preprocessing buffers reused across frames
+        self._buffers = {}
+
+    def model_path(self, filename):
+        """Return the full path of a model file, raising FileNotFoundError if it is missing."""
+        path = self.model_dir / filename
+        if not path.exists():
+            raise FileNotFoundError(
+                f"Model file {filename} for {self.name} not found. Please download it to {self.model_dir}. "
+                "Run download_models.py or see INSTALL.md for instructions."
+            )
+        return str(path)
+
+    def warmup(self, input_sizes):
+        """Prepare the model for each input size (only meaningful for resizable inputs)."""
+
+    def _to_rgb(self, frame):
+        """Convert a BGR frame to RGB in a buffer reused across frames of the same size."""
+        rgb_frame = reuse_buffer(self._buffers, 'rgb', frame.shape, frame.dtype)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb_frame)
+        return rgb_frame
+
+    def detect(self, frame, confidence_threshold):
+        """
+        Run the model on a frame.
+
+        Args:
+            frame (numpy.ndarray): BGR input frame
+            confidence_threshold (float): Minimum confidence for a detection
+
+        Returns:
+            list: Detection tuples in frame coordinates
+        """
+        raise NotImplementedError
+
+    def annotate(self, frame, detections):
+        """Draw detections onto frame in place."""
+        raise NotImplementedError
+
+
+class DarknetYoloBackend(ModelBackend):
+    """YOLO object detector loaded from Darknet cfg/weights with OpenCV DNN."""
+
+    resizable_input = True
+
+    def __init__(self, name, model_dir, confidence_threshold, config):
+        super().__init__(name, model_dir, confidence_threshold, config)
+        print(f"Initializing {name} model...")
+
+        # Load class names
+        with open(self.model_path(config['classes']), 'r') as f:
+            self.classes = [line.strip() for line in f.readlines()]
+
+        self.model = self._load_network()
+
+        # Set preferred backend and target
+        self.model.setPreferableBackend(DNN_BACKENDS[config.get('dnn_backend', 'opencv')])
+        self.model.setPreferableTarget(DNN_TARGETS[config.get('dnn_target', 'cpu')])
+
+        # OpenCV's thread pool is process-wide; 0 keeps OpenCV's default
+        if config.get('threads'):
+            cv2.setNumThreads(int(config['threads']))
+
+        # Get output layer names
+        self.output_layers = list(self.model.getUnconnectedOutLayersNames())
+
+        # Generate random colors for class visualization
+        np.random.seed(42)
+        self.colors = np.random.randint(0, 255, size=(len(self.classes), 3), dtype=np.uint8)
+
+    def _load_network(self):
+        """Load the network from the configured files."""
+        return cv2.dnn.readNetFromDarknet(self.model_path(self.config['cfg']),
+                                          self.model_path(self.config['weights']))
+
+    def warmup(self, input_sizes):
+        """
+        Run one forward pass at each input size so later size switches don't stall.
+
+        OpenCV allocates layer buffers and picks kernels on the first forward pass
+        for a new input shape. Doing this up front, largest size first so the
+        memory pool only grows once, keeps runtime switches cheap. It also
+        allocates the preprocessing and output buffers for each size.
+        """
+        for size in sorted(input_sizes, reverse=True):
+            self._size_buffers(size)
+
+    def _size_buffers(self, size):
+        """
+        Return the reusable buffers for an input size, creating them on first use.
+
+        The buffers hold the resized frame, the network input blob and the
+        network outputs. Creating them runs one forward pass so OpenCV can
+        report the output shapes.
+        """
+        buffers = self._buffers.get(size)
+        if buffers is None:
+            blob = np.zeros((1, 3, size, size), dtype=np.float32)
+            self.model.setInput(blob)
+            buffers = {
+                'resized': np.empty((size, size, 3), dtype=np.uint8),
+                'blob': blob,
+                'outputs': list(self.model.forward(self.output_layers))
+            }
+            self._buffers[size] = buffers
+        return buffers
+
+    def _forward(self, frame):
+        """
+        Run the network on a frame and return its raw outputs.
+
+        This is equivalent to cv2.dnn.blobFromImage(frame, 1/255, (size, size),
+        swapRB=True) followed by forward(), but every intermediate array is
+        written into buffers reused across frames.
+        """
+        buffers = self._size_buffers(self.input_size)
+        resized = buffers['resized']
+        blob = buffers['blob']
+
+        cv2.resize(frame, (self.input_size, self.input_size), dst=resized, interpolation=cv2.INTER_LINEAR)
+
+        # BGR HWC uint8 -> RGB CHW float32 scaled to 0..1
+        for channel in range(3):
+            np.multiply(resized[:, :, 2 - channel], 1 / 255.0, out=blob[0, channel],
+                        dtype=np.float32, casting='unsafe')
+
+        self.model.setInput(blob)
+        return self.model.forward(self.output_layers, buffers['outputs'])
+
+    def _decode(self, outputs, buffers):
+        """
+        Split raw outputs into box coordinates and class scores without copying.
+
+        Darknet rows are (cx, cy, w, h, objectness, class scores...) relative to the frame.
+
+        Returns:
+            tuple: ((N, 4) centers, (N, classes) scores, size the centers are relative to)
+        """
+        if len(outputs) == 1:
+            rows = outputs[0]
+        else:
+            rows = reuse_buffer(buffers, 'rows', (sum(len(output) for output in outputs),
+                                                  outputs[0].shape[1]), np.float32)
+            np.concatenate(outputs, out=rows)
+        return rows[:, :4], rows[:, 5:], 1.0
+
+    def detect(self, frame, confidence_threshold):
+        """Detect objects in a frame."""
+        height, width = frame.shape[:2]
+        buffers = self._size_buffers(self.input_size)
+        centers, scores, unit = self._decode(self._forward(frame), buffers)
+
+        # Keep rows whose best class score is above the threshold
+        confidences = reuse_buffer(buffers, 'confidences', (len(scores),), np.float32)
+        keep = reuse_buffer(buffers, 'keep', (len(scores),), np.bool_)
+        np.max(scores, axis=1, out=confidences)
+        np.greater(confidences, confidence_threshold, out=keep)
+        candidates = np.flatnonzero(keep)
+        if not len(candidates):
+            return []
+
+        # Only the few candidate rows are scaled and copied
+        class_ids = np.argmax(scores[candidates], axis=1)
+        centers = centers[candidates] * (np.array([width, height, width, height], dtype=np.float32) / unit)
+
+        # YOLO returns coordinates relative to the center of the object
+        centers[:, :2] -= centers[:, 2:] / 2
+        boxes = centers.astype(np.int32).tolist()
+        confidences = confidences[candidates].astype(float).tolist()
+
+        # Apply non-maximum suppression to remove redundant overlapping boxes
+        indices = cv2.dnn.NMSBoxes(boxes, confidences, confidence_threshold, 0.4)
+
+        return [Detection(self.classes[class_ids[i]], confidences[i], tuple(boxes[i]),
+                          int(class_ids[i]), self.name)
+                for i in np.array(indices, dtype=np.int32).flatten()]
+
+    def annotate(self, frame, detections):
+        """Draw bounding boxes and labels."""
+        for detection in detections:
+            x, y, w, h = detection.box
+            color = tuple(int(c) for c in self.colors[detection.class_id % len(self.colors)])
+
+            # Draw bounding box
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+
+            # Draw label background
+            text = f"{detection.label}: {detection.confidence:.2f}"
+            text_size, _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
+            cv2.rectangle(frame, (x, y - text_size[1] - 10), (x + text_size[0], y), color, -1)
+
+            # Draw label text
+            cv2.putText(frame, text, (x, y - 5),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+
+
+class OnnxYoloBackend(DarknetYoloBackend):
+    """YOLO object detector exported to ONNX (YOLOv5 or YOLOv8 output layout)."""
+
+    # ONNX exports usually have a fixed input shape
+    resizable_input = False
+
+    def __init__(self, name, model_dir, confidence_threshold, config):
+        super().__init__(name, model_dir, confidence_threshold, config)
+        # The network only runs at the input size it was exported with
+        size = onnx_input_size(self.model_path(config['onnx']))
+        if size is not None and size != self.input_size:
+            logging.warning(f"{name} has a fixed input size of {size}; ignoring input size {self.input_size}")
+            self.input_size = size
+
+    def _load_network(self):
+        """Load the network from the ONNX file."""
+        return cv2.dnn.readNetFromONNX(self.model_path(self.config['onnx']))
+
+    def warmup(self, input_sizes):
+        """Run a single forward pass at the fixed input size."""
+        super().warmup([self.input_size])
+
+    def _decode(self, outputs, buffers):
+        """
+        Split raw outputs into box coordinates and class scores.
+
+        YOLOv5 rows are (cx, cy, w, h, objectness, class scores...) and YOLOv8
+        outputs are transposed (cx, cy, w, h, class scores...) without
+        objectness. Both are in network input pixels.
+        """
+        output = outputs[0].reshape(outputs[0].shape[-2:])
+        if self.config.get('output_format') == 'yolov8':
+            rows = output.T
+            scores = rows[:, 4:]
+        else:
+            rows = output
+            scores = reuse_buffer(buffers, 'scores', (len(rows), rows.shape[1] - 5), np.float32)
+            np.multiply(rows[:, 5:], rows[:, 4:5], out=scores)
+
+        return rows[:, :4], scores, float(self.input_size)
+
+
+class MediaPipePoseBackend(ModelBackend):
+    """MediaPipe pose estimation."""
+
+    def __init__(self, name, model_dir, confidence_threshold, config):
+        super().__init__(name, model_dir, confidence_threshold, config)
+        try:
+            import mediapipe as mp
+        except ImportError:
+            raise ImportError(
+                "MediaPipe not installed. Please install it with: pip install mediapipe"
+            )
+
+        self.mp_pose = mp.solutions.pose
+        self.connections = list(self.mp_pose.POSE_CONNECTIONS)
+        self.model = self.mp_pose.Pose(
+            static_image_mode=config.get('static_image_mode', False),
+            model_complexity=config.get('model_complexity', 1),
+            smooth_landmarks=True,
+            min_detection_confidence=confidence_threshold,
+            min_tracking_confidence=confidence_threshold
+        )
+        print("MediaPipe Pose model initialized")
+
+    def detect(self, frame, confidence_threshold):
+        """Detect a pose in a frame."""
+        # Convert BGR to RGB
+        rgb_frame = self._to_rgb(frame)
+
+        # Process the frame
+        results = self.model.process(rgb_frame)
+        if not results.pose_landmarks:
+            return []
+
+        # Landmarks in frame pixels
+        height, width = frame.shape[:2]
+        landmarks = np.array([(lm.x * width, lm.y * height, lm.visibility)
+                              for lm in results.pose_landmarks.landmark], dtype=np.float32)
+
+        # Bounding box of the visible landmarks
+        visible = landmarks[landmarks[:, 2] > 0.5]
+        points = visible if len(visible) else landmarks
+        x0, y0 = points[:, :2].min(axis=0)
+        x1, y1 = points[:, :2].max(axis=0)
+        confidence = float(landmarks[:, 2].mean())
+
+        return [Detection('pose', confidence, (int(x0), int(y0), int(x1 - x0), int(y1 - y0)),
+                          0, self.name, landmarks)]
+
+    def annotate(self, frame, detections):
+        """Draw pose landmarks and connections."""
+        for detection in detections:
+            points = detection.landmarks
+            for start, end in self.connections:
+                if points[start, 2] > 0.5 and points[end, 2] > 0.5:
+                    cv2.line(frame, (int(points[start, 0]), int(points[start, 1])),
+                             (int(points[end, 0]), int(points[end, 1])), (245, 66, 230), 2)
+            for x, y, visibility in points:
+                if visibility > 0.5:
+                    cv2.circle(frame, (int(x), int(y)), 2, (245, 117, 66), 2)
+
+        if detections:
+            # Add text indicating pose detected
+            cv2.putText(frame, "Pose Detected", (10, 60),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+
+class MediaPipeFaceBackend(ModelBackend):
+    """MediaPipe face detection."""
+
+    def __init__(self, name, model_dir, confidence_threshold, config):
+        super().__init__(name, model_dir, confidence_threshold, config)
+        try:
+            import mediapipe as mp
+        except ImportError:
+            raise ImportError(
+                "MediaPipe not installed. Please install it with: pip install mediapipe"
+            )
+
+        self.model = mp.solutions.face_detection.FaceDetection(
+            model_selection=config.get('model_selection', 1),  # 0 for short-range, 1 for full-range detection
+            min_detection_confidence=confidence_threshold
+        )
+        print("MediaPipe Face Detection model initialized")
+
+    def detect(self, frame, confidence_threshold):
+        """Detect faces in a frame."""
+        # Convert BGR to RGB
+        rgb_frame = self._to_rgb(frame)
+
+        # Process the frame
+        results = self.model.process(rgb_frame)
+        if not results.detections:
+            return []
+
+        ih, iw = frame.shape[:2]
+        detections = []
+        for detection in results.detections:
+            score = detection.score[0]
+            if score < confidence_threshold:
+                continue
+            bbox = detection.location_data.relative_bounding_box
+            box = (int(bbox.xmin * iw), int(bbox.ymin * ih), int(bbox.width * iw), int(bbox.height * ih))
+            detections.append(Detection('face', float(score), box, 0, self.name))
+        return detections
+
+    def annotate(self, frame, detections):
+        """Draw face boxes and scores."""
+        for detection in detections:
+            x, y, w, h = detection.box
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+
+            # Draw confidence score
+            cv2.putText(frame, f"Face: {detection.confidence:.2f}",
+                        (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+        if detections:
+            # Add text showing number of faces detected
+            cv2.putText(frame, f"Faces Detected: {len(detections)}", (10, 60),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+
+# Built-in models
+register_model(
+    'yolov4', DarknetYoloBackend, "YOLOv4 (Object Detection)",
+    files={
+        "yolov4.weights": "https://github.com/AlexeyAB/darknet/releases/download/darknet_yolo_v3_optimal/yolov4.weights",
+        "yolov4.cfg": "https://raw.githubusercontent.com/AlexeyAB/darknet/master/cfg/yolov4.cfg",
+        "coco.names": COCO_NAMES_URL
+    },
+    cfg="yolov4.cfg", weights="yolov4.weights", classes="coco.names",
+    input_size=416, dnn_backend='opencv', dnn_target='cpu', threads=0
+)
+register_model(
+    'yolov4_tiny', DarknetYoloBackend, "YOLOv4-tiny (Fast Object Detection)",
+    files={
+        "yolov4-tiny.weights": "https://github.com/AlexeyAB/darknet/releases/download/darknet_yolo_v4_pre/yolov4-tiny.weights",
+        "yolov4-tiny.cfg": "https://raw.githubusercontent.com/AlexeyAB/darknet/master/cfg/yolov4-tiny.cfg",
+        "coco.names": COCO_NAMES_URL
+    },
+    cfg="yolov4-tiny.cfg", weights="yolov4-tiny.weights", classes="coco.names",
+    input_size=416, dnn_backend='opencv', dnn_target='cpu', threads=0
+)
+# ONNX exports are not published as release assets; export them yourself (see INSTALL.md)
+register_model(
+    'yolov5n_onnx', OnnxYoloBackend, "YOLOv5n ONNX (Fast Object Detection)",
+    files={"yolov5n.onnx": None, "coco.names": COCO_NAMES_URL},
+    onnx="yolov5n.onnx", classes="coco.names", output_format='yolov5',
+    input_size=640, dnn_backend='opencv', dnn_target='cpu', threads=0
+)
+register_model(
+    'yolov8n_onnx', OnnxYoloBackend, "YOLOv8n ONNX (Fast Object Detection)",
+    files={"yolov8n.onnx": None, "coco.names": COCO_NAMES_URL},
+    onnx="yolov8n.onnx", classes="coco.names", output_format='yolov8',
+    input_size=640, dnn_backend='opencv', dnn_target='cpu', threads=0
+)
+register_model('mediapipe_pose', MediaPipePoseBackend, "MediaPipe Pose", model_complexity=1)
+register_model('mediapipe_face', MediaPipeFaceBackend, "MediaPipe Face", model_selection=1)
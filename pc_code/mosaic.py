@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Multi-Camera Mosaic for the AI WiFi CAM Server
+
+A wall display showing many cameras would otherwise need one full-size
+/video stream per camera and decode every one of them. A Mosaic instead
+composites the latest annotated frame of each selected camera into one
+grid image on the server and streams that, so the viewer's bandwidth and
+decoding work no longer depend on the number of cameras.
+
+The grid is drawn into a canvas allocated once. New frames only replace
+the camera's latest frame and mark its tile dirty; at most fps times a
+second, render() downscales the dirty tiles straight into their part of
+the canvas (cv2.resize with the canvas view as destination, no
+intermediate image) and encodes the canvas once. When no tile changed,
+nothing is encoded and the viewers keep the image they have. All viewers
+of the same camera selection share one Mosaic and its JPEG.
+"""
+
+import math
+import threading
+
+import cv2
+import numpy as np
+
+LABEL_COLOR = (255, 255, 255)
+LABEL_SHADOW = (0, 0, 0)
+
+
+def grid_layout(count, width, height):
+    """
+    Divide a canvas into a grid of tiles for count cameras.
+
+    Returns:
+        list: (x, y, width, height) per camera, row by row
+    """
+    if count == 0:
+        return []
+    columns = math.ceil(math.sqrt(count))
+    rows = math.ceil(count / columns)
+    tile_width = width // columns
+    tile_height = height // rows
+    return [((index % columns) * tile_width, (index // columns) * tile_height, tile_width, tile_height)
+            for index in range(count)]
+
+
+def parse_size(text):
+    """
+    Parse a canvas size such as '1280x720'.
+
+    Returns:
+        tuple: (width, height)
+
+    Raises:
+        ValueError: If the size is malformed or not positive
+    """
+    try:
+        width, height = (int(value) for value in text.lower().split('x'))
+    except ValueError:
+        raise ValueError(f"Invalid size {text!r}, expected WIDTHxHEIGHT")
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Invalid size {text!r}, expected WIDTHxHEIGHT")
+    return width, height
+
+
+class Mosaic:
+    """Class compositing the latest frames of several cameras into one shared JPEG stream."""
+
+    def __init__(self, camera_ids=None, width=1280, height=720, fps=5.0, quality=75):
+        """
+        Initialize the mosaic with an empty canvas.
+
+        Args:
+            camera_ids (list): Cameras to show, in grid order (None for every camera, in the
+                order their first frames arrive)
+            width (int): Canvas width in pixels
+            height (int): Canvas height in pixels
+            fps (float): Highest rate at which the mosaic is rendered
+            quality (int): JPEG quality of the mosaic
+        """
+        self.camera_ids = list(camera_ids) if camera_ids else None
+        self.width = width
+        self.height = height
+        self.interval = 1.0 / fps
+        self.quality = quality
+        self.canvas = np.zeros((height, width, 3), dtype=np.uint8)
+        self.viewers = set()
+        self.jpeg = None
+        self.task = None  # Task rendering the mosaic for its viewers, set by the server
+
+        # Latest frame per camera and the cameras whose tile must be redrawn
+        self._lock = threading.Lock()
+        self._frames = {}
+        self._dirty = set()
+
+        # Current grid: tile per camera, and where the last frame was placed in it
+        self._order = []
+        self._tiles = {}
+        self._placements = {}
+
+        self.renders = 0
+        self.encodes = 0
+        self.tiles_drawn = 0
+
+    def update(self, camera_id, frame):
+        """
+        Record a camera's latest annotated frame.
+
+        The frame is drawn at the next render, so it must not be modified afterwards.
+
+        Args:
+            camera_id (str): Camera the frame came from
+            frame (numpy.ndarray): Annotated frame
+        """
+        if self.camera_ids is not None and camera_id not in self.camera_ids:
+            return
+        with self._lock:
+            self._frames[camera_id] = frame
+            self._dirty.add(camera_id)
+
+    def render(self):
+        """
+        Draw the changed tiles and encode the canvas.
+
+        Returns:
+            bytes: The new JPEG, or None if no tile changed since the last render
+        """
+        self.renders += 1
+        with self._lock:
+            order = self.camera_ids or list(self._frames)
+            if order != self._order:
+                self._set_layout(order)
+            dirty = self._dirty
+            self._dirty = set()
+            frames = {camera_id: self._frames.get(camera_id) for camera_id in dirty}
+        if not dirty:
+            return None
+
+        for camera_id, frame in frames.items():
+            self._draw_tile(camera_id, frame)
+        _, buffer = cv2.imencode('.jpg', self.canvas, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        self.jpeg = buffer.tobytes()
+        self.encodes += 1
+        return self.jpeg
+
+    def _set_layout(self, order):
+        """Lay out the grid for the cameras in order and mark every tile dirty (holding the lock)."""
+        self._order = list(order)
+        self._tiles = dict(zip(order, grid_layout(len(order), self.width, self.height)))
+        self._placements = {}
+        self.canvas[:] = 0
+        self._dirty = set(order)
+
+    def _draw_tile(self, camera_id, frame):
+        """Downscale a frame into its tile, keeping its aspect ratio, and label the tile."""
+        x, y, width, height = self._tiles[camera_id]
+        tile = self.canvas[y:y + height, x:x + width]
+        if frame is None:
+            # Selected camera without frames yet
+            tile[:] = 0
+        else:
+            frame_height, frame_width = frame.shape[:2]
+            placement = self._placements.get(camera_id)
+            if placement is None or placement[0] != frame.shape:
+                # New camera or resolution: letterbox within the tile
+                scale = min(width / frame_width, height / frame_height)
+                size = (max(1, int(frame_width * scale)), max(1, int(frame_height * scale)))
+                offset = ((width - size[0]) // 2, (height - size[1]) // 2)
+                # Shrinking more than 2x with plain linear interpolation aliases. Area averaging
+                # doesn't, but is slow for arbitrary factors, so scale linearly to twice the size
+                # first (into a buffer kept for the tile) and then average exactly 2x2 pixels.
+                scratch = np.empty((size[1] * 2, size[0] * 2, 3), dtype=np.uint8) if scale < 0.5 else None
+                placement = self._placements[camera_id] = (frame.shape, size, offset, scratch)
+                tile[:] = 0
+            _, size, offset, scratch = placement
+            target = tile[offset[1]:offset[1] + size[1], offset[0]:offset[0] + size[0]]
+            if scratch is None:
+                cv2.resize(frame, size, dst=target, interpolation=cv2.INTER_LINEAR)
+            else:
+                cv2.resize(frame, (size[0] * 2, size[1] * 2), dst=scratch, interpolation=cv2.INTER_LINEAR)
+                cv2.resize(scratch, size, dst=target, interpolation=cv2.INTER_AREA)
+        cv2.putText(tile, camera_id, (8, 22), cv2.FONT_HERSHEY_SIMPLEX, 0.6, LABEL_SHADOW, 3)
+        cv2.putText(tile, camera_id, (8, 22), cv2.FONT_HERSHEY_SIMPLEX, 0.6, LABEL_COLOR, 1)
+        self.tiles_drawn += 1
+
+    def stats(self):
+        """Return the viewer count and render counters."""
+        return {'cameras': len(self._order), 'viewers': len(self.viewers), 'renders': self.renders,
+                'encodes': self.encodes, 'tiles_drawn': self.tiles_drawn}
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Closed-loop Rate Control for the ESP32-CAM Stream
+
+This module measures how busy the receiver is and decides which frame rate,
+resolution and JPEG quality the camera should send at. The decisions are
+returned as small JSON-serializable commands that the receiver sends back
+over the camera's WebSocket connection.
+
+The controller converges on the highest frame rate the pipeline can process:
+- It tracks the time spent processing each frame (busy) and the time spent
+  waiting for the next one (idle) over a short window.
+- When the pipeline is saturated it lowers the camera frame rate to what the
+  measured service time allows, and drops the resolution when even the
+  minimum frame rate cannot be sustained.
+- When there is headroom it raises the frame rate again, then the resolution.
+
+Commands are rate-limited and use separate high/low utilization watermarks
+so that the camera settings do not oscillate.
+"""
+
+import time
+
+# Camera resolutions, smallest first. Names match the esp32-camera framesize_t enum.
+FRAME_SIZES = ['QQVGA', 'QVGA', 'CIF', 'VGA', 'SVGA']
+
+# Pixel dimensions for each frame size (used by the simulator and for cost estimates)
+FRAME_SIZE_DIMENSIONS = {
+    'QQVGA': (160, 120),
+    'QVGA': (320, 240),
+    'CIF': (400, 296),
+    'VGA': (640, 480),
+    'SVGA': (800, 600),
+}
+
+# JPEG quality for each frame size (0-63, lower is higher quality)
+FRAME_SIZE_QUALITY = {
+    'QQVGA': 10,
+    'QVGA': 10,
+    'CIF': 12,
+    'VGA': 12,
+    'SVGA': 14,
+}
+
+
+class RateController:
+    """Class to derive camera rate commands from the receiver's backlog."""
+
+    def __init__(self, max_fps=20.0, min_fps=5.0, framesize='VGA',
+                 target_utilization=0.85, high_water=0.95, low_water=0.7,
+                 window=1.0, hold_windows=2, min_command_interval=2.0,
+                 min_change=0.15, clock=time.monotonic):
+        """
+        Initialize the rate controller.
+
+        Args:
+            max_fps (float): Highest frame rate the camera may be asked for
+            min_fps (float): Lowest frame rate before the resolution is reduced instead
+            framesize (str): Frame size the camera starts with (see FRAME_SIZES)
+            target_utilization (float): Fraction of the pipeline capacity to aim for
+            high_water (float): Utilization above which the pipeline is saturated
+            low_water (float): Utilization below which the pipeline has headroom
+            window (float): Length of a measurement window in seconds
+            hold_windows (int): Consecutive windows a condition must hold before acting
+            min_command_interval (float): Minimum number of seconds between commands
+            min_change (float): Minimum relative frame rate change worth sending
+            clock (callable): Monotonic clock returning seconds
+        """
+        if framesize not in FRAME_SIZES:
+            raise ValueError(f"Unsupported frame size: {framesize}")
+
+        self.max_fps = max_fps
+        self.min_fps = min_fps
+        self.target_utilization = target_utilization
+        self.high_water = high_water
+        self.low_water = low_water
+        self.window = window
+        self.hold_windows = hold_windows
+        self.min_command_interval = min_command_interval
+        self.min_change = min_change
+        self.clock = clock
+
+        # Settings the camera is currently using
+        self.fps_limit = max_fps
+        self.framesize = framesize
+        self.quality = FRAME_SIZE_QUALITY[framesize]
+
+        # Measurements for the current window
+        self._window_start = clock()
+        self._busy = 0.0
+        self._idle = 0.0
+        self._frames = 0
+
+        # Hysteresis state
+        self._saturated_windows = 0
+        self._headroom_windows = 0
+        self._last_command_time = None
+
+        # Latest window results, exposed for stats
+        self.utilization = 0.0
+        self.capacity_fps = 0.0
+
+    def update(self, idle_time, busy_time):
+        """
+        Record one processed frame and decide whether the camera needs new settings.
+
+        Args:
+            idle_time (float): Seconds spent waiting for this frame to arrive
+            busy_time (float): Seconds spent processing this frame
+
+        Returns:
+            dict: Command to send to the camera, or None if nothing should change
+        """
+        self._idle += max(idle_time, 0.0)
+        self._busy += max(busy_time, 0.0)
+        self._frames += 1
+
+        now = self.clock()
+        if now - self._window_start < self.window:
+            return None
+
+        self._close_window(now)
+        return self._decide(now)
+
+    def _close_window(self, now):
+        """Turn the accumulated measurements into utilization and capacity."""
+        total = self._busy + self._idle
+        self.utilization = self._busy / total if total > 0 else 0.0
+        service_time = self._busy / self._frames if self._frames else 0.0
+        self.capacity_fps = 1.0 / service_time if service_time > 0 else self.max_fps
+
+        if self.utilization >= self.high_water:
+            self._saturated_windows += 1
+            self._headroom_windows = 0
+        elif self.utilization <= self.low_water:
+            self._headroom_windows += 1
+            self._saturated_windows = 0
+        else:
+            # Inside the hysteresis band: keep the current settings
+            self._saturated_windows = 0
+            self._headroom_windows = 0
+
+        self._window_start = now
+        self._busy = 0.0
+        self._idle = 0.0
+        self._frames = 0
+
+    def _decide(self, now):
+        """Pick new camera settings once a condition has held long enough."""
+        if (self._last_command_time is not None and
+                now - self._last_command_time < self.min_command_interval):
+            return None
+
+        target_fps = self.capacity_fps * self.target_utilization
+        size_index = FRAME_SIZES.index(self.framesize)
+
+        if self._saturated_windows >= self.hold_windows:
+            if target_fps < self.min_fps and size_index > 0:
+                # Even the minimum frame rate is too much: reduce the resolution
+                # and let the next windows find the frame rate for it.
+                return self._command(now, self.min_fps, FRAME_SIZES[size_index - 1])
+            fps = max(min(target_fps, self.fps_limit), self.min_fps)
+            if self._changed_enough(fps):
+                return self._command(now, fps, self.framesize)
+
+        elif self._headroom_windows >= self.hold_windows:
+            if self.fps_limit >= self.max_fps and size_index < len(FRAME_SIZES) - 1:
+                # Already at full frame rate: try the next resolution if the
+                # capacity scaled by the pixel count still allows full rate.
+                larger = FRAME_SIZES[size_index + 1]
+                if target_fps * self._area_ratio(self.framesize, larger) >= self.max_fps:
+                    return self._command(now, self.max_fps, larger)
+                return None
+            fps = min(max(target_fps, self.fps_limit), self.max_fps)
+            if self._changed_enough(fps):
+                return self._command(now, fps, self.framesize)
+
+        return None
+
+    def _changed_enough(self, fps):
+        """Check whether a new frame rate differs enough from the current one."""
+        return abs(fps - self.fps_limit) >= self.min_change * self.fps_limit
+
+    @staticmethod
+    def _area_ratio(current, candidate):
+        """Ratio of the pixel counts of two frame sizes (current / candidate)."""
+        cw, ch = FRAME_SIZE_DIMENSIONS[current]
+        nw, nh = FRAME_SIZE_DIMENSIONS[candidate]
+        return (cw * ch) / (nw * nh)
+
+    def _command(self, now, fps, framesize):
+        """Apply new settings locally and build the command for the camera."""
+        self.fps_limit = fps
+        self.framesize = framesize
+        self.quality = FRAME_SIZE_QUALITY[framesize]
+        self._last_command_time = now
+        self._saturated_windows = 0
+        self._headroom_windows = 0
+
+        return {
+            'type': 'rate_control',
+            'interval_ms': int(round(1000.0 / fps)),
+            'framesize': framesize,
+            'quality': self.quality
+        }
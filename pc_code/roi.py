@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Regions of Interest for the AI WiFi CAM Server
+
+Many cameras only need to watch part of the image, such as a doorway or a
+driveway. A region of interest (ROI) limits inference to that part:
+
+- The frame is cropped to the bounding box of all regions before the model
+  resizes it to its input size, so small objects in the ROI keep more pixels
+  for the same amount of compute.
+- Detections whose center lies outside the regions are dropped.
+
+Regions are given in normalized coordinates (0.0 to 1.0) so they still fit
+when rate control changes the camera resolution. Each region is either a
+rectangle or a polygon:
+
+    {"rect": [x, y, width, height]}
+    {"polygon": [[x1, y1], [x2, y2], [x3, y3], ...]}
+
+The regions of every camera are persisted in a JSON file by RoiStore.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from ai_processor import offset_detection
+
+
+def region_points(region):
+    """
+    Convert a rectangle or polygon region to polygon points.
+
+    Args:
+        region (dict): {"rect": [x, y, w, h]} or {"polygon": [[x, y], ...]} in normalized coordinates
+
+    Returns:
+        numpy.ndarray: (N, 2) float array of normalized polygon points
+
+    Raises:
+        ValueError: If the region is malformed or outside the image
+    """
+    try:
+        if 'rect' in region:
+            x, y, w, h = (float(value) for value in region['rect'])
+            points = np.array([[x, y], [x + w, y], [x + w, y + h], [x, y + h]])
+        else:
+            points = np.array(region['polygon'], dtype=float)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"Invalid region: {region}")
+
+    if points.ndim != 2 or points.shape[1] != 2 or len(points) < 3:
+        raise ValueError(f"A region needs at least three points: {region}")
+    if points.min() < 0.0 or points.max() > 1.0:
+        raise ValueError(f"Region coordinates must be between 0 and 1: {region}")
+    return points
+
+
+class RegionOfInterest:
+    """Class to crop frames to a camera's regions and filter detections by them."""
+
+    def __init__(self, regions):
+        """
+        Initialize the ROI.
+
+        Args:
+            regions (list): Rectangle or polygon regions in normalized coordinates
+
+        Raises:
+            ValueError: If there are no regions or a region is malformed
+        """
+        if not regions:
+            raise ValueError("A region of interest needs at least one region")
+        self.regions = list(regions)
+        self.points = [region_points(region) for region in regions]
+
+        # Pixel geometry per frame shape: (crop bounds, mask, polygons)
+        self._geometry = {}
+
+    def geometry(self, shape):
+        """
+        Return the pixel geometry of the regions for a frame shape.
+
+        Args:
+            shape (tuple): Frame shape
+
+        Returns:
+            tuple: ((x0, y0, x1, y1) crop bounds, uint8 mask, list of int32 polygons)
+        """
+        height, width = shape[:2]
+        cached = self._geometry.get((height, width))
+        if cached is None:
+            scale = np.array([width, height])
+            polygons = [np.round(points * scale).astype(np.int32) for points in self.points]
+            mask = np.zeros((height, width), dtype=np.uint8)
+            cv2.fillPoly(mask, polygons, 255)
+
+            corners = np.concatenate(polygons)
+            x0, y0 = np.clip(corners.min(axis=0), 0, [width, height])
+            x1, y1 = np.clip(corners.max(axis=0), 0, [width, height])
+            cached = ((int(x0), int(y0), int(x1), int(y1)), mask, polygons)
+            self._geometry[(height, width)] = cached
+        return cached
+
+    def crop(self, frame):
+        """
+        Crop a frame to the bounding box of the regions.
+
+        Args:
+            frame (numpy.ndarray): Input video frame
+
+        Returns:
+            tuple: (crop as a view into the frame, x offset, y offset)
+        """
+        (x0, y0, x1, y1), _, _ = self.geometry(frame.shape)
+        return frame[y0:y1, x0:x1], x0, y0
+
+    def filter(self, detections, shape):
+        """
+        Keep only the detections whose box center lies inside the regions.
+
+        Args:
+            detections (list): Detection tuples in frame coordinates
+            shape (tuple): Frame shape
+
+        Returns:
+            list: Detection tuples inside the regions
+        """
+        _, mask, _ = self.geometry(shape)
+        height, width = mask.shape
+        inside = []
+        for detection in detections:
+            x, y, w, h = detection.box
+            cx = min(max(int(x + w / 2), 0), width - 1)
+            cy = min(max(int(y + h / 2), 0), height - 1)
+            if mask[cy, cx]:
+                inside.append(detection)
+        return inside
+
+    def detect(self, processor, frame):
+        """
+        Run a processor on the ROI crop and return the detections inside the regions.
+
+        Args:
+            processor: AIProcessor (or compatible) to run
+            frame (numpy.ndarray): Input video frame
+
+        Returns:
+            list: Detection tuples in frame coordinates
+        """
+        crop, x0, y0 = self.crop(frame)
+        if crop.shape[0] < 2 or crop.shape[1] < 2:
+            return []
+        detections = [offset_detection(detection, x0, y0) for detection in processor.detect(crop)]
+        return self.filter(detections, frame.shape)
+
+    def draw(self, frame, color=(255, 200, 0)):
+        """Outline the regions on a frame in place."""
+        _, _, polygons = self.geometry(frame.shape)
+        cv2.polylines(frame, polygons, True, color, 1)
+
+
+class RoiStore:
+    """Class to keep the regions of interest of every camera in a JSON file."""
+
+    def __init__(self, path='roi.json'):
+        """
+        Initialize the store and load the saved regions.
+
+        Args:
+            path (str): JSON file holding {camera_id: [regions]}
+        """
+        self.path = Path(path)
+        self.regions = {}
+        if self.path.exists():
+            try:
+                self.regions = json.loads(self.path.read_text())
+            except json.JSONDecodeError as e:
+                logging.error(f"Ignoring invalid ROI file {self.path}: {e}")
+
+    def get(self, camera_id):
+        """Return the RegionOfInterest of a camera, or None if it processes the full frame."""
+        regions = self.regions.get(camera_id)
+        if not regions:
+            return None
+        try:
+            return RegionOfInterest(regions)
+        except ValueError as e:
+            logging.error(f"Ignoring invalid ROI for camera {camera_id}: {e}")
+            return None
+
+    def set(self, camera_id, regions):
+        """
+        Set and save the regions of a camera; an empty list restores full-frame processing.
+
+        Args:
+            camera_id (str): Camera to configure
+            regions (list): Rectangle or polygon regions in normalized coordinates
+
+        Returns:
+            RegionOfInterest: The new ROI, or None if it was cleared
+
+        Raises:
+            ValueError: If a region is malformed
+        """
+        roi = RegionOfInterest(regions) if regions else None
+        if roi is None:
+            self.regions.pop(camera_id, None)
+        else:
+            self.regions[camera_id] = roi.regions
+        self.save()
+        return roi
+
+    def save(self):
+        """Write the regions to the JSON file, replacing it atomically."""
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        temp_path.write_text(json.dumps(self.regions, indent=2))
+        os.replace(temp_path, self.path)
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Inference Scheduler for the AI WiFi CAM Server
+
+All cameras share one AI processor. Without a scheduler, frames were
+processed in whatever order their sockets were read, so a busy high-FPS
+camera could starve the others and frames that were already too old still
+went through inference.
+
+The scheduler keeps a short queue per camera and picks the next frame to
+process with smooth weighted round-robin, so each camera with frames
+waiting gets a share of inference proportional to its weight:
+
+- Every frame has a deadline (time received + deadline). Frames that are
+  past it when their turn comes are discarded before inference.
+- A full queue drops its oldest frame when a new one arrives, so cameras
+  that send faster than they are served don't build up a backlog.
+- A camera can have a target rate; it is not served more often than that.
+- Several frames can be processed at once (e.g. by remote inference
+  workers) up to the scheduler's concurrency, but never two of the same
+  camera, so each camera's results stay in order.
+
+Per-camera achieved inference rates and drop counters are available from
+stats().
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+
+class CameraQueue:
+    """Scheduling state and counters of a single camera."""
+
+    def __init__(self, camera_id, weight=1.0, target_fps=None, deadline=0.5, queue_size=2,
+                 on_done=None, rate_window=2.0):
+        """
+        Initialize the camera queue.
+
+        Args:
+            camera_id (str): Camera ID
+            weight (float): Share of inference relative to other cameras
+            target_fps (float): Highest inference rate for this camera (None for no limit)
+            deadline (float): Seconds after which a waiting frame is discarded
+            queue_size (int): Number of frames kept waiting
+            on_done (callable): Called as on_done(item, duration) after a frame was processed,
+                or on_done(item, None) if it was dropped
+            rate_window (float): Seconds over which the achieved rate is measured
+        """
+        self.camera_id = camera_id
+        self.weight = weight
+        self.target_fps = target_fps
+        self.deadline = deadline
+        self.on_done = on_done
+        self.rate_window = rate_window
+        self.frames = deque()
+        self.queue_size = queue_size
+
+        # Smooth weighted round-robin state, target rate pacing and whether a frame is being processed
+        self.current_weight = 0.0
+        self.next_due = 0.0
+        self.busy = False
+
+        # Counters
+        self.received = 0
+        self.processed = 0
+        self.deadline_misses = 0
+        self.superseded = 0
+        self.processing_time = 0.0
+        self._processed_times = deque()
+
+    def drop(self, item):
+        """Report a frame that will not be processed."""
+        if self.on_done is not None:
+            self.on_done(item, None)
+
+    def rate(self, now):
+        """Return the achieved inference rate over the rate window."""
+        while self._processed_times and self._processed_times[0] < now - self.rate_window:
+            self._processed_times.popleft()
+        return len(self._processed_times) / self.rate_window
+
+    def stats(self, now):
+        """Return the camera's scheduling counters."""
+        return {
+            'weight': self.weight,
+            'target_fps': self.target_fps,
+            'rate': round(self.rate(now), 2),
+            'received': self.received,
+            'processed': self.processed,
+            'deadline_misses': self.deadline_misses,
+            'superseded': self.superseded,
+            'queued': len(self.frames),
+            'avg_processing_ms': round(1000 * self.processing_time / self.processed, 1) if self.processed else None
+        }
+
+
+class InferenceScheduler:
+    """Class to share inference fairly between cameras."""
+
+    def __init__(self, process, deadline=0.5, queue_size=2, concurrency=1, clock=time.monotonic):
+        """
+        Initialize the scheduler.
+
+        Args:
+            process (callable): Coroutine function process(camera_id, item) that processes a frame
+            deadline (float): Default seconds after which a waiting frame is discarded
+            queue_size (int): Default number of frames kept waiting per camera
+            concurrency (int): Most frames processed at once by run() (can be changed at any time)
+            clock (callable): Function returning the current time in seconds
+        """
+        self.process = process
+        self.deadline = deadline
+        self.queue_size = queue_size
+        self.concurrency = concurrency
+        self.clock = clock
+        self.cameras = {}
+        self._wakeup = asyncio.Event()
+
+    def add_camera(self, camera_id, weight=1.0, target_fps=None, deadline=None, on_done=None):
+        """
+        Start scheduling frames for a camera.
+
+        Args:
+            camera_id (str): Camera ID
+            weight (float): Share of inference relative to other cameras
+            target_fps (float): Highest inference rate for this camera (None for no limit)
+            deadline (float): Seconds after which a waiting frame is discarded (default: scheduler's)
+            on_done (callable): See CameraQueue
+
+        Returns:
+            CameraQueue: The camera's queue
+        """
+        self.remove_camera(camera_id)
+        queue = CameraQueue(camera_id, weight, target_fps, deadline or self.deadline,
+                            self.queue_size, on_done)
+        self.cameras[camera_id] = queue
+        return queue
+
+    def remove_camera(self, camera_id):
+        """Stop scheduling a camera and drop its waiting frames."""
+        queue = self.cameras.pop(camera_id, None)
+        if queue is not None:
+            while queue.frames:
+                queue.drop(queue.frames.popleft()[1])
+
+    def configure(self, camera_id, weight=None, target_fps=None, deadline=None):
+        """
+        Change the scheduling parameters of a camera.
+
+        Args:
+            camera_id (str): Camera ID
+            weight (float): New weight (None keeps the current one)
+            target_fps (float): New target rate (None keeps it, 0 removes the limit)
+            deadline (float): New deadline in seconds (None keeps the current one)
+
+        Raises:
+            KeyError: If the camera is not scheduled
+            ValueError: If a value is out of range
+        """
+        queue = self.cameras[camera_id]
+        if weight is not None:
+            if weight <= 0:
+                raise ValueError("Weight must be positive")
+            queue.weight = float(weight)
+        if target_fps is not None:
+            if target_fps < 0:
+                raise ValueError("Target rate must not be negative")
+            queue.target_fps = float(target_fps) or None
+        if deadline is not None:
+            if deadline <= 0:
+                raise ValueError("Deadline must be positive")
+            queue.deadline = float(deadline)
+        self._wakeup.set()
+
+    def submit(self, camera_id, item, received=None):
+        """
+        Queue a frame of a camera.
+
+        Args:
+            camera_id (str): Camera ID (must have been added)
+            item: Frame data passed to process()
+            received (float): Time the frame was received (defaults to now)
+        """
+        queue = self.cameras[camera_id]
+        queue.received += 1
+        if len(queue.frames) >= queue.queue_size:
+            queue.superseded += 1
+            queue.drop(queue.frames.popleft()[1])
+        queue.frames.append((received if received is not None else self.clock(), item))
+        self._wakeup.set()
+
+    def next_frame(self):
+        """
+        Pick the next frame to process.
+
+        Frames past their deadline are discarded first.
+
+        Returns:
+            tuple: ((CameraQueue, item), None) if a frame is ready, else (None, seconds to wait or None)
+        """
+        now = self.clock()
+        eligible = []
+        wait = None
+        for queue in self.cameras.values():
+            while queue.frames and now - queue.frames[0][0] > queue.deadline:
+                queue.deadline_misses += 1
+                queue.drop(queue.frames.popleft()[1])
+            if not queue.frames or queue.busy:
+                continue
+            if queue.next_due > now:
+                wait = min(wait, queue.next_due - now) if wait is not None else queue.next_due - now
+                continue
+            eligible.append(queue)
+
+        if not eligible:
+            return None, wait
+
+        # Smooth weighted round-robin: deterministic and evenly interleaved
+        total = 0.0
+        for queue in eligible:
+            queue.current_weight += queue.weight
+            total += queue.weight
+        chosen = max(eligible, key=lambda queue: queue.current_weight)
+        chosen.current_weight -= total
+        return (chosen, chosen.frames.popleft()[1]), None
+
+    async def run_once(self):
+        """Process the next frame, or wait until one may be ready."""
+        choice, wait = self.next_frame()
+        if choice is None:
+            await self._wait(wait)
+            return
+
+        queue, item = choice
+        queue.busy = True
+        await self._process(queue, item)
+
+    async def _wait(self, timeout):
+        """Wait until a frame is queued, a camera is done or the timeout passes."""
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _process(self, queue, item):
+        """Process a frame of a camera marked busy and update its counters."""
+        start = self.clock()
+        if queue.target_fps:
+            queue.next_due = start + 1.0 / queue.target_fps
+        try:
+            await self.process(queue.camera_id, item)
+        except Exception as e:
+            logging.error(f"Error processing frame from camera {queue.camera_id}: {e}")
+        finally:
+            queue.busy = False
+            self._wakeup.set()
+        duration = self.clock() - start
+
+        queue.processed += 1
+        queue.processing_time += duration
+        queue._processed_times.append(start)
+        if queue.on_done is not None:
+            queue.on_done(item, duration)
+
+    async def run(self):
+        """Process frames, up to concurrency at once, until cancelled."""
+        active = set()
+        try:
+            while True:
+                if len(active) >= self.concurrency:
+                    await asyncio.wait(active, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                choice, wait = self.next_frame()
+                if choice is None:
+                    await self._wait(wait)
+                    continue
+
+                queue, item = choice
+                queue.busy = True
+                task = asyncio.ensure_future(self._process(queue, item))
+                active.add(task)
+                task.add_done_callback(active.discard)
+                # Let the frame start and the camera connections queue their next frames
+                await asyncio.sleep(0)
+        finally:
+            for task in active:
+                task.cancel()
+
+    def stats(self):
+        """Return the scheduling counters of every camera."""
+        now = self.clock()
+        return {camera_id: queue.stats(now) for camera_id, queue in self.cameras.items()}
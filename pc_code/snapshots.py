@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Snapshot Storage for the AI WiFi CAM Server
+
+This module saves snapshots of camera frames without blocking the event
+loop. The camera already sends JPEG-encoded frames, so a snapshot writes
+those bytes to disk as they are instead of re-encoding the decoded frame.
+Writes, thumbnail generation and index updates all happen on a single
+background thread.
+
+Snapshots are stored in date-sharded directories:
+
+    snapshots/2024/05/17/cam1_20240517_142301_123456.jpg
+    snapshots/2024/05/17/cam1_20240517_142301_123456_thumb.jpg
+
+Every snapshot is recorded in snapshots/index.jsonl (one JSON object per
+line with the camera, time and detections), which is loaded on start-up so
+snapshots can be listed page by page without scanning the directories.
+"""
+
+import json
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+INDEX_FILENAME = 'index.jsonl'
+
+
+class SnapshotStore:
+    """Class to save snapshots in the background and keep an index of them."""
+
+    def __init__(self, root='snapshots', thumbnail_width=160):
+        """
+        Initialize the snapshot store and load the existing index.
+
+        Args:
+            root (str): Directory to store snapshots in
+            thumbnail_width (int): Width of the precomputed thumbnails in pixels
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.thumbnail_width = thumbnail_width
+        self.index_path = self.root / INDEX_FILENAME
+
+        # Snapshot entries in the order they were taken, protected by the lock
+        self._lock = threading.Lock()
+        self._entries = []
+        self._by_id = {}
+        self._load_index()
+
+        # One writer thread keeps the index appends in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='snapshots')
+
+    def _load_index(self):
+        """Read the index file written by earlier runs."""
+        if not self.index_path.exists():
+            return
+        with open(self.index_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning(f"Skipping invalid snapshot index line: {line.strip()}")
+                    continue
+                self._entries.append(entry)
+                self._by_id[entry['id']] = entry
+
+    def save(self, jpeg, camera_id, detections=(), timestamp=None):
+        """
+        Queue a snapshot to be written in the background.
+
+        Args:
+            jpeg (bytes): JPEG-encoded frame, written as is
+            camera_id (str): Camera the frame came from
+            detections (iterable): Detection tuples for the frame
+            timestamp (datetime): Time the frame was taken (defaults to now)
+
+        Returns:
+            concurrent.futures.Future: Resolves to the index entry once written
+        """
+        timestamp = timestamp or datetime.now()
+        entry = {
+            'id': f"{safe_name(camera_id)}_{timestamp.strftime('%Y%m%d_%H%M%S_%f')}",
+            'camera': camera_id,
+            'time': timestamp.isoformat(timespec='milliseconds'),
+            'detections': [{'label': detection.label,
+                            'confidence': round(float(detection.confidence), 3),
+                            'box': [int(value) for value in detection.box]}
+                           for detection in detections]
+        }
+        return self._executor.submit(self._write, bytes(jpeg), entry, timestamp)
+
+    def _write(self, jpeg, entry, timestamp):
+        """Write the image, its thumbnail and the index entry (runs on the writer thread)."""
+        shard = Path(timestamp.strftime('%Y')) / timestamp.strftime('%m') / timestamp.strftime('%d')
+        (self.root / shard).mkdir(parents=True, exist_ok=True)
+
+        entry['path'] = (shard / f"{entry['id']}.jpg").as_posix()
+        (self.root / entry['path']).write_bytes(jpeg)
+
+        thumbnail = self.make_thumbnail(jpeg)
+        if thumbnail is not None:
+            entry['thumbnail'] = (shard / f"{entry['id']}_thumb.jpg").as_posix()
+            (self.root / entry['thumbnail']).write_bytes(thumbnail)
+
+        with open(self.index_path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+        with self._lock:
+            self._entries.append(entry)
+            self._by_id[entry['id']] = entry
+
+        logging.info(f"Snapshot saved to {self.root / entry['path']}")
+        return entry
+
+    def make_thumbnail(self, jpeg):
+        """
+        Create a small JPEG thumbnail from a JPEG image.
+
+        The JPEG decoder can scale down while decoding, which is much cheaper
+        than decoding the full image and resizing it.
+
+        Args:
+            jpeg (bytes): JPEG-encoded image
+
+        Returns:
+            bytes: JPEG-encoded thumbnail, or None if the image cannot be decoded
+        """
+        image = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_REDUCED_COLOR_2)
+        if image is None:
+            return None
+
+        height, width = image.shape[:2]
+        if width > self.thumbnail_width:
+            height = max(1, round(height * self.thumbnail_width / width))
+            image = cv2.resize(image, (self.thumbnail_width, height), interpolation=cv2.INTER_AREA)
+
+        _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 75])
+        return buffer.tobytes()
+
+    def list(self, offset=0, limit=20, camera=None):
+        """
+        List snapshots, newest first.
+
+        Args:
+            offset (int): Number of snapshots to skip
+            limit (int): Maximum number of snapshots to return
+            camera (str): Only list snapshots from this camera
+
+        Returns:
+            tuple: (list of index entries, total number of matching snapshots)
+        """
+        with self._lock:
+            entries = self._entries if camera is None else [
+                entry for entry in self._entries if entry['camera'] == camera]
+            total = len(entries)
+            end = total - offset
+            page = entries[max(0, end - limit):max(0, end)]
+        return page[::-1], total
+
+    def get(self, snapshot_id):
+        """Return the index entry of a snapshot, or None if it does not exist."""
+        with self._lock:
+            return self._by_id.get(snapshot_id)
+
+    def path(self, entry, thumbnail=False):
+        """
+        Return the file path of a snapshot or its thumbnail.
+
+        Args:
+            entry (dict): Index entry returned by get() or list()
+            thumbnail (bool): Return the thumbnail instead of the full image
+
+        Returns:
+            Path: File path, or None if the snapshot has no thumbnail
+        """
+        relative = entry.get('thumbnail') if thumbnail else entry['path']
+        return self.root / relative if relative else None
+
+    def close(self):
+        """Finish pending writes and stop the writer thread."""
+        self._executor.shutdown(wait=True)
+
+
+def safe_name(name):
+    """Make a camera ID safe to use in a file name."""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', str(name)) or 'camera'
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Static Asset Serving for the AI WiFi CAM Web Interface
+
+The web interface is a handful of small files that every viewer loads,
+often over the same Wi-Fi the cameras use. StaticAssets reads them once at
+startup and serves them from memory:
+
+- Files under js/ and css/ get a content hash in their name
+  (js/main.3f2a1b9c.js), and references to them in the HTML, JavaScript
+  and CSS are rewritten to the hashed names. Hashed URLs never change
+  content, so browsers may cache them forever (Cache-Control: immutable)
+  and don't ask again on the next page load.
+- Everything else (index.html, images) is served with an ETag and
+  Cache-Control: no-cache, so browsers revalidate it and get an empty
+  304 Not Modified response while it is unchanged.
+- Text assets are compressed once at startup with gzip, and with brotli if
+  the brotli package is installed. Each request gets the smallest variant
+  its Accept-Encoding allows. Each variant has its own ETag (the content
+  hash with -gz or -br appended), as strong validators must differ between
+  encodings, so caches never answer a request with another encoding's body.
+
+Assets are read once, so changes to the files are only picked up after a
+restart. The original names of hashed files keep working (revalidated like
+index.html) for clients that don't read them from the HTML.
+"""
+
+import copy
+import gzip
+import hashlib
+import mimetypes
+import re
+from pathlib import Path
+
+from aiohttp import web
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Directories whose files get content-hashed names
+FINGERPRINTED_DIRS = ('js', 'css')
+
+# Assets that may reference others, and whose references are rewritten
+REFERENCING_SUFFIXES = ('.html', '.js', '.css')
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# Appended to the content hash in the ETag of each encoding
+ETAG_SUFFIXES = {'identity': '', 'gzip': '-gz', 'br': '-br'}
+
+
+class Asset:
+    """One file held in memory with its compressed variants."""
+
+    def __init__(self, body, content_type, cache_control):
+        """
+        Prepare the asset and compress it if that makes it smaller.
+
+        Args:
+            body (bytes): File content (after rewriting references)
+            content_type (str): MIME type
+            cache_control (str): Cache-Control header value
+        """
+        self.content_type = content_type
+        self.cache_control = cache_control
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {'identity': body}
+        if content_type.startswith(COMPRESSIBLE_TYPES):
+            # mtime=0 keeps the gzip output identical across restarts
+            compressed = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                compressed['br'] = brotli.compress(body, quality=11)
+            for encoding, data in compressed.items():
+                if len(data) < len(body):
+                    self.variants[encoding] = data
+        self.etags = {encoding: f'"{digest}{ETAG_SUFFIXES[encoding]}"' for encoding in self.variants}
+
+    def with_cache_control(self, cache_control):
+        """Return the same content (sharing its variants) with other caching."""
+        asset = copy.copy(self)
+        asset.cache_control = cache_control
+        return asset
+
+    def select(self, accept_encoding):
+        """Return (encoding, body) of the smallest variant allowed by an Accept-Encoding header."""
+        accepted = parse_accept_encoding(accept_encoding)
+        best = 'identity'
+        for encoding, data in self.variants.items():
+            if encoding in accepted and len(data) < len(self.variants[best]):
+                best = encoding
+        return best, self.variants[best]
+
+
+def parse_accept_encoding(header):
+    """Return the encodings an Accept-Encoding header allows (identity is always allowed)."""
+    accepted = {'identity'}
+    for part in (header or '').split(','):
+        encoding, _, parameters = part.strip().partition(';')
+        quality = parameters.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if encoding:
+            accepted.add(encoding.strip().lower())
+    return accepted
+
+
+def fingerprinted_name(path, body):
+    """Insert a content hash into a file name: js/main.js -> js/main.3f2a1b9c.js."""
+    digest = hashlib.sha256(body).hexdigest()[:8]
+    name = Path(path)
+    return str(name.with_name(f"{name.stem}.{digest}{name.suffix}").as_posix())
+
+
+def reference_pattern(path):
+    """Match a path as a whole reference, not as part of a longer name."""
+    return re.compile(r'(?<![\w.-])' + re.escape(path) + r'(?![\w.-])')
+
+
+class StaticAssets:
+    """Class holding the web interface files in memory, fingerprinted and precompressed."""
+
+    def __init__(self, root, index='index.html'):
+        """
+        Read and prepare every file below root.
+
+        Args:
+            root (str): Directory of the web interface
+            index (str): File served for '/'
+        """
+        self.root = Path(root)
+        self.index = index
+        files = {path.relative_to(self.root).as_posix(): path.read_bytes()
+                 for path in sorted(self.root.rglob('*')) if path.is_file()}
+
+        # Hash files only after rewriting their own references (e.g. main.js naming the
+        # worker script), so a changed dependency also changes the hash of its users
+        self.hashed_names = {}
+        pending = [path for path in files if path.split('/')[0] in FINGERPRINTED_DIRS]
+        patterns = {path: reference_pattern(path) for path in pending}
+        while pending:
+            ready = [path for path in pending
+                     if all(other in self.hashed_names for other in self._references(path, files, patterns))]
+            # A reference cycle can't be resolved; hash what's left as it is
+            for path in ready or list(pending):
+                files[path] = self._rewrite(path, files[path], patterns)
+                self.hashed_names[path] = fingerprinted_name(path, files[path])
+                pending.remove(path)
+
+        self.assets = {}
+        for path, body in files.items():
+            body = self._rewrite(path, body, patterns)
+            content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            self.assets[path] = Asset(body, content_type, REVALIDATE)
+            if path in self.hashed_names:
+                self.assets[self.hashed_names[path]] = self.assets[path].with_cache_control(IMMUTABLE)
+
+    def _references(self, path, files, patterns):
+        """Return the fingerprinted files that a text file references."""
+        if not path.endswith(REFERENCING_SUFFIXES):
+            return []
+        text = files[path].decode('utf-8', errors='replace')
+        return [other for other, pattern in patterns.items() if other != path and pattern.search(text)]
+
+    def _rewrite(self, path, body, patterns):
+        """Replace references to fingerprinted files with their hashed names."""
+        if not path.endswith(REFERENCING_SUFFIXES) or not self.hashed_names:
+            return body
+        text = body.decode('utf-8')
+        for original, hashed in self.hashed_names.items():
+            text = patterns[original].sub(hashed, text)
+        return text.encode('utf-8')
+
+    def size(self):
+        """Return the total size of the assets in memory in bytes."""
+        variants = {id(data): len(data) for asset in self.assets.values() for data in asset.variants.values()}
+        return sum(variants.values())
+
+    async def handle(self, request):
+        """Serve an asset: the smallest acceptable encoding, with cache headers and ETag/304."""
+        path = request.match_info.get('path', '').strip('/') or self.index
+        asset = self.assets.get(path)
+        if asset is None and path + '/' + self.index in self.assets:
+            asset = self.assets[path + '/' + self.index]
+        if asset is None:
+            raise web.HTTPNotFound()
+
+        encoding, body = asset.select(request.headers.get('Accept-Encoding'))
+        headers = {'Cache-Control': asset.cache_control, 'ETag': asset.etags[encoding], 'Vary': 'Accept-Encoding'}
+        # Any variant's ETag shows the client has the current content
+        if_none_match = request.headers.get('If-None-Match', '')
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        if any(etag in tags for etag in asset.etags.values()) or if_none_match.strip() == '*':
+            return web.Response(status=304, headers=headers)
+
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        charset = 'utf-8' if asset.content_type.startswith(COMPRESSIBLE_TYPES) else None
+        return web.Response(body=body, content_type=asset.content_type, charset=charset, headers=headers)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Stats Publishing for the /control WebSocket
+
+The server pushes one combined stats message to every control client on a
+fixed tick instead of answering each command with separate settings, stats
+and detections messages. Each tick:
+
+- The current stats are compared with those sent on the previous tick and
+  only the changed fields are sent. Nested dictionaries (such as the
+  per-camera stats) are compared field by field; removed fields are sent
+  as null.
+- The message is serialized once and the same string is sent to all clients.
+
+A client that connects receives the full stats from the last tick first, so
+it holds the same state as every other client and can apply the following
+changes.
+
+StageTimings keeps smoothed per-stage processing times for the stats.
+"""
+
+import json
+import time
+
+
+def diff_stats(previous, current):
+    """
+    Return the fields of current that differ from previous.
+
+    Args:
+        previous (dict): Stats sent before
+        current (dict): Current stats
+
+    Returns:
+        dict: Changed and new fields; nested dictionaries contain only their changes,
+        and fields missing from current are None
+    """
+    changes = {}
+    for key, value in current.items():
+        old = previous.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            nested = diff_stats(old, value)
+            if nested:
+                changes[key] = nested
+        elif key not in previous or old != value:
+            changes[key] = value
+    for key in previous:
+        if key not in current:
+            changes[key] = None
+    return changes
+
+
+class StatsPublisher:
+    """Class to turn stats into full and incremental control messages."""
+
+    def __init__(self, message_type='stats'):
+        """
+        Initialize the publisher without any stats.
+
+        Args:
+            message_type (str): Value of the 'type' field of the messages
+        """
+        self.message_type = message_type
+        self.last = None
+
+    def update(self, stats):
+        """
+        Record the stats of this tick.
+
+        Args:
+            stats (dict): Current stats (JSON serializable)
+
+        Returns:
+            str: Serialized message with the changed fields, or None if nothing changed
+        """
+        if self.last is None:
+            self.last = stats
+            return self.full_message()
+
+        changes = diff_stats(self.last, stats)
+        self.last = stats
+        if not changes:
+            return None
+        return json.dumps(dict(changes, type=self.message_type))
+
+    def full_message(self):
+        """Return the serialized full stats of the last tick (None before the first tick)."""
+        if self.last is None:
+            return None
+        return json.dumps(dict(self.last, type=self.message_type, full=True))
+
+
+class StageTimings:
+    """Class to keep smoothed processing times of pipeline stages."""
+
+    def __init__(self, smoothing=0.1):
+        """
+        Initialize without any measurements.
+
+        Args:
+            smoothing (float): Weight of each new measurement in the moving average
+        """
+        self.smoothing = smoothing
+        self.averages = {}
+
+    def add(self, stage, seconds):
+        """Record the duration of one run of a stage."""
+        average = self.averages.get(stage)
+        self.averages[stage] = seconds if average is None else average + self.smoothing * (seconds - average)
+
+    def measure(self, stage, start):
+        """Record the time since start (from time.perf_counter) for a stage and return the current time."""
+        now = time.perf_counter()
+        self.add(stage, now - start)
+        return now
+
+    def snapshot(self):
+        """Return the average duration of each stage in milliseconds."""
+        return {stage: round(1000 * average, 1) for stage, average in self.averages.items()}
@@ -26,9 +26,32 @@ import os
 import json
 import base64
 import logging
+import multiprocessing
+import signal
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from ai_processor import AIProcessor
+from ai_processor import create_processor, parse_model_spec
+from model_backends import MODEL_REGISTRY, DNN_BACKENDS, DNN_TARGETS
+from rate_control import RateController
+from adaptive_input import InputSizeController, INPUT_SIZES
+from display import DisplayThread
+from snapshots import SnapshotStore
+from roi import RoiStore
+from duplicate_filter import DuplicateFilter
+from demand import Demand, FRAMES, DETECTIONS, IDLE, DETECT
+from scheduler import InferenceScheduler
+from stats_publisher import StatsPublisher, StageTimings
+from tcp_ingest import FrameReceiver
+from worker_pool import WorkerPool, WorkerLost
+from thread_budget import ThreadBudget
+from detection_log import DetectionLog, parse_time
+from analytics import Analytics, WINDOWS as ANALYTICS_WINDOWS
+from mosaic import Mosaic, parse_size
+from static_assets import StaticAssets
+from tuning import PROFILE_PATH, load_profile, apply_profile
 
 # For web server
 import aiohttp
@@ -39,25 +62,150 @@ from aiohttp.web_runner import GracefulExit
 parser = argparse.ArgumentParser(description='ESP32-CAM WebSocket Video Stream Receiver with AI Processing and Web Interface')
 parser.add_argument('--host', type=str, default='0.0.0.0', help='Host to listen on')
 parser.add_argument('--port', type=int, default=8888, help='Port to listen on')
+parser.add_argument('--tcp-port', type=int, default=None,
+                    help='Also accept cameras on this port with the binary TCP ingest protocol')
 parser.add_argument('--web-port', type=int, default=8080, help='Web server port')
-parser.add_argument('--model', type=str, default='yolov4', choices=['yolov4', 'mediapipe_pose', 'mediapipe_face'],
-                    help='AI model to use for processing')
+parser.add_argument('--model', type=str, default='yolov4',
+                    help='AI model to use for processing, or several comma-separated models to run in '
+                         'parallel; append :N to run a model on every N-th frame (e.g. yolov4_tiny:3,mediapipe_face)')
+parser.add_argument('--model-dir', type=str, default=None, help='Directory containing the model files')
+parser.add_argument('--input-size', type=int, default=None, help='Network input size (default: per model)')
+parser.add_argument('--dnn-backend', type=str, default=None, choices=list(DNN_BACKENDS),
+                    help='OpenCV DNN backend (default: per model)')
+parser.add_argument('--dnn-target', type=str, default=None, choices=list(DNN_TARGETS),
+                    help='OpenCV DNN target device (default: per model)')
+parser.add_argument('--dnn-threads', type=int, default=None,
+                    help='Number of OpenCV threads for inference (default: per model, or the CPU budget)')
+parser.add_argument('--cpu-budget', type=str, default='off', choices=['off', 'auto'],
+                    help='Divide the CPU cores between ingest, inference and encoding and pin each to its cores')
+parser.add_argument('--ingest-cpus', type=str, default=None,
+                    help='CPUs for receiving and decoding frames, e.g. 0 or 0-1 (overrides --cpu-budget)')
+parser.add_argument('--inference-cpus', type=str, default=None,
+                    help='CPUs for local inference, e.g. 2-7 (overrides --cpu-budget)')
+parser.add_argument('--encode-cpus', type=str, default=None,
+                    help='CPUs for encoding frames for web clients (overrides --cpu-budget)')
 parser.add_argument('--confidence', type=float, default=0.5, help='Confidence threshold for detections')
 parser.add_argument('--display', action='store_true', default=True, help='Display video stream')
 parser.add_argument('--no-display', dest='display', action='store_false', help='Do not display video stream')
+parser.add_argument('--display-fps', type=float, default=30.0, help='Maximum refresh rate of the display window')
 parser.add_argument('--save', action='store_true', help='Save processed video to file')
 parser.add_argument('--output-path', type=str, default='output', help='Path to save output video')
 parser.add_argument('--web', action='store_true', default=True, help='Enable web interface')
 parser.add_argument('--no-web', dest='web', action='store_false', help='Disable web interface')
 parser.add_argument('--web-path', type=str, default='web', help='Path to web interface files')
+parser.add_argument('--mosaic-size', type=str, default='1280x720',
+                    help='Size of the multi-camera mosaic streamed at /video/mosaic')
+parser.add_argument('--mosaic-fps', type=float, default=5.0, help='Highest frame rate of the mosaic stream')
+parser.add_argument('--mosaic-quality', type=int, default=75, help='JPEG quality of the mosaic stream')
+parser.add_argument('--snapshot-dir', type=str, default='snapshots', help='Directory to store snapshots in')
+parser.add_argument('--detection-log', type=str, default='detection_log',
+                    help='Directory of the log recording every detection (queried at /detections)')
+parser.add_argument('--no-detection-log', dest='detection_log', action='store_const', const=None,
+                    help='Do not record detections')
+parser.add_argument('--detection-log-flush', type=float, default=5.0,
+                    help='Seconds between writes of recorded detections to disk')
+parser.add_argument('--dwell-gap', type=float, default=3.0,
+                    help='Seconds a class may go undetected before its visit counts as ended (for analytics)')
+parser.add_argument('--roi-file', type=str, default='roi.json',
+                    help='JSON file storing the regions of interest of each camera')
+parser.add_argument('--rate-control', action='store_true', default=True,
+                    help='Throttle the camera when the server cannot keep up')
+parser.add_argument('--no-rate-control', dest='rate_control', action='store_false',
+                    help='Let the camera send at its own rate')
+parser.add_argument('--max-camera-fps', type=float, default=20.0, help='Highest frame rate requested from the camera')
+parser.add_argument('--min-camera-fps', type=float, default=5.0,
+                    help='Lowest frame rate before the camera resolution is reduced')
+parser.add_argument('--dedupe', action='store_true', default=True,
+                    help='Skip frames that repeat the last processed frame before decoding them')
+parser.add_argument('--no-dedupe', dest='dedupe', action='store_false', help='Process every frame')
+parser.add_argument('--dedupe-refresh', type=float, default=1.0,
+                    help='Process a frame at least this often (seconds) even if it repeats the last one')
+parser.add_argument('--idle-detection-interval', type=float, default=1.0,
+                    help='Seconds between detections when nobody watches the video but detections are used')
+parser.add_argument('--frame-deadline', type=float, default=0.5,
+                    help='Discard frames that waited this many seconds for inference')
+parser.add_argument('--camera-weights', type=str, default='',
+                    help='Inference share per camera, e.g. door=2,garage=1 (default weight: 1)')
+parser.add_argument('--camera-fps', type=str, default='',
+                    help='Highest inference rate per camera, e.g. door=10,garage=2')
+parser.add_argument('--stats-interval', type=float, default=1.0,
+                    help='Seconds between stats updates pushed to control clients')
+parser.add_argument('--worker-port', type=int, default=None,
+                    help='Accept remote inference workers (inference_worker.py) on this port')
+parser.add_argument('--worker-in-flight', type=int, default=2,
+                    help='Most frames sent to a remote worker before it returns a result')
+parser.add_argument('--worker-timeout', type=float, default=2.0,
+                    help='Seconds to wait for a remote worker before running the frame locally')
+parser.add_argument('--local-workers', type=int, default=0,
+                    help='Start this many inference worker processes on this machine')
+parser.add_argument('--target-fps', type=float, default=None,
+                    help='Adapt the YOLO input size per camera to sustain this inference rate')
+parser.add_argument('--latency-budget', type=float, default=None,
+                    help='Adapt the YOLO input size per camera to keep inference under this many ms')
+parser.add_argument('--input-sizes', type=str, default=','.join(str(size) for size in INPUT_SIZES),
+                    help='Comma-separated YOLO input sizes the adaptive controller may use')
+parser.add_argument('--profile', type=str, default=str(PROFILE_PATH),
+                    help='Runtime profile written by check_system.py --tune, applied as option defaults')
+parser.add_argument('--no-profile', dest='profile', action='store_const', const=None,
+                    help='Ignore the runtime profile')
+
+# The runtime profile replaces the defaults, so options on the command line still win
+runtime_profile = None
+profile_error = None
+profile_settings = {}
+profile_path = parser.parse_known_args()[0].profile
+if profile_path:
+    try:
+        runtime_profile = load_profile(profile_path)
+    except ValueError as e:
+        profile_error = str(e)
+    if runtime_profile is not None:
+        profile_settings = apply_profile(parser, runtime_profile)
 args = parser.parse_args()
 
+def parse_camera_values(text, option):
+    """Parse a 'camera=value,camera=value' option into a dict of positive floats."""
+    values = {}
+    for entry in filter(None, text.split(',')):
+        camera_id, _, value = entry.partition('=')
+        try:
+            values[camera_id.strip()] = float(value)
+        except ValueError:
+            parser.error(f"{option}: expected camera=number, got {entry}")
+        if values[camera_id.strip()] <= 0:
+            parser.error(f"{option}: {entry} must be positive")
+    return values
+
+try:
+    mosaic_size = parse_size(args.mosaic_size)
+except ValueError as e:
+    parser.error(f"--mosaic-size: {e}")
+if args.mosaic_fps <= 0:
+    parser.error("--mosaic-fps must be positive")
+if args.local_workers < 0:
+    parser.error("--local-workers must not be negative")
+
+camera_weights = parse_camera_values(args.camera_weights, '--camera-weights')
+camera_fps = parse_camera_values(args.camera_fps, '--camera-fps')
+try:
+    parse_model_spec(args.model)
+except ValueError as e:
+    parser.error(f"{e} (choose from {', '.join(MODEL_REGISTRY)})")
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
+if profile_error:
+    logging.warning(f"{profile_error}; not applied. Run check_system.py --tune to tune for this machine")
+elif runtime_profile is not None:
+    target = runtime_profile.get('target', {})
+    logging.info(f"Runtime profile {args.profile} (tuned for {target.get('cameras')} camera(s) at "
+                 f"{target.get('fps')} fps): " +
+                 ', '.join(f"{option}={getattr(args, option)}" for option in profile_settings))
+
 # Create output directory if saving video
 if args.save:
     os.makedirs(args.output_path, exist_ok=True)
@@ -66,11 +214,44 @@ if args.save:
     fourcc = cv2.VideoWriter_fourcc(*'XVID')
     out = None  # Will be initialized after receiving first frame
 
-# Create snapshots directory
-os.makedirs('snapshots', exist_ok=True)
+# Snapshots are written and indexed on a background thread
+snapshot_store = SnapshotStore(args.snapshot_dir)
+
+# Per-camera regions of interest, set from /control
+roi_store = RoiStore(args.roi_file)
+
+# Every detection, appended to memory-mapped segments and flushed periodically
+detection_log = DetectionLog(args.detection_log) if args.detection_log else None
+
+# Per-camera, per-class counts, occupancy and dwell over rolling windows
+analytics = Analytics(gap=args.dwell_gap)
+
+# Budget the CPU cores between the pipeline stages. The model is loaded within the
+# inference budget so the threads OpenCV and MediaPipe start for it inherit its cores.
+try:
+    thread_budget = ThreadBudget.from_args(args.cpu_budget, args.ingest_cpus, args.inference_cpus,
+                                           args.encode_cpus, args.dnn_threads)
+except ValueError as e:
+    parser.error(str(e))
+if thread_budget is not None:
+    thread_budget.log()
+    thread_budget.enter('inference')
 
 # Initialize AI processor
-ai_processor = AIProcessor(model_name=args.model, confidence_threshold=args.confidence)
+model_options = {
+    'input_size': args.input_size,
+    'model_dir': args.model_dir,
+    'dnn_backend': args.dnn_backend,
+    'dnn_target': args.dnn_target,
+    'threads': (thread_budget.threads('inference') if thread_budget is not None else None) or args.dnn_threads
+}
+ai_processor = create_processor(args.model, confidence_threshold=args.confidence, **model_options)
+
+# Prepare every input size up front when the input size adapts to load
+input_sizes = [int(size) for size in args.input_sizes.split(',')]
+adaptive_input = args.target_fps is not None or args.latency_budget is not None
+if adaptive_input:
+    ai_processor.warmup(input_sizes)
 
 # Global variables
 frame_count = 0
@@ -81,137 +262,468 @@ last_frame = None
 processed_frame = None
 clients = set()
 web_clients = set()
+mosaics = {}  # Shared mosaic per camera selection (None for all cameras), while it has viewers
+control_clients = set()
 detection_count = 0
+cameras = {}  # Per-camera state, keyed by camera ID
 settings = {
     'ai_model': args.model,
     'confidence_threshold': args.confidence,
-    'display_fps': True
+    'display_fps': True,
+    'target_fps': args.target_fps
 }
 
+# Local preview window; headless servers don't start the thread at all
+display = DisplayThread(refresh_rate=args.display_fps) if args.display else None
+
+# Who consumes the annotated video and the detections; frames only get the work they need
+demand = Demand(detection_interval=args.idle_detection_interval)
+if display is not None:
+    demand.add(FRAMES, 'display')
+if args.save:
+    demand.add(FRAMES, 'recorder')
+if detection_log is not None:
+    demand.add(DETECTIONS, 'detection_log')
+
+# Stats pushed to control clients, and smoothed per-stage processing times
+stats_publisher = StatsPublisher()
+stage_timings = StageTimings()
+
+# Shares inference between cameras and discards frames that waited too long (created in main)
+scheduler = None
+
+# Remote inference workers (created in main with --worker-port). While they are used, or
+# with a CPU budget, local inference runs on its own thread so the event loop keeps
+# receiving and dispatching frames. With a CPU budget, JPEG encoding for web clients
+# also gets its own thread.
+worker_pool = None
+local_executor = None
+encode_executor = None
+
+# Set to stop the servers (e.g. by pressing 'q' in the preview window)
+shutdown_event = None
+
 # Create a lock for thread safety
 frame_lock = asyncio.Lock()
 
-async def process_frames(websocket, path):
+def get_camera_id(websocket, path):
+    """Identify a camera by its WebSocket path (e.g. /cam2) or else its IP address."""
+    if path is None and getattr(websocket, 'request', None) is not None:
+        # websockets 13+ no longer passes the path to the handler
+        path = websocket.request.path
+    name = (path or '').strip('/')
+    if name:
+        return name
+    return str(websocket.remote_address[0])
+
+def create_input_controller():
+    """Create an input size controller from the current settings, or None if disabled."""
+    if not adaptive_input or not ai_processor.resizable_input:
+        return None
+    return InputSizeController(sizes=input_sizes, initial_size=ai_processor.input_size,
+                               target_fps=settings['target_fps'], latency_budget_ms=args.latency_budget)
+
+def connect_camera(camera_id, send_command):
+    """
+    Set up the state and scheduling of a newly connected camera.
+
+    Args:
+        camera_id (str): Camera ID
+        send_command (callable): Sends a rate control command (dict) to the camera
+
+    Returns:
+        callable: receive(message) queues a JPEG frame received from the camera
+    """
+    camera = cameras.setdefault(camera_id, {'id': camera_id, 'input_size': ai_processor.input_size,
+                                            'timings': StageTimings()})
+    camera['input_controller'] = create_input_controller()
+    camera['roi'] = roi_store.get(camera_id)
+    camera['duplicate_filter'] = DuplicateFilter(refresh_interval=args.dedupe_refresh) if args.dedupe else None
+
+    # Closed-loop rate control for this camera connection
+    rate_controller = None
+    if args.rate_control:
+        rate_controller = RateController(max_fps=args.max_camera_fps, min_fps=args.min_camera_fps)
+
+    def frame_done(item, duration):
+        """Tell the camera to slow down (or speed up) once a frame was processed or dropped."""
+        _, interval, _ = item
+        if rate_controller is None or interval <= 0:
+            return
+        # A dropped frame means the camera sends faster than it is served
+        busy = interval if duration is None else min(duration, interval)
+        command = rate_controller.update(interval - busy, busy)
+        if command is not None:
+            send_command(command)
+            logging.info(f"Rate control: {command['interval_ms']} ms/frame, "
+                         f"{command['framesize']}, quality {command['quality']}")
+
+    # Frames are queued and processed by the scheduler in fair order
+    scheduler.add_camera(camera_id, weight=camera_weights.get(camera_id, 1.0),
+                         target_fps=camera_fps.get(camera_id), on_done=frame_done)
+
+    last_received = None
+
+    def receive(message):
+        """Queue a frame along with the time since the previous one."""
+        nonlocal last_received
+        received = time.monotonic()
+        interval = received - last_received if last_received is not None else 0.0
+        last_received = received
+        if not paused:
+            scheduler.submit(camera_id, (message, interval, received), received)
+
+    return receive
+
+def disconnect_camera(camera_id):
+    """Stop scheduling a disconnected camera's frames."""
+    global out
+
+    scheduler.remove_camera(camera_id)
+    if args.save and out is not None:
+        out.release()
+
+async def process_frames(websocket, path=None):
     """Process incoming WebSocket frames from ESP32-CAM."""
-    global frame_count, fps, fps_time, paused, last_frame, processed_frame, out, detection_count
-
     logging.info(f"ESP32-CAM connected from {websocket.remote_address}")
 
+    camera_id = get_camera_id(websocket, path)
+    receive = connect_camera(camera_id,
+                             lambda command: asyncio.ensure_future(send_rate_command(websocket, command)))
     try:
         async for message in websocket:
-            if paused:
-                continue
-
-            # Convert binary message to numpy array
-            frame_data = np.frombuffer(message, dtype=np.uint8)
-
-            # Decode JPEG image
-            frame = cv2.imdecode(frame_data, cv2.IMREAD_COLOR)
-            if frame is None:
-                logging.warning("Failed to decode image")
-                continue
-
-            # Store the current frame
-            async with frame_lock:
-                last_frame = frame.copy()
-
-            # Process frame with AI
-            processed = ai_processor.process_frame(frame)
-
-            # Get detection count
-            if hasattr(ai_processor, 'last_detection_count'):
-                detection_count = ai_processor.last_detection_count
-
-            # Calculate FPS
-            frame_count += 1
-            if time.time() - fps_time >= 1.0:
-                fps = frame_count
-                frame_count = 0
-                fps_time = time.time()
-
-            # Add FPS text to frame if enabled
-            if settings['display_fps']:
-                cv2.putText(processed, f"FPS: {fps}", (10, 30),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-
-            # Store the processed frame
-            async with frame_lock:
-                processed_frame = processed.copy()
-
-            # Initialize video writer if saving and not yet initialized
-            if args.save and out is None:
-                height, width = processed_frame.shape[:2]
-                out = cv2.VideoWriter(output_filename, fourcc, 20.0, (width, height))
-
-            # Save frame to video if enabled
-            if args.save:
-                out.write(processed_frame)
-
-            # Display the frame if enabled
-            if args.display:
-                cv2.imshow('AI WiFi CAM', processed_frame)
-                key = cv2.waitKey(1) & 0xFF
-
-                # Handle key presses
-                if key == ord('q'):
-                    break
-                elif key == ord('s'):
-                    # Save snapshot
-                    snapshot_path = os.path.join('snapshots',
-                                               f'snapshot_{datetime.now().strftime("%Y%m%d_%H%M%S")}.jpg')
-                    cv2.imwrite(snapshot_path, processed_frame)
-                    logging.info(f"Snapshot saved to {snapshot_path}")
-                elif key == ord('p'):
-                    # Toggle pause
-                    paused = not paused
-                elif key == ord('+') or key == ord('='):
-                    # Increase confidence threshold
-                    ai_processor.confidence_threshold = min(ai_processor.confidence_threshold + 0.05, 1.0)
-                    settings['confidence_threshold'] = ai_processor.confidence_threshold
-                    logging.info(f"Confidence threshold: {ai_processor.confidence_threshold:.2f}")
-                elif key == ord('-'):
-                    # Decrease confidence threshold
-                    ai_processor.confidence_threshold = max(ai_processor.confidence_threshold - 0.05, 0.05)
-                    settings['confidence_threshold'] = ai_processor.confidence_threshold
-                    logging.info(f"Confidence threshold: {ai_processor.confidence_threshold:.2f}")
-
-            # Send the frame to all connected web clients
-            if web_clients and processed_frame is not None:
-                await broadcast_frame()
+            receive(message)
 
     except websockets.exceptions.ConnectionClosed:
         logging.info("ESP32-CAM disconnected")
     except Exception as e:
         logging.error(f"Error processing frames: {e}")
     finally:
-        if args.save and out is not None:
-            out.release()
-        if args.display:
-            cv2.destroyAllWindows()
+        disconnect_camera(camera_id)
+
+def create_tcp_receiver():
+    """Create the protocol for a camera connecting to the binary TCP ingest port."""
+    connection = {}
+
+    def on_frame(receiver, frame):
+        """Set the camera up on its first frame (which carries its ID), then queue frames."""
+        if not connection:
+            camera_id = frame.camera_id or str(receiver.peer[0])
+            logging.info(f"ESP32-CAM {camera_id} connected over TCP from {receiver.peer}")
+            connection['camera_id'] = camera_id
+            connection['receive'] = connect_camera(camera_id, receiver.send_command)
+        connection['receive'](frame.data)
+
+    def on_close(receiver):
+        """Stop scheduling the camera once its connection is gone."""
+        if connection:
+            logging.info(f"ESP32-CAM {connection['camera_id']} disconnected from TCP ingest")
+            disconnect_camera(connection['camera_id'])
+
+    return FrameReceiver(on_frame, on_close)
+
+async def send_rate_command(websocket, command):
+    """Send a rate control command to a camera."""
+    try:
+        await websocket.send(json.dumps(command))
+    except websockets.exceptions.ConnectionClosed:
+        pass
+
+async def process_scheduled_frame(camera_id, item):
+    """Process a frame picked by the scheduler."""
+    message, _, received = item
+    camera = cameras[camera_id]
+    record_stage(camera, 'queue', time.monotonic() - received)
+    await process_message(message, camera)
+
+def record_stage(camera, stage, seconds):
+    """Record how long a pipeline stage took, overall and for a camera."""
+    stage_timings.add(stage, seconds)
+    if camera is not None:
+        camera['timings'].add(stage, seconds)
+
+async def process_message(message, camera):
+    """
+    Decode, process and distribute a single JPEG frame from the camera.
+
+    Args:
+        message (bytes): JPEG-encoded frame
+        camera (dict): Per-camera state for the sending camera
+    """
+    global frame_count, fps, fps_time, last_frame, processed_frame, out, detection_count
+
+    received = datetime.now()
+
+    # Do only the work the current consumers need; with none, just drain the socket
+    plan = demand.plan(camera.get('detected_at'))
+    camera['mode'] = plan
+    if plan == IDLE:
+        return
+
+    # Skip frames that repeat the last processed one; its results still stand
+    duplicate_filter = camera.get('duplicate_filter')
+    if duplicate_filter is not None and duplicate_filter.is_duplicate(message):
+        return
 
-async def broadcast_frame():
+    # Hand the JPEG to a remote worker if one is free; it decodes the frame and runs the model
+    input_controller = camera.get('input_controller')
+    input_size = input_controller.size if input_controller is not None else None
+    roi = camera.get('roi')
+    regions = roi.regions if roi is not None else None
+    remote = worker_pool.submit(message, input_size, regions) if worker_pool is not None else None
+
+    # Decode locally while the worker runs, unless only the detections are needed
+    frame = None
+    if remote is None or plan != DETECT:
+        frame = decode_frame(message, camera)
+        if frame is None and remote is None:
+            return
+
+    detections = None
+    if remote is not None:
+        remote_start = time.monotonic()
+        try:
+            # The worker ran the model on the camera's regions of interest, as run_inference() does
+            detections, _, inference_time = await remote
+        except WorkerLost as e:
+            logging.warning(f"Running frame locally: {e}")
+        record_stage(camera, 'remote', time.monotonic() - remote_start)
+
+    if detections is None:
+        # No free worker, or it failed: process frame with AI here
+        if frame is None:
+            frame = decode_frame(message, camera)
+            if frame is None:
+                return
+        inference_start = time.monotonic()
+        if local_executor is not None:
+            detections = await asyncio.get_running_loop().run_in_executor(
+                local_executor, run_inference, frame, roi, input_size)
+        else:
+            detections = run_inference(frame, roi, input_size)
+        inference_time = time.monotonic() - inference_start
+
+    record_stage(camera, 'inference', inference_time)
+    if input_controller is not None:
+        camera['input_size'] = input_controller.update(inference_time)
+
+    # Get detection count
+    detection_count = len(detections)
+    # Keep the camera's JPEG as sent, together with its detections, so snapshots pair
+    # them correctly and don't need to re-encode it
+    camera['jpeg'] = message
+    camera['frame_time'] = received
+    camera['detections'] = detections
+    analytics.update(camera['id'], detections, received.timestamp())
+    if detection_log is not None:
+        detection_log.append(camera['id'], detections, received.timestamp())
+    camera['detected_at'] = time.monotonic()
+
+    # Calculate FPS
+    frame_count += 1
+    if time.time() - fps_time >= 1.0:
+        fps = frame_count
+        frame_count = 0
+        fps_time = time.time()
+
+    # Nobody is watching the video, so skip annotation and distribution
+    if plan == DETECT:
+        return
+
+    # Store the current frame
+    async with frame_lock:
+        last_frame = frame.copy()
+
+    start = time.perf_counter()
+    processed = ai_processor.annotate(frame, detections)
+    if roi is not None:
+        roi.draw(processed)
+
+    # Add FPS text to frame if enabled
+    if settings['display_fps']:
+        cv2.putText(processed, f"FPS: {fps}", (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+
+    # Store the processed frame
+    async with frame_lock:
+        processed_frame = processed.copy()
+    record_stage(camera, 'annotate', time.perf_counter() - start)
+
+    # Mosaics draw the frame into their tile at their next render
+    for mosaic in mosaics.values():
+        mosaic.update(camera['id'], processed_frame)
+
+    # Initialize video writer if saving and not yet initialized
+    if args.save and out is None:
+        height, width = processed_frame.shape[:2]
+        out = cv2.VideoWriter(output_filename, fourcc, 20.0, (width, height))
+
+    # Save frame to video if enabled
+    if args.save:
+        out.write(processed_frame)
+
+    # Hand the frame to the display thread; it drops frames it can't show in time
+    if display is not None:
+        display.publish(processed_frame)
+
+    # Send the frame to all connected web clients
+    if web_clients and processed_frame is not None:
+        await broadcast_frame(camera)
+
+def decode_frame(message, camera):
+    """Decode a camera's JPEG frame, or return None if it is corrupt."""
+    start = time.perf_counter()
+    frame = cv2.imdecode(np.frombuffer(message, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        logging.warning("Failed to decode image")
+        return None
+    record_stage(camera, 'decode', time.perf_counter() - start)
+    return frame
+
+def run_inference(frame, roi, input_size):
+    """
+    Run the local AI processor on a frame.
+
+    Args:
+        frame (numpy.ndarray): Decoded frame
+        roi (RegionOfInterest): Camera's regions of interest, or None for the full frame
+        input_size (int): Network input size for this camera, or None to keep the current one
+
+    Returns:
+        list: Detection tuples in frame coordinates
+    """
+    if input_size is not None:
+        ai_processor.input_size = input_size
+    if roi is not None:
+        # Only look inside the camera's regions of interest
+        return roi.detect(ai_processor, frame)
+    return ai_processor.detect(frame)
+
+def load_processor(spec, confidence_threshold):
+    """Create the processor for a model spec and prepare its input sizes."""
+    processor = create_processor(spec, confidence_threshold=confidence_threshold, **model_options)
+    if adaptive_input:
+        processor.warmup(input_sizes)
+    return processor
+
+def configure_workers():
+    """Send the current model settings to the remote workers."""
+    if worker_pool is not None:
+        worker_pool.configure(model=settings['ai_model'], confidence=settings['confidence_threshold'])
+
+def start_local_workers(port):
+    """
+    Start the --local-workers inference worker processes.
+
+    Where processes can be forked, one worker loads the model and forks the others so
+    they share it; elsewhere each process loads its own copy.
+
+    Args:
+        port (int): Port the worker pool listens on
+
+    Returns:
+        list: The started processes
+    """
+    command = [sys.executable, str(Path(__file__).parent / 'inference_worker.py'),
+               '--server', f'127.0.0.1:{port}', '--model', args.model, '--confidence', str(args.confidence)]
+    # Frames carry an input size only when it adapts to load; otherwise the workers use theirs
+    for option, value in [('--model-dir', args.model_dir), ('--input-size', args.input_size),
+                          ('--input-sizes', args.input_sizes if adaptive_input else None),
+                          ('--dnn-backend', args.dnn_backend), ('--dnn-target', args.dnn_target),
+                          ('--dnn-threads', args.dnn_threads)]:
+        if value is not None:
+            command += [option, str(value)]
+    if 'fork' in multiprocessing.get_all_start_methods():
+        commands = [command + ['--name', 'local', '--processes', str(args.local_workers)]]
+    else:
+        commands = [command + ['--name', f'local-{index}'] for index in range(args.local_workers)]
+    return [subprocess.Popen(command) for command in commands]
+
+def update_concurrency():
+    """Process as many frames at once as the remote workers can take, plus one locally."""
+    scheduler.concurrency = 1 + worker_pool.capacity
+
+async def handle_display_commands():
+    """Apply key presses from the display window on the event loop."""
+    global paused
+
+    while True:
+        command = display.get_command()
+        if command is None:
+            await asyncio.sleep(0.05)
+            continue
+
+        if command == 'quit':
+            shutdown_event.set()
+        elif command == 'snapshot':
+            # Save snapshot in the background
+            take_snapshot()
+        elif command == 'pause':
+            # Toggle pause
+            paused = not paused
+        elif command == 'confidence_up':
+            # Increase confidence threshold
+            ai_processor.confidence_threshold = min(ai_processor.confidence_threshold + 0.05, 1.0)
+            settings['confidence_threshold'] = ai_processor.confidence_threshold
+            configure_workers()
+            logging.info(f"Confidence threshold: {ai_processor.confidence_threshold:.2f}")
+        elif command == 'confidence_down':
+            # Decrease confidence threshold
+            ai_processor.confidence_threshold = max(ai_processor.confidence_threshold - 0.05, 0.05)
+            settings['confidence_threshold'] = ai_processor.confidence_threshold
+            configure_workers()
+            logging.info(f"Confidence threshold: {ai_processor.confidence_threshold:.2f}")
+
+def take_snapshot(camera_id=None):
+    """
+    Queue a snapshot of a camera's latest frame.
+
+    Args:
+        camera_id (str): Camera to take the snapshot from (defaults to the most recent frame)
+
+    Returns:
+        concurrent.futures.Future: Resolves to the snapshot's index entry, or None if there is no frame
+    """
+    if camera_id is not None:
+        camera = cameras.get(camera_id)
+    else:
+        with_frames = [camera for camera in cameras.values() if 'jpeg' in camera]
+        camera = max(with_frames, key=lambda camera: camera['frame_time'], default=None)
+
+    if camera is None or 'jpeg' not in camera:
+        return None
+    return snapshot_store.save(camera['jpeg'], camera['id'], camera['detections'], camera['frame_time'])
+
+async def broadcast_frame(camera=None):
     """Broadcast the current frame to all connected web clients."""
     if not web_clients or processed_frame is None:
         return
 
     try:
         # Convert the frame to JPEG
-        _, buffer = cv2.imencode('.jpg', processed_frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        start = time.perf_counter()
+        if encode_executor is not None:
+            _, buffer = await asyncio.get_running_loop().run_in_executor(
+                encode_executor, cv2.imencode, '.jpg', processed_frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        else:
+            _, buffer = cv2.imencode('.jpg', processed_frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        record_stage(camera, 'encode', time.perf_counter() - start)
 
         # Convert to bytes
         frame_bytes = buffer.tobytes()
 
         # Send to all connected clients
         disconnected_clients = set()
-        for client in web_clients:
+        for client in list(web_clients):
             try:
-                await client.send(frame_bytes)
+                await client.send_bytes(frame_bytes)
             except Exception:
                 disconnected_clients.add(client)
 
         # Remove disconnected clients
         for client in disconnected_clients:
-            web_clients.remove(client)
+            web_clients.discard(client)
+            demand.remove(FRAMES, client)
 
     except Exception as e:
         logging.error(f"Error broadcasting frame: {e}")
@@ -223,6 +735,7 @@ async def handle_web_socket_video(request):
 
     # Add client to set
     web_clients.add(ws)
+    demand.add(FRAMES, ws)
     logging.info(f"Web client connected for video stream: {request.remote}")
 
     try:
@@ -235,24 +748,95 @@ async def handle_web_socket_video(request):
         # Remove client from set
         if ws in web_clients:
             web_clients.remove(ws)
+        demand.remove(FRAMES, ws)
         logging.info(f"Web client disconnected from video stream: {request.remote}")
 
     return ws
 
-async def handle_web_socket_control(request):
-    """Handle WebSocket connections for control commands."""
+async def handle_web_socket_mosaic(request):
+    """Stream a grid of the latest frames of several cameras (query: cameras, comma-separated)."""
+    camera_ids = tuple(filter(None, request.query.get('cameras', '').split(','))) or None
     ws = web.WebSocketResponse()
     await ws.prepare(request)
 
-    logging.info(f"Web client connected for control: {request.remote}")
+    # Viewers of the same cameras share one mosaic, rendered by one task
+    mosaic = mosaics.get(camera_ids)
+    if mosaic is None:
+        mosaic = mosaics[camera_ids] = Mosaic(camera_ids, *mosaic_size, fps=args.mosaic_fps,
+                                              quality=args.mosaic_quality)
+        mosaic.task = asyncio.ensure_future(run_mosaic(mosaic))
+    mosaic.viewers.add(ws)
+    demand.add(FRAMES, ws)
+    logging.info(f"Web client connected for mosaic of {', '.join(camera_ids or ['all cameras'])}: {request.remote}")
+
+    try:
+        # Start with the current image rather than waiting for the next change
+        if mosaic.jpeg is not None:
+            await ws.send_bytes(mosaic.jpeg)
+        async for msg in ws:
+            # We don't expect any messages from the client
+            pass
+    except Exception as e:
+        logging.error(f"Error in web socket mosaic: {e}")
+    finally:
+        mosaic.viewers.discard(ws)
+        demand.remove(FRAMES, ws)
+        if not mosaic.viewers and mosaics.get(camera_ids) is mosaic:
+            mosaic.task.cancel()
+            del mosaics[camera_ids]
+        logging.info(f"Web client disconnected from mosaic: {request.remote}")
 
-    # Send current settings to client
-    await ws.send_json({
+    return ws
+
+async def run_mosaic(mosaic):
+    """Render a mosaic at most at its frame rate and send each new image to its viewers."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = time.monotonic()
+        try:
+            jpeg = await loop.run_in_executor(encode_executor, mosaic.render)
+        except Exception as e:
+            logging.error(f"Error rendering mosaic: {e}")
+            jpeg = None
+
+        if jpeg is not None:
+            for viewer in list(mosaic.viewers):
+                try:
+                    await viewer.send_bytes(jpeg)
+                except Exception:
+                    mosaic.viewers.discard(viewer)
+        await asyncio.sleep(max(0.0, mosaic.interval - (time.monotonic() - start)))
+
+def settings_message():
+    """Build the settings message sent to control clients."""
+    models = {name: spec['description'] for name, spec in MODEL_REGISTRY.items()}
+    if settings['ai_model'] not in models:
+        # Several models running in parallel
+        models[settings['ai_model']] = f"Combined: {settings['ai_model']}"
+
+    return {
         'type': 'settings',
         'ai_model': settings['ai_model'],
         'confidence_threshold': settings['confidence_threshold'],
-        'display_fps': settings['display_fps']
-    })
+        'display_fps': settings['display_fps'],
+        'target_fps': settings['target_fps'],
+        'models': models
+    }
+
+async def handle_web_socket_control(request):
+    """Handle WebSocket connections for control commands."""
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+
+    logging.info(f"Web client connected for control: {request.remote}")
+    demand.add(DETECTIONS, ws)
+
+    # Send current settings and the full stats; later ticks only send changes
+    await ws.send_json(settings_message())
+    if stats_publisher.last is None:
+        stats_publisher.update(build_stats())
+    await ws.send_str(stats_publisher.full_message())
+    control_clients.add(ws)
 
     try:
         async for msg in ws:
@@ -267,13 +851,35 @@ async def handle_web_socket_control(request):
     except Exception as e:
         logging.error(f"Error in web socket control: {e}")
     finally:
+        control_clients.discard(ws)
+        demand.remove(DETECTIONS, ws)
         logging.info(f"Web client disconnected from control: {request.remote}")
 
     return ws
 
+def camera_stats(camera):
+    """Build the per-camera part of the stats message."""
+    stats = {'input_size': camera['input_size'], 'roi': camera.get('roi') is not None,
+             'mode': camera.get('mode'), 'stages': camera['timings'].snapshot()}
+    if camera['id'] in scheduler.cameras:
+        stats['schedule'] = scheduler.cameras[camera['id']].stats(time.monotonic())
+    if camera.get('duplicate_filter') is not None:
+        stats['duplicates'] = camera['duplicate_filter'].stats()
+    stats['analytics'] = analytics.camera_stats(camera['id'])
+    return stats
+
+def valid_model_spec(spec):
+    """Check a model spec sent by a web client."""
+    try:
+        parse_model_spec(spec)
+        return True
+    except ValueError as e:
+        logging.error(f"Invalid model: {e}")
+        return False
+
 async def handle_control_message(ws, data):
     """Handle control messages from web clients."""
-    global settings
+    global settings, ai_processor
 
     if 'command' not in data:
         return
@@ -282,20 +888,23 @@ async def handle_control_message(ws, data):
 
     if command == 'get_settings':
         # Send current settings
-        await ws.send_json({
-            'type': 'settings',
-            'ai_model': settings['ai_model'],
-            'confidence_threshold': settings['confidence_threshold'],
-            'display_fps': settings['display_fps']
-        })
+        await ws.send_json(settings_message())
 
     elif command == 'update_settings':
         # Update settings
-        if 'ai_model' in data and data['ai_model'] in ['yolov4', 'mediapipe_pose', 'mediapipe_face']:
+        if 'ai_model' in data and data['ai_model'] != settings['ai_model'] and valid_model_spec(data['ai_model']):
             settings['ai_model'] = data['ai_model']
-            ai_processor.model_name = data['ai_model']
-            # Reinitialize the AI processor with the new model
-            ai_processor.__init__(model_name=data['ai_model'], confidence_threshold=ai_processor.confidence_threshold)
+            # Replace the AI processor with one for the new model(s), loaded on the inference thread
+            previous = ai_processor
+            if local_executor is not None:
+                ai_processor = await asyncio.get_running_loop().run_in_executor(
+                    local_executor, load_processor, data['ai_model'], previous.confidence_threshold)
+            else:
+                ai_processor = load_processor(data['ai_model'], previous.confidence_threshold)
+            if hasattr(previous, 'close'):
+                previous.close()
+            for camera in cameras.values():
+                camera['input_controller'] = create_input_controller()
 
         if 'confidence_threshold' in data:
             threshold = float(data['confidence_threshold'])
@@ -306,28 +915,165 @@ async def handle_control_message(ws, data):
         if 'display_fps' in data:
             settings['display_fps'] = bool(data['display_fps'])
 
-        # Confirm settings update
-        await ws.send_json({
-            'type': 'settings',
-            'ai_model': settings['ai_model'],
-            'confidence_threshold': settings['confidence_threshold'],
-            'display_fps': settings['display_fps']
-        })
+        if data.get('target_fps') and adaptive_input:
+            target_fps = float(data['target_fps'])
+            if target_fps > 0:
+                settings['target_fps'] = target_fps
+                # Restart every camera's input size controller with the new budget
+                for camera in cameras.values():
+                    camera['input_controller'] = create_input_controller()
+
+        configure_workers()
+
+        # Confirm the settings update to every control client
+        await send_to_control_clients(json.dumps(settings_message()))
 
         logging.info(f"Settings updated: {settings}")
 
-    # Send current stats
-    await ws.send_json({
-        'type': 'stats',
-        'fps': fps
+    elif command == 'snapshot':
+        # Save a snapshot on the server and report where it can be fetched
+        future = take_snapshot(data.get('camera'))
+        if future is None:
+            await ws.send_json({'type': 'error', 'message': 'No frame available for a snapshot'})
+        else:
+            entry = await asyncio.wrap_future(future)
+            await ws.send_json({'type': 'snapshot', 'snapshot': snapshot_json(entry)})
+
+    elif command == 'set_schedule':
+        # Change a camera's inference weight, target rate or frame deadline
+        try:
+            scheduler.configure(data.get('camera'), weight=data.get('weight'),
+                                target_fps=data.get('target_fps'), deadline=data.get('deadline'))
+        except KeyError:
+            await ws.send_json({'type': 'error', 'message': f"Camera not connected: {data.get('camera')}"})
+        except (TypeError, ValueError) as e:
+            await ws.send_json({'type': 'error', 'message': str(e)})
+
+    elif command == 'get_roi':
+        # Send a camera's regions of interest
+        camera_id = data.get('camera')
+        await ws.send_json({'type': 'roi', 'camera': camera_id,
+                            'regions': roi_store.regions.get(camera_id, [])})
+
+    elif command == 'set_roi':
+        # Update and save a camera's regions of interest (an empty list clears them)
+        camera_id = data.get('camera')
+        if not camera_id:
+            await ws.send_json({'type': 'error', 'message': 'set_roi needs a camera'})
+        else:
+            try:
+                roi = roi_store.set(camera_id, data.get('regions') or [])
+            except ValueError as e:
+                await ws.send_json({'type': 'error', 'message': str(e)})
+            else:
+                if camera_id in cameras:
+                    cameras[camera_id]['roi'] = roi
+                logging.info(f"ROI for camera {camera_id}: {roi.regions if roi else 'full frame'}")
+                await ws.send_json({'type': 'roi', 'camera': camera_id,
+                                    'regions': roi.regions if roi else []})
+
+def build_stats():
+    """Collect the stats pushed to control clients."""
+    return {
+        'fps': fps,
+        'input_size': ai_processor.input_size,
+        'detections': detection_count,
+        'stages': stage_timings.snapshot(),
+        'cameras': {camera_id: camera_stats(camera) for camera_id, camera in cameras.items()},
+        'consumers': demand.stats(),
+        'workers': worker_pool.stats() if worker_pool is not None else None,
+        'mosaics': {','.join(camera_ids or ['*']): mosaic.stats() for camera_ids, mosaic in mosaics.items()}
+    }
+
+async def push_stats():
+    """Send the changed stats to all control clients on every tick."""
+    while True:
+        await asyncio.sleep(args.stats_interval)
+        if not control_clients:
+            continue
+
+        # Serialized once for all clients
+        message = stats_publisher.update(build_stats())
+        if message is not None:
+            await send_to_control_clients(message)
+
+async def send_to_control_clients(message):
+    """Send a serialized message to every control client."""
+    for client in list(control_clients):
+        try:
+            await client.send_str(message)
+        except Exception:
+            control_clients.discard(client)
+
+async def flush_detection_log():
+    """Write recorded detections to disk periodically, off the event loop."""
+    while True:
+        await asyncio.sleep(args.detection_log_flush)
+        await asyncio.get_running_loop().run_in_executor(None, detection_log.flush)
+
+def snapshot_json(entry):
+    """Add the image and thumbnail URLs to a snapshot index entry."""
+    result = dict(entry, url=f"/snapshots/{entry['id']}")
+    if 'thumbnail' in entry:
+        result['thumbnail_url'] = f"/snapshots/{entry['id']}/thumbnail"
+    return result
+
+async def handle_snapshot_list(request):
+    """List snapshots, newest first (query: offset, limit, camera)."""
+    try:
+        offset = max(0, int(request.query.get('offset', 0)))
+        limit = min(100, max(1, int(request.query.get('limit', 20))))
+    except ValueError:
+        raise web.HTTPBadRequest(text='offset and limit must be integers')
+
+    entries, total = snapshot_store.list(offset, limit, request.query.get('camera'))
+    return web.json_response({
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'snapshots': [snapshot_json(entry) for entry in entries]
     })
 
-    # Send detection count
-    await ws.send_json({
-        'type': 'detections',
-        'count': detection_count
+async def handle_snapshot_file(request):
+    """Serve a snapshot image or its precomputed thumbnail."""
+    entry = snapshot_store.get(request.match_info['snapshot_id'])
+    thumbnail = request.path.endswith('/thumbnail')
+    path = snapshot_store.path(entry, thumbnail=thumbnail) if entry is not None else None
+    if path is None or not path.exists():
+        raise web.HTTPNotFound()
+
+    # Snapshots never change once written
+    return web.FileResponse(path, headers={'Cache-Control': 'public, max-age=31536000, immutable'})
+
+async def handle_detection_query(request):
+    """Query recorded detections (query: start, end, camera, label, limit)."""
+    try:
+        start = parse_time(request.query['start']) if 'start' in request.query else None
+        end = parse_time(request.query['end']) if 'end' in request.query else None
+        limit = min(10000, max(1, int(request.query.get('limit', 1000))))
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    if detection_log is None:
+        raise web.HTTPNotFound(text='Detection log is disabled')
+
+    records, total = detection_log.query(start, end, request.query.get('camera'), request.query.get('label'), limit)
+    return web.json_response({
+        'total': total,
+        'limit': limit,
+        'detections': detection_log.to_json(records)
     })
 
+async def handle_analytics(request):
+    """Rolling per-class activity of every camera, or of one (query: camera)."""
+    camera_id = request.query.get('camera')
+    if camera_id is None:
+        cameras = analytics.stats()
+    elif camera_id in analytics.cameras:
+        cameras = {camera_id: analytics.camera_stats(camera_id)}
+    else:
+        raise web.HTTPNotFound(text=f"No frames processed from camera {camera_id}")
+    return web.json_response({'windows': [name for name, _, _ in ANALYTICS_WINDOWS], 'cameras': cameras})
+
 # Set up the web server routes
 async def setup_web_server():
     """Set up the web server with routes."""
@@ -335,10 +1081,23 @@ async def setup_web_server():
 
     # WebSocket routes
     app.router.add_get('/video', handle_web_socket_video)
+    app.router.add_get('/video/mosaic', handle_web_socket_mosaic)
     app.router.add_get('/control', handle_web_socket_control)
 
-    # Static files
-    app.router.add_static('/', Path(args.web_path), show_index=True)
+    # Snapshot listing and images
+    app.router.add_get('/snapshots', handle_snapshot_list)
+    app.router.add_get('/snapshots/{snapshot_id}', handle_snapshot_file)
+    app.router.add_get('/snapshots/{snapshot_id}/thumbnail', handle_snapshot_file)
+
+    # Recorded detections by time range, camera and label, and rolling activity
+    app.router.add_get('/detections', handle_detection_query)
+    app.router.add_get('/analytics', handle_analytics)
+
+    # Static files, fingerprinted and precompressed in memory
+    static_assets = StaticAssets(args.web_path)
+    logging.info(f"Serving {len(static_assets.assets)} web assets from memory "
+                 f"({static_assets.size() / 1024:.0f} KB with compressed variants)")
+    app.router.add_get('/{path:.*}', static_assets.handle)
 
     # Start the web server
     runner = web.AppRunner(app)
@@ -352,6 +1111,8 @@ async def setup_web_server():
 
 async def main():
     """Main function to start the WebSocket server and web server."""
+    global shutdown_event, scheduler, worker_pool, local_executor, encode_executor
+
     logging.info("AI WiFi CAM Server")
     logging.info("-----------------")
     logging.info(f"Model: {args.model}")
@@ -360,10 +1121,43 @@ async def main():
     # Start tasks
     tasks = []
 
+    # The event loop receives and decodes frames; inference and encoding get their own threads
+    if thread_budget is not None:
+        thread_budget.enter('ingest')
+        local_executor = thread_budget.executor('inference')
+        encode_executor = thread_budget.executor('encode')
+
+    # Start processing queued frames before any camera can connect
+    scheduler = InferenceScheduler(process_scheduled_frame, deadline=args.frame_deadline)
+    scheduler_task = asyncio.ensure_future(scheduler.run())
+
+    # Accept remote inference workers; each adds to the number of frames processed at once
+    worker_processes = []
+    if args.worker_port or args.local_workers:
+        local_executor = local_executor or ThreadPoolExecutor(max_workers=1)
+        worker_pool = WorkerPool(max_in_flight=args.worker_in_flight, timeout=args.worker_timeout,
+                                 on_change=update_concurrency)
+        configure_workers()
+        # Local workers connect over loopback; without --worker-port any free port will do
+        host, port = (args.host, args.worker_port) if args.worker_port else ('127.0.0.1', 0)
+        worker_server = await worker_pool.start(host, port)
+        port = worker_server.sockets[0].getsockname()[1]
+        logging.info(f"Accepting inference workers on {host}:{port}")
+        if args.local_workers:
+            worker_processes = start_local_workers(port)
+            logging.info(f"Started {args.local_workers} local inference worker(s)")
+
     # Start WebSocket server for ESP32-CAM
     logging.info(f"Starting WebSocket server on {args.host}:{args.port}")
-    cam_server = await websockets.serve(process_frames, args.host, args.port)
+    # JPEG frames don't compress, so don't negotiate per-message deflate
+    cam_server = await websockets.serve(process_frames, args.host, args.port, compression=None)
     logging.info(f"WebSocket server started on ws://{args.host}:{args.port}")
+
+    # Binary TCP ingest for cameras that don't need WebSocket framing
+    tcp_server = None
+    if args.tcp_port:
+        tcp_server = await asyncio.get_running_loop().create_server(create_tcp_receiver, args.host, args.tcp_port)
+        logging.info(f"TCP ingest server started on {args.host}:{args.tcp_port}")
     logging.info("Waiting for ESP32-CAM connection...")
 
     # Start web server if enabled
@@ -373,17 +1167,62 @@ async def main():
         web_runner = await setup_web_server()
         logging.info(f"Web interface available at http://{args.host}:{args.web_port}")
 
-    # Keep the servers running
+    # Push stats to control clients
+    stats_task = asyncio.ensure_future(push_stats())
+    flush_task = asyncio.ensure_future(flush_detection_log()) if detection_log is not None else None
+
+    # Start the local preview window and its key press handler
+    shutdown_event = asyncio.Event()
+    try:
+        # Shut down cleanly, stopping the local workers too, when a service manager stops the server
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, shutdown_event.set)
+    except NotImplementedError:
+        pass
+    display_task = None
+    if display is not None:
+        display.start()
+        display_task = asyncio.ensure_future(handle_display_commands())
+
+    # Keep the servers running until asked to quit
     try:
-        await asyncio.Future()  # Run forever
+        await shutdown_event.wait()
     finally:
         # Cleanup
+        scheduler_task.cancel()
+        stats_task.cancel()
+        if flush_task is not None:
+            flush_task.cancel()
+        if display_task is not None:
+            display_task.cancel()
+            display.stop()
+
         cam_server.close()
         await cam_server.wait_closed()
+        if tcp_server is not None:
+            tcp_server.close()
+        if worker_pool is not None:
+            worker_pool.close()
+        for process in worker_processes:
+            process.terminate()
+        for process in worker_processes:
+            process.wait()
+        # Let the pool notice the closed connections before the event loop stops
+        for _ in range(100):
+            if worker_pool is None or not worker_pool.workers:
+                break
+            await asyncio.sleep(0.01)
+        for executor in [local_executor, encode_executor]:
+            if executor is not None:
+                executor.shutdown(wait=True)
 
         if web_runner:
             await web_runner.cleanup()
 
+        # Finish writing any queued snapshots and the recorded detections
+        snapshot_store.close()
+        if detection_log is not None:
+            detection_log.close()
+
 if __name__ == "__main__":
     try:
         # Check if web directory exists
@@ -398,11 +1237,7 @@ if __name__ == "__main__":
         logging.info("Server stopped by user")
         if args.save and 'out' in locals() and out is not None:
             out.release()
-        if args.display:
-            cv2.destroyAllWindows()
     except Exception as e:
         logging.error(f"Error: {e}")
         if args.save and 'out' in locals() and out is not None:
             out.release()
-        if args.display:
-            cv2.destroyAllWindows()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Binary TCP Ingest for the AI WiFi CAM Server
+
+An alternative to the camera WebSocket: cameras open a plain TCP connection
+and send each JPEG frame behind a small fixed header. There is no WebSocket
+handshake, framing or masking, and the receiver reads straight into its
+buffers with asyncio.BufferedProtocol instead of assembling messages from
+chunks.
+
+Every frame on the wire is:
+
+    offset  size  field
+    0       2     magic b'AC'
+    2       1     protocol version (1)
+    3       1     length of the camera ID in bytes (0 to use the sender's IP address)
+    4       4     sequence number (wraps around)
+    8       8     timestamp in microseconds on the sender's clock
+    16      4     JPEG length in bytes
+    20      n     camera ID (UTF-8)
+    20 + n  len   JPEG data
+
+All integers are big-endian. The server sends rate control commands back on
+the same connection as one JSON object per line.
+
+Reads go into one buffer that is reused for the whole connection; headers
+are parsed in place and a single read usually holds several frames. Each
+JPEG gets a buffer of exactly its size, which is handed to the pipeline
+without another copy; when most of a large JPEG is still missing, it is
+received straight into that buffer. The pipeline keeps frames after they
+are received (in the scheduler queue, for snapshots and duplicate checks),
+so JPEG buffers are not recycled.
+"""
+
+import asyncio
+import json
+import logging
+import struct
+import time
+from collections import namedtuple
+
+MAGIC = b'AC'
+VERSION = 1
+HEADER = struct.Struct('!2sBBIQI')
+MAX_CAMERA_ID_LENGTH = 255
+MAX_FRAME_SIZE = 4 * 1024 * 1024
+
+# A received frame; data is a bytearray holding the JPEG
+Frame = namedtuple('Frame', ['camera_id', 'sequence', 'timestamp_us', 'data'])
+
+
+def pack_header(camera_id, sequence, timestamp_us, length):
+    """
+    Build the header (including the camera ID) sent in front of a JPEG.
+
+    Args:
+        camera_id (str): Camera ID, or '' to be identified by IP address
+        sequence (int): Frame sequence number
+        timestamp_us (int): Capture time in microseconds
+        length (int): JPEG length in bytes
+
+    Returns:
+        bytes: Header followed by the camera ID
+    """
+    name = camera_id.encode('utf-8')
+    if len(name) > MAX_CAMERA_ID_LENGTH:
+        raise ValueError(f"Camera ID is longer than {MAX_CAMERA_ID_LENGTH} bytes")
+    return HEADER.pack(MAGIC, VERSION, len(name), sequence & 0xFFFFFFFF,
+                       timestamp_us & 0xFFFFFFFFFFFFFFFF, length) + name
+
+
+class FrameReceiver(asyncio.BufferedProtocol):
+    """Protocol receiving length-prefixed frames from one camera connection."""
+
+    def __init__(self, on_frame, on_close=None, max_frame_size=MAX_FRAME_SIZE, buffer_size=65536):
+        """
+        Initialize the receiver.
+
+        Args:
+            on_frame (callable): Called as on_frame(receiver, frame) for every complete Frame
+            on_close (callable): Called as on_close(receiver) when the connection is closed
+            max_frame_size (int): Largest JPEG accepted; larger ones close the connection
+            buffer_size (int): Size of the reused receive buffer
+        """
+        self.on_frame = on_frame
+        self.on_close = on_close
+        self.max_frame_size = max_frame_size
+        self.transport = None
+        self.peer = None
+
+        # Reused for every read except the bulk of large JPEGs
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._filled = 0
+
+        # Frame being received: header fields, JPEG buffer and bytes received so far
+        self._fields = None
+        self._data = None
+        self._received = 0
+
+        # Counters
+        self.frames = 0
+        self.bytes = 0
+        self.lost = 0
+        self._last_sequence = None
+
+    def connection_made(self, transport):
+        """Remember the transport and the sender's address."""
+        self.transport = transport
+        self.peer = transport.get_extra_info('peername')
+
+    def get_buffer(self, sizehint):
+        """Return the buffer to receive into: the JPEG itself if much of it is missing, else the reused buffer."""
+        if self._data is not None and len(self._data) - self._received >= len(self._buffer):
+            return memoryview(self._data)[self._received:]
+        return self._view[self._filled:]
+
+    def buffer_updated(self, nbytes):
+        """Take every complete header and all JPEG data out of the received bytes."""
+        self.bytes += nbytes
+        if self._data is not None and self._filled == 0 and len(self._data) - self._received >= len(self._buffer):
+            # Received straight into the JPEG buffer
+            self._received += nbytes
+            if self._received == len(self._data):
+                self._finish_frame()
+            return
+
+        self._filled += nbytes
+        position = 0
+        while True:
+            if self._data is not None:
+                # Copy the JPEG data that came with the header
+                count = min(len(self._data) - self._received, self._filled - position)
+                self._data[self._received:self._received + count] = self._view[position:position + count]
+                self._received += count
+                position += count
+                if self._received < len(self._data):
+                    break
+                self._finish_frame()
+
+            if self._filled - position < HEADER.size:
+                break
+            magic, version, id_length, sequence, timestamp_us, length = HEADER.unpack_from(self._buffer, position)
+            if magic != MAGIC or version != VERSION:
+                self._fail(f"unknown frame header {bytes(self._view[position:position + 4])!r}")
+                return
+            if length > self.max_frame_size:
+                self._fail(f"frame of {length} bytes exceeds the limit of {self.max_frame_size}")
+                return
+            if self._filled - position < HEADER.size + id_length:
+                break
+
+            camera_id = self._view[position + HEADER.size:position + HEADER.size + id_length]
+            self._fields = (bytes(camera_id).decode('utf-8', 'replace'), sequence, timestamp_us)
+            self._data = bytearray(length)
+            self._received = 0
+            position += HEADER.size + id_length
+
+        # Keep an incomplete header for the next read
+        remaining = self._filled - position
+        if remaining and position:
+            self._buffer[:remaining] = bytes(self._view[position:self._filled])
+        self._filled = remaining
+
+    def _finish_frame(self):
+        """Deliver the completed frame."""
+        camera_id, sequence, timestamp_us = self._fields
+        data = self._data
+        self._data = None
+
+        # Count frames the sender numbered but that never arrived (e.g. dropped on the camera)
+        if self._last_sequence is not None:
+            gap = (sequence - self._last_sequence - 1) & 0xFFFFFFFF
+            if gap < 0x80000000:
+                self.lost += gap
+        self._last_sequence = sequence
+        self.frames += 1
+
+        self.on_frame(self, Frame(camera_id, sequence, timestamp_us, data))
+
+    def _fail(self, reason):
+        """Close a connection that does not speak the protocol."""
+        logging.warning(f"Closing TCP ingest connection from {self.peer}: {reason}")
+        self._filled = 0
+        self.transport.abort()
+
+    def send_command(self, command):
+        """Send a JSON command (e.g. rate control) to the camera."""
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.write(json.dumps(command).encode('utf-8') + b'\n')
+
+    def connection_lost(self, exc):
+        """Report the closed connection."""
+        if self.on_close is not None:
+            self.on_close(self)
+
+    def stats(self):
+        """Return the connection's counters."""
+        return {'frames': self.frames, 'bytes': self.bytes, 'lost': self.lost}
+
+
+class FrameSender:
+    """Client side of the protocol, used by the camera simulator and the benchmark."""
+
+    def __init__(self, camera_id=''):
+        """
+        Initialize the sender.
+
+        Args:
+            camera_id (str): Camera ID sent with every frame ('' to be identified by IP address)
+        """
+        self.camera_id = camera_id
+        self.sequence = 0
+        self.reader = None
+        self.writer = None
+
+    async def connect(self, host, port):
+        """Open the connection to the server."""
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+
+    async def send(self, jpeg, timestamp_us=None):
+        """
+        Send one JPEG frame.
+
+        Args:
+            jpeg (bytes): JPEG-encoded frame
+            timestamp_us (int): Capture time in microseconds (defaults to now)
+        """
+        if timestamp_us is None:
+            timestamp_us = int(time.time() * 1000000)
+        self.writer.write(pack_header(self.camera_id, self.sequence, timestamp_us, len(jpeg)))
+        self.writer.write(jpeg)
+        self.sequence += 1
+        await self.writer.drain()
+
+    async def commands(self):
+        """Yield the JSON commands sent by the server until the connection closes."""
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+    async def close(self):
+        """Close the connection."""
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
@@ -14,7 +14,10 @@ import argparse
 import time
 import os
 import logging
+import json
 from pathlib import Path
+from rate_control import FRAME_SIZE_DIMENSIONS
+from tcp_ingest import FrameSender
 
 # Configure logging
 logging.basicConfig(
@@ -26,78 +29,145 @@ logging.basicConfig(
 parser = argparse.ArgumentParser(description='AI WiFi CAM Web Interface Test')
 parser.add_argument('--host', type=str, default='localhost', help='Server host')
 parser.add_argument('--port', type=int, default=8888, help='Server port')
+parser.add_argument('--transport', choices=['websocket', 'tcp'], default='websocket',
+                    help='Send frames over a WebSocket or the binary TCP ingest protocol')
+parser.add_argument('--tcp-port', type=int, default=8889, help='Server TCP ingest port (with --transport tcp)')
+parser.add_argument('--camera-id', type=str, default='', help='Camera ID to send (default: identified by IP address)')
 parser.add_argument('--video', type=str, default='0', help='Video source (0 for webcam, or path to video file)')
 parser.add_argument('--fps', type=int, default=15, help='Target FPS for sending frames')
 args = parser.parse_args()
 
+# Camera settings, updated by rate control commands from the server
+camera_settings = {
+    'frame_delay': 1.0 / args.fps,
+    'framesize': None,  # None keeps the source resolution
+    'quality': 80
+}
+
+async def websocket_commands(websocket):
+    """Yield the JSON commands sent by the server over the WebSocket."""
+    async for message in websocket:
+        if not isinstance(message, str):
+            continue
+        try:
+            yield json.loads(message)
+        except json.JSONDecodeError:
+            continue
+
+async def receive_commands(commands):
+    """Apply rate control commands sent back by the server, like the ESP32-CAM does."""
+    async for command in commands:
+        if command.get('type') != 'rate_control':
+            continue
+
+        if command.get('interval_ms'):
+            camera_settings['frame_delay'] = command['interval_ms'] / 1000.0
+        if command.get('framesize') in FRAME_SIZE_DIMENSIONS:
+            camera_settings['framesize'] = command['framesize']
+        if 'quality' in command:
+            # ESP32 quality is 0-63 with lower meaning better; map it to OpenCV's 0-100
+            camera_settings['quality'] = max(10, 100 - int(command['quality']) * 1.5)
+
+        logging.info(f"Rate control: {command}")
+
 async def send_frames():
     """Send video frames to the server."""
-    # Connect to the server
-    uri = f"ws://{args.host}:{args.port}"
+    if args.transport == 'tcp':
+        # Binary TCP ingest: header and JPEG, commands come back as JSON lines
+        logging.info(f"Connecting to {args.host}:{args.tcp_port} (TCP ingest)")
+        sender = FrameSender(args.camera_id)
+        try:
+            await sender.connect(args.host, args.tcp_port)
+            logging.info("Connected to server")
+            await stream_video(sender.send, sender.commands())
+        except ConnectionError as e:
+            logging.error(f"Connection closed: {e}")
+        finally:
+            await sender.close()
+        return
+
+    # Connect to the server; the WebSocket path is the camera ID
+    uri = f"ws://{args.host}:{args.port}/{args.camera_id}"
     logging.info(f"Connecting to {uri}")
     
     try:
         async with websockets.connect(uri) as websocket:
             logging.info("Connected to server")
+            await stream_video(websocket.send, websocket_commands(websocket))
+    
+    except websockets.exceptions.ConnectionClosed:
+        logging.error("Connection closed")
+    except Exception as e:
+        logging.error(f"Error: {e}")
+
+async def stream_video(send, commands):
+    """
+    Read, encode and send video frames until stopped.
+
+    Args:
+        send (callable): Coroutine function sending one JPEG frame
+        commands: Async iterator over the commands sent by the server
+    """
+    # Open video source
+    if args.video.isdigit():
+        cap = cv2.VideoCapture(int(args.video))
+        logging.info(f"Using webcam {args.video}")
+    else:
+        cap = cv2.VideoCapture(args.video)
+        logging.info(f"Using video file: {args.video}")
+    
+    if not cap.isOpened():
+        logging.error("Failed to open video source")
+        return
+    
+    # Listen for rate control commands while sending
+    command_task = asyncio.ensure_future(receive_commands(commands))
+    
+    try:
+        while True:
+            start_time = time.time()
             
-            # Open video source
-            if args.video.isdigit():
-                cap = cv2.VideoCapture(int(args.video))
-                logging.info(f"Using webcam {args.video}")
-            else:
-                cap = cv2.VideoCapture(args.video)
-                logging.info(f"Using video file: {args.video}")
+            # Read a frame
+            ret, frame = cap.read()
+            if not ret:
+                if args.video.isdigit():
+                    # For webcam, continue even if a frame is missed
+                    continue
+                else:
+                    # For video file, loop back to the beginning
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
             
-            if not cap.isOpened():
-                logging.error("Failed to open video source")
-                return
+            # Scale to the frame size requested by the server
+            if camera_settings['framesize'] is not None:
+                frame = cv2.resize(frame, FRAME_SIZE_DIMENSIONS[camera_settings['framesize']],
+                                   interpolation=cv2.INTER_AREA)
             
-            # Calculate frame delay based on target FPS
-            frame_delay = 1.0 / args.fps
+            # Encode frame as JPEG
+            _, buffer = cv2.imencode('.jpg', frame,
+                                     [cv2.IMWRITE_JPEG_QUALITY, int(camera_settings['quality'])])
             
-            try:
-                while True:
-                    start_time = time.time()
-                    
-                    # Read a frame
-                    ret, frame = cap.read()
-                    if not ret:
-                        if args.video.isdigit():
-                            # For webcam, continue even if a frame is missed
-                            continue
-                        else:
-                            # For video file, loop back to the beginning
-                            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                            continue
-                    
-                    # Encode frame as JPEG
-                    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-                    
-                    # Send frame to server
-                    await websocket.send(buffer.tobytes())
-                    
-                    # Display the frame locally
-                    cv2.imshow('Test Video Source', frame)
-                    
-                    # Check for key press
-                    key = cv2.waitKey(1) & 0xFF
-                    if key == ord('q'):
-                        break
-                    
-                    # Calculate time to wait to maintain target FPS
-                    elapsed = time.time() - start_time
-                    wait_time = max(0, frame_delay - elapsed)
-                    await asyncio.sleep(wait_time)
+            # Send frame to server
+            await send(buffer.tobytes())
             
-            finally:
-                # Clean up
-                cap.release()
-                cv2.destroyAllWindows()
+            # Display the frame locally
+            cv2.imshow('Test Video Source', frame)
+            
+            # Check for key press
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord('q'):
+                break
+            
+            # Calculate time to wait to maintain target FPS
+            elapsed = time.time() - start_time
+            wait_time = max(0, camera_settings['frame_delay'] - elapsed)
+            await asyncio.sleep(wait_time)
     
-    except websockets.exceptions.ConnectionClosed:
-        logging.error("Connection closed")
-    except Exception as e:
-        logging.error(f"Error: {e}")
+    finally:
+        # Clean up
+        command_task.cancel()
+        cap.release()
+        cv2.destroyAllWindows()
 
 async def main():
     """Main function."""
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tiny model files for tests.
+
+The real YOLO weights are hundreds of megabytes, so tests build small but
+valid networks with the same file layout instead. They produce meaningless
+detections but exercise the real OpenCV DNN code paths.
+"""
+
+import numpy as np
+
+TEST_CLASSES = ["person", "car", "chair", "book"]
+
+TINY_YOLO_CFG = """[net]
+batch=1
+subdivisions=1
+width=416
+height=416
+channels=3
+
+[convolutional]
+filters=8
+size=3
+stride=2
+pad=1
+activation=leaky
+
+[maxpool]
+size=2
+stride=2
+
+[convolutional]
+size=1
+stride=1
+pad=1
+filters=27
+activation=linear
+
+[yolo]
+mask = 0,1,2
+anchors = 10,14,  23,27,  37,58
+classes=4
+num=3
+"""
+
+def write_tiny_yolo(model_dir, cfg_name="yolov4-tiny.cfg", weights_name="yolov4-tiny.weights"):
+    """
+    Write a tiny Darknet YOLO network and coco.names into model_dir.
+
+    The file names default to the ones registered for yolov4_tiny, so
+    AIProcessor('yolov4_tiny', model_dir=model_dir) loads the tiny network.
+    """
+    (model_dir / cfg_name).write_text(TINY_YOLO_CFG)
+    (model_dir / "coco.names").write_text("\n".join(TEST_CLASSES) + "\n")
+
+    # Darknet header (major, minor, revision, images seen) followed by float32
+    # weights: conv 3->8 (3x3, with bias) and conv 8->27 (1x1, with bias)
+    count = (8 * 3 * 3 * 3 + 8) + (27 * 8 + 27)
+    weights = np.random.RandomState(0).randn(count).astype(np.float32) * 0.5
+    header = np.array([0, 2, 0], dtype=np.int32).tobytes() + np.array([0], dtype=np.int64).tobytes()
+    (model_dir / weights_name).write_bytes(header + weights.tobytes())
+
+def write_tiny_onnx(path, output_format='yolov5', input_size=64):
+    """
+    Write a tiny ONNX YOLO-like network with the given output layout.
+
+    Requires the onnx package.
+
+    Args:
+        path (Path): Output file
+        output_format (str): 'yolov5' for (1, N, 5 + classes) or 'yolov8' for (1, 4 + classes, N)
+        input_size (int): Fixed square input size (multiple of 8)
+    """
+    import onnx
+    from onnx import helper, numpy_helper, TensorProto
+
+    channels = 5 + len(TEST_CLASSES) if output_format == 'yolov5' else 4 + len(TEST_CLASSES)
+    cells = (input_size // 8) ** 2
+    rng = np.random.RandomState(0)
+    conv_weights = numpy_helper.from_array(
+        (rng.randn(channels, 3, 8, 8) * 0.1).astype(np.float32), name='W')
+    shape = numpy_helper.from_array(np.array([1, channels, cells], dtype=np.int64), name='shape')
+
+    nodes = [
+        helper.make_node('Conv', ['images', 'W'], ['conv'], kernel_shape=[8, 8], strides=[8, 8]),
+        helper.make_node('Sigmoid', ['conv'], ['sig']),
+        helper.make_node('Reshape', ['sig', 'shape'], ['flat'])
+    ]
+    if output_format == 'yolov5':
+        nodes.append(helper.make_node('Transpose', ['flat'], ['output'], perm=[0, 2, 1]))
+        output_shape = [1, cells, channels]
+    else:
+        nodes.append(helper.make_node('Identity', ['flat'], ['output']))
+        output_shape = [1, channels, cells]
+
+    graph = helper.make_graph(
+        nodes, 'tiny_yolo',
+        [helper.make_tensor_value_info('images', TensorProto.FLOAT, [1, 3, input_size, input_size])],
+        [helper.make_tensor_value_info('output', TensorProto.FLOAT, output_shape)],
+        initializer=[conv_weights, shape])
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 11)])
+    model.ir_version = 7
+    onnx.save(model, str(path))
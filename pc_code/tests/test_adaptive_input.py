@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the adaptive input size module.
+
+This module contains tests for the InputSizeController class.
+"""
+
+import unittest
+import sys
+from pathlib import Path
+
+# Add parent directory to path to import adaptive_input
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from adaptive_input import InputSizeController
+
+def simulated_time(size, time_at_416=0.1):
+    """Inference time that scales with the pixel count, like a real network."""
+    return time_at_416 * (size * size) / (416 * 416)
+
+class TestInputSizeController(unittest.TestCase):
+    """Test cases for the InputSizeController class."""
+
+    def test_requires_budget(self):
+        """Test that a target FPS or latency budget is required."""
+        with self.assertRaises(ValueError):
+            InputSizeController()
+
+    def test_steps_down_under_load(self):
+        """Test that the size drops until inference fits the budget."""
+        # 100 ms at 416 but only 50 ms allowed
+        controller = InputSizeController(target_fps=20, hold_frames=3)
+        for _ in range(100):
+            controller.update(simulated_time(controller.size))
+
+        self.assertLessEqual(simulated_time(controller.size), controller.budget)
+        self.assertEqual(controller.size, 256)
+
+    def test_steps_up_with_headroom(self):
+        """Test that the size grows back when there is spare time."""
+        controller = InputSizeController(latency_budget_ms=250, initial_size=256, hold_frames=3)
+        for _ in range(100):
+            controller.update(simulated_time(controller.size))
+
+        # 512 takes ~151 ms which fits 70% of 250 ms; 608 (~214 ms) does not
+        self.assertEqual(controller.size, 512)
+
+    def test_stable_when_within_budget(self):
+        """Test that a size that fits without headroom for the next one is kept."""
+        controller = InputSizeController(latency_budget_ms=120, hold_frames=3)
+        sizes = set()
+        for _ in range(100):
+            sizes.add(controller.update(simulated_time(controller.size)))
+
+        self.assertEqual(sizes, {416})
+
+    def test_tighter_budget_wins(self):
+        """Test that the tighter of target FPS and latency budget is used."""
+        controller = InputSizeController(target_fps=10, latency_budget_ms=50)
+        self.assertAlmostEqual(controller.budget, 0.05)
+
+if __name__ == "__main__":
+    unittest.main()
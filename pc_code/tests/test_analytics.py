@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the analytics module.
+
+This module contains tests for the RollingWindow ring buffer and the
+per-camera, per-class counts, occupancy and dwell times of Analytics.
+"""
+
+import unittest
+import sys
+from pathlib import Path
+
+# Add parent directory to path to import analytics
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from model_backends import Detection
+from analytics import Analytics, RollingWindow
+
+START = 1700000000.0
+
+def detections(*labels):
+    """Build a frame's detections from class labels."""
+    return [Detection(label, 0.9, (0, 0, 10, 10)) for label in labels]
+
+class TestRollingWindow(unittest.TestCase):
+    """Test cases for the RollingWindow class."""
+
+    def test_buckets_expire(self):
+        """Test that values leave the window bucket by bucket."""
+        window = RollingWindow(10, 10, sums=1, maxima=1)
+        for second in range(10):
+            window.add(START + second, (1,), (second,))
+        self.assertEqual(window.values(START + 9.5), ([10], [9]))
+        self.assertEqual(window.values(START + 12), ([7], [9]))
+        # Long after: everything expired, touching each bucket once
+        self.assertEqual(window.values(START + 10 ** 6), ([0], [0]))
+
+    def test_clock_stepping_back(self):
+        """Test that values from before the newest bucket are counted in it."""
+        window = RollingWindow(10, 10)
+        window.add(START + 5, (1,))
+        window.add(START + 2, (1,))
+        self.assertEqual(window.values(START + 14.5)[0], [2])
+        self.assertEqual(window.values(START + 15)[0], [0])
+
+class TestAnalytics(unittest.TestCase):
+    """Test cases for the Analytics class."""
+
+    def setUp(self):
+        """Set up analytics with a controllable clock."""
+        self.now = START
+        self.analytics = Analytics(gap=2.0, clock=lambda: self.now)
+
+    def feed(self, frames, fps=10):
+        """Feed a list of per-frame label lists to cam1 at fps, advancing the clock."""
+        for labels in frames:
+            self.analytics.update('cam1', detections(*labels), self.now)
+            self.now += 1 / fps
+
+    def test_counts_occupancy_and_dwell(self):
+        """Test visits, peak and mean occupancy, presence and dwell per class."""
+        # 5 s with two persons, 5 s with a car only, then a person again for 3 s
+        self.feed([['person', 'person']] * 50 + [['car']] * 50 + [['person']] * 30)
+        stats = self.analytics.camera_stats('cam1')
+
+        person = stats['person']
+        self.assertTrue(person['present'])
+        self.assertAlmostEqual(person['dwell_s'], 2.9)
+        self.assertEqual(person['1m']['visits'], 2)
+        self.assertEqual(person['1m']['detections'], 130)
+        self.assertEqual(person['1m']['peak'], 2)
+        self.assertEqual(person['1m']['mean'], 1.0)
+        self.assertEqual(person['1m']['presence_s'], 7.9)
+        self.assertEqual(person['1m']['longest_dwell_s'], 4.9)
+
+        car = stats['car']
+        self.assertFalse(car['present'])
+        self.assertEqual(car['dwell_s'], 0)
+        self.assertEqual(car['1h']['visits'], 1)
+
+    def test_short_gaps_continue_a_visit(self):
+        """Test that missed detections shorter than the gap don't start a new visit."""
+        self.feed([['person']] * 10 + [[]] * 15 + [['person']] * 10)
+        self.assertEqual(self.analytics.camera_stats('cam1')['person']['1m']['visits'], 1)
+        self.feed([[]] * 25 + [['person']])
+        self.assertEqual(self.analytics.camera_stats('cam1')['person']['1m']['visits'], 2)
+
+    def test_windows(self):
+        """Test that old activity leaves the short windows first."""
+        self.feed([['person']] * 10)
+        self.now += 120
+        stats = self.analytics.camera_stats('cam1')['person']
+        self.assertEqual(stats['1m']['detections'], 0)
+        self.assertEqual(stats['1m']['mean'], 0)
+        self.assertEqual(stats['15m']['detections'], 10)
+        self.assertEqual(stats['1h']['visits'], 1)
+
+    def test_constant_memory(self):
+        """Test that a day of frames keeps the same number of buckets."""
+        camera = None
+        for _ in range(24):
+            # 36 frames an hour
+            self.feed([['person', 'car']] * 36, fps=0.01)
+            camera = camera or self.analytics.cameras['cam1']
+        self.assertEqual(sorted(camera.classes), ['car', 'person'])
+        for window in list(camera.frames.values()) + list(camera.classes['person'].windows.values()):
+            self.assertEqual(len(window._slots), 60)
+        # The frame an hour before now has just left the window
+        self.assertEqual(camera.stats(self.now)['person']['1h']['detections'], 35)
+
+    def test_cameras(self):
+        """Test that cameras are kept apart."""
+        self.analytics.update('cam1', detections('person'), self.now)
+        self.analytics.update('cam2', detections('dog'), self.now)
+        self.assertEqual(list(self.analytics.stats()), ['cam1', 'cam2'])
+        self.assertEqual(list(self.analytics.camera_stats('cam2')), ['dog'])
+        self.assertIsNone(self.analytics.camera_stats('cam3'))
+
+if __name__ == "__main__":
+    unittest.main()
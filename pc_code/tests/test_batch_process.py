@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the batch_process module.
+
+This module contains tests for offline batch processing of a video file,
+a JPEG directory and an MJPEG archive with a tiny generated YOLO network,
+including resuming an interrupted run.
+"""
+
+import unittest
+import json
+import sys
+import tempfile
+import shutil
+import cv2
+import numpy as np
+from pathlib import Path
+
+# Add parent directory to path to import batch_process
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from ai_processor import AIProcessor
+from batch_process import run_batch, iter_mjpeg, load_progress
+from tests.model_fixtures import write_tiny_yolo
+
+class TestBatchProcess(unittest.TestCase):
+    """Test cases for run_batch and its input readers."""
+
+    def setUp(self):
+        """Write a tiny YOLO network and inputs of each kind."""
+        self.directory = Path(tempfile.mkdtemp())
+        write_tiny_yolo(self.directory)
+        rng = np.random.RandomState(0)
+        self.frames = [cv2.resize(rng.randint(0, 255, (24, 32, 3), dtype=np.uint8), (320, 240))
+                       for _ in range(6)]
+        self.jpegs = [cv2.imencode('.jpg', frame)[1].tobytes() for frame in self.frames]
+
+        self.images = self.directory / 'images'
+        self.images.mkdir()
+        for index, jpeg in enumerate(self.jpegs):
+            (self.images / f"frame_{index:02d}.jpg").write_bytes(jpeg)
+            (self.images / f"frame_{index:02d}_thumb.jpg").write_bytes(jpeg)
+
+        # Multipart stream as saved from an HTTP MJPEG server
+        self.mjpeg = self.directory / 'stream.mjpeg'
+        self.mjpeg.write_bytes(b''.join(b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n'
+                                        for jpeg in self.jpegs))
+
+        self.video = self.directory / 'clip.avi'
+        writer = cv2.VideoWriter(str(self.video), cv2.VideoWriter_fourcc(*'MJPG'), 5.0, (320, 240))
+        for frame in self.frames:
+            writer.write(frame)
+        writer.release()
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        shutil.rmtree(self.directory)
+
+    def run_batch(self, inputs, output, workers=2, **options):
+        """Run the tiny model over inputs (with two worker processes by default)."""
+        return run_batch([str(path) for path in inputs], output, model='yolov4_tiny', confidence=0.3,
+                         workers=workers, prefetch=3, model_dir=self.directory, **options)
+
+    def read_output(self, output):
+        """Return the records of an output file."""
+        return [json.loads(line) for line in Path(output).read_text().splitlines()]
+
+    def test_mjpeg_reader(self):
+        """Test that frames are split out of a multipart stream, also across read chunks."""
+        self.assertEqual(list(iter_mjpeg(self.mjpeg, chunk_size=1000)), self.jpegs)
+
+    def test_inputs_match_local_inference(self):
+        """Test that every input kind yields the same detections as running the model directly."""
+        output = self.directory / 'detections.jsonl'
+        video = self.directory / 'annotated.avi'
+        summary = self.run_batch([self.video, self.images, self.mjpeg], output, annotated_video=str(video))
+        self.assertEqual(summary['frames'], 18)
+
+        records = self.read_output(output)
+        self.assertEqual([(Path(record['source']).name, record['frame']) for record in records],
+                         [(name, index) for name in ['clip.avi', 'images', 'stream.mjpeg'] for index in range(6)])
+        self.assertEqual(records[1]['time_s'], 0.2)
+        self.assertEqual(records[6]['name'], 'frame_00.jpg')
+        self.assertEqual(records[6]['shape'], [240, 320])
+
+        processor = AIProcessor('yolov4_tiny', confidence_threshold=0.3, model_dir=self.directory)
+        for record, jpeg in zip(records[6:12], self.jpegs):
+            expected = processor.detect(cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR))
+            self.assertEqual([(detection['label'], detection['box']) for detection in record['detections']],
+                             [(detection.label, list(detection.box)) for detection in expected])
+        self.assertEqual(records[6]['detections'], records[12]['detections'])
+
+        capture = cv2.VideoCapture(str(video))
+        self.assertEqual(int(capture.get(cv2.CAP_PROP_FRAME_COUNT)), 18)
+        capture.release()
+
+    def test_resume(self):
+        """Test that a resumed run continues after the frames already written."""
+        output = self.directory / 'detections.jsonl'
+        self.run_batch([self.images, self.video], output)
+        complete = output.read_text()
+
+        # Interrupted during the video, in the middle of writing a line
+        lines = complete.splitlines(keepends=True)
+        output.write_text(''.join(lines[:8]) + lines[8][:10])
+        self.assertEqual(load_progress(output), {str(self.images): 6, str(self.video): 2})
+        self.assertEqual(len(output.read_text().splitlines()), 8)
+
+        # Resumed with a single worker, which runs on a thread
+        summary = self.run_batch([self.images, self.video], output, workers=1, resume=True)
+        self.assertEqual(summary['frames'], 4)
+        self.assertEqual(output.read_text(), complete)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the demand module.
+
+This module contains tests for the Demand class.
+"""
+
+import unittest
+import sys
+from pathlib import Path
+
+# Add parent directory to path to import demand
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from demand import Demand, FRAMES, DETECTIONS, IDLE, DETECT, FULL
+
+class FakeClock:
+    """Clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+class TestDemand(unittest.TestCase):
+    """Test cases for the Demand class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.clock = FakeClock()
+        self.demand = Demand(detection_interval=1.0, clock=self.clock)
+
+    def test_idle_without_consumers(self):
+        """Test that frames are dropped when nobody is listening."""
+        self.assertEqual(self.demand.plan(), IDLE)
+        self.assertEqual(self.demand.stats(), {FRAMES: 0, DETECTIONS: 0})
+
+    def test_viewers_get_full_processing(self):
+        """Test that every frame is fully processed while someone watches the video."""
+        self.demand.add(FRAMES, 'viewer')
+        self.demand.add(DETECTIONS, 'control')
+        self.assertEqual(self.demand.plan(self.clock.now), FULL)
+
+    def test_detection_subscribers_get_reduced_rate(self):
+        """Test that detection-only consumers get detections at the configured interval."""
+        self.demand.add(DETECTIONS, 'control')
+        self.assertEqual(self.demand.plan(None), DETECT)
+
+        last_detection = self.clock.now
+        self.clock.now += 0.5
+        self.assertEqual(self.demand.plan(last_detection), IDLE)
+        self.clock.now += 0.5
+        self.assertEqual(self.demand.plan(last_detection), DETECT)
+
+    def test_remove_consumers(self):
+        """Test that removing the last consumer returns to idle."""
+        self.demand.add(FRAMES, 'viewer')
+        self.demand.add(FRAMES, 'viewer')
+        self.assertEqual(self.demand.count(FRAMES), 1)
+        self.demand.remove(FRAMES, 'viewer')
+        self.demand.remove(FRAMES, 'viewer')
+        self.assertEqual(self.demand.plan(), IDLE)
+
+if __name__ == "__main__":
+    unittest.main()
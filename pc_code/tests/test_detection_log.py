@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the detection_log module.
+
+This module contains tests for appending detections to segment files,
+querying them by time range, camera and label, and reopening the log
+after a flush.
+"""
+
+import unittest
+import shutil
+import sys
+import tempfile
+from datetime import datetime, date
+from pathlib import Path
+
+# Add parent directory to path to import detection_log
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from model_backends import Detection
+from detection_log import DetectionLog, parse_time
+
+START = datetime(2024, 5, 17, 14, 0).timestamp()
+
+class TestDetectionLog(unittest.TestCase):
+    """Test cases for the DetectionLog class."""
+
+    def setUp(self):
+        """Set up a log with small segments."""
+        self.root = Path(tempfile.mkdtemp())
+        self.log = DetectionLog(self.root, segment_rows=100)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.root)
+
+    def fill(self, log, frames=120):
+        """Append one frame per minute alternating between two cameras: a person, plus a car every third frame."""
+        for frame in range(frames):
+            detections = [Detection('person', 0.9, (frame, 20, 30, 40))]
+            if frame % 3 == 0:
+                detections.append(Detection('car', 0.6, (100, 200, 50, 60)))
+            log.append(f"cam{frame % 2 + 1}", detections, START + frame * 60)
+
+    def test_segments_roll_over(self):
+        """Test that rows spill into new segments of the configured size."""
+        self.fill(self.log)
+        self.assertEqual(self.log.rows, 160)
+        self.assertEqual([segment.rows for segment in self.log.segments], [100, 60])
+        self.assertEqual(len(list(self.root.glob('segment_*.npy'))), 2)
+
+    def test_query(self):
+        """Test queries by time range, camera and label."""
+        self.fill(self.log)
+
+        # All persons on camera 2 between 14:00 and 15:00
+        records, total = self.log.query(START, START + 3600, camera='cam2', label='person')
+        self.assertEqual(total, 30)
+        self.assertEqual(list(records['box'][:3, 0]), [1, 3, 5])
+        self.assertTrue((records['time'][1:] >= records['time'][:-1]).all())
+
+        records, total = self.log.query(START + 90 * 60, label='car')
+        self.assertEqual(total, 10)
+        records, total = self.log.query(end=START + 60, limit=2)
+        self.assertEqual((len(records), total), (2, 3))
+
+        # Unknown names match nothing
+        self.assertEqual(self.log.query(camera='cam9')[1], 0)
+        self.assertEqual(self.log.query(label='dog')[1], 0)
+
+    def test_to_json(self):
+        """Test the JSON form of query results."""
+        self.log.append('door', [Detection('person', 0.87654, (1, 2, 3, 4))], START)
+        records, _ = self.log.query()
+        self.assertEqual(self.log.to_json(records), [{
+            'time': '2024-05-17T14:00:00.000', 'timestamp': START, 'camera': 'door', 'label': 'person',
+            'confidence': 0.877, 'box': [1, 2, 3, 4], 'track_id': None
+        }])
+
+    def test_reopen_after_flush(self):
+        """Test that a reopened log holds the flushed rows and keeps appending after them."""
+        self.fill(self.log, frames=60)
+        self.log.close()
+        # Not flushed: lost when the log is reopened
+        self.log.append('cam1', [Detection('dog', 0.5, (0, 0, 1, 1))], START + 7200)
+
+        reopened = DetectionLog(self.root, segment_rows=100)
+        self.assertEqual(reopened.rows, 80)
+        self.assertEqual(reopened.query(label='dog')[1], 0)
+        self.fill(reopened, frames=60)
+        self.assertEqual([segment.rows for segment in reopened.segments], [100, 60])
+        self.assertEqual(reopened.query(camera='cam1', label='person')[1], 60)
+
+    def test_time_never_goes_back(self):
+        """Test that rows appended with an earlier clock keep the time column sorted."""
+        self.log.append('cam1', [Detection('person', 0.9, (0, 0, 1, 1))], START + 10)
+        self.log.append('cam1', [Detection('person', 0.9, (0, 0, 1, 1))], START)
+        records, _ = self.log.query()
+        self.assertEqual(list(records['time']), [START + 10, START + 10])
+
+class TestParseTime(unittest.TestCase):
+    """Test cases for the parse_time function."""
+
+    def test_formats(self):
+        """Test epoch seconds, ISO dates and times of day."""
+        self.assertEqual(parse_time('1700000000.5'), 1700000000.5)
+        self.assertEqual(parse_time('2024-05-17T14:00'), START)
+        self.assertEqual(parse_time('14:30'), datetime.combine(date.today(), datetime(1, 1, 1, 14, 30).time()).timestamp())
+        with self.assertRaises(ValueError):
+            parse_time('yesterday')
+
+if __name__ == "__main__":
+    unittest.main()
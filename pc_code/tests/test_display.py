@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the display module.
+
+This module contains tests for the DisplayThread class, using fake GUI
+functions instead of a real window.
+"""
+
+import unittest
+import sys
+import threading
+import time
+import numpy as np
+from pathlib import Path
+
+# Add parent directory to path to import display
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from display import DisplayThread
+
+class FakeGui:
+    """Records shown frames and replays queued key presses."""
+
+    def __init__(self, show_time=0.0):
+        self.show_time = show_time
+        self.shown = []
+        self.keys = []
+        self.destroyed = threading.Event()
+
+    def imshow(self, name, frame):
+        time.sleep(self.show_time)
+        self.shown.append(frame)
+
+    def wait_key(self, delay):
+        return self.keys.pop(0) if self.keys else -1
+
+    def destroy_window(self, name):
+        self.destroyed.set()
+
+class TestDisplayThread(unittest.TestCase):
+    """Test cases for the DisplayThread class."""
+
+    def create_display(self, gui, refresh_rate=200.0):
+        """Create a display thread using the fake GUI."""
+        display = DisplayThread(refresh_rate=refresh_rate, imshow=gui.imshow,
+                                wait_key=gui.wait_key, destroy_window=gui.destroy_window)
+        self.addCleanup(display.stop)
+        return display
+
+    def test_publish_never_blocks(self):
+        """Test that publishing is fast even when showing a frame is slow."""
+        gui = FakeGui(show_time=0.05)
+        display = self.create_display(gui)
+        display.start()
+
+        frame = np.zeros((10, 10, 3), dtype=np.uint8)
+        start = time.monotonic()
+        for _ in range(100):
+            display.publish(frame)
+        self.assertLess(time.monotonic() - start, 0.05)
+
+    def test_drops_frames_it_cannot_show(self):
+        """Test that only the latest frame is shown and older ones are counted as dropped."""
+        gui = FakeGui()
+        display = self.create_display(gui)
+
+        frames = [np.full((4, 4, 3), i, dtype=np.uint8) for i in range(5)]
+        for frame in frames:
+            display.publish(frame)
+        display.start()
+        time.sleep(0.1)
+
+        self.assertEqual(len(gui.shown), 1)
+        self.assertIs(gui.shown[0], frames[-1])
+        self.assertEqual(display.frames_dropped, 4)
+        self.assertEqual(display.frames_shown, 1)
+
+    def test_key_presses_become_commands(self):
+        """Test that key presses are passed back through the command queue."""
+        gui = FakeGui()
+        gui.keys = [ord('p'), ord('+'), ord('x'), ord('-'), ord('s'), ord('q')]
+        display = self.create_display(gui)
+        display.start()
+        time.sleep(0.1)
+
+        commands = []
+        command = display.get_command()
+        while command is not None:
+            commands.append(command)
+            command = display.get_command()
+        self.assertEqual(commands, ['pause', 'confidence_up', 'confidence_down', 'snapshot', 'quit'])
+
+    def test_stop_closes_window(self):
+        """Test that stopping the thread closes the window from the display thread."""
+        gui = FakeGui()
+        display = self.create_display(gui)
+        display.start()
+        display.stop()
+        self.assertTrue(gui.destroyed.is_set())
+
+if __name__ == "__main__":
+    unittest.main()
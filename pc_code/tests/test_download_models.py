@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the download_models module.
+
+This module contains tests for downloading model files from a local HTTP
+server: parallel downloads, resuming partial files with range requests,
+SHA-256 verification, the shared cache and instant repeat runs.
+"""
+
+import unittest
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+# Add parent directory to path to import download_models
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from download_models import Provisioner, DownloadError, VERIFIED_FILENAME
+
+FILES = {
+    'model.weights': os.urandom(300000),
+    'model.cfg': b'[net]\nwidth=416\nheight=416\n' * 50,
+    'coco.names': b'person\nbicycle\ncar\n',
+}
+
+def manifest_for(files):
+    """Return a manifest with the right hashes and sizes."""
+    return {name: {'sha256': hashlib.sha256(data).hexdigest(), 'size': len(data)} for name, data in files.items()}
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serve FILES, honoring 'Range: bytes=N-' unless the server disables ranges."""
+
+    def do_HEAD(self):
+        """Send the headers of a file."""
+        self.do_GET(body=False)
+
+    def do_GET(self, body=True):
+        """Send a file or the rest of it."""
+        server = self.server
+        data = server.files.get(self.path.rpartition('/')[2])
+        server.requests.append((self.command, self.path, self.headers.get('Range')))
+        if data is None:
+            self.send_error(404)
+            return
+        offset = 0
+        range_header = self.headers.get('Range')
+        if range_header and server.ranges:
+            offset = int(range_header.split('=')[1].rstrip('-'))
+            if offset >= len(data):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {offset}-{len(data) - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(data) - offset))
+        self.end_headers()
+        if body:
+            self.wfile.write(data[offset:])
+            server.bytes_sent += len(data) - offset
+
+    def log_message(self, format, *args):
+        """Keep the test output quiet."""
+
+class TestDownloadModels(unittest.TestCase):
+    """Test cases for the Provisioner class."""
+
+    def setUp(self):
+        """Start a local server and create an empty model directory."""
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+        self.server.files = dict(FILES)
+        self.server.requests = []
+        self.server.bytes_sent = 0
+        self.server.ranges = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.mirror = f"http://127.0.0.1:{self.server.server_address[1]}/models"
+        self.directory = Path(tempfile.mkdtemp())
+        self.model_dir = self.directory / 'models'
+
+    def tearDown(self):
+        """Stop the server and remove the files."""
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def provision(self, manifest=None, files=None, **options):
+        """Provision the files (all of FILES by default) from the local server."""
+        provisioner = Provisioner(self.model_dir, manifest_for(FILES) if manifest is None else manifest,
+                                  mirror=self.mirror, retries=1, **options)
+        return provisioner.provision_all({name: None for name in files or FILES}, jobs=3)
+
+    def test_download_and_repeat_run(self):
+        """Test that files are downloaded and verified, and that a repeat run sends no requests."""
+        results, errors = self.provision()
+        self.assertEqual(errors, {})
+        self.assertEqual({result['status'] for result in results}, {'downloaded'})
+        for name, data in FILES.items():
+            self.assertEqual((self.model_dir / name).read_bytes(), data)
+        self.assertEqual(list(self.model_dir.glob('*.part')), [])
+        self.assertEqual(set(json.loads((self.model_dir / VERIFIED_FILENAME).read_text())), set(FILES))
+
+        self.server.requests.clear()
+        results, errors = self.provision()
+        self.assertEqual({result['status'] for result in results}, {'present'})
+        self.assertEqual(self.server.requests, [])
+
+    def test_resume_partial_file(self):
+        """Test that a '.part' file left by an interrupted run is continued, not restarted."""
+        self.model_dir.mkdir()
+        data = FILES['model.weights']
+        (self.model_dir / 'model.weights.part').write_bytes(data[:100000])
+        results, errors = self.provision(files=['model.weights'])
+        self.assertEqual(errors, {})
+        self.assertEqual(self.server.requests, [('GET', '/models/model.weights', 'bytes=100000-')])
+        self.assertEqual(self.server.bytes_sent, len(data) - 100000)
+        self.assertEqual((self.model_dir / 'model.weights').read_bytes(), data)
+
+        # A server without range support sends the whole file, which replaces the part
+        (self.model_dir / 'model.weights').unlink()
+        (self.model_dir / 'model.weights.part').write_bytes(data[:100000])
+        self.server.ranges = False
+        results, errors = self.provision(files=['model.weights'])
+        self.assertEqual(errors, {})
+        self.assertEqual((self.model_dir / 'model.weights').read_bytes(), data)
+
+    def test_truncated_file_without_hash(self):
+        """Test that a truncated model file is detected by its size and resumed."""
+        self.model_dir.mkdir()
+        data = FILES['model.weights']
+        (self.model_dir / 'model.weights').write_bytes(data[:5000])
+        results, errors = self.provision(manifest={}, files=['model.weights'])
+        self.assertEqual(errors, {})
+        self.assertEqual(self.server.requests[-1], ('GET', '/models/model.weights', 'bytes=5000-'))
+        self.assertEqual((self.model_dir / 'model.weights').read_bytes(), data)
+
+    def test_checksum_mismatch(self):
+        """Test that a file not matching the manifest is never put in place."""
+        manifest = manifest_for(FILES)
+        manifest['model.cfg']['sha256'] = '0' * 64
+        results, errors = self.provision(manifest=manifest)
+        self.assertEqual(set(errors), {'model.cfg'})
+        self.assertIn('SHA-256', errors['model.cfg'])
+        self.assertFalse((self.model_dir / 'model.cfg').exists())
+        self.assertFalse((self.model_dir / 'model.cfg.part').exists())
+        self.assertTrue((self.model_dir / 'model.weights').exists())
+
+        # A corrupted model file is replaced
+        (self.model_dir / 'model.weights').write_bytes(bytes(len(FILES['model.weights'])))
+        results, errors = self.provision(files=['model.weights'], verify=True)
+        self.assertEqual(errors, {})
+        self.assertEqual((self.model_dir / 'model.weights').read_bytes(), FILES['model.weights'])
+
+    def test_shared_cache(self):
+        """Test that downloads fill the cache and other model directories are filled from it."""
+        cache = self.directory / 'cache'
+        self.provision(cache_dir=cache)
+        self.assertEqual((cache / 'model.weights').read_bytes(), FILES['model.weights'])
+
+        self.server.requests.clear()
+        self.model_dir = self.directory / 'other'
+        results, errors = self.provision(cache_dir=cache)
+        self.assertEqual({result['status'] for result in results}, {'cached'})
+        self.assertEqual(self.server.requests, [])
+        self.assertEqual((self.model_dir / 'model.cfg').read_bytes(), FILES['model.cfg'])
+
+    def test_missing_file(self):
+        """Test that a file missing on the server is reported as an error."""
+        del self.server.files['coco.names']
+        results, errors = self.provision()
+        self.assertIn('404', errors['coco.names'])
+        self.assertEqual(len(results), 2)
+        with self.assertRaises(DownloadError):
+            Provisioner(self.model_dir, retries=1).provision('unknown.onnx', None)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the duplicate_filter module.
+
+This module contains tests for the DuplicateFilter class.
+"""
+
+import unittest
+import sys
+import cv2
+import numpy as np
+from pathlib import Path
+
+# Add parent directory to path to import duplicate_filter
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from duplicate_filter import DuplicateFilter
+
+class FakeClock:
+    """Clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def encode(image):
+    """Encode an image like the ESP32-CAM would."""
+    return cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 12])[1].tobytes()
+
+class TestDuplicateFilter(unittest.TestCase):
+    """Test cases for the DuplicateFilter class."""
+
+    def setUp(self):
+        """Set up a static scene and a filter with a controllable clock."""
+        rng = np.random.RandomState(0)
+        scene = cv2.resize(rng.randint(0, 255, (48, 64, 3), dtype=np.uint8), (640, 480))
+        self.scene = scene
+        self.noisy = np.clip(scene.astype(int) + rng.randint(-3, 4, scene.shape), 0, 255).astype(np.uint8)
+        self.clock = FakeClock()
+        self.filter = DuplicateFilter(refresh_interval=1.0, clock=self.clock)
+
+    def test_first_frame_processed(self):
+        """Test that the first frame is always processed."""
+        self.assertFalse(self.filter.is_duplicate(encode(self.scene)))
+
+    def test_exact_duplicate(self):
+        """Test that identical bytes are suppressed."""
+        jpeg = encode(self.scene)
+        self.filter.is_duplicate(jpeg)
+        self.assertTrue(self.filter.is_duplicate(bytes(jpeg)))
+        self.assertEqual(self.filter.exact_duplicates, 1)
+
+    def test_near_duplicate(self):
+        """Test that sensor noise alone is suppressed."""
+        self.filter.is_duplicate(encode(self.scene))
+        self.assertTrue(self.filter.is_duplicate(encode(self.noisy)))
+        self.assertEqual(self.filter.near_duplicates, 1)
+
+    def test_small_change_processed(self):
+        """Test that a small object entering the scene is not suppressed."""
+        self.filter.is_duplicate(encode(self.scene))
+        changed = self.noisy.copy()
+        cv2.rectangle(changed, (100, 100), (130, 160), (255, 255, 255), -1)
+        self.assertFalse(self.filter.is_duplicate(encode(changed)))
+
+    def test_compares_with_last_processed_frame(self):
+        """Test that a slow drift is caught once it adds up."""
+        self.filter.is_duplicate(encode(self.scene))
+        results = [self.filter.is_duplicate(encode(np.clip(self.scene.astype(int) + step * 2, 0, 255)
+                                                   .astype(np.uint8)))
+                   for step in range(1, 6)]
+        self.assertIn(False, results)
+
+    def test_forced_refresh(self):
+        """Test that duplicates are processed again after the refresh interval."""
+        jpeg = encode(self.scene)
+        self.filter.is_duplicate(jpeg)
+        self.clock.now = 0.5
+        self.assertTrue(self.filter.is_duplicate(jpeg))
+        self.clock.now = 1.0
+        self.assertFalse(self.filter.is_duplicate(jpeg))
+        self.clock.now = 1.5
+        self.assertTrue(self.filter.is_duplicate(jpeg))
+
+        self.assertEqual(self.filter.stats(), {'checked': 4, 'exact_duplicates': 2,
+                                               'near_duplicates': 0, 'forced_refreshes': 1})
+        self.assertEqual(self.filter.frames_suppressed, 2)
+
+    def test_undecodable_bytes(self):
+        """Test that garbage of similar size is passed on to the decoder."""
+        jpeg = encode(self.scene)
+        self.filter.is_duplicate(jpeg)
+        self.assertFalse(self.filter.is_duplicate(b'\0' * len(jpeg)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the model backend registry.
+
+This module contains tests for the model registry and the OpenCV DNN
+backends, using tiny generated networks instead of the real weights.
+"""
+
+import unittest
+import importlib.util
+import threading
+import time
+import tracemalloc
+import cv2
+import shutil
+import sys
+import tempfile
+import numpy as np
+from pathlib import Path
+
+# Add parent directory to path to import model_backends
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from ai_processor import (AIProcessor, CascadeProcessor, MultiModelProcessor, create_processor,
+                          parse_model_spec)
+from model_backends import (MODEL_REGISTRY, Detection, ModelBackend, create_backend,
+                            missing_model_files, register_model)
+from tests.model_fixtures import write_tiny_yolo, write_tiny_onnx
+
+HAVE_ONNX = importlib.util.find_spec("onnx") is not None
+
+class TestModelRegistry(unittest.TestCase):
+    """Test cases for the model registry."""
+
+    def test_builtin_models_registered(self):
+        """Test that the built-in models are registered with a backend class."""
+        for name in ['yolov4', 'yolov4_tiny', 'yolov5n_onnx', 'yolov8n_onnx',
+                     'mediapipe_pose', 'mediapipe_face']:
+            self.assertIn(name, MODEL_REGISTRY)
+            self.assertTrue(issubclass(MODEL_REGISTRY[name]['backend'], ModelBackend))
+
+    def test_unknown_model(self):
+        """Test that unknown model names are rejected."""
+        with self.assertRaises(ValueError):
+            create_backend('not_a_model')
+
+    def test_missing_model_files(self):
+        """Test that missing files are reported per model."""
+        with tempfile.TemporaryDirectory() as model_dir:
+            self.assertEqual(sorted(missing_model_files('yolov4_tiny', model_dir)),
+                             ['coco.names', 'yolov4-tiny.cfg', 'yolov4-tiny.weights'])
+            self.assertEqual(missing_model_files('mediapipe_face', model_dir), [])
+
+class TestDnnBackends(unittest.TestCase):
+    """Test cases for the OpenCV DNN backends."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.model_dir = Path(tempfile.mkdtemp())
+        write_tiny_yolo(self.model_dir)
+        self.frame = np.random.RandomState(1).randint(0, 255, (480, 640, 3), dtype=np.uint8)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.model_dir)
+
+    def check_detections(self, detections, model_name):
+        """Check that detections are well-formed and inside the frame area."""
+        for detection in detections:
+            self.assertIsInstance(detection, Detection)
+            self.assertEqual(detection.source, model_name)
+            self.assertEqual(len(detection.box), 4)
+            self.assertGreater(detection.confidence, 0.1)
+
+    def test_darknet_backend(self):
+        """Test detection and annotation with a Darknet network."""
+        processor = AIProcessor('yolov4_tiny', confidence_threshold=0.1, model_dir=self.model_dir)
+        self.assertTrue(processor.resizable_input)
+        self.assertEqual(processor.input_size, 416)
+
+        detections = processor.detect(self.frame)
+        self.check_detections(detections, 'yolov4_tiny')
+        self.assertEqual(processor.last_detection_count, len(detections))
+
+        result = processor.process_frame(self.frame)
+        self.assertEqual(result.shape, self.frame.shape)
+
+    def test_darknet_input_size_override(self):
+        """Test that per-model configuration can be overridden."""
+        processor = AIProcessor('yolov4_tiny', model_dir=self.model_dir, input_size=320,
+                                dnn_backend='opencv', dnn_target='cpu', threads=1)
+        self.assertEqual(processor.input_size, 320)
+
+        processor.warmup([256, 320])
+        processor.input_size = 256
+        self.assertEqual(processor.input_size, 256)
+        self.assertIsInstance(processor.detect(self.frame), list)
+
+    def test_preprocessing_matches_blob_from_image(self):
+        """Test that the in-place preprocessing equals cv2.dnn.blobFromImage."""
+        processor = AIProcessor('yolov4_tiny', model_dir=self.model_dir, input_size=320)
+        processor.detect(self.frame)
+
+        expected = cv2.dnn.blobFromImage(self.frame, 1/255.0, (320, 320), swapRB=True, crop=False)
+        blob = processor.backend._size_buffers(320)['blob']
+        np.testing.assert_allclose(blob, expected, atol=1e-6)
+
+    def test_steady_state_allocations(self):
+        """Test that processing frames allocates almost nothing once buffers exist."""
+        processor = AIProcessor('yolov4_tiny', confidence_threshold=0.5, model_dir=self.model_dir)
+        processor.warmup([320, 416])
+
+        # Warm up both sizes so every buffer exists
+        for size in (320, 416, 320, 416):
+            processor.input_size = size
+            processor.process_frame(self.frame)
+
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            for i in range(20):
+                processor.input_size = 320 if i % 2 else 416
+                processor.process_frame(self.frame)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # A single 416x416 float32 blob is ~2 MB and a 640x480 frame copy ~900 KB;
+        # only small transient buffers (NumPy casting, candidate rows) remain.
+        self.assertLess(peak - baseline, 128 * 1024)
+        self.assertLess(current - baseline, 8 * 1024)
+
+    @unittest.skipUnless(HAVE_ONNX, "onnx package not installed")
+    def test_onnx_backends(self):
+        """Test both ONNX output layouts."""
+        for model_name, output_format in [('yolov5n_onnx', 'yolov5'), ('yolov8n_onnx', 'yolov8')]:
+            write_tiny_onnx(self.model_dir / MODEL_REGISTRY[model_name]['config']['onnx'],
+                            output_format=output_format, input_size=64)
+            processor = AIProcessor(model_name, confidence_threshold=0.1,
+                                    model_dir=self.model_dir, input_size=64)
+            self.assertFalse(processor.resizable_input)
+
+            # Fixed-size inputs ignore resize requests
+            processor.input_size = 128
+            self.assertEqual(processor.input_size, 64)
+
+            detections = processor.detect(self.frame)
+            self.assertTrue(detections)
+            self.check_detections(detections, model_name)
+
+            # So does a different input size at construction, which the network can't run at
+            with self.assertLogs(level='WARNING'):
+                processor = AIProcessor(model_name, confidence_threshold=0.1,
+                                        model_dir=self.model_dir, input_size=32)
+            self.assertEqual(processor.input_size, 64)
+            processor.warmup([32])
+            self.assertEqual(len(processor.detect(self.frame)), len(detections))
+
+class TestMultiModelProcessor(unittest.TestCase):
+    """Test cases for running several models on the same frame."""
+
+    def setUp(self):
+        """Set up test fixtures with two tiny Darknet models."""
+        self.model_dir = Path(tempfile.mkdtemp())
+        write_tiny_yolo(self.model_dir)
+        write_tiny_yolo(self.model_dir, cfg_name="yolov4.cfg", weights_name="yolov4.weights")
+        self.frame = np.random.RandomState(1).randint(0, 255, (480, 640, 3), dtype=np.uint8)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.model_dir)
+
+    def create(self, spec):
+        """Create a processor for a model spec and close it after the test."""
+        processor = create_processor(spec, confidence_threshold=0.1, model_dir=self.model_dir)
+        if isinstance(processor, MultiModelProcessor):
+            self.addCleanup(processor.close)
+        return processor
+
+    def test_parse_model_spec(self):
+        """Test parsing model specs with frame intervals."""
+        self.assertEqual(parse_model_spec('yolov4_tiny:3, mediapipe_face'),
+                         [('yolov4_tiny', 3), ('mediapipe_face', 1)])
+        for spec in ['not_a_model', 'yolov4:0', 'yolov4:x', 'yolov4,yolov4']:
+            with self.assertRaises(ValueError):
+                parse_model_spec(spec)
+
+    def test_single_model_uses_ai_processor(self):
+        """Test that a single model without an interval needs no thread pool."""
+        self.assertIsInstance(self.create('yolov4_tiny'), AIProcessor)
+
+    def test_merged_detections(self):
+        """Test that detections of all models are merged and annotated."""
+        processor = self.create('yolov4,yolov4_tiny')
+        self.assertEqual(processor.model_name, 'yolov4,yolov4_tiny')
+
+        result = processor.process_frame(self.frame)
+        self.assertEqual(result.shape, self.frame.shape)
+        sources = {detection.source for detection in processor.last_detections}
+        self.assertEqual(sources, {'yolov4', 'yolov4_tiny'})
+        self.assertEqual(processor.last_detection_count, len(processor.last_detections))
+
+        processor.confidence_threshold = 0.9
+        self.assertEqual([p.confidence_threshold for p in processor.processors], [0.9, 0.9])
+
+    def test_frame_intervals(self):
+        """Test that each model runs at its own rate and keeps its last detections."""
+        processor = self.create('yolov4:3,yolov4_tiny')
+        calls = {'yolov4': 0, 'yolov4_tiny': 0}
+        for model in processor.processors:
+            detect = model.backend.detect
+            def counting_detect(frame, threshold, detect=detect, name=model.model_name):
+                calls[name] += 1
+                return detect(frame, threshold)
+            model.backend.detect = counting_detect
+
+        for _ in range(6):
+            detections = processor.detect(self.frame)
+            self.assertIn('yolov4', {detection.source for detection in detections})
+        self.assertEqual(calls, {'yolov4': 2, 'yolov4_tiny': 6})
+
+    def test_models_run_in_parallel(self):
+        """Test that latency is close to the slowest model rather than the sum."""
+        processor = self.create('yolov4,yolov4_tiny')
+        threads = set()
+        for model, delay in zip(processor.processors, (0.1, 0.15)):
+            def slow_detect(frame, threshold, delay=delay):
+                threads.add(threading.get_ident())
+                time.sleep(delay)
+                return []
+            model.backend.detect = slow_detect
+
+        start = time.monotonic()
+        processor.detect(self.frame)
+        self.assertLess(time.monotonic() - start, 0.22)
+        self.assertEqual(len(threads), 2)
+
+class CropRecorder(ModelBackend):
+    """Second-stage backend that records its crops and finds one landmark per crop."""
+
+    def __init__(self, name, model_dir, confidence_threshold, config):
+        super().__init__(name, model_dir, confidence_threshold, config)
+        self.crops = []
+
+    def detect(self, frame, confidence_threshold):
+        self.crops.append(frame.shape)
+        landmarks = np.array([[5.0, 6.0, 1.0]], dtype=np.float32)
+        return [Detection('face', 0.9, (5, 6, 10, 10), 0, self.name, landmarks)]
+
+    def annotate(self, frame, detections):
+        for detection in detections:
+            x, y, w, h = detection.box
+            frame[y:y + h, x:x + w] = 255
+
+class TestCascadeProcessor(unittest.TestCase):
+    """Test cases for running a model only inside YOLO person crops."""
+
+    def setUp(self):
+        """Set up a tiny detector and a recording second-stage model."""
+        self.model_dir = Path(tempfile.mkdtemp())
+        write_tiny_yolo(self.model_dir)
+        register_model('crop_recorder', CropRecorder, "Records crops")
+        self.frame = np.zeros((480, 640, 3), dtype=np.uint8)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        del MODEL_REGISTRY['crop_recorder']
+        shutil.rmtree(self.model_dir)
+
+    def create(self, first_stage):
+        """Create a cascade whose detector returns the given detections."""
+        processor = create_processor('yolov4_tiny>crop_recorder', model_dir=self.model_dir)
+        self.assertIsInstance(processor, CascadeProcessor)
+        processor.backend.detect = lambda frame, threshold: list(first_stage)
+        return processor
+
+    def test_spec_validation(self):
+        """Test that cascades need a YOLO detector and known models."""
+        self.assertEqual(parse_model_spec('yolov4_tiny>crop_recorder:2'), [('yolov4_tiny>crop_recorder', 2)])
+        for spec in ['crop_recorder>yolov4', 'yolov4>not_a_model']:
+            with self.assertRaises(ValueError):
+                parse_model_spec(spec)
+
+    def test_runs_only_on_people(self):
+        """Test that only padded person crops reach the second stage."""
+        processor = self.create([
+            Detection('person', 0.9, (100, 100, 100, 200), 0, 'yolov4_tiny'),
+            Detection('car', 0.9, (300, 100, 100, 100), 1, 'yolov4_tiny'),
+            Detection('person', 0.9, (600, 400, 100, 100), 0, 'yolov4_tiny'),
+            Detection('person', 0.9, (10, 10, 8, 8), 0, 'yolov4_tiny')
+        ])
+        stage = processor.stages[0]
+        self.assertTrue(stage.config['static_image_mode'])
+
+        detections = processor.detect(self.frame)
+
+        # 15% padding, clipped to the frame; the 8 px person is too small
+        self.assertEqual(stage.crops, [(260, 130, 3), (95, 55, 3)])
+        self.assertEqual(processor.last_crop_count, 2)
+
+        faces = [detection for detection in detections if detection.source == 'crop_recorder']
+        self.assertEqual([face.box for face in faces], [(90, 76, 10, 10), (590, 391, 10, 10)])
+        self.assertEqual(faces[0].landmarks.tolist(), [[90.0, 76.0, 1.0]])
+        self.assertEqual(len(detections), 6)
+
+        result = processor.process_frame(self.frame)
+        self.assertEqual(result[80, 95].tolist(), [255, 255, 255])
+
+    def test_skips_frames_without_people(self):
+        """Test that the second stage doesn't run when nobody is in the frame."""
+        processor = self.create([Detection('car', 0.9, (300, 100, 100, 100), 1, 'yolov4_tiny')])
+        self.assertEqual(len(processor.detect(self.frame)), 1)
+        self.assertEqual(processor.stages[0].crops, [])
+
+if __name__ == "__main__":
+    unittest.main()
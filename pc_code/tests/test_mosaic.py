@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the mosaic module.
+
+This module contains tests for the grid layout and for compositing camera
+frames into the mosaic, redrawing and re-encoding only what changed.
+"""
+
+import unittest
+import sys
+import cv2
+import numpy as np
+from pathlib import Path
+
+# Add parent directory to path to import mosaic
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mosaic import Mosaic, grid_layout, parse_size
+
+def solid(color, width=640, height=480):
+    """Return a frame of one color."""
+    return np.full((height, width, 3), color, dtype=np.uint8)
+
+class TestMosaic(unittest.TestCase):
+    """Test cases for the Mosaic class."""
+
+    def test_grid_layout(self):
+        """Test that cameras are arranged in a near-square grid."""
+        self.assertEqual(grid_layout(1, 1280, 720), [(0, 0, 1280, 720)])
+        self.assertEqual(grid_layout(3, 1280, 720), [(0, 0, 640, 360), (640, 0, 640, 360), (0, 360, 640, 360)])
+        self.assertEqual(len(set(grid_layout(9, 1280, 720))), 9)
+        self.assertEqual(grid_layout(9, 1280, 720)[-1], (852, 480, 426, 240))
+
+    def test_parse_size(self):
+        """Test parsing the mosaic size option."""
+        self.assertEqual(parse_size('1920X1080'), (1920, 1080))
+        for text in ['1280', '0x720', 'axb']:
+            with self.assertRaises(ValueError):
+                parse_size(text)
+
+    def test_tiles_and_letterbox(self):
+        """Test that frames are scaled into their tiles, keeping their aspect ratio."""
+        mosaic = Mosaic(width=1280, height=720)
+        mosaic.update('cam1', solid((0, 0, 255)))
+        mosaic.update('cam2', solid((0, 255, 0), width=320, height=320))
+        jpeg = mosaic.render()
+        self.assertEqual(cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR).shape, (720, 1280, 3))
+
+        # Two tiles of 640x720: the 4:3 frame fills the width, the square one the width too
+        self.assertEqual(list(mosaic.canvas[360, 320]), [0, 0, 255])
+        self.assertEqual(list(mosaic.canvas[360, 960]), [0, 255, 0])
+        self.assertEqual(list(mosaic.canvas[100, 320]), [0, 0, 0])
+        self.assertEqual(list(mosaic.canvas[30, 960]), [0, 0, 0])
+
+    def test_only_changes_are_rendered(self):
+        """Test that unchanged mosaics aren't re-encoded and only changed tiles are redrawn."""
+        mosaic = Mosaic(['cam1', 'cam2', 'cam3', 'cam4'])
+        for camera_id in ['cam1', 'cam2', 'cam3', 'cam4']:
+            mosaic.update(camera_id, solid((50, 50, 50)))
+        first = mosaic.render()
+        self.assertEqual(mosaic.tiles_drawn, 4)
+        self.assertIsNone(mosaic.render())
+
+        # Several frames of one camera between renders: one redraw, one encode
+        mosaic.update('cam3', solid((200, 0, 0)))
+        mosaic.update('cam3', solid((0, 200, 0)))
+        second = mosaic.render()
+        self.assertNotEqual(first, second)
+        self.assertEqual((mosaic.tiles_drawn, mosaic.encodes), (5, 2))
+        self.assertEqual(list(mosaic.canvas[540, 320]), [0, 200, 0])
+
+        # Cameras outside the selection are ignored
+        mosaic.update('cam9', solid((0, 0, 200)))
+        self.assertIsNone(mosaic.render())
+
+    def test_new_camera_changes_layout(self):
+        """Test that the grid grows when a camera sends its first frame."""
+        mosaic = Mosaic(width=400, height=200)
+        mosaic.update('cam1', solid((0, 0, 255)))
+        mosaic.render()
+        mosaic.update('cam2', solid((255, 0, 0)))
+        mosaic.render()
+        self.assertEqual(mosaic.stats()['cameras'], 2)
+        self.assertEqual(list(mosaic.canvas[100, 100]), [0, 0, 255])
+        self.assertEqual(list(mosaic.canvas[100, 300]), [255, 0, 0])
+
+    def test_downscale_is_averaged(self):
+        """Test that shrinking a lot averages pixels instead of sampling them."""
+        # 1-pixel stripes would alias to solid black or white when sampled
+        stripes = np.zeros((480, 640, 3), dtype=np.uint8)
+        stripes[:, ::2] = 255
+        mosaic = Mosaic(width=160, height=120)
+        mosaic.update('cam1', stripes)
+        mosaic.render()
+        self.assertTrue(100 < mosaic.canvas[60, 100, 0] < 155)
+
+if __name__ == "__main__":
+    unittest.main()
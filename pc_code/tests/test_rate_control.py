@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the rate control module.
+
+This module contains tests for the RateController class.
+"""
+
+import unittest
+import sys
+from pathlib import Path
+
+# Add parent directory to path to import rate_control
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from rate_control import RateController
+
+class FakeClock:
+    """Manually advanced clock for deterministic tests."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestRateController(unittest.TestCase):
+    """Test cases for the RateController class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.clock = FakeClock()
+        self.controller = RateController(max_fps=20.0, min_fps=5.0, framesize='VGA',
+                                         clock=self.clock)
+
+    def run_frames(self, count, idle_time, busy_time):
+        """Feed frames with fixed timings and return the commands produced."""
+        commands = []
+        for _ in range(count):
+            self.clock.now += idle_time + busy_time
+            command = self.controller.update(idle_time, busy_time)
+            if command is not None:
+                commands.append(command)
+        return commands
+
+    def test_saturated_pipeline_lowers_frame_rate(self):
+        """Test that a saturated pipeline asks the camera for fewer frames."""
+        # 100 ms per frame with no idle time: capacity is 10 FPS
+        commands = self.run_frames(30, 0.0, 0.1)
+
+        self.assertEqual(len(commands), 1)
+        self.assertEqual(commands[0]['type'], 'rate_control')
+        self.assertEqual(commands[0]['framesize'], 'VGA')
+        # 85% of 10 FPS
+        self.assertEqual(commands[0]['interval_ms'], 118)
+
+    def test_overloaded_pipeline_lowers_resolution(self):
+        """Test that the resolution drops when even the minimum rate is too much."""
+        commands = self.run_frames(20, 0.0, 0.5)
+
+        self.assertTrue(commands)
+        self.assertEqual(commands[0]['framesize'], 'CIF')
+        self.assertEqual(commands[0]['interval_ms'], 200)
+
+    def test_headroom_raises_frame_rate(self):
+        """Test that the frame rate recovers once the pipeline has headroom."""
+        self.run_frames(30, 0.0, 0.1)
+        self.assertLess(self.controller.fps_limit, 20.0)
+
+        # Processing got cheaper: 20 ms busy out of each 118 ms
+        commands = self.run_frames(60, 0.098, 0.02)
+
+        self.assertTrue(commands)
+        self.assertEqual(self.controller.fps_limit, 20.0)
+
+    def test_hysteresis_band_sends_nothing(self):
+        """Test that utilization between the watermarks leaves the camera alone."""
+        # 80% utilization sits between low_water (0.7) and high_water (0.95)
+        commands = self.run_frames(100, 0.01, 0.04)
+        self.assertEqual(commands, [])
+
+    def test_commands_are_rate_limited(self):
+        """Test that commands are at least min_command_interval apart."""
+        times = []
+        for _ in range(200):
+            self.clock.now += 0.5
+            if self.controller.update(0.0, 0.5) is not None:
+                times.append(self.clock.now)
+
+        self.assertGreater(len(times), 1)
+        for earlier, later in zip(times, times[1:]):
+            self.assertGreaterEqual(later - earlier, self.controller.min_command_interval)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the roi module.
+
+This module contains tests for the RegionOfInterest and RoiStore classes.
+"""
+
+import unittest
+import shutil
+import sys
+import tempfile
+import numpy as np
+from pathlib import Path
+
+# Add parent directory to path to import roi
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from model_backends import Detection
+from roi import RegionOfInterest, RoiStore, region_points
+
+class FixedProcessor:
+    """Processor that records its input and returns fixed detections in input coordinates."""
+
+    def __init__(self, detections):
+        self.detections = detections
+        self.inputs = []
+
+    def detect(self, frame):
+        self.inputs.append(frame)
+        return list(self.detections)
+
+class TestRegionOfInterest(unittest.TestCase):
+    """Test cases for the RegionOfInterest class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        # A doorway on the left and a triangle on the right
+        self.roi = RegionOfInterest([
+            {'rect': [0.1, 0.25, 0.2, 0.5]},
+            {'polygon': [[0.5, 0.5], [0.75, 0.5], [0.75, 0.75]]}
+        ])
+
+    def test_invalid_regions(self):
+        """Test that malformed regions are rejected."""
+        for region in [{'rect': [0, 0, 1]}, {'polygon': [[0, 0], [1, 1]]},
+                       {'rect': [0.5, 0.5, 0.6, 0.1]}, {'circle': [0, 0, 1]}, None]:
+            with self.assertRaises(ValueError):
+                region_points(region)
+        with self.assertRaises(ValueError):
+            RegionOfInterest([])
+
+    def test_crop_bounds(self):
+        """Test that the crop covers the bounding box of all regions."""
+        crop, x0, y0 = self.roi.crop(self.frame)
+        self.assertEqual((x0, y0), (64, 120))
+        self.assertEqual(crop.shape, (240, 416, 3))
+
+        # Geometry follows the frame size when the camera resolution changes
+        crop, x0, y0 = self.roi.crop(np.zeros((240, 320, 3), dtype=np.uint8))
+        self.assertEqual((x0, y0, crop.shape[1], crop.shape[0]), (32, 60, 208, 120))
+
+    def test_filter_by_center(self):
+        """Test that detections are kept only if their center is inside a region."""
+        inside = Detection('person', 0.9, (100, 150, 40, 100))
+        in_triangle = Detection('car', 0.9, (440, 250, 20, 20))
+        between = Detection('car', 0.9, (250, 200, 40, 40))
+        outside_triangle = Detection('car', 0.9, (330, 320, 20, 20))
+        kept = self.roi.filter([inside, in_triangle, between, outside_triangle], self.frame.shape)
+        self.assertEqual(kept, [inside, in_triangle])
+
+    def test_detect_on_crop(self):
+        """Test that inference runs on the crop and boxes are mapped back to the frame."""
+        processor = FixedProcessor([Detection('person', 0.9, (36, 30, 40, 100)),
+                                    Detection('person', 0.9, (200, 50, 20, 20))])
+        detections = self.roi.detect(processor, self.frame)
+
+        self.assertEqual(processor.inputs[0].shape, (240, 416, 3))
+        self.assertEqual([detection.box for detection in detections], [(100, 150, 40, 100)])
+
+    def test_draw(self):
+        """Test that the region outlines are drawn."""
+        self.roi.draw(self.frame)
+        self.assertTrue(self.frame[120, 64:192].any())
+        self.assertFalse(self.frame[0].any())
+
+class TestRoiStore(unittest.TestCase):
+    """Test cases for the RoiStore class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.directory = Path(tempfile.mkdtemp())
+        self.path = self.directory / 'roi.json'
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.directory)
+
+    def test_persisted(self):
+        """Test that regions survive a restart and can be cleared."""
+        store = RoiStore(self.path)
+        self.assertIsNone(store.get('cam1'))
+        self.assertIsInstance(store.set('cam1', [{'rect': [0, 0, 0.5, 0.5]}]), RegionOfInterest)
+
+        store = RoiStore(self.path)
+        self.assertEqual(store.get('cam1').regions, [{'rect': [0, 0, 0.5, 0.5]}])
+
+        self.assertIsNone(store.set('cam1', []))
+        self.assertIsNone(RoiStore(self.path).get('cam1'))
+
+    def test_invalid_regions_not_saved(self):
+        """Test that invalid regions leave the saved regions unchanged."""
+        store = RoiStore(self.path)
+        store.set('cam1', [{'rect': [0, 0, 0.5, 0.5]}])
+        with self.assertRaises(ValueError):
+            store.set('cam1', [{'rect': [0, 0, 2, 2]}])
+        self.assertEqual(RoiStore(self.path).get('cam1').regions, [{'rect': [0, 0, 0.5, 0.5]}])
+
+if __name__ == "__main__":
+    unittest.main()
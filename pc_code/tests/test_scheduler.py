@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the scheduler module.
+
+This module contains tests for the InferenceScheduler class.
+"""
+
+import unittest
+import asyncio
+import sys
+from collections import Counter
+from pathlib import Path
+
+# Add parent directory to path to import scheduler
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from scheduler import InferenceScheduler
+
+class FakeClock:
+    """Clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+class TestInferenceScheduler(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the InferenceScheduler class."""
+
+    def setUp(self):
+        """Set up a scheduler that records processed frames."""
+        self.clock = FakeClock()
+        self.processed = []
+        self.done = []
+        self.scheduler = InferenceScheduler(self.process, deadline=0.5, queue_size=2, clock=self.clock)
+
+    async def process(self, camera_id, item):
+        """Record a processed frame; each frame takes 10 ms."""
+        self.processed.append((camera_id, item))
+        self.clock.now += 0.01
+
+    def add(self, camera_id, **options):
+        """Add a camera that records its completed and dropped frames."""
+        on_done = lambda item, duration: self.done.append((camera_id, item, duration))
+        return self.scheduler.add_camera(camera_id, on_done=on_done, **options)
+
+    def pick(self):
+        """Return the camera and item of the next frame, or None."""
+        choice, _ = self.scheduler.next_frame()
+        return (choice[0].camera_id, choice[1]) if choice else None
+
+    def test_weighted_round_robin(self):
+        """Test that busy cameras get their weighted share and can't starve others."""
+        self.add('busy', weight=2)
+        self.add('quiet')
+        served = Counter()
+        for i in range(30):
+            # The busy camera always has frames waiting, the quiet one too
+            self.scheduler.submit('busy', i)
+            self.scheduler.submit('quiet', i)
+            served[self.pick()[0]] += 1
+        self.assertEqual(served, {'busy': 20, 'quiet': 10})
+
+    def test_deadline_misses_discarded(self):
+        """Test that frames past their deadline never reach inference."""
+        self.add('cam')
+        self.scheduler.submit('cam', 'old')
+        self.clock.now += 0.6
+        self.scheduler.submit('cam', 'new')
+
+        self.assertEqual(self.pick(), ('cam', 'new'))
+        self.assertIsNone(self.pick())
+        self.assertEqual(self.scheduler.cameras['cam'].deadline_misses, 1)
+        self.assertEqual(self.done, [('cam', 'old', None)])
+
+    def test_full_queue_drops_oldest(self):
+        """Test that a camera sending faster than it is served doesn't build a backlog."""
+        self.add('cam')
+        for i in range(5):
+            self.scheduler.submit('cam', i)
+        self.assertEqual([self.pick()[1], self.pick()[1]], [3, 4])
+        self.assertEqual(self.scheduler.cameras['cam'].superseded, 3)
+
+    async def test_target_rate(self):
+        """Test that a camera is not served more often than its target rate."""
+        self.add('cam', target_fps=5)
+        self.scheduler.submit('cam', 1)
+        await self.scheduler.run_once()
+        self.scheduler.submit('cam', 2)
+
+        choice, wait = self.scheduler.next_frame()
+        self.assertIsNone(choice)
+        self.assertAlmostEqual(wait, 0.19)
+
+        self.clock.now += 0.2
+        self.assertEqual(self.pick(), ('cam', 2))
+
+    async def test_run_once_reports_duration(self):
+        """Test that processing updates counters and calls back with the duration."""
+        self.add('cam')
+        self.scheduler.submit('cam', 'frame')
+        await self.scheduler.run_once()
+
+        self.assertEqual(self.processed, [('cam', 'frame')])
+        self.assertEqual(len(self.done), 1)
+        self.assertAlmostEqual(self.done[0][2], 0.01)
+
+        stats = self.scheduler.stats()['cam']
+        self.assertEqual((stats['received'], stats['processed'], stats['queued']), (1, 1, 0))
+        self.assertEqual(stats['avg_processing_ms'], 10.0)
+        self.assertEqual(stats['rate'], 0.5)
+
+    async def test_concurrency_one_frame_per_camera(self):
+        """Test that run() overlaps frames of different cameras but never of the same camera."""
+        running = []
+        overlap = []
+        release = asyncio.Event()
+
+        async def slow_process(camera_id, item):
+            running.append(camera_id)
+            overlap.append(list(running))
+            await release.wait()
+            running.remove(camera_id)
+
+        self.scheduler.process = slow_process
+        self.scheduler.concurrency = 3
+        self.add('a')
+        self.add('b')
+        for i in range(2):
+            self.scheduler.submit('a', i)
+            self.scheduler.submit('b', i)
+
+        task = asyncio.ensure_future(self.scheduler.run())
+        for _ in range(5):
+            await asyncio.sleep(0)
+        self.assertEqual(sorted(running), ['a', 'b'])
+
+        release.set()
+        for _ in range(10):
+            await asyncio.sleep(0)
+        task.cancel()
+        self.assertEqual(self.scheduler.stats()['a']['processed'], 2)
+        self.assertTrue(all(len(set(cameras)) == len(cameras) for cameras in overlap))
+
+    def test_configure(self):
+        """Test changing a camera's schedule at runtime."""
+        self.add('cam', target_fps=5)
+        self.scheduler.configure('cam', weight=3, target_fps=0, deadline=1.0)
+        queue = self.scheduler.cameras['cam']
+        self.assertEqual((queue.weight, queue.target_fps, queue.deadline), (3.0, None, 1.0))
+        with self.assertRaises(ValueError):
+            self.scheduler.configure('cam', weight=0)
+        with self.assertRaises(KeyError):
+            self.scheduler.configure('unknown', weight=1)
+
+    def test_remove_camera_drops_frames(self):
+        """Test that frames of a disconnected camera are dropped."""
+        self.add('cam')
+        self.scheduler.submit('cam', 'frame')
+        self.scheduler.remove_camera('cam')
+        self.assertEqual(self.done, [('cam', 'frame', None)])
+        self.assertIsNone(self.pick())
+
+if __name__ == "__main__":
+    unittest.main()
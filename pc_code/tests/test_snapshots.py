@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the snapshots module.
+
+This module contains tests for the SnapshotStore class.
+"""
+
+import unittest
+import json
+import shutil
+import sys
+import tempfile
+import cv2
+import numpy as np
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add parent directory to path to import snapshots
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from model_backends import Detection
+from snapshots import SnapshotStore
+
+class TestSnapshotStore(unittest.TestCase):
+    """Test cases for the SnapshotStore class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.root = Path(tempfile.mkdtemp())
+        self.store = SnapshotStore(self.root, thumbnail_width=80)
+        frame = np.random.RandomState(0).randint(0, 255, (480, 640, 3), dtype=np.uint8)
+        self.jpeg = cv2.imencode('.jpg', frame)[1].tobytes()
+        self.start = datetime(2024, 5, 17, 14, 23, 1)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.store.close()
+        shutil.rmtree(self.root)
+
+    def save(self, count, camera_id='cam1'):
+        """Save count snapshots one second apart and return their entries."""
+        futures = [self.store.save(self.jpeg, camera_id, timestamp=self.start + timedelta(seconds=i))
+                   for i in range(count)]
+        return [future.result() for future in futures]
+
+    def test_save_writes_original_bytes(self):
+        """Test that the JPEG is stored as is in a date-sharded directory."""
+        detection = Detection('person', 0.87654, (1, 2, 3, 4))
+        entry = self.store.save(self.jpeg, 'cam1', [detection], self.start).result()
+
+        self.assertEqual(entry['path'], '2024/05/17/cam1_20240517_142301_000000.jpg')
+        self.assertEqual(self.store.path(entry).read_bytes(), self.jpeg)
+        self.assertEqual(entry['detections'],
+                         [{'label': 'person', 'confidence': 0.877, 'box': [1, 2, 3, 4]}])
+
+    def test_thumbnail(self):
+        """Test that a small thumbnail is precomputed."""
+        entry = self.save(1)[0]
+        thumbnail = cv2.imread(str(self.store.path(entry, thumbnail=True)))
+        self.assertEqual(thumbnail.shape, (60, 80, 3))
+
+    def test_list_pages_newest_first(self):
+        """Test paginated listing, filtering by camera."""
+        entries = self.save(5)
+        self.save(2, camera_id='192.168.1.20')
+
+        page, total = self.store.list(offset=0, limit=2, camera='cam1')
+        self.assertEqual(total, 5)
+        self.assertEqual([entry['id'] for entry in page], [entries[4]['id'], entries[3]['id']])
+
+        page, total = self.store.list(offset=4, limit=2, camera='cam1')
+        self.assertEqual([entry['id'] for entry in page], [entries[0]['id']])
+
+        self.assertEqual(self.store.list(offset=10)[0], [])
+        self.assertEqual(self.store.list()[1], 7)
+
+    def test_index_survives_restart(self):
+        """Test that the index is reloaded from disk."""
+        entries = self.save(3)
+        self.store.close()
+
+        lines = (self.root / 'index.jsonl').read_text().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [entry['id'] for entry in entries])
+
+        self.store = SnapshotStore(self.root)
+        self.assertEqual(self.store.get(entries[1]['id']), entries[1])
+        self.assertEqual(self.store.list()[1], 3)
+
+    def test_unsafe_camera_id(self):
+        """Test that camera IDs can't escape the snapshot directory."""
+        entry = self.store.save(self.jpeg, '../cam/1', timestamp=self.start).result()
+        self.assertEqual(entry['camera'], '../cam/1')
+        self.assertTrue(self.store.path(entry).resolve().is_relative_to(self.root.resolve()))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the static_assets module.
+
+This module contains tests for fingerprinting the web interface files,
+rewriting references to them, and serving them compressed with cache
+headers and ETag revalidation.
+"""
+
+import unittest
+import gzip
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from aiohttp import web
+from aiohttp.test_utils import TestServer, TestClient
+
+# Add parent directory to path to import static_assets
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from static_assets import StaticAssets, parse_accept_encoding
+
+INDEX = '<html><head><link rel="stylesheet" href="css/styles.css"></head>' \
+        '<body><script src="js/main.js"></script></body></html>'
+MAIN = "const worker = new Worker('js/worker.js');\n" + '// padding\n' * 200
+WORKER = "self.onmessage = () => {};\n//# sourceMappingURL=js/main.js.map\n"
+
+class TestStaticAssets(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the StaticAssets class."""
+
+    def setUp(self):
+        """Write a small web interface."""
+        self.root = Path(tempfile.mkdtemp())
+        (self.root / 'js').mkdir()
+        (self.root / 'css').mkdir()
+        (self.root / 'img').mkdir()
+        (self.root / 'index.html').write_text(INDEX)
+        (self.root / 'js' / 'main.js').write_text(MAIN)
+        (self.root / 'js' / 'worker.js').write_text(WORKER)
+        # A name that contains another fingerprinted name must not be rewritten
+        (self.root / 'js' / 'main.js.map').write_text('{}')
+        (self.root / 'css' / 'styles.css').write_text("body { background: url('../img/bg.png'); }")
+        (self.root / 'img' / 'bg.png').write_bytes(b'\x89PNG' + bytes(100))
+
+    def tearDown(self):
+        """Remove the web interface."""
+        shutil.rmtree(self.root)
+
+    async def asyncSetUp(self):
+        """Serve the web interface."""
+        self.assets = StaticAssets(self.root)
+        app = web.Application()
+        app.router.add_get('/{path:.*}', self.assets.handle)
+        self.client = TestClient(TestServer(app), auto_decompress=False)
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        """Stop the server."""
+        await self.client.close()
+
+    def test_references_are_rewritten(self):
+        """Test that references use hashed names, and that hashes follow dependencies."""
+        names = self.assets.hashed_names
+        self.assertRegex(names['js/main.js'], r'^js/main\.[0-9a-f]{8}\.js$')
+        self.assertNotIn('img/bg.png', names)
+
+        index = self.assets.assets['index.html'].variants['identity'].decode()
+        self.assertIn(f'src="{names["js/main.js"]}"', index)
+        self.assertIn(f'href="{names["css/styles.css"]}"', index)
+        main = self.assets.assets[names['js/main.js']].variants['identity'].decode()
+        self.assertIn(f"new Worker('{names['js/worker.js']}')", main)
+        # js/main.js within js/main.js.map is not a reference to main.js
+        worker = self.assets.assets['js/worker.js'].variants['identity'].decode()
+        self.assertIn(names['js/main.js.map'], worker)
+        self.assertNotIn(names['js/main.js'], worker)
+
+        # Changing the worker changes the hash of the script that loads it
+        (self.root / 'js' / 'worker.js').write_text(WORKER + '// changed\n')
+        changed = StaticAssets(self.root).hashed_names
+        self.assertNotEqual(changed['js/worker.js'], names['js/worker.js'])
+        self.assertNotEqual(changed['js/main.js'], names['js/main.js'])
+        self.assertEqual(changed['css/styles.css'], names['css/styles.css'])
+
+    async def test_hashed_assets_are_immutable_and_compressed(self):
+        """Test that hashed URLs are cached forever and served gzip-compressed when accepted."""
+        url = '/' + self.assets.hashed_names['js/main.js']
+        response = await self.client.get(url, headers={'Accept-Encoding': 'gzip, br;q=0'})
+        self.assertEqual(response.status, 200)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        body = await response.read()
+        original = self.assets.assets['js/main.js'].variants['identity']
+        self.assertLess(len(body), len(original))
+        self.assertEqual(gzip.decompress(body), original)
+
+        # Without Accept-Encoding the file is sent as is
+        response = await self.client.get(url, headers={'Accept-Encoding': ''})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(await response.read(), original)
+
+    async def test_index_is_revalidated(self):
+        """Test that index.html is served for '/' with an ETag and answered with 304 while unchanged."""
+        response = await self.client.get('/')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        etag = response.headers['ETag']
+
+        response = await self.client.get('/index.html', headers={'If-None-Match': etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(await response.read(), b'')
+        response = await self.client.get('/', headers={'If-None-Match': '"other"'})
+        self.assertEqual(response.status, 200)
+
+    async def test_etag_per_encoding(self):
+        """Test that each encoding has its own ETag and any of them revalidates."""
+        etags = {}
+        for accept in ['', 'gzip']:
+            response = await self.client.get('/index.html', headers={'Accept-Encoding': accept})
+            etags[response.headers.get('Content-Encoding', 'identity')] = response.headers['ETag']
+        self.assertEqual(set(etags), {'identity', 'gzip'})
+        self.assertTrue(etags['gzip'].endswith('-gz"'))
+        self.assertNotEqual(etags['identity'], etags['gzip'])
+
+        # A client holding the gzip body is told it is current, with the ETag of what it would get
+        response = await self.client.get('/index.html', headers={'Accept-Encoding': '',
+                                                                 'If-None-Match': etags['gzip']})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(response.headers['ETag'], etags['identity'])
+
+    async def test_other_files(self):
+        """Test original names, binary files and missing files."""
+        response = await self.client.get('/js/main.js')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        response = await self.client.get('/img/bg.png', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.content_type, 'image/png')
+        self.assertNotIn('Content-Encoding', response.headers)
+        for path in ['/missing.js', '/../secret', '/js']:
+            response = await self.client.get(path)
+            self.assertEqual(response.status, 404)
+
+    def test_accept_encoding(self):
+        """Test parsing Accept-Encoding headers."""
+        self.assertEqual(parse_accept_encoding('gzip, deflate, br'), {'identity', 'gzip', 'deflate', 'br'})
+        self.assertEqual(parse_accept_encoding('br;q=0, GZIP;q=0.5'), {'identity', 'gzip'})
+        self.assertEqual(parse_accept_encoding(None), {'identity'})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the stats_publisher module.
+
+This module contains tests for stats diffing, the StatsPublisher class and
+the StageTimings class.
+"""
+
+import unittest
+import json
+import sys
+from pathlib import Path
+
+# Add parent directory to path to import stats_publisher
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from stats_publisher import StatsPublisher, StageTimings, diff_stats
+
+class TestDiffStats(unittest.TestCase):
+    """Test cases for the diff_stats function."""
+
+    def test_changed_fields_only(self):
+        """Test that unchanged fields are left out, also in nested dictionaries."""
+        previous = {'fps': 10, 'cameras': {'cam1': {'rate': 5, 'misses': 0}, 'cam2': {'rate': 3}}}
+        current = {'fps': 10, 'cameras': {'cam1': {'rate': 6, 'misses': 0}, 'cam2': {'rate': 3}}}
+        self.assertEqual(diff_stats(previous, current), {'cameras': {'cam1': {'rate': 6}}})
+
+    def test_added_and_removed_fields(self):
+        """Test that new fields are sent whole and removed fields as None."""
+        previous = {'cameras': {'cam1': {'rate': 5}}, 'old': 1}
+        current = {'cameras': {'cam2': {'rate': 3}}, 'new': [1, 2]}
+        self.assertEqual(diff_stats(previous, current),
+                         {'cameras': {'cam1': None, 'cam2': {'rate': 3}}, 'new': [1, 2], 'old': None})
+
+    def test_no_changes(self):
+        """Test that equal stats produce no changes."""
+        self.assertEqual(diff_stats({'a': {'b': 1}}, {'a': {'b': 1}}), {})
+
+class TestStatsPublisher(unittest.TestCase):
+    """Test cases for the StatsPublisher class."""
+
+    def test_ticks(self):
+        """Test full first message, incremental updates and silent ticks."""
+        publisher = StatsPublisher()
+        self.assertIsNone(publisher.full_message())
+
+        first = json.loads(publisher.update({'fps': 10, 'detections': 2}))
+        self.assertEqual(first, {'type': 'stats', 'full': True, 'fps': 10, 'detections': 2})
+
+        self.assertEqual(json.loads(publisher.update({'fps': 12, 'detections': 2})),
+                         {'type': 'stats', 'fps': 12})
+        self.assertIsNone(publisher.update({'fps': 12, 'detections': 2}))
+
+        # Late joiners get everything as of the last tick
+        self.assertEqual(json.loads(publisher.full_message()),
+                         {'type': 'stats', 'full': True, 'fps': 12, 'detections': 2})
+
+class TestStageTimings(unittest.TestCase):
+    """Test cases for the StageTimings class."""
+
+    def test_moving_average(self):
+        """Test that stage times are smoothed and reported in milliseconds."""
+        timings = StageTimings(smoothing=0.5)
+        timings.add('decode', 0.004)
+        timings.add('decode', 0.002)
+        timings.add('inference', 0.1)
+        self.assertEqual(timings.snapshot(), {'decode': 3.0, 'inference': 100.0})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the stream_receiver module.
+
+This module contains tests for how the receiver processes camera frames,
+run against a tiny model with the servers not started.
+"""
+
+import unittest
+import asyncio
+import shutil
+import sys
+import tempfile
+import cv2
+import numpy as np
+from pathlib import Path
+
+# Add parent directory to path to import stream_receiver
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from tests.model_fixtures import write_tiny_yolo
+from demand import DETECTIONS, IDLE
+from stats_publisher import StageTimings
+from worker_pool import WorkerPool
+from ai_processor import AIProcessor
+
+def jpeg(color):
+    """Return a JPEG of one color."""
+    return cv2.imencode('.jpg', np.full((120, 160, 3), color, dtype=np.uint8))[1].tobytes()
+
+def setUpModule():
+    """Import the receiver with a tiny model and temporary directories."""
+    global receiver, directory
+    directory = Path(tempfile.mkdtemp())
+    write_tiny_yolo(directory)
+    argv = sys.argv
+    sys.argv = ['stream_receiver.py', '--no-display', '--no-web', '--no-detection-log', '--no-profile',
+                '--model', 'yolov4_tiny', '--model-dir', str(directory),
+                '--snapshot-dir', str(directory / 'snapshots'), '--roi-file', str(directory / 'roi.json')]
+    try:
+        import stream_receiver as receiver
+    finally:
+        sys.argv = argv
+
+def tearDownModule():
+    """Stop the snapshot writer and remove the directories."""
+    receiver.snapshot_store.close()
+    shutil.rmtree(directory)
+
+class TestSnapshots(unittest.IsolatedAsyncioTestCase):
+    """Test cases for snapshots of processed frames."""
+
+    def setUp(self):
+        """Add a camera without consumers."""
+        self.camera = receiver.cameras.setdefault('cam1', {'id': 'cam1', 'timings': StageTimings()})
+
+    def tearDown(self):
+        """Remove the camera and consumers."""
+        receiver.cameras.clear()
+        receiver.demand.remove(DETECTIONS, 'test')
+
+    async def test_snapshot_while_idle(self):
+        """Test that an idle camera's snapshot pairs the last detected JPEG with its detections."""
+        # Nobody uses the frames: nothing is processed, and there is nothing to take
+        await receiver.process_message(jpeg((0, 0, 255)), self.camera)
+        self.assertEqual(self.camera['mode'], IDLE)
+        self.assertIsNone(receiver.take_snapshot('cam1'))
+        self.assertIsNone(receiver.take_snapshot())
+
+        # One frame is detected, the next ones arrive within the detection interval
+        receiver.demand.add(DETECTIONS, 'test')
+        detected = jpeg((0, 255, 0))
+        await receiver.process_message(detected, self.camera)
+        detections = self.camera['detections']
+        await receiver.process_message(jpeg((255, 0, 0)), self.camera)
+        self.assertEqual(self.camera['mode'], IDLE)
+
+        entry = receiver.take_snapshot('cam1').result(timeout=10)
+        path = receiver.snapshot_store.path(entry)
+        self.assertEqual(Path(path).read_bytes(), detected)
+        self.assertEqual(len(entry['detections']), len(detections))
+
+class TestLocalWorkers(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the worker processes started with --local-workers."""
+
+    async def asyncSetUp(self):
+        """Start a worker pool as the receiver does, with a profile's input size."""
+        self.pool = WorkerPool(max_in_flight=1, timeout=30.0)
+        self.pool.configure(model='yolov4_tiny', confidence=0.3)
+        server = await self.pool.start('127.0.0.1', 0)
+        self.port = server.sockets[0].getsockname()[1]
+        self.options = (receiver.args.input_size, receiver.args.local_workers, receiver.args.confidence)
+        receiver.args.input_size, receiver.args.local_workers, receiver.args.confidence = 320, 1, 0.3
+        self.processes = []
+
+    async def asyncTearDown(self):
+        """Stop the workers and the pool."""
+        receiver.args.input_size, receiver.args.local_workers, receiver.args.confidence = self.options
+        for process in self.processes:
+            process.terminate()
+            process.wait()
+        self.pool.close()
+
+    async def test_workers_use_profile_input_size(self):
+        """Test that local workers run at the configured input size when frames don't name one."""
+        frame = np.random.RandomState(1).randint(0, 255, (240, 320, 3), dtype=np.uint8)
+        message = cv2.imencode('.jpg', frame)[1].tobytes()
+        decoded = cv2.imdecode(np.frombuffer(message, np.uint8), cv2.IMREAD_COLOR)
+        expected = {}
+        for size in [320, 416]:
+            local = AIProcessor('yolov4_tiny', confidence_threshold=receiver.args.confidence,
+                                model_dir=directory, input_size=size)
+            expected[size] = [(d.label, d.box) for d in local.detect(decoded)]
+        # The tiny model's default size (416) must give other detections for the test to tell
+        self.assertNotEqual(expected[320], expected[416])
+
+        self.processes = receiver.start_local_workers(self.port)
+        for _ in range(3000):
+            if self.pool.workers:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(len(self.pool.workers), 1)
+
+        # Without adaptive input sizes the receiver sends no size with the frame
+        detections, _, _ = await self.pool.submit(message, None)
+        self.assertEqual([(d.label, d.box) for d in detections], expected[320])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the tcp_ingest module.
+
+This module contains tests for the binary TCP ingest protocol, using a
+FrameReceiver server and FrameSender client on the loopback interface.
+"""
+
+import unittest
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path to import tcp_ingest
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from tcp_ingest import FrameReceiver, FrameSender, pack_header, HEADER
+
+class TestTcpIngest(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the FrameReceiver and FrameSender classes."""
+
+    async def asyncSetUp(self):
+        """Start an ingest server that records frames and closed connections."""
+        self.frames = []
+        self.receivers = []
+        self.closed = asyncio.Event()
+
+        def create_receiver():
+            # The small receive buffer makes frames over 64 bytes take the direct read path
+            receiver = FrameReceiver(lambda receiver, frame: self.frames.append(frame),
+                                     lambda receiver: self.closed.set(), max_frame_size=1024,
+                                     buffer_size=64)
+            self.receivers.append(receiver)
+            return receiver
+
+        self.server = await asyncio.get_running_loop().create_server(create_receiver, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        """Stop the server."""
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def wait_for_frames(self, count):
+        """Wait until the server has received count frames."""
+        for _ in range(200):
+            if len(self.frames) >= count:
+                return
+            await asyncio.sleep(0.01)
+        self.fail(f"Received {len(self.frames)} of {count} frames")
+
+    async def test_frames_and_commands(self):
+        """Test that frames arrive intact and commands reach the sender."""
+        sender = FrameSender('door')
+        await sender.connect('127.0.0.1', self.port)
+        await sender.send(b'\xff\xd8first', timestamp_us=1000)
+        await sender.send(b'\xff\xd8' + bytes(range(200)), timestamp_us=2000)
+        await self.wait_for_frames(2)
+
+        self.assertEqual([(frame.camera_id, frame.sequence, frame.timestamp_us) for frame in self.frames],
+                         [('door', 0, 1000), ('door', 1, 2000)])
+        self.assertEqual(bytes(self.frames[0].data), b'\xff\xd8first')
+        self.assertEqual(bytes(self.frames[1].data), b'\xff\xd8' + bytes(range(200)))
+
+        self.receivers[0].send_command({'type': 'rate_control', 'interval_ms': 100})
+        commands = sender.commands()
+        self.assertEqual(await commands.__anext__(), {'type': 'rate_control', 'interval_ms': 100})
+        await sender.close()
+        await asyncio.wait_for(self.closed.wait(), 1)
+
+    async def test_split_writes_and_lost_frames(self):
+        """Test frames sent in small pieces, without a camera ID and with a sequence gap."""
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        data = pack_header('', 5, 0, 3) + b'abc' + pack_header('', 8, 0, 0)
+        for i in range(len(data)):
+            writer.write(data[i:i + 1])
+            await writer.drain()
+        await self.wait_for_frames(2)
+
+        self.assertEqual([(frame.camera_id, bytes(frame.data)) for frame in self.frames], [('', b'abc'), ('', b'')])
+        self.assertEqual(self.receivers[0].stats(), {'frames': 2, 'bytes': 2 * HEADER.size + 3, 'lost': 2})
+        writer.close()
+
+    async def test_invalid_frames_close_connection(self):
+        """Test that a bad header or an oversized frame closes the connection."""
+        for data in [b'GET / HTTP/1.1\r\nHost: cam\r\n\r\n', pack_header('cam', 0, 0, 4096)]:
+            self.closed.clear()
+            reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+            writer.write(data)
+            await asyncio.wait_for(self.closed.wait(), 1)
+            writer.close()
+        self.assertEqual(self.frames, [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the thread_budget module.
+
+This module contains tests for CPU list parsing, topology detection from a
+generated /sys tree, the automatic budget on different machine shapes, and
+pinning threads to a stage's CPUs.
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+import cv2
+from pathlib import Path
+
+# Add parent directory to path to import thread_budget
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from thread_budget import (ThreadBudget, StageBudget, parse_cpu_list, format_cpu_list, cpu_topology,
+                           split_cores, available_cpus)
+
+def smt_cores(count):
+    """Physical cores with two hyper-threads each, numbered like Linux (siblings count apart)."""
+    return [[core, core + count] for core in range(count)]
+
+class TestThreadBudget(unittest.TestCase):
+    """Test cases for the ThreadBudget class and topology helpers."""
+
+    def test_cpu_lists(self):
+        """Test parsing and formatting CPU lists."""
+        self.assertEqual(parse_cpu_list('0-3,6, 8-9'), [0, 1, 2, 3, 6, 8, 9])
+        self.assertEqual(format_cpu_list([9, 0, 1, 2, 3, 6, 8]), '0-3,6,8-9')
+        for text in ['', '3-1', 'a', '-1']:
+            with self.assertRaises(ValueError):
+                parse_cpu_list(text)
+
+    def test_topology_groups_siblings(self):
+        """Test that hyper-threading siblings are grouped into physical cores."""
+        sysfs = Path(tempfile.mkdtemp())
+        try:
+            # Two packages with two cores each; CPUs 4-7 are the second hyper-threads
+            for cpu in range(8):
+                topology = sysfs / f"cpu{cpu}" / "topology"
+                topology.mkdir(parents=True)
+                (topology / 'physical_package_id').write_text(f"{(cpu % 4) // 2}\n")
+                (topology / 'core_id').write_text(f"{cpu % 2}\n")
+            self.assertEqual(cpu_topology(range(8), sysfs), [[0, 4], [1, 5], [2, 6], [3, 7]])
+            self.assertEqual(cpu_topology([1, 5, 6], sysfs), [[1, 5], [6]])
+            # No topology files: every CPU is its own core
+            self.assertEqual(cpu_topology([0, 1], sysfs / 'missing'), [[0], [1]])
+        finally:
+            shutil.rmtree(sysfs)
+
+    def test_auto_budget(self):
+        """Test the automatic budget on small and large machines."""
+        single = ThreadBudget.auto([[0, 1]])
+        self.assertEqual(single.stages['inference'], StageBudget([0, 1], 1))
+        self.assertEqual(single.stages['ingest'].cpus, [0, 1])
+
+        quad = ThreadBudget.auto(smt_cores(4))
+        self.assertEqual(quad.describe(), {
+            'ingest': {'cpus': '0,4', 'threads': 1},
+            'inference': {'cpus': '1-3,5-7', 'threads': 3},
+            'encode': {'cpus': '0,4', 'threads': 1}
+        })
+
+        large = ThreadBudget.auto(smt_cores(16))
+        self.assertEqual(large.stages['ingest'].cpus, [0, 1, 16, 17])
+        self.assertEqual(large.stages['encode'].cpus, [2, 18])
+        self.assertEqual(large.threads('inference'), 13)
+
+        workers = ThreadBudget.auto(smt_cores(4), ingest=False)
+        self.assertEqual(list(workers.stages), ['inference'])
+        self.assertEqual(workers.threads('inference'), 4)
+
+    def test_split_cores(self):
+        """Test dividing cores between processes."""
+        self.assertEqual(split_cores(smt_cores(5), 2),
+                         [StageBudget([0, 1, 2, 5, 6, 7], 3), StageBudget([3, 4, 8, 9], 2)])
+        # More processes than cores: they share
+        self.assertEqual(split_cores([[0], [1]], 3), [StageBudget([0], 1), StageBudget([1], 1), StageBudget([0], 1)])
+
+    def test_from_args(self):
+        """Test budgets selected by command-line options."""
+        self.assertIsNone(ThreadBudget.from_args('off'))
+        cpus = format_cpu_list(available_cpus())
+        budget = ThreadBudget.from_args('off', inference_cpus=cpus, inference_threads=2)
+        self.assertEqual(list(budget.stages), ['inference'])
+        self.assertEqual(budget.stages['inference'], StageBudget(available_cpus(), 2))
+        self.assertEqual(set(ThreadBudget.from_args('auto').stages), {'ingest', 'inference', 'encode'})
+        with self.assertRaises(ValueError):
+            ThreadBudget.from_args('auto', ingest_cpus=str(max(available_cpus()) + 1))
+
+    @unittest.skipUnless(hasattr(os, 'sched_setaffinity'), "needs os.sched_setaffinity")
+    def test_executor_thread_is_pinned(self):
+        """Test that a stage's executor thread runs on the stage's CPUs with its OpenCV thread count."""
+        cpu = available_cpus()[-1]
+        budget = ThreadBudget({'inference': StageBudget([cpu], 1)})
+        previous = cv2.getNumThreads()
+        executor = budget.executor('inference')
+        try:
+            affinity, threads = executor.submit(lambda: (os.sched_getaffinity(0), cv2.getNumThreads())).result()
+            self.assertEqual(affinity, {cpu})
+            self.assertEqual(threads, 1)
+            # Only the executor's thread was pinned
+            self.assertEqual(sorted(os.sched_getaffinity(0)), available_cpus())
+        finally:
+            executor.shutdown()
+            cv2.setNumThreads(previous)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the tuning module.
+
+This module contains tests for choosing runtime settings from machine
+measurements and for writing and loading runtime profiles.
+"""
+
+import unittest
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path to import tuning
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from tuning import choose_settings, save_profile, load_profile, profile_defaults, apply_profile
+
+HOST = {'machine': 'x86_64', 'system': 'Linux', 'cpus': 8, 'cores': 4}
+
+def measure(model, input_size, threads, detect_ms):
+    """Return one inference measurement."""
+    return {'model': model, 'input_size': input_size, 'threads': threads, 'detect_ms': detect_ms}
+
+# yolov4 is accurate but slow, yolov4_tiny fast; more threads help sublinearly
+MEASUREMENTS = [
+    measure('yolov4', 416, 1, 400.0), measure('yolov4', 416, 3, 160.0),
+    measure('yolov4', 320, 1, 250.0), measure('yolov4', 320, 3, 100.0),
+    measure('yolov4_tiny', 416, 1, 40.0), measure('yolov4_tiny', 416, 3, 18.0),
+    measure('yolov4_tiny', 320, 1, 25.0), measure('yolov4_tiny', 320, 3, 11.0),
+]
+
+class TestChooseSettings(unittest.TestCase):
+    """Test cases for choose_settings()."""
+
+    def test_prefers_accuracy_when_it_keeps_up(self):
+        """Test that a light load gets the most accurate model and input size."""
+        choice = choose_settings(MEASUREMENTS, decode_ms=2.0, cameras=1, fps=2, cores=4)
+        self.assertEqual(choice['settings']['model'], 'yolov4')
+        self.assertEqual(choice['settings']['input_size'], 416)
+        # One process with 3 threads (160 ms) keeps up; among those, the lowest latency wins
+        self.assertEqual((choice['settings']['dnn_threads'], choice['settings']['local_workers']), (3, 0))
+        self.assertTrue(choice['expected']['meets_target'])
+        self.assertEqual(choice['settings']['max_camera_fps'], 2)
+
+    def test_processes_and_interval(self):
+        """Test that detecting on every frame comes before accuracy, using several processes where needed."""
+        # 1 camera at 10 fps: three single-thread processes of yolov4 at 320 make 9 inferences/s,
+        # so detecting every frame needs yolov4_tiny
+        choice = choose_settings(MEASUREMENTS, decode_ms=2.0, cameras=1, fps=10, cores=4)
+        self.assertEqual(choice['settings']['model'], 'yolov4_tiny')
+        self.assertEqual(choice['settings']['input_size'], 416)
+
+        # 2 cameras at 5 fps are 10 inferences/s, more than yolov4 makes (at most 9/s at 320).
+        # Every other frame is 5/s, which three single-thread processes make at 416 (5.6/s).
+        choice = choose_settings([m for m in MEASUREMENTS if m['model'] == 'yolov4'], decode_ms=2.0,
+                                 cameras=2, fps=5, cores=4)
+        self.assertEqual(choice['settings']['model'], 'yolov4:2')
+        self.assertEqual(choice['settings']['input_size'], 416)
+        self.assertEqual((choice['settings']['dnn_threads'], choice['settings']['local_workers']), (1, 2))
+
+    def test_overload(self):
+        """Test that an impossible target picks the fastest setting and reports what it sustains."""
+        # 480 frames/s; three processes of yolov4_tiny at 320 make 90/s, 270 at every third frame
+        choice = choose_settings(MEASUREMENTS, decode_ms=2.0, cameras=8, fps=60, cores=4)
+        self.assertEqual(choice['settings']['model'], 'yolov4_tiny:3')
+        self.assertEqual(choice['settings']['input_size'], 320)
+        self.assertEqual((choice['settings']['dnn_threads'], choice['settings']['local_workers']), (1, 2))
+        self.assertFalse(choice['expected']['meets_target'])
+        self.assertEqual(choice['expected']['camera_fps'], 33.8)
+        self.assertEqual(choice['settings']['max_camera_fps'], choice['expected']['camera_fps'])
+
+    def test_decode_limit(self):
+        """Test that the camera frame rate is capped to what the event loop can decode."""
+        # 10 ms per frame is 75 decodes/s with headroom, shared by 5 cameras
+        choice = choose_settings(MEASUREMENTS, decode_ms=10.0, cameras=5, fps=30, cores=4)
+        self.assertEqual(choice['settings']['max_camera_fps'], 15)
+
+    def test_single_core(self):
+        """Test that one core is shared by decoding and a single inference process."""
+        choice = choose_settings([measure('yolov4_tiny', 416, 1, 40.0), measure('yolov4_tiny', 416, 3, 18.0)],
+                                 decode_ms=2.0, cameras=1, fps=5, cores=1)
+        self.assertEqual((choice['settings']['dnn_threads'], choice['settings']['local_workers']), (1, 0))
+        self.assertTrue(choice['expected']['meets_target'])
+        with self.assertRaises(ValueError):
+            choose_settings([], decode_ms=2.0, cameras=1, fps=5, cores=1)
+
+class TestProfiles(unittest.TestCase):
+    """Test cases for runtime profile files."""
+
+    def setUp(self):
+        """Create a temporary directory."""
+        self.directory = Path(tempfile.mkdtemp())
+        self.path = self.directory / 'runtime_profile.json'
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        """Test that a saved profile loads on the same machine and sets option defaults."""
+        choice = choose_settings(MEASUREMENTS, decode_ms=2.0, cameras=1, fps=2, cores=4)
+        save_profile(self.path, choice, MEASUREMENTS, 2.0, 1, 2, host=HOST)
+        profile = load_profile(self.path, host=HOST)
+        self.assertEqual(profile['target'], {'cameras': 1, 'fps': 2})
+        self.assertEqual(profile_defaults(profile), {'model': 'yolov4', 'input_size': 416, 'dnn_threads': 3,
+                                                     'local_workers': 0, 'max_camera_fps': 2})
+        self.assertEqual(len(profile['measurements']['inference']), len(MEASUREMENTS))
+
+    def test_rejected_profiles(self):
+        """Test missing, foreign and unreadable profiles."""
+        self.assertIsNone(load_profile(self.path, host=HOST))
+
+        choice = choose_settings(MEASUREMENTS, decode_ms=2.0, cameras=1, fps=2, cores=4)
+        save_profile(self.path, choice, MEASUREMENTS, 2.0, 1, 2, host=HOST)
+        with self.assertRaisesRegex(ValueError, 'another machine'):
+            load_profile(self.path, host=dict(HOST, cores=2, cpus=4))
+
+        profile = json.loads(self.path.read_text())
+        self.path.write_text(json.dumps(dict(profile, version=99)))
+        with self.assertRaisesRegex(ValueError, 'version'):
+            load_profile(self.path, host=HOST)
+        self.path.write_text('{')
+        with self.assertRaises(ValueError):
+            load_profile(self.path, host=HOST)
+
+    def test_model_override(self):
+        """Test that a profile's input size and threads only apply to the profile's model."""
+        choice = choose_settings(MEASUREMENTS, decode_ms=2.0, cameras=2, fps=5, cores=4)
+        choice['settings'].update(model='yolov4:2', input_size=320)
+        profile = save_profile(self.path, choice, MEASUREMENTS, 2.0, 2, 5, host=HOST)
+
+        def parse(*argv):
+            parser = argparse.ArgumentParser()
+            parser.add_argument('--model', default='yolov4')
+            parser.add_argument('--input-size', type=int, default=None)
+            parser.add_argument('--dnn-threads', type=int, default=0)
+            parser.add_argument('--local-workers', type=int, default=0)
+            parser.add_argument('--max-camera-fps', type=float, default=None)
+            apply_profile(parser, profile, list(argv))
+            return parser.parse_args(list(argv))
+
+        args = parse()
+        self.assertEqual((args.model, args.input_size), ('yolov4:2', 320))
+        # Another model runs at its own input size, every frame, with the default threads
+        args = parse('--model', 'yolov8n_onnx')
+        self.assertEqual((args.model, args.input_size, args.dnn_threads), ('yolov8n_onnx', None, 0))
+        self.assertEqual(args.max_camera_fps, choice['settings']['max_camera_fps'])
+        # The profile's model at another interval keeps its settings
+        args = parse('--model', 'yolov4:1')
+        self.assertEqual((args.model, args.input_size), ('yolov4:1', 320))
+        # Given on the command line, the input size wins
+        args = parse('--model', 'yolov8n_onnx', '--input-size', '640')
+        self.assertEqual(args.input_size, 640)
+
+if __name__ == "__main__":
+    unittest.main()
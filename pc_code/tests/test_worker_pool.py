@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the worker_pool module.
+
+This module contains tests for the WorkerPool class, using simulated
+workers on the loopback interface and real inference_worker.py processes
+running a tiny generated YOLO network, including preforked processes
+sharing one copy of it.
+"""
+
+import unittest
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import shutil
+import cv2
+import numpy as np
+from pathlib import Path
+
+# Add parent directory to path to import worker_pool
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from ai_processor import AIProcessor
+from model_backends import Detection
+from worker_pool import (WorkerPool, WorkerLost, MESSAGE, JOB, RESULT, HELLO, CONFIG, STATUS, JOB_KIND,
+                         RESULT_KIND, pack_message, encode_detections, decode_detections)
+from inference_worker import process_memory, can_share
+from roi import RegionOfInterest
+from tests.model_fixtures import write_tiny_yolo
+
+PERSON = Detection('person', 0.9, (10, 20, 30, 40), 0, 'yolov4_tiny')
+
+class SimulatedWorker:
+    """Worker speaking the protocol that answers only when told to."""
+
+    async def connect(self, port, name):
+        """Connect to the pool and start collecting jobs."""
+        self.reader, self.writer = await asyncio.open_connection('127.0.0.1', port)
+        self.writer.write(pack_message(HELLO, json.dumps({'name': name}).encode('utf-8')))
+        self.configs = []
+        self.jobs = []
+        self.task = asyncio.ensure_future(self.read())
+
+    async def read(self):
+        """Record config messages and job IDs."""
+        try:
+            while True:
+                length, kind = MESSAGE.unpack(await self.reader.readexactly(MESSAGE.size))
+                body = await self.reader.readexactly(length)
+                if bytes([kind]) == CONFIG:
+                    self.configs.append(json.loads(body))
+                elif bytes([kind]) == JOB_KIND:
+                    self.jobs.append(JOB.unpack_from(body)[0])
+        except asyncio.IncompleteReadError:
+            pass
+
+    def answer(self, job_id, detections=(PERSON,)):
+        """Send the result of a job."""
+        result = {'detections': encode_detections(detections), 'shape': [480, 640], 'ms': 12.5}
+        self.writer.write(pack_message(RESULT_KIND, RESULT.pack(job_id) + json.dumps(result).encode('utf-8')))
+
+    def close(self):
+        """Disconnect from the pool."""
+        self.task.cancel()
+        self.writer.close()
+
+class TestWorkerPool(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the WorkerPool class."""
+
+    async def asyncSetUp(self):
+        """Start a pool that counts capacity changes."""
+        self.changes = 0
+        self.pool = WorkerPool(max_in_flight=2, timeout=1.0, on_change=self.changed)
+        self.pool.configure(model='yolov4_tiny', confidence=0.4)
+        server = await self.pool.start('127.0.0.1', 0)
+        self.port = server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        """Stop the pool."""
+        self.pool.close()
+
+    def changed(self):
+        self.changes += 1
+
+    async def add_worker(self, name):
+        """Connect a simulated worker and wait until the pool has registered it."""
+        worker = SimulatedWorker()
+        await worker.connect(self.port, name)
+        await self.wait_until(lambda: name in self.pool.workers)
+        return worker
+
+    async def wait_until(self, condition, timeout=10.0):
+        """Wait until condition() is true."""
+        for _ in range(int(timeout / 0.01)):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        self.fail("Condition not reached")
+
+    def test_detection_encoding(self):
+        """Test that detections survive the trip through JSON."""
+        face = Detection('face', 0.75, (1, 2, 3, 4), -1, 'mediapipe_face',
+                         np.array([[5.0, 6.0, 1.0]], dtype=np.float32))
+        decoded = decode_detections(json.loads(json.dumps(encode_detections([PERSON, face]))))
+        self.assertEqual(decoded[0], PERSON)
+        self.assertEqual(decoded[1][:5], face[:5])
+        np.testing.assert_array_equal(decoded[1].landmarks, face.landmarks)
+
+    async def test_load_aware_dispatch_and_in_flight_limit(self):
+        """Test that frames go to the quickest free worker and no worker gets more than its limit."""
+        fast = await self.add_worker('fast')
+        slow = await self.add_worker('slow')
+        self.assertEqual(self.pool.capacity, 4)
+        self.pool.workers['fast'].turnaround = 0.01
+        self.pool.workers['slow'].turnaround = 0.1
+
+        pending = [self.pool.submit(b'jpeg') for _ in range(4)]
+        self.assertIsNone(self.pool.submit(b'jpeg'))
+        await self.wait_until(lambda: len(fast.jobs) + len(slow.jobs) == 4)
+        self.assertEqual((len(fast.jobs), len(slow.jobs)), (2, 2))
+        self.assertEqual(fast.configs, [{'model': 'yolov4_tiny', 'confidence': 0.4}])
+
+        for job_id in fast.jobs:
+            fast.answer(job_id)
+        for job_id in slow.jobs:
+            slow.answer(job_id, [])
+        results = await asyncio.gather(*pending)
+        self.assertEqual([len(detections) for detections, _, _ in results], [1, 1, 0, 0])
+        self.assertEqual(results[0], ([PERSON], (480, 640), 0.0125))
+        self.assertEqual(self.pool.stats()['fast']['completed'], 2)
+
+    async def test_disconnect_fails_frames_in_flight(self):
+        """Test that a worker disappearing fails its frames so they can run locally."""
+        worker = await self.add_worker('flaky')
+        pending = self.pool.submit(b'jpeg')
+        await self.wait_until(lambda: worker.jobs)
+        worker.close()
+
+        with self.assertRaises(WorkerLost):
+            await pending
+        await self.wait_until(lambda: not self.pool.workers)
+        self.assertEqual(self.pool.capacity, 0)
+        self.assertIsNone(self.pool.submit(b'jpeg'))
+        self.assertEqual(self.changes, 2)
+
+    async def test_timeout_disconnects_silent_worker(self):
+        """Test that frames time out and a worker that keeps timing out is dropped."""
+        self.pool.timeout = 0.05
+        self.pool.max_timeouts = 2
+        worker = await self.add_worker('silent')
+        for _ in range(2):
+            with self.assertRaises(WorkerLost):
+                await self.pool.submit(b'jpeg')
+        await self.wait_until(lambda: not self.pool.workers)
+
+        # A late answer for a frame that timed out is ignored
+        worker.answer(1)
+        worker.close()
+
+    async def test_status_in_stats(self):
+        """Test that the last status a worker reports shows up in its stats."""
+        worker = await self.add_worker('reporting')
+        status = {'pid': 42, 'model': 'yolov4_tiny', 'rss_mb': 80.0, 'shared': True, 'spawn_s': 0.2}
+        worker.writer.write(pack_message(STATUS, json.dumps(status).encode('utf-8')))
+        await self.wait_until(lambda: self.pool.stats()['reporting'].get('pid') == 42)
+        stats = self.pool.stats()['reporting']
+        self.assertEqual({key: stats[key] for key in status}, status)
+        self.assertEqual(stats['completed'], 0)
+        worker.close()
+
+    def test_process_memory_and_sharing(self):
+        """Test the memory report and which models can be shared by forked processes."""
+        memory = process_memory()
+        if memory is None:
+            self.skipTest("/proc/<pid>/smaps_rollup not available")
+        self.assertGreater(memory['rss_mb'], 0)
+        self.assertLessEqual(memory['private_mb'], memory['rss_mb'])
+        self.assertTrue(can_share('yolov4_tiny:2,yolov4'))
+        self.assertFalse(can_share('yolov4_tiny,mediapipe_face'))
+        self.assertFalse(can_share('yolov4_tiny>mediapipe_pose'))
+
+class TestLocalWorkerProcesses(unittest.IsolatedAsyncioTestCase):
+    """Test the pool with inference_worker.py processes on this host."""
+
+    async def asyncSetUp(self):
+        """Write a tiny YOLO network and start a pool for it."""
+        self.model_dir = Path(tempfile.mkdtemp())
+        write_tiny_yolo(self.model_dir)
+        self.pool = WorkerPool(max_in_flight=1, timeout=30.0)
+        self.pool.configure(model='yolov4_tiny', confidence=0.3)
+        server = await self.pool.start('127.0.0.1', 0)
+        self.port = server.sockets[0].getsockname()[1]
+        self.processes = []
+
+    async def asyncTearDown(self):
+        """Stop the workers and the pool."""
+        for process in self.processes:
+            # Also stops the processes forked by a --processes worker
+            os.killpg(process.pid, 9)
+            process.wait()
+        self.pool.close()
+        shutil.rmtree(self.model_dir)
+
+    def start_worker(self, *args):
+        """Start inference_worker.py connected to the pool."""
+        self.processes.append(subprocess.Popen(
+            [sys.executable, 'inference_worker.py', '--server', f'127.0.0.1:{self.port}',
+             '--model-dir', str(self.model_dir), '--retry', '0.2', *args],
+            cwd=Path(__file__).parent.parent, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True))
+
+    async def wait_until(self, condition, timeout=30.0):
+        """Wait until condition() is true."""
+        for _ in range(int(timeout / 0.01)):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        self.fail("Condition not reached")
+
+    def expected_detections(self, jpeg):
+        """Run the model locally on a JPEG."""
+        local = AIProcessor('yolov4_tiny', confidence_threshold=0.3, model_dir=self.model_dir)
+        return local.detect(cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR))
+
+    async def test_workers_match_local_inference(self):
+        """Test that two worker processes return the same detections as local inference."""
+        for name in ['w1', 'w2']:
+            self.start_worker('--name', name)
+        await self.wait_until(lambda: len(self.pool.workers) == 2)
+        self.assertEqual(sorted(self.pool.workers), ['w1', 'w2'])
+
+        frame = np.random.RandomState(1).randint(0, 255, (240, 320, 3), dtype=np.uint8)
+        jpeg = cv2.imencode('.jpg', frame)[1].tobytes()
+        expected = self.expected_detections(jpeg)
+
+        # One frame each (in-flight limit 1), then the pool is full
+        pending = [self.pool.submit(jpeg), self.pool.submit(jpeg, input_size=416)]
+        self.assertIsNone(self.pool.submit(jpeg))
+        for detections, shape, _ in await asyncio.gather(*pending):
+            self.assertEqual(shape, (240, 320))
+            self.assertEqual([(d.label, d.box) for d in detections], [(d.label, d.box) for d in expected])
+        self.assertEqual({name: stats['completed'] for name, stats in self.pool.stats().items()},
+                         {'w1': 1, 'w2': 1})
+
+        # A worker that dies no longer gets frames
+        self.processes[0].kill()
+        await self.wait_until(lambda: len(self.pool.workers) == 1, timeout=5.0)
+        self.assertEqual(list(self.pool.workers), ['w2'])
+
+    async def test_workers_crop_to_regions(self):
+        """Test that a worker runs the model on a camera's regions of interest, as local inference does."""
+        self.start_worker('--name', 'roi')
+        await self.wait_until(lambda: len(self.pool.workers) == 1)
+
+        frame = np.random.RandomState(1).randint(0, 255, (240, 320, 3), dtype=np.uint8)
+        jpeg = cv2.imencode('.jpg', frame)[1].tobytes()
+        decoded = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        regions = [{'rect': [0.0, 0.0, 0.5, 1.0]}]
+        roi = RegionOfInterest(regions)
+        local = AIProcessor('yolov4_tiny', confidence_threshold=0.3, model_dir=self.model_dir)
+        expected = [(d.label, d.box) for d in roi.detect(local, decoded)]
+        # The crop is seen at a higher resolution, so filtering full-frame detections gives others
+        self.assertNotEqual(expected, [(d.label, d.box) for d in roi.filter(local.detect(decoded), decoded.shape)])
+
+        detections, shape, _ = await self.pool.submit(jpeg, regions=regions)
+        self.assertEqual(shape, (240, 320))
+        self.assertEqual([(d.label, d.box) for d in detections], expected)
+
+        # Invalid regions fail the frame, which then runs locally
+        with self.assertRaises(WorkerLost):
+            await self.pool.submit(jpeg, regions=[{'rect': [0.5, 0.5]}])
+
+    @unittest.skipUnless(hasattr(os, 'fork') and Path('/proc/self/smaps_rollup').exists(),
+                         "needs fork and /proc/<pid>/smaps_rollup")
+    async def test_preforked_workers_share_model(self):
+        """Test that processes forked after loading the model share it and still detect correctly."""
+        self.start_worker('--name', 'shared', '--processes', '2', '--model', 'yolov4_tiny',
+                          '--confidence', '0.3', '--input-sizes', '416,320')
+        names = ['shared-0', 'shared-1']
+        await self.wait_until(lambda: sorted(self.pool.workers) == names and
+                              all('pid' in worker.status for worker in self.pool.workers.values()))
+
+        stats = self.pool.stats()
+        self.assertEqual(len({stats[name]['pid'] for name in names}), 2)
+        for name in names:
+            self.assertTrue(stats[name]['shared'])
+            self.assertEqual(stats[name]['model'], 'yolov4_tiny')
+            self.assertGreaterEqual(stats[name]['spawn_s'], 0)
+            # Pages inherited from the parent are shared, so each process's share is below its RSS
+            self.assertLess(stats[name]['pss_mb'], stats[name]['rss_mb'])
+
+        frame = np.random.RandomState(2).randint(0, 255, (240, 320, 3), dtype=np.uint8)
+        jpeg = cv2.imencode('.jpg', frame)[1].tobytes()
+        pending = [self.pool.submit(jpeg, input_size=320), self.pool.submit(jpeg, input_size=320)]
+        local = AIProcessor('yolov4_tiny', confidence_threshold=0.3, model_dir=self.model_dir, input_size=320)
+        expected = local.detect(cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR))
+        for detections, _, _ in await asyncio.gather(*pending):
+            self.assertEqual([(d.label, d.box) for d in detections], [(d.label, d.box) for d in expected])
+
+        # The parent replaces a worker process that dies
+        os.kill(stats['shared-0']['pid'], 9)
+        await self.wait_until(lambda: 'shared-0' in self.pool.workers and
+                              self.pool.workers['shared-0'].status.get('pid') not in (None, stats['shared-0']['pid']))
+
+if __name__ == "__main__":
+    unittest.main()
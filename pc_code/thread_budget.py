@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+CPU Thread Budget for the AI WiFi CAM Server
+
+OpenCV's DNN thread pool, MediaPipe and our own executors all default to
+one thread per logical CPU. Running them side by side (several cameras,
+or several inference worker processes on one machine) starts more
+threads than there are cores. They then preempt each other, migrate
+between cores and evict each other's caches. Inference gets slower and
+its latency less predictable.
+
+A ThreadBudget divides the CPUs this process may use between the
+pipeline stages, gives each stage a thread count, and pins each stage's
+threads to its CPUs:
+
+- ingest: the event loop, which receives, decodes and annotates frames
+- inference: the thread running the model, and the OpenCV pool and
+  MediaPipe threads it starts (cv2.setNumThreads)
+- encode: JPEG encoding of the annotated frames for web clients
+
+Threads started by a pinned thread inherit its CPUs, so pinning the
+thread that loads and runs the model covers the threads OpenCV and
+MediaPipe start for it.
+
+The automatic budget works in physical cores and keeps hyper-threading
+siblings together, because DNN inference gains little from a core's
+second hardware thread. Inference gets one thread per physical core.
+Ingest and encode share one core, or get cores of their own on machines
+with 8 or more. Pinning uses os.sched_setaffinity, which only exists on
+Linux; elsewhere only the thread counts are applied.
+"""
+
+import logging
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+
+# CPUs (logical CPU numbers) and thread count of one stage
+StageBudget = namedtuple('StageBudget', ['cpus', 'threads'])
+
+
+def parse_cpu_list(text):
+    """
+    Parse a CPU list such as '0-3,6' (the format of taskset and /sys).
+
+    Returns:
+        list: Sorted CPU numbers
+
+    Raises:
+        ValueError: If the list is empty or malformed
+    """
+    cpus = set()
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        try:
+            first = int(first)
+            last = int(last) if last else first
+        except ValueError:
+            raise ValueError(f"Invalid CPU list: {text}")
+        if first < 0 or last < first:
+            raise ValueError(f"Invalid CPU range: {part}")
+        cpus.update(range(first, last + 1))
+    if not cpus:
+        raise ValueError(f"Empty CPU list: {text!r}")
+    return sorted(cpus)
+
+
+def format_cpu_list(cpus):
+    """Format CPU numbers as a compact list such as '0-3,6'."""
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+def available_cpus():
+    """Return the CPUs this process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def cpu_topology(cpus=None, sysfs='/sys/devices/system/cpu'):
+    """
+    Group CPUs into physical cores.
+
+    Args:
+        cpus (list): Logical CPUs to group (default: the CPUs this process may use)
+        sysfs (str): Location of the kernel's CPU topology files
+
+    Returns:
+        list: One sorted list of logical CPUs (hyper-threading siblings) per physical
+        core, ordered by their first CPU. Without topology information (non-Linux),
+        every CPU counts as a core.
+    """
+    cpus = available_cpus() if cpus is None else sorted(cpus)
+    cores = {}
+    for cpu in cpus:
+        topology = Path(sysfs) / f"cpu{cpu}" / "topology"
+        try:
+            key = ((topology / 'physical_package_id').read_text().strip(),
+                   (topology / 'core_id').read_text().strip())
+        except OSError:
+            key = ('cpu', cpu)
+        cores.setdefault(key, []).append(cpu)
+    return sorted(cores.values())
+
+
+def split_cores(cores, count):
+    """
+    Divide physical cores into count groups that are as even as possible.
+
+    With fewer cores than groups, groups share cores round-robin.
+
+    Returns:
+        list: count StageBudgets with one thread per physical core
+    """
+    if len(cores) < count:
+        return [StageBudget(cores[index % len(cores)], 1) for index in range(count)]
+    groups = []
+    start = 0
+    for index in range(count):
+        size = len(cores) // count + (1 if index < len(cores) % count else 0)
+        group = cores[start:start + size]
+        groups.append(StageBudget(sorted(cpu for core in group for cpu in core), len(group)))
+        start += size
+    return groups
+
+
+class ThreadBudget:
+    """Class assigning CPUs and thread counts to the pipeline stages."""
+
+    def __init__(self, stages):
+        """
+        Initialize the budget.
+
+        Args:
+            stages (dict): StageBudget per stage name; stages left out are not restricted
+        """
+        self.stages = dict(stages)
+
+    @classmethod
+    def auto(cls, cores=None, ingest=True):
+        """
+        Budget the available cores automatically.
+
+        Args:
+            cores (list): Physical cores as returned by cpu_topology() (default: this machine's)
+            ingest (bool): Reserve cores for ingest and encode; False gives everything to
+                inference (e.g. for inference worker processes)
+
+        Returns:
+            ThreadBudget: The budget
+        """
+        cores = cpu_topology() if cores is None else cores
+        everything = sorted(cpu for core in cores for cpu in core)
+        if not ingest:
+            return cls({'inference': StageBudget(everything, len(cores))})
+        if len(cores) == 1:
+            # Nothing to divide; still keep inference from starting a thread per logical CPU
+            single = StageBudget(everything, 1)
+            return cls({'ingest': single, 'inference': single, 'encode': single})
+
+        # One ingest core per 8, plus one encode core per 16 from 8 cores up
+        ingest_count = max(1, len(cores) // 8)
+        encode_count = len(cores) // 16 if len(cores) >= 16 else (1 if len(cores) >= 8 else 0)
+        ingest_cores = cores[:ingest_count]
+        encode_cores = cores[ingest_count:ingest_count + encode_count] or ingest_cores
+        inference_cores = cores[ingest_count + encode_count:]
+        flatten = lambda group: sorted(cpu for core in group for cpu in core)
+        return cls({
+            'ingest': StageBudget(flatten(ingest_cores), 1),
+            'inference': StageBudget(flatten(inference_cores), len(inference_cores)),
+            'encode': StageBudget(flatten(encode_cores), 1)
+        })
+
+    @classmethod
+    def from_args(cls, mode, ingest_cpus=None, inference_cpus=None, encode_cpus=None, inference_threads=None,
+                  ingest=True):
+        """
+        Build the budget selected by command-line options.
+
+        Args:
+            mode (str): 'auto' for the automatic budget, 'off' for none
+            ingest_cpus (str): CPU list overriding the ingest stage
+            inference_cpus (str): CPU list overriding the inference stage
+            encode_cpus (str): CPU list overriding the encode stage
+            inference_threads (int): Inference thread count (default: physical cores of its CPUs)
+            ingest (bool): Whether this process has ingest and encode stages
+
+        Returns:
+            ThreadBudget: The budget, or None if it is off and nothing is overridden
+
+        Raises:
+            ValueError: If a CPU list is invalid or names CPUs this process can't use
+        """
+        overrides = {'ingest': ingest_cpus, 'inference': inference_cpus, 'encode': encode_cpus}
+        if mode == 'off' and not any(overrides.values()):
+            return None
+        cores = cpu_topology()
+        budget = cls.auto(cores, ingest=ingest) if mode != 'off' else cls({})
+        allowed = set(cpu for core in cores for cpu in core)
+        for stage, text in overrides.items():
+            if not text:
+                continue
+            cpus = parse_cpu_list(text)
+            if not set(cpus) <= allowed:
+                raise ValueError(f"--{stage}-cpus {text} names CPUs outside {format_cpu_list(allowed)}")
+            physical = len([core for core in cores if set(core) & set(cpus)])
+            budget.stages[stage] = StageBudget(cpus, physical if stage == 'inference' else 1)
+        if inference_threads and 'inference' in budget.stages:
+            budget.stages['inference'] = budget.stages['inference']._replace(threads=inference_threads)
+        return budget
+
+    def threads(self, stage):
+        """Return a stage's thread count, or None if it is not budgeted."""
+        budget = self.stages.get(stage)
+        return budget.threads if budget is not None else None
+
+    def split(self, stage, count):
+        """Divide a stage's CPUs between count processes (e.g. inference worker processes)."""
+        budget = self.stages[stage]
+        return split_cores(cpu_topology(budget.cpus), count)
+
+    def enter(self, stage):
+        """
+        Restrict the calling thread to a stage's CPUs (and, for inference, set OpenCV's thread count).
+
+        Threads it starts afterwards inherit the CPUs, so call this before the stage
+        loads models or starts thread pools.
+        """
+        budget = self.stages.get(stage)
+        if budget is None:
+            return
+        pin_current_thread(budget.cpus)
+        if stage == 'inference':
+            cv2.setNumThreads(budget.threads)
+
+    def executor(self, stage, name=None):
+        """Return a single-thread executor whose thread runs within a stage's budget."""
+        return ThreadPoolExecutor(max_workers=1, thread_name_prefix=name or stage,
+                                  initializer=self.enter, initargs=(stage,))
+
+    def describe(self):
+        """Return the budget as {stage: {'cpus': '0-3', 'threads': n}}."""
+        return {stage: {'cpus': format_cpu_list(budget.cpus), 'threads': budget.threads}
+                for stage, budget in self.stages.items()}
+
+    def log(self):
+        """Log the budget of every stage."""
+        for stage, budget in self.describe().items():
+            logging.info(f"CPU budget for {stage}: CPUs {budget['cpus']}, {budget['threads']} thread(s)")
+
+
+def pin_current_thread(cpus):
+    """
+    Restrict the calling thread to the given CPUs (Linux only).
+
+    Returns:
+        bool: Whether the thread was pinned
+    """
+    if not hasattr(os, 'sched_setaffinity'):
+        return False
+    try:
+        # On Linux, 0 means the calling thread rather than the whole process
+        os.sched_setaffinity(0, cpus)
+        return True
+    except OSError as e:
+        logging.warning(f"Cannot pin thread {threading.current_thread().name} to CPUs "
+                        f"{format_cpu_list(cpus)}: {e}")
+        return False
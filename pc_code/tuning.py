@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Runtime Profiles for the AI WiFi CAM Server
+
+Which model, input size, thread count and number of inference processes a
+machine can sustain depends on its CPU, its OpenCV build and how many
+cameras it serves, so the server's defaults rarely suit it. check_system.py
+--tune measures the machine (JPEG decoding, and inference time per model,
+input size and thread count) and choose_settings() picks the best
+configuration for a target camera count and frame rate from those
+measurements. The result is written as a runtime profile that
+stream_receiver.py applies at startup as the defaults of its options, so
+options given on the command line still win.
+
+The choice works like this:
+
+- Frames are decoded on the event loop thread, so decoding limits the
+  total frame rate. The camera frame rate is capped to what one core can
+  decode (--max-camera-fps). That core is kept out of inference on
+  machines with more than one core; on a single core, inference gets
+  what decoding leaves.
+- Each configuration of model, input size and threads per process is run
+  by as many processes as the remaining cores allow (the server's own
+  inference thread plus --local-workers worker processes). Throughput is
+  assumed to grow linearly with the processes, so only part of it is
+  counted (HEADROOM), which also leaves room for annotation and encoding.
+- Of the configurations that keep up, the one detecting on the most
+  frames wins (lowest interval N in --model name:N), then the most
+  accurate model, then the largest input size, then the lowest latency,
+  then the fewest cores.
+- When none keeps up, the one with the highest throughput at the longest
+  interval is chosen and the profile records the frame rate it sustains.
+
+The input size, thread count and detection interval suit the profile's
+model only, so they are not applied when --model names another one.
+"""
+
+import argparse
+import json
+import os
+import platform
+import time
+from pathlib import Path
+
+from thread_budget import cpu_topology
+
+PROFILE_PATH = Path(__file__).parent / 'runtime_profile.json'
+PROFILE_VERSION = 1
+
+# Share of the measured throughput a configuration may use
+HEADROOM = 0.75
+
+# Longest detection interval to consider (detect on every N-th frame)
+MAX_INTERVAL = 3
+
+# Relative accuracy of the object detectors (COCO mAP), higher is better.
+# Models not listed (MediaPipe) rank below them.
+MODEL_QUALITY = {
+    'yolov4': 4,
+    'yolov8n_onnx': 3,
+    'yolov5n_onnx': 2,
+    'yolov4_tiny': 1,
+}
+
+# Options stream_receiver.py takes from a profile, by argparse destination
+PROFILE_OPTIONS = ('model', 'input_size', 'dnn_threads', 'local_workers', 'max_camera_fps')
+
+# Options chosen for the profile's model, which other models don't take
+MODEL_OPTIONS = ('input_size', 'dnn_threads')
+
+
+def host_info():
+    """Return what identifies this machine's performance: architecture and CPU counts."""
+    cores = cpu_topology()
+    return {
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'cpus': sum(len(core) for core in cores),
+        'cores': len(cores),
+    }
+
+
+def choose_settings(measurements, decode_ms, cameras, fps, cores, headroom=HEADROOM, max_interval=MAX_INTERVAL):
+    """
+    Choose the settings that best serve cameras at fps on this machine.
+
+    Args:
+        measurements (list): Dicts with model, input_size (None if fixed), threads and detect_ms
+        decode_ms (float): Time to decode one camera JPEG
+        cameras (int): Number of cameras to serve
+        fps (float): Target frame rate per camera
+        cores (int): Physical CPU cores
+        headroom (float): Share of the measured throughput that may be used
+        max_interval (int): Longest detection interval to consider
+
+    Returns:
+        dict: settings (by stream_receiver option), and the expected performance
+
+    Raises:
+        ValueError: If there are no measurements
+    """
+    if not measurements:
+        raise ValueError("No inference measurements to choose from")
+
+    # The event loop decodes every frame on one core
+    decode_fps = headroom * 1000.0 / decode_ms if decode_ms > 0 else float('inf')
+    camera_fps = min(fps, decode_fps / cameras)
+    inference_cores = max(1, cores - 1) if cores > 1 else 1
+    # On a single core, inference only gets what decoding leaves of it
+    shared = 1.0 if cores > 1 else max(0.1, 1.0 - cameras * camera_fps * decode_ms / 1000.0)
+
+    candidates = []
+    for measurement in measurements:
+        threads = measurement['threads'] or 1
+        if threads > inference_cores:
+            continue
+        for processes in range(1, inference_cores // threads + 1):
+            throughput = headroom * shared * processes * 1000.0 / measurement['detect_ms']
+            for interval in range(1, max_interval + 1):
+                candidates.append({
+                    'measurement': measurement,
+                    'processes': processes,
+                    'interval': interval,
+                    'throughput': throughput,
+                    'fits': throughput >= cameras * camera_fps / interval
+                })
+    if not candidates:
+        # Every measurement used more threads than there are cores
+        measurement = min(measurements, key=lambda m: m['detect_ms'])
+        candidates.append({'measurement': measurement, 'processes': 1, 'interval': max_interval,
+                           'throughput': headroom * shared * 1000.0 / measurement['detect_ms'], 'fits': False})
+
+    fitting = [candidate for candidate in candidates if candidate['fits']]
+    if fitting:
+        best = max(fitting, key=lambda c: (
+            -c['interval'],
+            MODEL_QUALITY.get(c['measurement']['model'], 0),
+            c['measurement']['input_size'] or 0,
+            -c['measurement']['detect_ms'],
+            -c['processes'] * (c['measurement']['threads'] or 1)
+        ))
+    else:
+        best = max(candidates, key=lambda c: (c['throughput'] * c['interval'], -c['measurement']['detect_ms']))
+        camera_fps = min(camera_fps, best['throughput'] * best['interval'] / cameras)
+
+    measurement = best['measurement']
+    model = measurement['model'] if best['interval'] == 1 else f"{measurement['model']}:{best['interval']}"
+    return {
+        'settings': {
+            'model': model,
+            'input_size': measurement['input_size'],
+            'dnn_threads': measurement['threads'],
+            'local_workers': best['processes'] - 1,
+            'max_camera_fps': round(camera_fps, 1)
+        },
+        'expected': {
+            'meets_target': bool(fitting) and camera_fps >= fps,
+            'camera_fps': round(camera_fps, 1),
+            'inferences_per_second': round(best['throughput'] / headroom / shared, 1),
+            'detect_ms': measurement['detect_ms'],
+            'decode_fps': round(decode_fps / headroom, 1)
+        }
+    }
+
+
+def save_profile(path, choice, measurements, decode_ms, cameras, fps, host=None):
+    """Write a runtime profile atomically."""
+    profile = {
+        'version': PROFILE_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': host or host_info(),
+        'target': {'cameras': cameras, 'fps': fps},
+        'settings': choice['settings'],
+        'expected': choice['expected'],
+        'measurements': {'decode_ms': decode_ms, 'inference': measurements}
+    }
+    path = Path(path)
+    temporary = path.with_suffix('.tmp')
+    temporary.write_text(json.dumps(profile, indent=2) + '\n')
+    os.replace(temporary, path)
+    return profile
+
+
+def load_profile(path, host=None):
+    """
+    Read a runtime profile and check that it was made on this kind of machine.
+
+    Args:
+        path (str): Profile file
+        host (dict): This machine's host_info() (measured if None)
+
+    Returns:
+        dict: The profile, or None if the file doesn't exist
+
+    Raises:
+        ValueError: If the profile is unreadable, of another version, or from another machine
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        profile = json.loads(path.read_text())
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Cannot read runtime profile {path}: {e}")
+    if not isinstance(profile, dict) or profile.get('version') != PROFILE_VERSION:
+        raise ValueError(f"Runtime profile {path} has an unsupported version")
+    host = host or host_info()
+    recorded = profile.get('host', {})
+    different = [key for key in ('machine', 'cpus', 'cores') if recorded.get(key) != host[key]]
+    if different:
+        raise ValueError(f"Runtime profile {path} was made on another machine "
+                         f"({', '.join(f'{key} {recorded.get(key)} != {host[key]}' for key in different)})")
+    return profile
+
+
+def profile_defaults(profile, model=None):
+    """
+    Return the option defaults a profile sets, by argparse destination.
+
+    Args:
+        profile (dict): Runtime profile
+        model (str): Model spec given on the command line, or None to use the profile's
+
+    Returns:
+        dict: Option defaults, without the model's settings if model is another model
+    """
+    settings = profile.get('settings', {})
+    defaults = {option: settings[option] for option in PROFILE_OPTIONS if settings.get(option) is not None}
+    if model is not None:
+        # The detection interval is part of the model spec, so the given one replaces it
+        profile_model = defaults.pop('model', None)
+        if profile_model is None or model.strip().partition(':')[0] != profile_model.partition(':')[0]:
+            for option in MODEL_OPTIONS:
+                defaults.pop(option, None)
+    return defaults
+
+
+def apply_profile(parser, profile, argv=None):
+    """
+    Set a profile's settings as the defaults of stream_receiver's options.
+
+    Args:
+        parser (argparse.ArgumentParser): Parser with the options in PROFILE_OPTIONS
+        profile (dict): Runtime profile
+        argv (list): Command line arguments (default: sys.argv)
+
+    Returns:
+        dict: The defaults set, by argparse destination
+    """
+    # Attributes already in the namespace don't get their default, so model is None unless given
+    model = parser.parse_known_args(argv, namespace=argparse.Namespace(model=None))[0].model
+    defaults = profile_defaults(profile, model)
+    parser.set_defaults(**defaults)
+    return defaults
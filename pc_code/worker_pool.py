@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Remote Inference Workers for the AI WiFi CAM Server
+
+One PC runs out of CPU after a few cameras. Inference workers
+(inference_worker.py) run the AI model on other machines, or in other
+processes on the same one, and connect back to the receiver over TCP. The
+receiver sends them the camera's JPEG bytes, with its regions of interest
+if it has any, and gets compact detection results back; decoding and
+inference happen on the worker, which crops the frame to the regions just
+as local inference does.
+
+The WorkerPool on the receiver side:
+
+- Tells every worker which model and confidence threshold to use, when it
+  connects and whenever the settings change.
+- Sends each frame to the worker expected to finish it first, judged by
+  the number of frames it has in flight and its measured turnaround time.
+- Never has more than max_in_flight frames outstanding per worker. A small
+  number above one hides the network round trip without queueing frames
+  on a slow worker.
+- Fails the frames of a worker that disconnects or doesn't answer in time
+  with WorkerLost, so the receiver can run them locally instead. A worker
+  that times out repeatedly is disconnected.
+
+Messages in both directions are a 4-byte big-endian body length, a 1-byte
+kind and the body:
+
+    H  worker -> receiver  JSON hello: {"name": ...}
+    C  receiver -> worker  JSON config: {"model": spec, "confidence": threshold}
+    S  worker -> receiver  JSON status after each config: process ID, model, memory use in MB
+                           (rss, pss, private), model load and worker spawn time in seconds
+    J  receiver -> worker  job ID (uint32), input size (uint16, 0 for default), regions length
+                           (uint32), JSON regions of interest (normalized, see roi.py) or nothing, JPEG
+    R  worker -> receiver  job ID (uint32), JSON {"detections": [...], "shape": [h, w], "ms": ...}
+                           or {"error": message}
+
+Detections are sent as [label, confidence, [x, y, w, h], class_id, source, landmarks].
+"""
+
+import asyncio
+import json
+import logging
+import struct
+import time
+
+import numpy as np
+
+from model_backends import Detection
+
+MESSAGE = struct.Struct('!IB')
+JOB = struct.Struct('!IHI')
+RESULT = struct.Struct('!I')
+
+HELLO = b'H'
+CONFIG = b'C'
+STATUS = b'S'
+JOB_KIND = b'J'
+RESULT_KIND = b'R'
+
+
+class WorkerLost(Exception):
+    """Raised when a worker could not return the result of a frame."""
+
+
+def pack_message(kind, body):
+    """Frame a message body for the worker protocol."""
+    return MESSAGE.pack(len(body), kind[0]) + body
+
+
+def encode_detections(detections):
+    """Turn Detection tuples into JSON-serializable lists."""
+    encoded = []
+    for detection in detections:
+        landmarks = None
+        if detection.landmarks is not None:
+            landmarks = np.round(np.asarray(detection.landmarks, dtype=float), 3).tolist()
+        encoded.append([detection.label, round(float(detection.confidence), 4),
+                        [int(value) for value in detection.box], int(detection.class_id),
+                        detection.source, landmarks])
+    return encoded
+
+
+def decode_detections(encoded):
+    """Turn lists from encode_detections() back into Detection tuples."""
+    detections = []
+    for label, confidence, box, class_id, source, landmarks in encoded:
+        if landmarks is not None:
+            landmarks = np.array(landmarks, dtype=np.float32)
+        detections.append(Detection(label, confidence, tuple(box), class_id, source, landmarks))
+    return detections
+
+
+class RemoteWorker:
+    """Connection to one inference worker and its load."""
+
+    def __init__(self, name, reader, writer, max_in_flight):
+        """
+        Initialize the worker connection.
+
+        Args:
+            name (str): Worker name from its hello message
+            reader (asyncio.StreamReader): Connection reader
+            writer (asyncio.StreamWriter): Connection writer
+            max_in_flight (int): Most frames sent to the worker without a result
+        """
+        self.name = name
+        self.reader = reader
+        self.writer = writer
+        self.max_in_flight = max_in_flight
+        self.address = writer.get_extra_info('peername')
+        self.in_flight = {}
+        self.status = {}
+
+        # Smoothed turnaround (seconds) and counters
+        self.turnaround = None
+        self.completed = 0
+        self.failed = 0
+        self.consecutive_timeouts = 0
+
+    @property
+    def free(self):
+        """Whether the worker can take another frame."""
+        return len(self.in_flight) < self.max_in_flight
+
+    def expected_finish(self, default_turnaround):
+        """Estimate how long a new frame would take, including those already in flight."""
+        turnaround = self.turnaround if self.turnaround is not None else default_turnaround
+        return (len(self.in_flight) + 1) * turnaround
+
+    def stats(self):
+        """Return the worker's counters and its last reported status."""
+        return dict(self.status, **{
+            'address': f"{self.address[0]}:{self.address[1]}" if self.address else None,
+            'in_flight': len(self.in_flight),
+            'completed': self.completed,
+            'failed': self.failed,
+            'turnaround_ms': round(1000 * self.turnaround, 1) if self.turnaround is not None else None
+        })
+
+
+class WorkerPool:
+    """Class to dispatch frames to remote inference workers."""
+
+    def __init__(self, max_in_flight=2, timeout=2.0, max_timeouts=3, smoothing=0.2, on_change=None):
+        """
+        Initialize an empty pool.
+
+        Args:
+            max_in_flight (int): Most frames outstanding per worker
+            timeout (float): Seconds to wait for a result before running the frame elsewhere
+            max_timeouts (int): Consecutive timeouts after which a worker is disconnected
+            smoothing (float): Weight of each new turnaround time in the moving average
+            on_change (callable): Called without arguments when workers connect or disconnect
+        """
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.max_timeouts = max_timeouts
+        self.smoothing = smoothing
+        self.on_change = on_change
+        self.workers = {}
+        self.config = {}
+        self._next_job = 0
+        self._server = None
+
+    async def start(self, host, port):
+        """Listen for worker connections."""
+        self._server = await asyncio.start_server(self.handle_connection, host, port)
+        return self._server
+
+    def close(self):
+        """Stop listening and disconnect all workers."""
+        if self._server is not None:
+            self._server.close()
+        for worker in list(self.workers.values()):
+            worker.writer.close()
+
+    @property
+    def capacity(self):
+        """Total number of frames the connected workers may have in flight."""
+        return sum(worker.max_in_flight for worker in self.workers.values())
+
+    def configure(self, **config):
+        """Update the model settings and send them to every worker (e.g. model=..., confidence=...)."""
+        self.config.update(config)
+        message = pack_message(CONFIG, json.dumps(self.config).encode('utf-8'))
+        for worker in self.workers.values():
+            worker.writer.write(message)
+
+    async def handle_connection(self, reader, writer):
+        """Register a worker, then read its results until it disconnects."""
+        worker = None
+        try:
+            kind, body = await self._read_message(reader)
+            if kind != HELLO:
+                raise ValueError(f"expected hello, got {kind!r}")
+            hello = json.loads(body)
+            name = str(hello.get('name') or writer.get_extra_info('peername'))
+            if name in self.workers:
+                name = f"{name}@{writer.get_extra_info('peername')}"
+
+            worker = RemoteWorker(name, reader, writer, self.max_in_flight)
+            writer.write(pack_message(CONFIG, json.dumps(self.config).encode('utf-8')))
+            self.workers[name] = worker
+            logging.info(f"Inference worker {name} connected from {worker.address}")
+            self._changed()
+
+            while True:
+                kind, body = await self._read_message(reader)
+                if kind == RESULT_KIND:
+                    self._resolve(worker, body)
+                elif kind == STATUS:
+                    worker.status = json.loads(body)
+
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except (ValueError, KeyError) as e:
+            logging.warning(f"Invalid message from inference worker: {e}")
+        finally:
+            writer.close()
+            if worker is not None:
+                self._remove(worker)
+
+    async def _read_message(self, reader):
+        """Read one message; returns (kind, body)."""
+        length, kind = MESSAGE.unpack(await reader.readexactly(MESSAGE.size))
+        return bytes([kind]), await reader.readexactly(length)
+
+    def _resolve(self, worker, body):
+        """Complete the frame a result belongs to."""
+        (job_id,) = RESULT.unpack_from(body)
+        job = worker.in_flight.pop(job_id, None)
+        if job is None:
+            # Arrived after its timeout; the frame was already handled elsewhere
+            return
+        future, sent = job
+        result = json.loads(body[RESULT.size:])
+        worker.consecutive_timeouts = 0
+        if 'error' in result:
+            worker.failed += 1
+            future.set_exception(WorkerLost(f"{worker.name}: {result['error']}"))
+            return
+
+        turnaround = time.monotonic() - sent
+        worker.turnaround = turnaround if worker.turnaround is None else \
+            worker.turnaround + self.smoothing * (turnaround - worker.turnaround)
+        worker.completed += 1
+        future.set_result((decode_detections(result['detections']), tuple(result['shape']), result['ms'] / 1000.0))
+
+    def _remove(self, worker):
+        """Forget a disconnected worker and fail its frames in flight."""
+        if self.workers.get(worker.name) is worker:
+            del self.workers[worker.name]
+            logging.warning(f"Inference worker {worker.name} disconnected")
+        for future, _ in worker.in_flight.values():
+            if not future.done():
+                future.set_exception(WorkerLost(f"{worker.name} disconnected"))
+        worker.failed += len(worker.in_flight)
+        worker.in_flight.clear()
+        self._changed()
+
+    def _changed(self):
+        """Notify the listener that the available capacity changed."""
+        if self.on_change is not None:
+            self.on_change()
+
+    def pick(self):
+        """Return the free worker expected to finish a new frame first, or None."""
+        free = [worker for worker in self.workers.values() if worker.free]
+        if not free:
+            return None
+        known = [worker.turnaround for worker in self.workers.values() if worker.turnaround is not None]
+        default = sum(known) / len(known) if known else 0.1
+        return min(free, key=lambda worker: worker.expected_finish(default))
+
+    def submit(self, jpeg, input_size=None, regions=None):
+        """
+        Send a frame to the best free worker.
+
+        Args:
+            jpeg (bytes): JPEG-encoded frame
+            input_size (int): Network input size to use (None for the model default)
+            regions (list): Camera's regions of interest to run the model on (None for the full frame)
+
+        Returns:
+            Awaitable resolving to (detections, frame shape, inference seconds) and raising
+            WorkerLost if the worker fails, or None if no worker is free
+        """
+        worker = self.pick()
+        if worker is None:
+            return None
+
+        self._next_job = (self._next_job + 1) & 0xFFFFFFFF
+        job_id = self._next_job
+        future = asyncio.get_running_loop().create_future()
+        worker.in_flight[job_id] = (future, time.monotonic())
+        regions = json.dumps(regions).encode('utf-8') if regions else b''
+        worker.writer.write(pack_message(JOB_KIND, JOB.pack(job_id, input_size or 0, len(regions)) +
+                                         regions + bytes(jpeg)))
+        return self._wait(worker, job_id, future)
+
+    async def _wait(self, worker, job_id, future):
+        """Wait for a result, giving up on the worker's frame after the timeout."""
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            worker.in_flight.pop(job_id, None)
+            worker.failed += 1
+            worker.consecutive_timeouts += 1
+            if worker.consecutive_timeouts >= self.max_timeouts:
+                logging.warning(f"Inference worker {worker.name} stopped answering")
+                worker.writer.close()
+            raise WorkerLost(f"{worker.name} timed out")
+
+    def stats(self):
+        """Return the counters of every connected worker."""
+        return {name: worker.stats() for name, worker in self.workers.items()}
@@ -3,8 +3,13 @@ let webSocket = null;
 let imageWebSocket = null;
 let isConnected = false;
 let startTime = null;
-let snapshotCounter = 0;
 let fpsUpdateInterval = null;
+let cameraStats = {};
+let videoWorker = null;
+let videoContext = null;
+let decoding = false;
+let renderedFrames = 0;
+let droppedFrames = 0;
 
 // DOM elements
 const videoStream = document.getElementById('video-stream');
@@ -13,6 +18,9 @@ const statusValue = document.getElementById('status-value');
 const fpsValue = document.getElementById('fps-value');
 const resolutionValue = document.getElementById('resolution-value');
 const detectionsValue = document.getElementById('detections-value');
+const renderFpsValue = document.getElementById('render-fps-value');
+const droppedFramesValue = document.getElementById('dropped-frames-value');
+const inputSizeValue = document.getElementById('input-size-value');
 const uptimeValue = document.getElementById('uptime-value');
 const loadingOverlay = document.getElementById('loading-overlay');
 const snapshotBtn = document.getElementById('snapshot-btn');
@@ -22,6 +30,7 @@ const confidenceValue = document.getElementById('confidence-value');
 const aiModel = document.getElementById('ai-model');
 const displayFps = document.getElementById('display-fps');
 const applySettings = document.getElementById('apply-settings');
+const activityRows = document.getElementById('activity-rows');
 const snapshotsGrid = document.getElementById('snapshots-grid');
 const snapshotModal = document.getElementById('snapshot-modal');
 const modalImage = document.getElementById('modal-image');
@@ -72,9 +81,15 @@ function initializeApp() {
         downloadSnapshot();
     });
 
+    // Decode and draw video frames off the main thread where the browser allows it
+    setupVideoRendering();
+
     // Connect to the server
     connectToServer();
 
+    // Show the snapshots already stored on the server
+    loadSnapshots();
+
     // Start the uptime counter
     startTime = new Date();
     setInterval(updateUptime, 1000);
@@ -117,8 +132,19 @@ function connectToServer() {
         handleWebSocketMessage(event);
     };
 
+    // Video frames are received by the video worker if there is one
+    const videoUrl = `${protocol}//${host}:${port}/video`;
+    if (videoWorker) {
+        videoWorker.postMessage({ command: 'connect', url: videoUrl });
+        return;
+    }
+    
     // Image WebSocket for receiving video frames
-    imageWebSocket = new WebSocket(`${protocol}//${host}:${port}/video`);
+    if (imageWebSocket) {
+        imageWebSocket.onmessage = null;
+        imageWebSocket.close();
+    }
+    imageWebSocket = new WebSocket(videoUrl);
     
     imageWebSocket.onopen = () => {
         console.log('Image WebSocket connected');
@@ -150,6 +176,8 @@ function handleWebSocketMessage(event) {
             updateStats(data);
         } else if (data.type === 'detections') {
             updateDetections(data);
+        } else if (data.type === 'snapshot') {
+            snapshotsGrid.prepend(createSnapshotItem(data.snapshot));
         } else if (data.type === 'error') {
             console.error('Server error:', data.message);
         }
@@ -158,15 +186,87 @@ function handleWebSocketMessage(event) {
     }
 }
 
-// Handle image messages
+// Start the video worker, handing it the canvas if it can draw there itself
+function setupVideoRendering() {
+    if (window.Worker && window.createImageBitmap) {
+        videoWorker = new Worker('js/video-worker.js');
+        videoWorker.onmessage = handleVideoWorkerMessage;
+        
+        if (videoStream.transferControlToOffscreen) {
+            const offscreen = videoStream.transferControlToOffscreen();
+            videoWorker.postMessage({ command: 'canvas', canvas: offscreen }, [offscreen]);
+            return;
+        }
+    } else {
+        // No worker: frames are decoded here and counted for the render stats
+        setInterval(() => {
+            updateRenderStats({ fps: renderedFrames, dropped: droppedFrames });
+            renderedFrames = 0;
+        }, 1000);
+    }
+    videoContext = videoStream.getContext('2d');
+}
+
+// Handle messages from the video worker
+function handleVideoWorkerMessage(event) {
+    const data = event.data;
+    
+    if (data.type === 'frame') {
+        // Decoded by the worker, which waits for this frame to be drawn before decoding the next
+        drawFrame(data.bitmap);
+        data.bitmap.close();
+        videoWorker.postMessage({ command: 'drawn' });
+    } else if (data.type === 'first-frame') {
+        showVideo();
+    } else if (data.type === 'stats') {
+        updateRenderStats(data);
+    } else if (data.type === 'open') {
+        console.log('Image WebSocket connected');
+    } else if (data.type === 'close') {
+        console.log('Image WebSocket disconnected');
+    } else if (data.type === 'error') {
+        console.error('Image WebSocket error');
+    }
+}
+
+// Draw a decoded frame on the video canvas
+function drawFrame(image) {
+    if (videoStream.width !== image.width || videoStream.height !== image.height) {
+        videoStream.width = image.width;
+        videoStream.height = image.height;
+        resolutionValue.textContent = `${image.width} × ${image.height}`;
+    }
+    videoContext.drawImage(image, 0, 0);
+}
+
+// Handle image messages when there is no video worker
 function handleImageMessage(event) {
-    // Convert blob to image URL
-    const imageUrl = URL.createObjectURL(event.data);
-    
-    // Update the video stream
-    videoStream.src = imageUrl;
+    // Drop frames that arrive while the previous one is still decoding
+    if (decoding) {
+        droppedFrames++;
+        return;
+    }
+    decoding = true;
     
-    // Hide loading overlay if it's visible
+    // The object URL is released as soon as the image has been decoded or failed
+    const imageUrl = URL.createObjectURL(event.data);
+    const image = new Image();
+    image.onload = () => {
+        URL.revokeObjectURL(imageUrl);
+        drawFrame(image);
+        renderedFrames++;
+        decoding = false;
+        showVideo();
+    };
+    image.onerror = () => {
+        URL.revokeObjectURL(imageUrl);
+        decoding = false;
+    };
+    image.src = imageUrl;
+}
+
+// Hide the loading overlay once frames arrive
+function showVideo() {
     if (loadingOverlay.style.display === 'flex') {
         loadingOverlay.style.display = 'none';
         
@@ -177,14 +277,15 @@ function handleImageMessage(event) {
         // Update connection status
         updateConnectionStatus(true);
     }
-    
-    // Clean up the object URL to avoid memory leaks
-    videoStream.onload = () => {
-        URL.revokeObjectURL(imageUrl);
-        
-        // Update resolution value
-        resolutionValue.textContent = `${videoStream.naturalWidth} × ${videoStream.naturalHeight}`;
-    };
+}
+
+// Show how fast this browser renders the video and how many frames it dropped
+function updateRenderStats(data) {
+    renderFpsValue.textContent = data.fps;
+    droppedFramesValue.textContent = data.dropped;
+    if (data.width && data.height) {
+        resolutionValue.textContent = `${data.width} × ${data.height}`;
+    }
 }
 
 // Update connection status
@@ -216,6 +317,7 @@ function handleDisconnection() {
     // Reset stats
     fpsValue.textContent = '0';
     detectionsValue.textContent = '0';
+    renderFpsValue.textContent = '0';
 }
 
 // Update status information
@@ -227,6 +329,10 @@ function updateStatus(data) {
 
 // Update settings UI
 function updateSettingsUI(data) {
+    if (data.models) {
+        updateModelOptions(data.models);
+    }
+    
     if (data.ai_model) {
         aiModel.value = data.ai_model;
     }
@@ -241,11 +347,81 @@ function updateSettingsUI(data) {
     }
 }
 
-// Update statistics
+// Rebuild the AI model list from the models the server has registered
+function updateModelOptions(models) {
+    const selected = aiModel.value;
+    aiModel.innerHTML = '';
+    
+    for (const [name, description] of Object.entries(models)) {
+        const option = document.createElement('option');
+        option.value = name;
+        option.textContent = description;
+        aiModel.appendChild(option);
+    }
+    
+    if (models[selected]) {
+        aiModel.value = selected;
+    }
+}
+
+// Update statistics; the server pushes only the fields that changed since the last update
 function updateStats(data) {
-    if (data.fps) {
+    if (data.fps !== undefined) {
         fpsValue.textContent = data.fps;
     }
+    
+    if (data.input_size) {
+        inputSizeValue.textContent = `${data.input_size} × ${data.input_size}`;
+    }
+    
+    if (data.detections !== undefined) {
+        detectionsValue.textContent = data.detections;
+    }
+    
+    if (data.cameras !== undefined) {
+        cameraStats = data.cameras === null ? {} : mergeStats(cameraStats, data.cameras);
+        updateActivity();
+    }
+}
+
+// Apply changed stats fields to the stats received before; null removes a field
+function mergeStats(target, changes) {
+    for (const [key, value] of Object.entries(changes)) {
+        if (value === null) {
+            delete target[key];
+        } else if (typeof value === 'object' && !Array.isArray(value) &&
+                   typeof target[key] === 'object' && target[key] !== null) {
+            mergeStats(target[key], value);
+        } else {
+            target[key] = value;
+        }
+    }
+    return target;
+}
+
+// Show the rolling activity of every class seen on each camera
+function updateActivity() {
+    activityRows.innerHTML = '';
+    
+    for (const [cameraId, camera] of Object.entries(cameraStats)) {
+        for (const [label, activity] of Object.entries(camera.analytics || {})) {
+            const row = document.createElement('tr');
+            const cells = [
+                cameraId,
+                label,
+                activity.present ? `${Math.round(activity.dwell_s)} s` : '-',
+                `${activity['1m'].visits} / ${activity['15m'].visits} / ${activity['1h'].visits}`,
+                activity['1h'].peak,
+                `${Math.round(activity['1h'].presence_s / 60)} min`
+            ];
+            for (const value of cells) {
+                const cell = document.createElement('td');
+                cell.textContent = value;
+                row.appendChild(cell);
+            }
+            activityRows.appendChild(row);
+        }
+    }
 }
 
 // Update detections count
@@ -272,42 +448,55 @@ function applySettingsToServer() {
     webSocket.send(JSON.stringify(settings));
 }
 
-// Take a snapshot
+// Take a snapshot on the server; it replies with a 'snapshot' message
 function takeSnapshot() {
-    if (!isConnected) return;
+    if (!isConnected || !webSocket || webSocket.readyState !== WebSocket.OPEN) return;
     
-    // Create a canvas element
-    const canvas = document.createElement('canvas');
-    canvas.width = videoStream.naturalWidth;
-    canvas.height = videoStream.naturalHeight;
+    webSocket.send(JSON.stringify({ command: 'snapshot' }));
+}
+
+// Load the most recent snapshots stored on the server
+async function loadSnapshots() {
+    try {
+        const response = await fetch('/snapshots?limit=24');
+        if (!response.ok) return;
+        
+        const data = await response.json();
+        for (const snapshot of data.snapshots) {
+            snapshotsGrid.appendChild(createSnapshotItem(snapshot));
+        }
+    } catch (error) {
+        console.error('Error loading snapshots:', error);
+    }
+}
+
+// Create a grid item showing a snapshot's thumbnail
+function createSnapshotItem(snapshot) {
+    const timestamp = new Date(snapshot.time).toLocaleString();
+    const detections = snapshot.detections.length;
     
-    // Draw the current frame on the canvas
-    const ctx = canvas.getContext('2d');
-    ctx.drawImage(videoStream, 0, 0, canvas.width, canvas.height);
+    const snapshotItem = document.createElement('div');
+    snapshotItem.className = 'snapshot-item';
     
-    // Convert canvas to data URL
-    const dataUrl = canvas.toDataURL('image/jpeg');
+    const image = document.createElement('img');
+    image.src = snapshot.thumbnail_url || snapshot.url;
+    image.alt = `Snapshot ${snapshot.id}`;
+    image.loading = 'lazy';
     
-    // Create timestamp
-    const now = new Date();
-    const timestamp = now.toLocaleTimeString();
+    // Camera IDs come from the connection path, so don't treat them as HTML
+    const caption = document.createElement('div');
+    caption.className = 'snapshot-timestamp';
+    caption.textContent = `${snapshot.camera} · ${timestamp} · ${detections} detected`;
     
-    // Create snapshot item
-    const snapshotItem = document.createElement('div');
-    snapshotItem.className = 'snapshot-item';
-    snapshotItem.innerHTML = `
-        <img src="${dataUrl}" alt="Snapshot ${++snapshotCounter}">
-        <div class="snapshot-timestamp">${timestamp}</div>
-    `;
+    snapshotItem.append(image, caption);
     
-    // Add click event to open modal
+    // Open the full image in the modal
     snapshotItem.addEventListener('click', () => {
-        modalImage.src = dataUrl;
+        modalImage.src = snapshot.url;
         snapshotModal.style.display = 'block';
     });
     
-    // Add to snapshots grid
-    snapshotsGrid.prepend(snapshotItem);
+    return snapshotItem;
 }
 
 // Download snapshot
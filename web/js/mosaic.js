@@ -0,0 +1,40 @@
+// Wall display: one server-side composite of several cameras, drawn by the video worker
+const mosaicCanvas = document.getElementById('mosaic');
+const mosaicStatus = document.getElementById('mosaic-status');
+
+document.addEventListener('DOMContentLoaded', () => {
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const cameras = new URLSearchParams(window.location.search).get('cameras');
+    const query = cameras ? `?cameras=${encodeURIComponent(cameras)}` : '';
+    const url = `${protocol}//${window.location.host}/video/mosaic${query}`;
+
+    const worker = new Worker('js/video-worker.js');
+    let context = null;
+    if (mosaicCanvas.transferControlToOffscreen) {
+        const offscreen = mosaicCanvas.transferControlToOffscreen();
+        worker.postMessage({ command: 'canvas', canvas: offscreen }, [offscreen]);
+    } else {
+        context = mosaicCanvas.getContext('2d');
+    }
+
+    worker.onmessage = (event) => {
+        const data = event.data;
+
+        if (data.type === 'frame') {
+            mosaicCanvas.width = data.bitmap.width;
+            mosaicCanvas.height = data.bitmap.height;
+            context.drawImage(data.bitmap, 0, 0);
+            data.bitmap.close();
+            worker.postMessage({ command: 'drawn' });
+        } else if (data.type === 'first-frame') {
+            mosaicStatus.style.display = 'none';
+        } else if (data.type === 'close') {
+            // Reconnect after 5 seconds, like the main page
+            mosaicStatus.textContent = 'Disconnected';
+            mosaicStatus.style.display = 'block';
+            setTimeout(() => worker.postMessage({ command: 'connect', url }), 5000);
+        }
+    };
+
+    worker.postMessage({ command: 'connect', url });
+});
@@ -0,0 +1,93 @@
+// Video worker: receives the /video frames, decodes them off the main thread and draws them.
+//
+// Each JPEG is decoded with createImageBitmap. While a frame is being decoded (or, without
+// OffscreenCanvas, until the main thread has drawn it) newer frames are dropped instead of
+// queued, so a slow device shows the latest frame it can manage rather than falling behind.
+
+let socket = null;
+let canvas = null;
+let context = null;
+let busy = false;
+let firstFrame = true;
+
+// Counters reported to the main thread once per second
+let rendered = 0;
+let dropped = 0;
+let width = 0;
+let height = 0;
+
+self.onmessage = (event) => {
+    const message = event.data;
+
+    if (message.command === 'canvas') {
+        // OffscreenCanvas transferred from the page; frames are drawn here
+        canvas = message.canvas;
+        context = canvas.getContext('2d');
+    } else if (message.command === 'connect') {
+        connect(message.url);
+    } else if (message.command === 'drawn') {
+        // The main thread drew the frame it was sent
+        rendered++;
+        busy = false;
+    }
+};
+
+// Open the video WebSocket, replacing any previous connection
+function connect(url) {
+    if (socket) {
+        socket.onclose = null;
+        socket.close();
+    }
+    busy = false;
+    firstFrame = true;
+
+    socket = new WebSocket(url);
+    socket.binaryType = 'blob';
+    socket.onopen = () => self.postMessage({ type: 'open' });
+    socket.onclose = () => self.postMessage({ type: 'close' });
+    socket.onerror = () => self.postMessage({ type: 'error' });
+    socket.onmessage = (event) => handleFrame(event.data);
+}
+
+// Decode and draw a frame, or drop it if the previous one isn't done
+async function handleFrame(blob) {
+    if (busy) {
+        dropped++;
+        return;
+    }
+    busy = true;
+
+    let bitmap;
+    try {
+        bitmap = await createImageBitmap(blob);
+    } catch (error) {
+        busy = false;
+        return;
+    }
+    width = bitmap.width;
+    height = bitmap.height;
+
+    if (firstFrame) {
+        firstFrame = false;
+        self.postMessage({ type: 'first-frame' });
+    }
+
+    if (context) {
+        if (canvas.width !== width || canvas.height !== height) {
+            canvas.width = width;
+            canvas.height = height;
+        }
+        context.drawImage(bitmap, 0, 0);
+        bitmap.close();
+        rendered++;
+        busy = false;
+    } else {
+        // Transferred without copying; the main thread answers with 'drawn'
+        self.postMessage({ type: 'frame', bitmap }, [bitmap]);
+    }
+}
+
+setInterval(() => {
+    self.postMessage({ type: 'stats', fps: rendered, dropped, width, height });
+    rendered = 0;
+}, 1000);